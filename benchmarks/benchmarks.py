@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmarks for the ray tracing and analysis hot paths
+
+    The benchmarks follow the `asv <https://asv.readthedocs.io>`_
+    conventions: each suite is a class with optional `params` and
+    `param_names` attributes, a `setup` method taking the parameter values
+    and a set of `time_*` methods. They can be run by asv or by the
+    standalone runner, `run_benchmarks.py`, which writes the results as JSON
+    and compares them against a baseline.
+
+    The sample lenses used are:
+
+        - dbl_gauss: the double Gauss in codev/tests/ag_dblgauss.seq
+        - wide_angle: the Nikon Z 14-30mm zoom, with the wide angle
+          ray aiming switched on
+        - off_axis_mirror: the tilted and decentered mirror system in
+          codev/tests/dec_tilt_test.seq
+"""
+
+import subprocess
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.elem import profiles
+from rayoptics.parax import firstorder
+from rayoptics.optimize import dls
+from rayoptics.optimize.operands import EFL, SpotRMS
+from rayoptics.optimize.variables import (GapVariable, ProfileVariable,
+                                          get_values)
+from rayoptics.raytr import analyses, raytrace, vigcalc, wideangle
+from rayoptics.util.misc_math import normalize
+
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+root_pth = Path(ro.__file__).resolve().parent
+
+sample_lenses = {
+    'dbl_gauss': 'codev/tests/ag_dblgauss.seq',
+    'wide_angle': 'optical/tests/Nikon Nikkor Z 14-30mm f-4 S.roa',
+    'off_axis_mirror': 'codev/tests/dec_tilt_test.seq',
+    }
+
+model_files = {
+    'seq': 'codev/tests/ag_dblgauss.seq',
+    'roa': 'optical/tests/Nikon Nikkor Z 14-30mm f-4 S.roa',
+    'zmx': 'zemax/tests/US00583336-2-scaled.zmx',
+    }
+
+
+def open_sample_lens(name):
+    """ Open the sample lens `name`, ready for tracing. """
+    opm = open_model(root_pth/sample_lenses[name])
+    if name == 'wide_angle':
+        opm['osp']['fov'].is_wide_angle = True
+        opm.update_model()
+    return opm
+
+
+class RayTrace:
+    """ Single ray and ray grid tracing. """
+    params = list(sample_lenses.keys())
+    param_names = ['lens']
+
+    def setup(self, lens):
+        self.opm = opm = open_sample_lens(lens)
+        self.sm = opm['seq_model']
+        osp = opm['optical_spec']
+        self.fld = osp['fov'].fields[-1]
+        self.wvl = osp['wvls'].central_wvl
+        self.foc = osp['focus'].focus_shift
+        self.pt0, self.dir0 = osp.ray_start_from_osp([0.5, 0.5], self.fld,
+                                                     'rel pupil')
+        self.grid_def = [np.array([-1., -1.]), np.array([1., 1.]), 21]
+
+    def time_trace_raw(self, lens):
+        raytrace.trace_raw(self.sm.path(wl=self.wvl), self.pt0, self.dir0,
+                           self.wvl)
+
+    def time_trace_ray_grid(self, lens):
+        analyses.trace_ray_grid(self.opm, self.grid_def, self.fld, self.wvl,
+                                self.foc)
+
+
+class Analysis:
+    """ Wavefront, vignetting and first order calculations. """
+    params = list(sample_lenses.keys())
+    param_names = ['lens']
+
+    def setup(self, lens):
+        self.opm = opm = open_sample_lens(lens)
+        osp = opm['optical_spec']
+        self.fld = osp['fov'].fields[-1]
+        self.wvl = osp['wvls'].central_wvl
+        self.foc = osp['focus'].focus_shift
+
+    def time_eval_wavefront(self, lens):
+        analyses.eval_wavefront(self.opm, self.fld, self.wvl, self.foc,
+                                num_rays=21)
+
+    def time_eval_wavefront_256(self, lens):
+        analyses.eval_wavefront(self.opm, self.fld, self.wvl, self.foc,
+                                num_rays=256)
+
+    def time_calc_vignetting_for_field(self, lens):
+        vigcalc.calc_vignetting_for_field(self.opm, self.fld, self.wvl)
+
+    def time_set_vig(self, lens):
+        vigcalc.set_vig(self.opm)
+
+    def time_relative_illumination(self, lens):
+        analyses.RelativeIllumination(self.opm, num_flds=21)
+
+    def time_through_focus(self, lens):
+        analyses.ThroughFocus(self.opm, num_foc=101, num_rays=32)
+
+    def time_compute_first_order(self, lens):
+        firstorder.compute_first_order(self.opm,
+                                       self.opm['seq_model'].stop_surface,
+                                       self.wvl)
+
+    def time_compute_first_order_batch(self, lens):
+        sm = self.opm['seq_model']
+        thi = {1: sm.gaps[1].thi*np.linspace(0.8, 1.2, 10000)}
+        firstorder.compute_first_order_batch(self.opm, sm.stop_surface,
+                                             self.wvl, thi=thi)
+
+    def time_update_model(self, lens):
+        self.opm.update_model()
+
+
+class FindRealEnP:
+    """ The real entrance pupil search for wide angle systems. """
+
+    def setup(self):
+        self.opm = opm = open_sample_lens('wide_angle')
+        osp = opm['optical_spec']
+        self.stop = opm['seq_model'].stop_surface
+        self.fld = osp['fov'].fields[-1]
+        self.wvl = osp['wvls'].central_wvl
+
+    def time_find_real_enp(self):
+        # clear the previous result so the full search is done each time
+        self.fld.aim_info = None
+        wideangle.find_real_enp(self.opm, self.stop, self.fld, self.wvl)
+
+
+class PSF:
+    """ The FFT based PSF calculation. """
+    params = [32, 64]
+    param_names = ['num_rays']
+
+    def setup(self, num_rays):
+        opm = open_sample_lens('dbl_gauss')
+        ray_grid = analyses.RayGrid(opm, f=1, num_rays=num_rays)
+        self.wavefront = ray_grid.grid[2]
+        self.maxdim = 4*num_rays
+
+    def time_calc_psf(self, num_rays):
+        analyses.calc_psf(self.wavefront, len(self.wavefront), self.maxdim)
+
+
+class ProfileIntersect:
+    """ Ray intersection with each of the surface profiles. """
+    params = ['Spherical', 'Conic', 'EvenPolynomial', 'RadialPolynomial',
+              'YToroid', 'XToroid']
+    param_names = ['profile']
+
+    def setup(self, profile):
+        if profile == 'Spherical':
+            prf = profiles.Spherical(c=0.02)
+        elif profile == 'Conic':
+            prf = profiles.Conic(c=0.02, cc=-0.5)
+        elif profile == 'EvenPolynomial':
+            prf = profiles.EvenPolynomial(c=0.02, cc=-0.5,
+                                          coefs=[0., 1e-5, -2e-7, 3e-10])
+        elif profile == 'RadialPolynomial':
+            prf = profiles.RadialPolynomial(c=0.02, ec=0.5,
+                                            coefs=[0., 0., 1e-4, 0., -2e-7])
+        elif profile == 'YToroid':
+            prf = profiles.YToroid(c=0.02, cR=0.01, cc=-0.5,
+                                   coefs=[0., 1e-5, -2e-7])
+        elif profile == 'XToroid':
+            prf = profiles.XToroid(c=0.02, cR=0.01, cc=-0.5,
+                                   coefs=[0., 1e-5, -2e-7])
+        prf.update()
+        self.prf = prf
+        self.p0 = np.array([3., 4., -5.])
+        self.d0 = normalize(np.array([0.05, -0.1, 1.]))
+
+    def time_intersect(self, profile):
+        self.prf.intersect(self.p0, self.d0, 1.0e-12, 1.0)
+
+
+class Optimize:
+    """ Merit function evaluation and damped least squares iterations. """
+
+    def setup(self):
+        self.opm = opm = open_sample_lens('dbl_gauss')
+        efl = opm['analysis_results']['parax_data'].fod.efl
+        self.variables = [ProfileVariable(i, 'cv') for i in (1, 3, 9, 11)]
+        self.variables.append(GapVariable(11))
+        self.operands = [SpotRMS(fi) for fi in range(3)]
+        self.operands.append(EFL(target=efl))
+        self.x = get_values(opm, self.variables)
+
+    def time_merit_evaluation(self):
+        dls.evaluate(self.opm, self.variables, self.operands, self.x)
+
+    def time_dls_iteration(self):
+        dls.DampedLeastSquares(self.opm, self.variables, self.operands,
+                               max_iter=1).run()
+
+
+class OpenModel:
+    """ Reading lens files in each of the supported formats. """
+    params = list(model_files.keys())
+    param_names = ['file_type']
+    number = 1
+
+    def time_open_model(self, file_type):
+        open_model(root_pth/model_files[file_type])
+
+
+class Startup:
+    """ A new python process opening a model, as a batch worker would. """
+    params = ['roa', 'rob']
+    param_names = ['file_type']
+    number = 1
+
+    def setup(self, file_type):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        pth = root_pth/'optical/tests/cell_phone_camera.roa'
+        if file_type == 'rob':
+            pth = open_model(pth).save_snapshot(Path(self.tmp_dir.name)/'cell')
+        self.script = ("from rayoptics.gui.appcmds import open_model; "
+                       f"open_model({str(pth)!r})")
+
+    def teardown(self, file_type):
+        self.tmp_dir.cleanup()
+
+    def time_open_model_process(self, file_type):
+        subprocess.run([sys.executable, '-c', self.script], check=True)
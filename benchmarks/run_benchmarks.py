@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Run the benchmarks in benchmarks.py and save the results as JSON
+
+    Usage::
+
+        python run_benchmarks.py -o results.json
+        python run_benchmarks.py -o new.json --compare results.json
+        python run_benchmarks.py -k trace --repeat 7
+
+    Each benchmark is timed with :mod:`timeit`; the number of calls per
+    measurement is chosen automatically unless the suite defines a `number`
+    attribute. The JSON output records the environment (python, numpy and
+    rayoptics versions, platform) and, for each benchmark, the minimum and
+    median time per call in seconds.
+
+    With ``--compare``, benchmarks whose minimum time exceeds the baseline
+    by more than the threshold fraction are reported, and the exit status
+    is 1 if there are any regressions.
+"""
+
+import argparse
+import datetime
+import inspect
+import itertools
+import json
+import platform
+import statistics
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import benchmarks  # noqa: E402
+import rayoptics  # noqa: E402
+
+
+def benchmark_suites():
+    """ Return the benchmark classes defined in :mod:`benchmarks`. """
+    return [cls for name, cls in inspect.getmembers(benchmarks,
+                                                    inspect.isclass)
+            if cls.__module__ == benchmarks.__name__]
+
+
+def param_combinations(suite):
+    """ Return a list of parameter tuples for `suite`. """
+    params = getattr(suite, 'params', None)
+    if params is None:
+        return [()]
+    if not (params and isinstance(params[0], (list, tuple))):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def benchmark_name(suite, method, params):
+    name = f"{suite.__name__}.{method}"
+    if params:
+        name += '(' + ', '.join(str(p) for p in params) + ')'
+    return name
+
+
+def time_benchmark(suite, method, params, repeat):
+    """ Time `method` of an instance of `suite` set up with `params`. """
+    bench = suite()
+    if hasattr(bench, 'setup'):
+        bench.setup(*params)
+    fct = getattr(bench, method)
+    timer = timeit.Timer(lambda: fct(*params))
+    number = getattr(suite, 'number', 0)
+    if number == 0:
+        number, _ = timer.autorange()
+    times = [t/number for t in timer.repeat(repeat=repeat, number=number)]
+    if hasattr(bench, 'teardown'):
+        bench.teardown(*params)
+    return {'min': min(times),
+            'median': statistics.median(times),
+            'number': number,
+            'repeat': repeat,
+            'params': [str(p) for p in params],
+            }
+
+
+def run(pattern=None, repeat=5, file=sys.stdout):
+    """ Run the benchmarks whose names contain `pattern`. """
+    results = {}
+    for suite in benchmark_suites():
+        methods = [m for m in dir(suite) if m.startswith('time_')]
+        for method, params in itertools.product(methods,
+                                                param_combinations(suite)):
+            name = benchmark_name(suite, method, params)
+            if pattern is not None and pattern not in name:
+                continue
+            result = time_benchmark(suite, method, params, repeat)
+            results[name] = result
+            print(f"{name:60s} {1e3*result['min']:12.4f} ms", file=file)
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'rayoptics': rayoptics.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            }
+
+
+def compare(results, baseline, threshold, file=sys.stdout):
+    """ Return the names of the benchmarks slower than `baseline`. """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['min']/baseline[name]['min']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = 'REGRESSION'
+        print(f"{name:60s} {ratio:8.3f} {flag}", file=file)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON file of baseline results')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed fractional slowdown (default 0.2)')
+    parser.add_argument('-k', dest='pattern',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timing measurements (default 5)')
+    args = parser.parse_args(argv)
+
+    results = run(pattern=args.pattern, repeat=args.repeat)
+    output = {'environment': environment(), 'benchmarks': results}
+
+    if args.output:
+        with open(args.output, mode='w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['benchmarks']
+        print(f"\ntime ratio vs {args.compare}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than "
+                  f"{1 + args.threshold:.2f}x the baseline")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@
         - :mod:`~.oprops`: optical property and actions
         - :mod:`~.parax`: support for paraxial optical design
         - :mod:`~.raytr`: support for ray tracing and analysis
+        - :mod:`~.optimize`: damped least squares optimization
 
         - :mod:`~.codev`: handles import of CODE V .seq files
         - :mod:`~.zemax`: handles import of Zemax .zmx files
@@ -22,7 +22,6 @@ from rayoptics.raytr.opticalspec import Field
 from rayoptics.util.misc_math import isanumber
 
 import opticalglass as og
-from opticalglass import glassfactory as gfact
 from opticalglass import opticalmedium as om
 from opticalglass import modelglass as mg
 
@@ -34,14 +33,33 @@ logger.addHandler(_fh)
 
 _tla = tla.MapTLA()
 
-# Support for CODE V private catalog materials.
-# Should this be in OpticalModel?
-_reading_private_catalog = False
-_private_catalog_wvls = None
-_private_catalog_glasses = {}
 
-_glass_handler = None
-_track_contents = None
+class CVImportContext():
+    """ The parse state of a single .seq file import.
+
+    :func:`read_lens` creates a new context for each file and passes it to
+    the command functions, so that files can be imported concurrently from
+    multiple threads.
+
+    Attributes:
+        glass_handler: the :class:`CVGlassHandler` for the file
+        track_contents: Counter of the import statistics
+        reading_private_catalog: True while processing a PRV block
+        private_catalog_wvls: wavelengths of the current PRV block
+        private_catalog_glasses: dict of private catalog glasses by name
+    """
+
+    def __init__(self, filename):
+        self.track_contents = og.util.Counter()
+        self.reading_private_catalog = False
+        self.private_catalog_wvls = None
+        self.private_catalog_glasses = {}
+        self.glass_handler = CVGlassHandler(
+            filename, private_catalog_glasses=self.private_catalog_glasses)
+
+    def info(self) -> tuple[dict, dict]:
+        """ Return the import info tuple. """
+        return self.track_contents, self.glass_handler.glasses_not_found
 
 
 def fictitious_glass_decode(gc):
@@ -64,41 +82,35 @@ def read_lens(filename, **kwargs) -> tuple["OpticalModel", tuple[dict, dict]]:
         an OpticalModel instance and a info tuple
     """
     from rayoptics.optical.opticalmodel import OpticalModel
-    global _glass_handler, _track_contents
-    global _reading_private_catalog
-    _reading_private_catalog = False
-    _track_contents = og.util.Counter()
+    ctx = CVImportContext(filename)
     opt_model = OpticalModel(do_init=False)
-    _glass_handler = CVGlassHandler(filename)
     cmds = cvr.read_seq_file(filename)
     for i, c in enumerate(cmds):
-        cmd_fct, tla, qlist, dlist = process_command(c)
+        cmd_fct, tla, qlist, dlist = process_command(c, ctx)
         if cmd_fct:
-            eval_str = cmd_fct + '(opt_model, tla, qlist, dlist)'
+            eval_str = cmd_fct + '(opt_model, tla, qlist, dlist, ctx)'
             eval(eval_str)
         else:
             logger.info('Line %d: Command %s not supported', i+1, c[0])
 
-    post_process_input(opt_model, filename, **kwargs)
-    _glass_handler.save_replacements()
-    _track_contents.update(_glass_handler.track_contents)
+    post_process_input(opt_model, filename, ctx, **kwargs)
+    ctx.glass_handler.save_replacements()
+    ctx.track_contents.update(ctx.glass_handler.track_contents)
 
     opt_model.update_model()
 
-    if 'input ca list' in _track_contents:
+    if 'input ca list' in ctx.track_contents:
         # There are some surfaces with CA from the file but others with no 
         # data. Set clear apertures but avoid resetting the user specified 
         # imported apertures.
-        input_ca_list = _track_contents['input ca list']
+        input_ca_list = ctx.track_contents['input ca list']
         opt_model['sm'].set_clear_apertures(avoid_list=input_ca_list)
         opt_model.update_model()
 
-    info = _track_contents, _glass_handler.glasses_not_found
-    return opt_model, info
+    return opt_model, ctx.info()
 
 
-def process_command(cmd):
-    global _reading_private_catalog
+def process_command(cmd, ctx):
     CmdFct, IndxQuals, DataType, Quals = range(4)
     tla = cmd[0][:3].upper()
     qlist = []
@@ -142,17 +154,15 @@ def process_command(cmd):
             dlist.append(cmd[3])  # glass
         if cmd_len > 4:
             dlist.append(cmd[4])  # rmd
-    elif _reading_private_catalog and isinstance(cmd[0], str):
-        global _private_catalog_wvls, _private_catalog_glasses
+    elif ctx.reading_private_catalog and isinstance(cmd[0], str):
         label = cmd[0]
         if isanumber(cmd[1]):
             for t in cmd[1:]:
                 dlist.append(float(t))
             prv_glass = om.InterpolatedMedium(label, 
-                                            wvls=_private_catalog_wvls, 
+                                            wvls=ctx.private_catalog_wvls, 
                                             rndx=dlist, cat='CV private catalog')
-            _private_catalog_glasses[label] = prv_glass
-            gfact.register_glass(prv_glass)
+            ctx.private_catalog_glasses[label] = prv_glass
         else:
             logger.debug(f"Unsupported PRV glass def: {cmd[0]} {cmd[1]}")
 
@@ -163,8 +173,7 @@ def log_cmd(label, tla, qlist, dlist):
     logger.debug("%s: %s %s %s", label, tla, str(qlist), str(dlist))
 
 
-def post_process_input(opt_model, filename, **kwargs):
-    global _track_contents
+def post_process_input(opt_model, filename, ctx, **kwargs):
     sm = opt_model['seq_model']
     osp = opt_model['optical_spec']
 
@@ -184,31 +193,31 @@ def post_process_input(opt_model, filename, **kwargs):
     if math.isinf(sm.gaps[0].thi):
         sm.gaps[0].thi = 1e10
         conj_type = 'infinite'
-    _track_contents['conj type'] = conj_type
+    ctx.track_contents['conj type'] = conj_type
 
     sm.ifcs[0].label = 'Obj'
     sm.ifcs[0].interact_mode = 'dummy'
     sm.ifcs[-1].label = 'Img'
     sm.ifcs[-1].interact_mode = 'dummy'
-    _track_contents['# surfs'] = len(sm.ifcs)
+    ctx.track_contents['# surfs'] = len(sm.ifcs)
 
-    if _track_contents.get('# clear ap', 0) > 0:
+    if ctx.track_contents.get('# clear ap', 0) > 0:
         for ifc in sm.ifcs:
             ca_list = [i for i, ifc in enumerate(sm.ifcs) 
                        if len(ifc.get_ca_list()) > 0]
-        _track_contents['input ca list'] = ca_list
+        ctx.track_contents['input ca list'] = ca_list
         sm.do_apertures = False
 
-    _track_contents['# wvls'] = len(osp['wvls'].wavelengths)
+    ctx.track_contents['# wvls'] = len(osp['wvls'].wavelengths)
     
     fov = osp['fov']
-    _track_contents['fov'] = fov.key
-    _track_contents['# fields'] = len(fov.fields)
+    ctx.track_contents['fov'] = fov.key
+    ctx.track_contents['# fields'] = len(fov.fields)
     max_fld, max_fld_idx = fov.max_field()
     fov.value = max_fld
     fov.is_wide_angle = fov.check_is_wide_angle()
 
-def wvl_spec_data(opm, tla, qlist, dlist):
+def wvl_spec_data(opm, tla, qlist, dlist, ctx):
     osp = opm['optical_spec']
     if tla == "WL":
         osp['wvls'].wavelengths = dlist
@@ -221,7 +230,7 @@ def wvl_spec_data(opm, tla, qlist, dlist):
         osp['wvls'].coating_wvl = dlist
 
 
-def pupil_spec_data(opm, tla, qlist, dlist):
+def pupil_spec_data(opm, tla, qlist, dlist, ctx):
     pupil = opm['optical_spec']['pupil']
     if tla == "EPD":
         pupil.key = 'object', 'epd'
@@ -236,7 +245,7 @@ def pupil_spec_data(opm, tla, qlist, dlist):
     logger.debug("pupil_spec_data: %s %f", tla, dlist[0])
 
 
-def field_spec_data(opm, tla, qlist, dlist):
+def field_spec_data(opm, tla, qlist, dlist, ctx):
     fov = opm['optical_spec']['fov']
     if tla == 'XOB' or tla == 'YOB':
         fov.key = 'object', 'height'
@@ -265,7 +274,7 @@ def field_spec_data(opm, tla, qlist, dlist):
     log_cmd("field_spec_data", tla, qlist, dlist)
 
 
-def spec_data(opm, tla, qlist, dlist):
+def spec_data(opm, tla, qlist, dlist, ctx):
     if tla == "LEN":
         pass
     elif tla == "RDM":
@@ -318,14 +327,13 @@ def get_index_qualifier(seq_model, qtype, qlist):
                 return num_or_alpha(q[1]),
 
 
-def surface_cmd(opt_model, tla, qlist, dlist):
+def surface_cmd(opt_model, tla, qlist, dlist, ctx):
     seq_model = opt_model.seq_model
     idx, = get_index_qualifier(seq_model, 'S', qlist)
-    update_surface_and_gap(opt_model, dlist, idx)
+    update_surface_and_gap(opt_model, dlist, ctx, idx)
 
 
-def update_surface_and_gap(opt_model, dlist, idx=None):
-    global _glass_handler
+def update_surface_and_gap(opt_model, dlist, ctx, idx=None):
     seq_model = opt_model.seq_model
     s, g = seq_model.insert_surface_and_gap()
 
@@ -347,27 +355,26 @@ def update_surface_and_gap(opt_model, dlist, idx=None):
                 s.interact_mode = 'reflect'
                 g.medium = seq_model.gaps[seq_model.cur_surface-1].medium
             else:
-                g.medium = _glass_handler.process_glass_data(dlist[2])
+                g.medium = ctx.glass_handler.process_glass_data(dlist[2])
 
     else:
         # at image surface, apply defocus to previous thickness
         seq_model.gaps[idx-1].thi += dlist[1]
 
 
-def private_catalog(optm, tla, qlist, dlist):
-    global _reading_private_catalog, _private_catalog_wvls
+def private_catalog(optm, tla, qlist, dlist, ctx):
     if tla == "PRV":
-        _reading_private_catalog = True
+        ctx.reading_private_catalog = True
     elif tla == "PWL":
-        _private_catalog_wvls = dlist
+        ctx.private_catalog_wvls = dlist
     elif tla == "END":
-        _reading_private_catalog = False
-        _private_catalog_wvls = None
+        ctx.reading_private_catalog = False
+        ctx.private_catalog_wvls = None
 
     log_cmd("private_catalog", tla, qlist, dlist)
 
 
-def surface_data(opm, tla, qlist, dlist):
+def surface_data(opm, tla, qlist, dlist, ctx):
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
     if not idx:
@@ -406,7 +413,7 @@ def update_surface_profile(seq_model, profile_type, idx=None):
     return seq_model.ifcs[idx].profile
 
 
-def profile_data(opm, tla, qlist, dlist):
+def profile_data(opm, tla, qlist, dlist, ctx):
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
     if not idx:
@@ -448,7 +455,7 @@ def profile_data(opm, tla, qlist, dlist):
     log_cmd("profile_data", tla, qlist, dlist)
 
 
-def aperture_data(opm, tla, qlist, dlist):
+def aperture_data(opm, tla, qlist, dlist, ctx):
     """ add aperture data, either creating a new aperture or modifying the last """
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
@@ -491,12 +498,12 @@ def aperture_data(opm, tla, qlist, dlist):
 
     if ca:
         obs = '# obscurations' if ca.is_obscuration else '# clear ap'
-        _track_contents[obs] += 1
+        ctx.track_contents[obs] += 1
 
     log_cmd("aperture_data", tla, qlist, dlist)
 
 
-def aperture_data_general(opm, tla, qlist, dlist):
+def aperture_data_general(opm, tla, qlist, dlist, ctx):
     """ handle the general aperture commands, add to end of list """
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
@@ -521,7 +528,7 @@ def aperture_data_general(opm, tla, qlist, dlist):
     log_cmd("aperture_data_general", tla, qlist, dlist)
 
 
-def aperture_offset(opm, tla, qlist, dlist):
+def aperture_offset(opm, tla, qlist, dlist, ctx):
     """ handle the aperture offset commands, assume last aperture in list """
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
@@ -540,7 +547,7 @@ def aperture_offset(opm, tla, qlist, dlist):
     log_cmd("aperture_offset", tla, qlist, dlist)
 
 
-def decenter_data(opm, tla, qlist, dlist):
+def decenter_data(opm, tla, qlist, dlist, ctx):
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
     if not idx:
@@ -579,7 +586,7 @@ def decenter_data(opm, tla, qlist, dlist):
 #  HOR 1.0
 #  HWL 587.5618; HCT R
 #  HCO C1 -0.001807322521767816; HCC C1 100
-def diffractive_optic(opm, tla, qlist, dlist):
+def diffractive_optic(opm, tla, qlist, dlist, ctx):
     seq_model = opm['seq_model']
     idx = get_index_qualifier(seq_model, 'S', qlist)
     if not idx:
@@ -624,6 +631,11 @@ class CVGlassHandler(GlassHandlerBase):
     needed to find the requested glass or a substitute.
     """
 
+    def __init__(self, filename, private_catalog_glasses=None):
+        super().__init__(filename)
+        self.private_catalog_glasses = ({} if private_catalog_glasses is None
+                                        else private_catalog_glasses)
+
     def process_glass_data(self, glass_data) -> om.OpticalMedium:
         if isanumber(glass_data):
             # process as a 6 digit code, no decimal point
@@ -651,13 +663,13 @@ class CVGlassHandler(GlassHandlerBase):
                     if not name[-2:].isdigit() and name[-1].isdigit():
                         name = name[:-1]+' '+name[-1]
 
+            # the file's private catalog takes precedence over the catalogs
+            if catalog is None and name in self.private_catalog_glasses:
+                self.track_contents['glass found'] += 1
+                return self.private_catalog_glasses[name]
+
             medium = self.find_glass(name, catalog, always=False)
             if medium:
                 return medium
             else:  # name with no data. default to crown glass
-                global _private_catalog_glasses
-                if name in _private_catalog_glasses:
-                    medium = _private_catalog_glasses[name]
-                else:
-                    medium = om.ConstantIndex(1.5, 'not '+name)
-                return medium
+                return om.ConstantIndex(1.5, 'not '+name)
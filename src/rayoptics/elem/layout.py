@@ -29,7 +29,6 @@ from rayoptics.elem import elements as ele
 
 import rayoptics.optical.model_constants as mc
 from rayoptics.util.rgb2mpl import rgb2mpl
-from rayoptics.qtgui import guiappcmds
 from rayoptics.util import colors
 
 
@@ -627,6 +626,7 @@ class LensLayout():
 
     def get_ray_table(self):
         if self.ray_table is None:
+            from rayoptics.qtgui import guiappcmds
             self.ray_table = guiappcmds.create_ray_table_model(self.opt_model, None)
             gui_parent = self.opt_model.app_manager.gui_parent
             gui_parent.create_table_view(self.ray_table, "Ray Table")
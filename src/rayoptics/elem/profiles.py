@@ -15,12 +15,28 @@ from scipy import optimize
 
 from rayoptics.util.misc_math import normalize, is_fuzzy_zero
 from rayoptics.raytr.traceerror import TraceError, TraceMissedSurfaceError
+from rayoptics.raytr import instrument as rt_instr
 
 
 def resize_list(lst, new_length, null_item=None):
     return lst + [null_item for item in range(new_length - len(lst))]
 
 
+def sqrt_or_miss(arg):
+    """ square root of *arg*, a scalar or an array.
+
+    A negative scalar *arg* raises a TraceMissedSurfaceError. Negative 
+    elements of an array *arg* return nan, so that the caller can mask them.
+    """
+    if np.ndim(arg) == 0:
+        if arg < 0.:
+            raise TraceMissedSurfaceError
+        return sqrt(arg)
+    else:
+        with np.errstate(invalid='ignore'):
+            return np.sqrt(arg)
+
+
 def intersect_parabola(cv, p, d, z_dir=1.0):
     ''' Intersect a parabolid, starting from an arbitrary point.
 
@@ -60,6 +76,8 @@ class SurfaceProfile:
         :math:`f({\\boldsymbol{p}}) = 0`
 
         where :math:`\\boldsymbol{p}=({x, y, z})^T`
+
+        *p* may also be an [N, 3] array of points, returning an [N] array.
         """
         pass
 
@@ -67,6 +85,8 @@ class SurfaceProfile:
         """Returns the gradient of the profile surface function at point :math:`\\boldsymbol{p}`. 
         
         :math:`df(\\boldsymbol{p}) = \\partial{f(\\boldsymbol{p})}/\\partial{\\boldsymbol{p}}`
+
+        *p* may also be an [N, 3] array of points, returning an [N, 3] array.
         """
         pass
 
@@ -76,7 +96,10 @@ class SurfaceProfile:
         return normalize(self.df(p))
 
     def sag(self, x, y):
-        """Returns the sagitta (z coordinate) of the surface at x, y. """
+        """Returns the sagitta (z coordinate) of the surface at x, y. 
+
+        x and y may also be arrays; points outside the surface return nan.
+        """
         pass
 
     def profile(self, sd, dir=1, steps=6):
@@ -110,6 +133,54 @@ class SurfaceProfile:
         '''
         return self.intersect_spencer(p0, d, eps, z_dir)
 
+    def intersect_batch(self, p0, d, eps, z_dir):
+        ''' Intersect a batch of rays with the profile.
+
+        The default implementation is a vectorized version of 
+        :meth:`intersect_spencer`. Newton iterations are applied to the whole
+        batch, with a mask of the rays that haven't converged yet.
+
+        Args:
+            p0:  [N, 3] start points of the rays in the profile's coordinates
+            d:  [N, 3] direction cosines of the rays in the profile's coordinates
+            eps: numeric tolerance for convergence of any iterative procedure
+            z_dir: +1 if propagation positive direction, -1 if otherwise
+
+        Returns:
+            tuple: distances *s1* [N], intersection points *p* [N, 3] and a 
+            boolean mask [N] of the rays that missed the profile
+        '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = np.array(p0, dtype=float)
+            s1 = -self.f(p)/np.einsum('ij,ij->i', d, self.df(p))
+            active = np.abs(s1) > eps
+            iter = 0
+            ray_iters = 0
+            while active.any() and iter < 1000:
+                ray_iters += np.count_nonzero(active)
+                pa = p0[active] + s1[active, np.newaxis]*d[active]
+                p[active] = pa
+                s2 = s1[active] - (self.f(pa) / 
+                                   np.einsum('ij,ij->i', d[active],
+                                             self.df(pa)))
+                delta = np.abs(s2 - s1[active])
+                s1[active] = s2
+                # nan deltas drop out of the active set as misses
+                active[active] = delta > eps
+                iter += 1
+        if rt_instr.active is not None:
+            rt_instr.active.record_batch_iterations(
+                self, int(ray_iters), iter, int(np.count_nonzero(active)))
+        missed = ~np.isfinite(s1)
+        s1[missed] = np.nan
+        p[missed] = np.nan
+        return s1, p, missed
+
+    def normal_batch(self, p):
+        """Returns the unit normals of the profile at the [N, 3] points *p*. """
+        df = self.df(p)
+        return df/np.linalg.norm(df, axis=-1)[..., np.newaxis]
+
     def intersect_welford(self, p, d, eps, z_dir):
         ''' Intersect a profile, starting from an arbitrary point.
 
@@ -183,6 +254,9 @@ class SurfaceProfile:
             s1 = s2
             iter += 1
         # print('intersect iter =', iter)
+        if rt_instr.active is not None:
+            rt_instr.active.record_iterations(self, iter, 
+                                              converged=delta <= eps)
         return s1, p
 
     def intersect_scipy(self, p0, d, eps, z_dir):
@@ -327,6 +401,21 @@ class Spherical(SurfaceProfile):
         p1 = p + s*d
         return s, p1
 
+    def intersect_batch(self, p, d, eps, z_dir):
+        ''' Intersection of a batch of rays with a sphere. '''
+        ax2 = self.cv
+        cx2 = self.cv * np.einsum('ij,ij->i', p, p) - 2*p[:, 2]
+        b = self.cv * np.einsum('ij,ij->i', d, p) - d[:, 2]
+        disc = b*b - ax2*cx2
+        missed = ~(disc >= 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Use z_dir to pick correct root
+            s = cx2/(z_dir*np.sqrt(disc) - b)
+        s[missed] = np.nan
+
+        p1 = p + s[:, np.newaxis]*d
+        return s, p1, missed
+
     def f(self, p):
         """ surface function for Spherical profile
 
@@ -347,11 +436,12 @@ class Spherical(SurfaceProfile):
 
         which is Spencer's eq 25.
         """
-        return p[2] - 0.5*self.cv*(np.dot(p, p))
+        return p[..., 2] - 0.5*self.cv*(np.einsum('...i,...i', p, p))
 
     def df(self, p):
-        return np.array(
-                [-self.cv*p[0], -self.cv*p[1], 1.0-self.cv*p[2]])
+        return np.stack(
+                [-self.cv*p[..., 0], -self.cv*p[..., 1], 1.0-self.cv*p[..., 2]],
+                axis=-1)
 
     def sag(self, x, y):
         if self.cv != 0.0:
@@ -363,7 +453,7 @@ class Spherical(SurfaceProfile):
             else:
                 return r*(1 - np.abs(adj/r))
         else:
-            return 0
+            return 0*(x + y)
 
     def profile(self, sd, dir=1, steps=6):
         '''Generate a profile curve for the segment sd.
@@ -576,28 +666,43 @@ class Conic(SurfaceProfile):
         p1 = p + s*d
         return s, p1
 
+    def intersect_batch(self, p, d, eps, z_dir):
+        ''' Intersection of a batch of rays with a conic. '''
+        ec = self.ec
+        ax2 = self.cv*(1. + self.cc*d[:, 2]*d[:, 2])
+        cx2 = self.cv*(p[:, 0]*p[:, 0] + p[:, 1]*p[:, 1] + 
+                       ec*p[:, 2]*p[:, 2]) - 2.0*p[:, 2]
+        b = self.cv*(d[:, 0]*p[:, 0] + d[:, 1]*p[:, 1] + 
+                     ec*d[:, 2]*p[:, 2]) - d[:, 2]
+        disc = b*b - ax2*cx2
+        missed = ~(disc >= 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Use z_dir to pick correct root
+            s = cx2/(z_dir*np.sqrt(disc) - b)
+        s[missed] = np.nan
+
+        p1 = p + s[:, np.newaxis]*d
+        return s, p1, missed
+
     def f(self, p):
         """ surface function for Conic profile
 
         This function implements Spencer's eq 25, with 
         kappa = ec = 1 + cc
         """
-        return p[2] - 0.5*self.cv*(p[0]*p[0] +
-                                   p[1]*p[1] +
-                                   (self.cc+1.0)*p[2]*p[2])
+        return p[..., 2] - 0.5*self.cv*(p[..., 0]*p[..., 0] +
+                                        p[..., 1]*p[..., 1] +
+                                        (self.cc+1.0)*p[..., 2]*p[..., 2])
 
     def df(self, p):
-        return np.array(
-                [-self.cv*p[0],
-                 -self.cv*p[1],
-                 1.0-(self.cc+1.0)*self.cv*p[2]])
+        return np.stack(
+                [-self.cv*p[..., 0],
+                 -self.cv*p[..., 1],
+                 1.0-(self.cc+1.0)*self.cv*p[..., 2]], axis=-1)
 
     def sag(self, x, y):
         r2 = x*x + y*y
-        try:
-            z = self.cv*r2/(1. + sqrt(1. - (self.cc+1.0)*self.cv*self.cv*r2))
-        except ValueError:
-            raise TraceMissedSurfaceError
+        z = self.cv*r2/(1. + sqrt_or_miss(1. - (self.cc+1.0)*self.cv*self.cv*r2))
         return z
 
     def profile(self, sd, dir=1, steps=6):
@@ -832,29 +937,26 @@ class EvenPolynomial(SurfaceProfile):
 
     def sag(self, x, y):
         r2 = x*x + y*y
-        try:
-            # sphere + conic contribution
-            z = self.cv*r2/(1. + sqrt(1. - (self.cc+1.0)*self.cv*self.cv*r2))
-        except ValueError:
-            raise TraceMissedSurfaceError
+        # sphere + conic contribution
+        z = self.cv*r2/(1. + sqrt_or_miss(1. - (self.cc+1.0)*self.cv*self.cv*r2))
 
         # polynomial asphere contribution
         z_asp = 0.0
         r_pow = r2
         for i in range(self.max_nonzero_coef):
             z_asp += self.coefs[i]*r_pow
-            r_pow *= r2
+            r_pow = r_pow*r2
 
         z_tot = z + z_asp
         return z_tot
 
     def f(self, p):
-        return p[2] - self.sag(p[0], p[1])
+        return p[..., 2] - self.sag(p[..., 0], p[..., 1])
 
     def df(self, p):
         # sphere + conic contribution
-        r2 = p[0]*p[0] + p[1]*p[1]
-        e = self.cv/sqrt(1. - self.ec*self.cv*self.cv*r2)
+        r2 = p[..., 0]*p[..., 0] + p[..., 1]*p[..., 1]
+        e = self.cv/sqrt_or_miss(1. - self.ec*self.cv*self.cv*r2)
 
         # polynomial asphere contribution
         r_pow = 1
@@ -863,10 +965,11 @@ class EvenPolynomial(SurfaceProfile):
         for i in range(self.max_nonzero_coef):
             e_asp += c_coef*self.coefs[i]*r_pow
             c_coef += 2.0
-            r_pow *= r2
+            r_pow = r_pow*r2
 
         e_tot = e + e_asp
-        return np.array([-e_tot*p[0], -e_tot*p[1], 1.0])
+        return np.stack([-e_tot*p[..., 0], -e_tot*p[..., 1], 
+                         np.ones_like(e_tot)], axis=-1)
 
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
@@ -1053,48 +1156,44 @@ class RadialPolynomial(SurfaceProfile):
 
     def sag(self, x, y):
         r2 = x*x + y*y
-        r = sqrt(r2)
-        try:
-            # sphere + conic contribution
-            z = self.cv*r2/(1. + sqrt(1. - self.ec*self.cv*self.cv*r2))
-        except ValueError:
-            raise TraceMissedSurfaceError
+        r = np.sqrt(r2)
+        # sphere + conic contribution
+        z = self.cv*r2/(1. + sqrt_or_miss(1. - self.ec*self.cv*self.cv*r2))
 
         # polynomial asphere contribution
         z_asp = 0.0
         r_pow = r
         for coef in self.coefs[:self.max_nonzero_coef]:
             z_asp += coef*r_pow
-            r_pow *= r
+            r_pow = r_pow*r
 
         z_tot = z + z_asp
         return z_tot
 
     def f(self, p):
-        return p[2] - self.sag(p[0], p[1])
+        return p[..., 2] - self.sag(p[..., 0], p[..., 1])
 
     def df(self, p):
         # sphere + conic contribution
-        r2 = p[0]*p[0] + p[1]*p[1]
-        r = sqrt(r2)
-        e = self.cv/sqrt(1. - self.ec*self.cv*self.cv*r2)
+        r2 = p[..., 0]*p[..., 0] + p[..., 1]*p[..., 1]
+        r = np.sqrt(r2)
+        e = self.cv/sqrt_or_miss(1. - self.ec*self.cv*self.cv*r2)
 
         # polynomial asphere contribution - compute using Horner's Rule
         e_asp = 0.0
-        if r == 0.0:
-            r_pow = 1.0
-        else:
-            # Initialize to 1/r because we multiply by r's components p[0] and
-            # p[1] at the final normalization step.
-            r_pow = 1/r
+        # Initialize to 1/r because we multiply by r's components p[0] and
+        # p[1] at the final normalization step.
+        with np.errstate(divide='ignore'):
+            r_pow = np.where(r == 0.0, 1.0, 1/r)
         c_coef = 1.0
         for coef in self.coefs[:self.max_nonzero_coef]:
             e_asp += c_coef*coef*r_pow
             c_coef += 1.0
-            r_pow *= r
+            r_pow = r_pow*r
 
         e_tot = e + e_asp
-        return np.array([-e_tot*p[0], -e_tot*p[1], 1.0])
+        return np.stack([-e_tot*p[..., 0], -e_tot*p[..., 1], 
+                         np.ones_like(e_tot)], axis=-1)
 
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
@@ -1304,37 +1403,35 @@ class YToroid(SurfaceProfile):
             return fY
         else:
             rRp = self.rR - fY
-            z = rRp - sqrt(rRp*rRp - x*x)
+            z = rRp - sqrt_or_miss(rRp*rRp - x*x)
 
             z_tot = z + fY
             return z_tot
 
     def fY(self, y):
         y2 = y*y
-        try:
-            # sphere + conic contribution
-            z = self.cv*y2/(1. + sqrt(1. - (self.cc+1.0)*self.cv*self.cv*y2))
-        except ValueError:
-            raise TraceMissedSurfaceError
+        # sphere + conic contribution
+        z = self.cv*y2/(1. + sqrt_or_miss(1. - (self.cc+1.0)*self.cv*self.cv*y2))
 
         # polynomial asphere contribution
         z_asp = 0.0
         y_pow = y2
         for i in range(self.max_nonzero_coef):
             z_asp += self.coefs[i]*y_pow
-            y_pow *= y2
+            y_pow = y_pow*y2
 
         z_tot = z + z_asp
         return z_tot
 
     def f(self, p):
-        fY = self.fY(p[1])
-        return p[2] - fY - self.cR*(p[0]*p[0] + p[2]*p[2] - fY*fY)/2
+        fY = self.fY(p[..., 1])
+        return (p[..., 2] - fY - 
+                self.cR*(p[..., 0]*p[..., 0] + p[..., 2]*p[..., 2] - fY*fY)/2)
 
     def df(self, p):
         # sphere + conic contribution
-        y2 = p[1]*p[1]
-        e = self.cv/sqrt(1. - (self.cc+1.0)*self.cv*self.cv*y2)
+        y2 = p[..., 1]*p[..., 1]
+        e = self.cv/sqrt_or_miss(1. - (self.cc+1.0)*self.cv*self.cv*y2)
 
         # polynomial asphere contribution
         e_asp = 0.0
@@ -1343,14 +1440,14 @@ class YToroid(SurfaceProfile):
         for i in range(self.max_nonzero_coef):
             e_asp += c_coef*self.coefs[i]*y_pow
             c_coef += 2.0
-            y_pow *= y2
+            y_pow = y_pow*y2
 
         dfdY = e + e_asp
-        Fx = -self.cR*p[0]
-        Fy = (self.cR*self.fY(p[1]) - 1)*(dfdY)*p[1]
-        Fz = 1 - self.cR*p[2]
+        Fx = -self.cR*p[..., 0]
+        Fy = (self.cR*self.fY(p[..., 1]) - 1)*(dfdY)*p[..., 1]
+        Fz = 1 - self.cR*p[..., 2]
 
-        return np.array([Fx, Fy, Fz])
+        return np.stack([Fx, Fy, Fz], axis=-1)
 
     def profile(self, sd, dir=1, steps=21):
         return aspheric_profile(self, sd, dir, steps)
@@ -1414,11 +1511,11 @@ class XToroid(YToroid):
         return super().sag(y, x)
 
     def f(self, p):
-        return super().f(np.array([p[1], p[0], p[2]]))
+        return super().f(p[..., [1, 0, 2]])
 
     def df(self, p):
-        grad = super().df(np.array([p[1], p[0], p[2]]))
-        return np.array([grad[1], grad[0], grad[2]])
+        grad = super().df(p[..., [1, 0, 2]])
+        return grad[..., [1, 0, 2]]
 
 
 dispatch = {
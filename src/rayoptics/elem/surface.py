@@ -207,6 +207,15 @@ class Surface(interface.Interface):
 
         return is_inside
 
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        if len(self.clear_apertures) > 0:
+            inside = np.ones(np.shape(x), dtype=bool)
+            for ca in self.clear_apertures:
+                inside &= ca.points_inside(x, y, fuzz)
+            return inside
+        else:
+            return super().points_inside(x, y, fuzz)
+
     def edge_pt_target(self, rel_dir: V2d) -> float:
         """ Get a target for ray aiming to aperture boundaries.
         
@@ -270,6 +279,12 @@ class Surface(interface.Interface):
     def normal(self, p):
         return self.profile.normal(p)
 
+    def intersect_batch(self, p0, d, z_dir=1.0, eps=1.0e-12):
+        return self.profile.intersect_batch(p0, d, eps, z_dir)
+
+    def normal_batch(self, p):
+        return self.profile.normal_batch(p)
+
 
 class DecenterData():
     """ Maintains data and actions for position and orientation changes.
@@ -315,6 +330,10 @@ class DecenterData():
         else:
             self.rot_mat = None
 
+    def geometry_key(self) -> tuple:
+        """ Returns a key that changes when the position or orientation does. """
+        return self.dtype, tuple(self.dec), tuple(self.euler)
+
     def apply_scale_factor(self, scale_factor: float):
         self.dec *= scale_factor
         self.rot_pt *= scale_factor
@@ -379,6 +398,15 @@ class Aperture():
     def point_inside(self, x: float, y: float, fuzz: float = 1e-5) -> bool:
         pass
 
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        """ Returns a boolean array, True for points inside the aperture. 
+        
+        This is the vectorized counterpart to :meth:`point_inside`; 
+        subclasses should override this with an array implementation.
+        """
+        return np.array([bool(self.point_inside(xi, yi, fuzz)) 
+                         for xi, yi in zip(x, y)], dtype=bool)
+
     def bounding_box(self):
         center = np.array([self.x_offset, self.y_offset])
         extent = np.array(self.dimension())
@@ -393,6 +421,12 @@ class Aperture():
         y -= self.y_offset
         return x, y
 
+    def tform_points(self, x, y):
+        """ Array version of :meth:`tform`, the inputs aren't modified. """
+        x = np.asarray(x, dtype=float) - self.x_offset
+        y = np.asarray(y, dtype=float) - self.y_offset
+        return x, y
+
 
 class Circular(Aperture):
     def __init__(self, radius=1.0, **kwargs):
@@ -418,6 +452,11 @@ class Circular(Aperture):
         ans = sqrt(x*x + y*y) <= self.radius + fuzz
         return ans if (not self.is_obscuration) else (not ans)
 
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        x, y = self.tform_points(x, y)
+        ans = np.sqrt(x*x + y*y) <= self.radius + fuzz
+        return ans if (not self.is_obscuration) else ~ans
+
 
     def edge_pt_target(self, rel_dir):
         """ Get a target for ray aiming to aperture boundaries.
@@ -457,6 +496,12 @@ class Rectangular(Aperture):
                and abs(y) <= self.y_half_width + fuzz)
         return ans if (not self.is_obscuration) else (not ans)
 
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        x, y = self.tform_points(x, y)
+        ans = ((np.abs(x) <= self.x_half_width + fuzz) & 
+               (np.abs(y) <= self.y_half_width + fuzz))
+        return ans if (not self.is_obscuration) else ~ans
+
     def edge_pt_target(self, rel_dir):
         """ Get a target for ray aiming to aperture boundaries. """
         edge_pt = np.array([self.x_half_width*rel_dir[0], 
@@ -488,6 +533,26 @@ class Elliptical(Aperture):
         self.x_half_width = abs(x)
         self.y_half_width = abs(y)
 
+    def point_inside(self, x: float, y: float, fuzz: float = 1e-5) -> bool:
+        x, y = self.tform(x, y)
+        a = self.x_half_width + fuzz
+        b = self.y_half_width + fuzz
+        ans = (x/a)**2 + (y/b)**2 <= 1.0
+        return ans if (not self.is_obscuration) else (not ans)
+
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        x, y = self.tform_points(x, y)
+        a = self.x_half_width + fuzz
+        b = self.y_half_width + fuzz
+        ans = (x/a)**2 + (y/b)**2 <= 1.0
+        return ans if (not self.is_obscuration) else ~ans
+
+    def edge_pt_target(self, rel_dir):
+        """ Get a target for ray aiming to aperture boundaries. """
+        edge_pt = np.array([self.x_half_width*rel_dir[0], 
+                            self.y_half_width*rel_dir[1]])
+        return edge_pt
+
     def apply_scale_factor(self, scale_factor):
         super().apply_scale_factor(scale_factor)
         self.x_half_width *= scale_factor
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the vectorized aperture checks against the single point versions"""
+
+
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from rayoptics.elem.surface import (Surface, Circular, Rectangular,
+                                    Elliptical)
+
+
+class AperturesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.x = rng.uniform(-3., 3., 500)
+        self.y = rng.uniform(-3., 3., 500)
+
+    def check_points_inside(self, ap, fuzz=1e-5):
+        x, y = self.x.copy(), self.y.copy()
+        inside = ap.points_inside(x, y, fuzz)
+        # the input arrays aren't modified
+        npt.assert_array_equal(x, self.x)
+        truth = [bool(ap.point_inside(xi, yi, fuzz))
+                 for xi, yi in zip(self.x, self.y)]
+        npt.assert_array_equal(inside, truth)
+        return inside
+
+    def test_apertures(self):
+        for ap_type in (Circular, Rectangular, Elliptical):
+            if ap_type is Circular:
+                kwargs = dict(radius=2.0)
+            else:
+                kwargs = dict(x_half_width=2.0, y_half_width=1.0)
+            inside = self.check_points_inside(ap_type(**kwargs))
+            self.assertTrue(inside.any() and not inside.all())
+            self.check_points_inside(ap_type(x_offset=0.5, y_offset=-0.2,
+                                             is_obscuration=True, **kwargs))
+
+        ellipse = Elliptical(x_half_width=2.0, y_half_width=1.0)
+        npt.assert_array_equal(
+            ellipse.points_inside([1.99, 0., 1.5, 0.], [0., 0.99, 0.7, 1.1]),
+            [True, True, False, False])
+
+    def test_surface(self):
+        s = Surface()
+        s.max_aperture = 1.5
+        self.check_points_inside(s)
+
+        s.clear_apertures = [Circular(radius=2.5),
+                             Circular(radius=0.5, is_obscuration=True)]
+        inside = self.check_points_inside(s, fuzz=1e-4)
+        r = np.hypot(self.x, self.y)
+        npt.assert_array_equal(inside, (r <= 2.5 + 1e-4) & (r > 0.5 + 1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
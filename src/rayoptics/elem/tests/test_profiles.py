@@ -9,8 +9,10 @@ Created on Wed Oct 18 10:59:29 2017
 
 import unittest
 from pytest import approx
-from rayoptics.elem.profiles import Spherical, EvenPolynomial
+from rayoptics.elem.profiles import (Spherical, Conic, EvenPolynomial,
+                                     RadialPolynomial, YToroid, XToroid)
 from rayoptics.util.misc_math import normalize
+from rayoptics.raytr.traceerror import TraceMissedSurfaceError
 import numpy as np
 import numpy.testing as npt
 from math import sqrt
@@ -154,5 +156,65 @@ class SphericalProfileTestCase(unittest.TestCase):
         npt.assert_allclose(dir_p1s1, dir_p1s1_truth, rtol=1e-14)
 
 
+class BatchProfileTestCase(unittest.TestCase):
+    """ Check the array versions of the profile functions vs the scalar ones """
+    def setUp(self):
+        self.eps = 1.0e-12
+        self.z_dir = 1.0
+        ys = np.linspace(-12., 12., 7)
+        self.p0 = np.array([[0., y, -1.] for y in ys] +
+                           [[y, 0.5*y, -1.] for y in ys])
+        d = np.array([[0., -0.01*y, 1.] for y in ys] +
+                     [[0.01*y, 0., 1.] for y in ys])
+        self.d = d/np.linalg.norm(d, axis=-1)[:, np.newaxis]
+        self.profiles = [
+            Spherical(r=-10.),
+            Conic(r=20., cc=-1.5),
+            EvenPolynomial(r=15., cc=-0.5, coefs=[0., 1e-4, -2e-6]),
+            RadialPolynomial(r=15., ec=0.5, coefs=[0., 0., 1e-4, 1e-6]),
+            YToroid(r=15., rR=30., coefs=[0., 1e-4]),
+            XToroid(r=-25., rR=40., cc=-0.5),
+            ]
+
+    def test_intersect_batch(self):
+        for prf in self.profiles:
+            s_b, p_b, missed = prf.intersect_batch(self.p0, self.d,
+                                                   self.eps, self.z_dir)
+            for i in range(len(self.p0)):
+                try:
+                    s1, p1 = prf.intersect(self.p0[i], self.d[i],
+                                           self.eps, self.z_dir)
+                except TraceMissedSurfaceError:
+                    self.assertTrue(missed[i])
+                else:
+                    self.assertFalse(missed[i])
+                    self.assertAlmostEqual(s_b[i], s1, places=12)
+                    npt.assert_allclose(p_b[i], p1, rtol=0, atol=1e-12)
+                    npt.assert_allclose(prf.normal_batch(p_b[i:i+1])[0],
+                                        prf.normal(p1), rtol=0, atol=1e-12)
+
+    def test_sag_f_df(self):
+        for prf in self.profiles:
+            x, y = self.p0[:, 0]/2, self.p0[:, 1]/2
+            sag = prf.sag(x, y)
+            pts = np.stack([x, y, sag], axis=-1)
+            f = prf.f(pts)
+            df = prf.df(pts)
+            for i in range(len(x)):
+                self.assertAlmostEqual(sag[i], prf.sag(x[i], y[i]), places=14)
+                self.assertAlmostEqual(f[i], prf.f(pts[i]), places=14)
+                npt.assert_allclose(df[i], prf.df(pts[i]), 
+                                    rtol=0, atol=1e-14)
+
+    def test_missed_batch(self):
+        # rays outside the clear aperture of a steep sphere miss
+        prf = EvenPolynomial(r=5., coefs=[0., 1e-4])
+        _, _, missed = prf.intersect_batch(self.p0, self.d,
+                                           self.eps, self.z_dir)
+        self.assertTrue(missed[0])
+        self.assertFalse(missed[3])
+        self.assertTrue(np.isnan(prf.sag(np.array([6.]), np.array([0.])))[0])
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=3)
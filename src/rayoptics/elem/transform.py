@@ -107,6 +107,59 @@ def compute_local_transforms(seq_model, seq, step) -> list[Tfm3d]:
     return tfrms
 
 
+def update_local_transforms(seq_model, tfrms: list[Tfm3d], 
+                            changed: list[bool]) -> list[Tfm3d]:
+    """ Return forward transforms, recomputing those affected by `changed`.
+
+    Args:
+        seq_model: sequential model
+        tfrms: the forward local transforms from the previous update
+        changed: flags, by interface, of changes to the interface or to the
+                 gap following it
+
+    The transform from interface i to i+1 is recomputed if either i or i+1
+    changed.
+    """
+    tfrms = list(tfrms)
+    ifcs = seq_model.ifcs
+    for i, gap in enumerate(seq_model.gaps):
+        if changed[i] or changed[i+1]:
+            r, t = forward_transform(ifcs[i], gap.thi, ifcs[i+1])
+            tfrms[i] = r.transpose(), t
+    return tfrms
+
+
+def update_global_coords(seq_model, tfrms: list[Tfm3d], 
+                         changed: list[bool]) -> list[Tfm3d]:
+    """ Return global coordinates wrt surface 1, recomputing those affected.
+
+    Args:
+        seq_model: sequential model
+        tfrms: the global transforms from the previous update, computed by
+               :func:`compute_global_coords` with glo=1 and no origin
+        changed: flags, by interface, of changes to the interface or to the
+                 gap following it
+
+    Changes upstream of surface 1 only affect the object surface; changes
+    downstream of surface 1 are propagated to all of the following surfaces.
+    """
+    tfrms = list(tfrms)
+    ifcs = seq_model.ifcs
+    gaps = seq_model.gaps
+    if changed[0] or changed[1]:
+        tfrms[0] = reverse_transform(ifcs[1], -gaps[0].thi, ifcs[0])
+
+    start = next((i for i in range(1, len(ifcs)) if changed[i]), None)
+    if start is not None:
+        start = max(start, 2)
+        r_prev, t_prev = tfrms[start-1]
+        for i in range(start, len(ifcs)):
+            r, t = forward_transform(ifcs[i-1], gaps[i-1].thi, ifcs[i])
+            r_prev, t_prev = cascade_transform(r_prev, t_prev, r, t)
+            tfrms[i] = r_prev, t_prev
+    return tfrms
+
+
 def list_tfrms(tfrms, sel: str='r+t', *args):
     """ Formatted output of transform lists.
     
@@ -256,3 +309,29 @@ def transform_after_surface(interface, ray_seg: Ray3d) -> Ray3d:
         b4_pt, b4_dir = ray_seg[0], ray_seg[1]
 
     return b4_pt, b4_dir
+
+
+def transform_after_surface_batch(interface, pts, dirs):
+    """Transform arrays of ray points and directions to the following seg.
+
+    This is the array version of :func:`transform_after_surface`.
+
+    Args:
+        interface: the :class:`~.interface.Interface` for the path sequence
+        pts: [rays, 3] array of ray points exiting from **interface**
+        dirs: [rays, 3] array of ray directions exiting from **interface**
+
+    Returns:
+        (**b4_pts**, **b4_dirs**), the ray points and direction cosines wrt
+        the following seg
+    """
+    if interface.decenter:
+        # get transformation info after surf
+        r, t = interface.decenter.tform_after_surf()
+        if r is None:
+            return pts - t, dirs
+        else:
+            # row vector form of rt.dot(v)
+            return (pts - t).dot(r), dirs.dot(r)
+    else:
+        return pts, dirs
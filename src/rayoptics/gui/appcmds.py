@@ -11,17 +11,16 @@
 import logging
 import math
 import pathlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Sequence
 
 from rayoptics.gui.roafile import open_roa
-from rayoptics.codev import cmdproc
-from rayoptics.optical import obench
-from rayoptics.zemax import zmxread
+from rayoptics.gui.robfile import open_rob
 
 from rayoptics.optical.opticalmodel import OpticalModel
 from rayoptics.elem.profiles import Spherical, Conic
 import rayoptics.elem.elements as ele
-from rayoptics.elem import layout
 from rayoptics.parax import paraxialdesign
 from rayoptics.parax.firstorder import specsheet_from_parax_data
 from rayoptics.parax.idealimager import ideal_imager_setup
@@ -30,8 +29,6 @@ from rayoptics.parax.specsheet import SpecSheet
 from rayoptics.raytr import vigcalc
 from rayoptics.raytr import trace
 
-from rayoptics.mpl import interactivefigure
-
 
 logger = logging.getLogger(__name__)
 
@@ -39,10 +36,13 @@ logger = logging.getLogger(__name__)
 def open_model(file_url, info=False, **kwargs) -> Optional[OpticalModel] | tuple[OpticalModel, tuple[dict, dict]]:
     """ open a file or url and populate an optical model with the data
 
+    The importers for the other programs' files are loaded on first use.
+
     Args:
         file_url (str): a filename or url of a supported file type
 
             - .roa - a rayoptics JSON encoded file
+            - .rob - a rayoptics binary snapshot file
             - .seq - a CODE V (TM) sequence file
             - .zmx - a Zemax (TM) lens file
             - a URL from the www.photonstophotos.net OpticalBench database
@@ -58,13 +58,18 @@ def open_model(file_url, info=False, **kwargs) -> Optional[OpticalModel] | tuple
     if file_extension == '.roa':
         # if we have a rayoptics file, we just read it
         opm = open_roa(file_url_pth, **kwargs)
+    elif file_extension == '.rob':
+        opm = open_rob(file_url_pth, **kwargs)
     else:
         # if we're importing another program's file, collect import info
         if 'www.photonstophotos.net' in str(file_url_pth):
+            from rayoptics.optical import obench
             opm, import_info = obench.read_obench_url(file_url, **kwargs)
         elif file_extension == '.seq':
+            from rayoptics.codev import cmdproc
             opm, import_info = cmdproc.read_lens(file_url_pth, **kwargs)
         elif file_extension == '.zmx':
+            from rayoptics.zemax import zmxread
             opm, import_info = zmxread.read_lens_file(file_url_pth, **kwargs)
         
         # At this point we have a complete opt_model; 
@@ -74,6 +79,75 @@ def open_model(file_url, info=False, **kwargs) -> Optional[OpticalModel] | tuple
     return opm
 
 
+ImportResult = namedtuple('ImportResult', ['path', 'opt_model', 'info',
+                                           'error'])
+ImportResult.path.__doc__ = "the file path"
+ImportResult.opt_model.__doc__ = "the OpticalModel, or None if import failed"
+ImportResult.info.__doc__ = "the import info tuple, None for .roa/.rob files"
+ImportResult.error.__doc__ = "the exception raised by the import, or None"
+
+bulk_import_types = ('.roa', '.rob', '.seq', '.zmx')
+
+
+def _open_model_result(path, **kwargs) -> ImportResult:
+    """ open_model() for `path`, capturing the info tuple or exception """
+    try:
+        if path.suffix.lower() in ('.roa', '.rob'):
+            return ImportResult(path, open_model(path, **kwargs), None, None)
+        opm, import_info = open_model(path, info=True, **kwargs)
+    except Exception as exc:
+        logger.warning('Import of %s failed: %r', path, exc)
+        return ImportResult(path, None, None, exc)
+    return ImportResult(path, opm, import_info, None)
+
+
+def bulk_open_models(paths, executor=None, max_workers=None,
+                     recursive=False, **kwargs) -> list[ImportResult]:
+    """ open a set of lens files in parallel
+
+    The CODE V and Zemax importers keep their parse state in a per-import
+    context, so files can be imported concurrently from multiple threads.
+    The glass catalogs are loaded once, before the imports are started.
+
+    Args:
+        paths: a directory, searched for .roa, .rob, .seq and .zmx files,
+               or an iterable of file paths
+        executor: a :class:`concurrent.futures.Executor` to run the imports.
+                  If None, a ThreadPoolExecutor is created for the call.
+        max_workers: the number of threads for the default executor
+        recursive: if True, search subdirectories of a `paths` directory
+        kwargs (dict): keyword args passed to the reader functions
+
+    Returns:
+        a list of :class:`ImportResult`, in the order of `paths`. Files that
+        fail to import have an `opt_model` of None and the exception in
+        `error`.
+    """
+    if isinstance(paths, (str, pathlib.Path)):
+        dir_pth = pathlib.Path(paths)
+        files = dir_pth.rglob('*') if recursive else dir_pth.iterdir()
+        paths = sorted(p for p in files
+                       if p.suffix.lower() in bulk_import_types)
+    else:
+        paths = [pathlib.Path(p) for p in paths]
+
+    if any(p.suffix.lower() in ('.seq', '.zmx') for p in paths):
+        from opticalglass import glassfactory as gfact
+        from rayoptics.seq.glassindex import glass_catalog_names
+        for cat_name in glass_catalog_names():
+            gfact.get_glass_catalog(cat_name)
+
+    def open_all(exctr):
+        futures = [exctr.submit(_open_model_result, p, **kwargs)
+                   for p in paths]
+        return [f.result() for f in futures]
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return open_all(executor)
+    return open_all(executor)
+
+
 def create_empty_model(**kwargs):
     """ factory function returns an instance of OpticalModel """
     opt_model = OpticalModel(**kwargs)
@@ -144,6 +218,7 @@ def create_yybar_model():
 
 
 def create_live_layout_commands(fig):
+    from rayoptics.elem import layout
     lo = fig.layout
     cmds = []
     # Add thin lens
@@ -171,6 +246,7 @@ def create_live_layout_commands(fig):
 
 
 def create_parax_design_commands(fig):
+    from rayoptics.mpl import interactivefigure
     cmds = []
     dgm = fig.diagram
     # initialize dgm with a Select command
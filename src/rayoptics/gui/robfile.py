@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""The .rob file format, binary snapshots of an OpticalModel
+
+    A .rob file holds a snapshot of an :class:`~.opticalmodel.OpticalModel`
+    as written by :func:`~.snapshot.dumps_snapshot`; see
+    :mod:`~.optical.snapshot` for the format. .rob files are much faster to
+    open than the JSON based .roa files.
+
+    Snapshots use :mod:`pickle`; only open .rob files from trusted sources.
+    The .roa format remains the archival format: snapshots are tied to the
+    class layout of the rayoptics version that wrote them.
+"""
+
+from pathlib import Path
+
+from rayoptics.optical.opticalmodel import OpticalModel
+from rayoptics.optical.snapshot import dumps_snapshot, loads_snapshot
+
+
+def save_rob(opt_model: OpticalModel, file_name, analysis=True,
+             compress=True) -> Path:
+    """ Save a binary snapshot of `opt_model` to a .rob file.
+
+    Args:
+        opt_model: the model to save
+        file_name: str or Path; the suffix is set to .rob
+        analysis: if True, include the computed `analysis_results`
+        compress: if True, zlib compress the pickled model
+
+    Returns:
+        the Path of the saved file
+    """
+    file_pth = Path(file_name).with_suffix('.rob')
+    if not file_pth.parent.exists():
+        file_pth.parent.mkdir(parents=True)
+    file_pth.write_bytes(dumps_snapshot(opt_model, analysis=analysis,
+                                        compress=compress))
+    return file_pth
+
+
+def open_rob(file_name, **kwargs) -> OpticalModel:
+    """ open a .rob snapshot file and return the OpticalModel
+
+    Args:
+        file_name (str): a filename with a .rob extension
+
+    Returns:
+        an OpticalModel instance
+    """
+    return loads_snapshot(Path(file_name).read_bytes())
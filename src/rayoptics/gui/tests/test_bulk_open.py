@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test concurrent import of lens files with bulk_open_models"""
+
+
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from opticalglass import opticalmedium as om
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model, bulk_open_models
+
+
+class BulkOpenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        root_pth = Path(ro.__file__).resolve().parent
+        self.paths = [root_pth/'codev/tests'/f for f in
+                      ('ag_dblgauss.seq', 'dec_tilt_test.seq', 'asp46.seq',
+                       'CODV_65988.seq', 'questar35.seq')]
+        self.paths += [root_pth/'zemax/tests'/f for f in
+                       ('US00583336-2-scaled.zmx', 'US05831776-1.zmx',
+                        'HoO-V2C18Ex03.zmx', 'zmax_37992.zmx')]
+        self.paths += [root_pth/'optical/tests/cell_phone_camera.roa']
+
+    def test_bulk_open_models(self):
+        serial = {}
+        for p in self.paths:
+            if p.suffix == '.roa':
+                serial[p] = open_model(p), None
+            else:
+                serial[p] = open_model(p, info=True)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = bulk_open_models(self.paths*2, executor=executor)
+
+        self.assertEqual(len(results), 2*len(self.paths))
+        for r in results:
+            self.assertIsNone(r.error)
+            opm, info = serial[r.path]
+            sm, r_sm = opm['seq_model'], r.opt_model['seq_model']
+            self.assertEqual(len(r_sm.ifcs), len(sm.ifcs))
+            self.assertEqual([g.medium.name() for g in r_sm.gaps],
+                             [g.medium.name() for g in sm.gaps])
+            self.assertAlmostEqual(r.opt_model['analysis_results']
+                                   ['parax_data'].fod.efl,
+                                   opm['analysis_results']
+                                   ['parax_data'].fod.efl)
+            if info is None:
+                self.assertIsNone(r.info)
+            else:
+                self.assertEqual(dict(r.info[0]), dict(info[0]))
+
+    def test_private_catalog_glasses(self):
+        """ PRV glasses of one file must not be seen by other imports """
+        seq = self.paths[3].read_text()
+        prv_start, prv_end = seq.index('PRV'), seq.index('END')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            no_prv = Path(tmpdir)/'no_prv.seq'
+            no_prv.write_text(seq[:prv_start] + seq[prv_end+4:])
+            other_prv = Path(tmpdir)/'other_prv.seq'
+            other_prv.write_text(seq[:prv_start] +
+                                 seq[prv_start:prv_end].replace(' 1.5', ' 1.6')
+                                 + seq[prv_end:])
+
+            opm = open_model(self.paths[3])
+            n_e48 = opm['seq_model'].rndx[1]
+            for r in bulk_open_models([no_prv, other_prv, self.paths[3]],
+                                      max_workers=1):
+                self.assertIsNone(r.error)
+                sm = r.opt_model['seq_model']
+                if r.path == no_prv:
+                    self.assertIsInstance(sm.gaps[1].medium,
+                                          om.ConstantIndex)
+                    self.assertEqual(sm.gaps[1].medium.name(), 'not E48')
+                elif r.path == other_prv:
+                    self.assertGreater(sm.rndx[1][0], n_e48[0] + 0.05)
+                else:
+                    self.assertEqual(sm.rndx[1], n_e48)
+
+    def test_bulk_open_errors(self):
+        missing = self.paths[0].with_name('not_a_lens.seq')
+        results = bulk_open_models([self.paths[0], missing], max_workers=2)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].opt_model)
+        self.assertIsInstance(results[1].error, Exception)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the binary snapshot (.rob) save and restore"""
+
+
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.gui import robfile
+from rayoptics.optical.snapshot import dumps_snapshot, loads_snapshot
+from rayoptics.raytr import analyses
+
+
+def model_params(opm):
+    """ A list of the sequential model parameters of `opm`. """
+    sm = opm['seq_model']
+    params = []
+    for ifc, g in zip(sm.ifcs, sm.gaps + [None]):
+        prf = getattr(ifc, 'profile', None)
+        params.append((type(ifc).__name__, ifc.interact_mode,
+                       None if prf is None else (type(prf).__name__,
+                                                 repr(vars(prf))),
+                       None if ifc.decenter is None else
+                       (ifc.decenter.dtype, tuple(ifc.decenter.dec),
+                        tuple(ifc.decenter.euler)),
+                       None if g is None else (g.thi, g.medium.name())))
+    return params
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_pth = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_round_trip(self, opm):
+        rob_pth = opm.save_snapshot(self.tmp_pth/'model')
+        self.assertEqual(rob_pth.suffix, '.rob')
+        opm_rob = open_model(rob_pth)
+
+        self.assertEqual(model_params(opm_rob), model_params(opm))
+        pd, pd_rob = (opm['analysis_results']['parax_data'],
+                      opm_rob['analysis_results']['parax_data'])
+        self.assertEqual(pd_rob.fod.efl, pd.fod.efl)
+        self.assertEqual(pd_rob.ax_ray, pd.ax_ray)
+        for (r, t), (r_rob, t_rob) in zip(opm['seq_model'].gbl_tfrms,
+                                          opm_rob['seq_model'].gbl_tfrms):
+            npt.assert_array_equal(r_rob, r)
+            npt.assert_array_equal(t_rob, t)
+
+        ray_grid = analyses.RayGrid(opm, f=-1, num_rays=11)
+        ray_grid_rob = analyses.RayGrid(opm_rob, f=-1, num_rays=11)
+        npt.assert_array_equal(ray_grid_rob.grid, ray_grid.grid)
+
+        # the snapshot model saves the same .roa model as the original
+        opm.save_model(self.tmp_pth/'model')
+        opm_rob.save_model(self.tmp_pth/'model_rob')
+        opm_roa = open_model(self.tmp_pth/'model.roa',
+                             save_updated_version=False)
+        opm_rob_roa = open_model(self.tmp_pth/'model_rob.roa',
+                                 save_updated_version=False)
+        self.assertEqual(model_params(opm_rob_roa), model_params(opm_roa))
+        return opm_rob
+
+    def test_seq_round_trip(self):
+        opm = open_model(self.root_pth/'codev/tests/dec_tilt_test.seq')
+        self.check_round_trip(opm)
+
+    def test_roa_round_trip(self):
+        opm = open_model(self.root_pth/'optical/tests/cell_phone_camera.roa')
+        opm_rob = self.check_round_trip(opm)
+        # the restored model remains editable
+        opm_rob['seq_model'].gaps[2].thi += 0.1
+        opm_rob.update_model()
+        self.assertNotEqual(opm_rob['analysis_results']['parax_data'].fod.efl,
+                            opm['analysis_results']['parax_data'].fod.efl)
+
+    def test_without_analysis(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        data = dumps_snapshot(opm, analysis=False, compress=False)
+        opm_snap = loads_snapshot(data)
+        self.assertEqual(model_params(opm_snap), model_params(opm))
+        self.assertAlmostEqual(
+            opm_snap['analysis_results']['parax_data'].fod.efl,
+            opm['analysis_results']['parax_data'].fod.efl)
+        self.assertIs(opm_snap['analysis_results'],
+                      opm_snap.analysis_results)
+
+        with self.assertRaises(ValueError):
+            loads_snapshot(b'not a snapshot')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
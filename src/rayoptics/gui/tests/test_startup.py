@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test that a headless open_model() doesn't import GUI or plotting modules"""
+
+
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import rayoptics as ro
+
+# modules that should only be imported on first use
+deferred_modules = ('matplotlib', 'PySide6', 'PyQt5', 'qtpy', 'IPython',
+                    'ipywidgets', 'rayoptics.mpl', 'rayoptics.qtgui',
+                    'rayoptics.gui.dashboards',
+                    'rayoptics.elem.layout', 'rayoptics.parax.diagram',
+                    'rayoptics.codev', 'rayoptics.zemax',
+                    'rayoptics.optical.obench')
+
+script = """
+import json, sys
+from rayoptics.gui.appcmds import open_model
+opm = open_model(sys.argv[1])
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def modules_imported_by_open_model(filename):
+    """ Return the modules imported by open_model(filename), in a new
+    python process. """
+    root_pth = Path(ro.__file__).resolve().parent
+    output = subprocess.run([sys.executable, '-c', script, str(filename)],
+                            capture_output=True, text=True, check=True,
+                            cwd=root_pth.parent)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def test_headless_open_model(self):
+        root_pth = Path(ro.__file__).resolve().parent
+        modules = modules_imported_by_open_model(
+            root_pth/'optical/tests/cell_phone_camera.roa')
+        self.assertIn('rayoptics.optical.opticalmodel', modules)
+        deferred = [m for m in modules
+                    if any(m == d or m.startswith(d + '.')
+                           for d in deferred_modules)]
+        self.assertEqual(deferred, [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
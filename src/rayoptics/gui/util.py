@@ -10,7 +10,6 @@
 from collections import namedtuple
 import numpy as np
 
-import opticalglass.glasspolygons as gp  # type: ignore
 
 GUIHandle = namedtuple('GUIHandle', ['poly', 'bbox'])
 GUIHandle.poly.__doc__ = "poly entity for underlying graphics system (e.g. mpl)"
@@ -112,6 +111,8 @@ def calc_render_color_for_material(matl):
         # set element color based on V-number
         indx = round(1.0 + (int(gc)/1000), 3)
         vnbr = round(100.0*(gc - int(gc)), 3)
+        # glasspolygons uses matplotlib; import it on first use
+        import opticalglass.glasspolygons as gp  # type: ignore
         dsg, rgb = gp.find_glass_designation(indx, vnbr)
         if rgb is None:
             return [228, 237, 243, 64]  # ED designation
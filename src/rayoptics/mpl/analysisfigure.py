@@ -12,6 +12,11 @@
        - :class:`~.RayGeoPSF`: spot diagrams and 2D histograms
        - :class:`~.Wavefront`: wavefront map
        - :class:`~.DiffractionPSF`: diffraction Point Spread Function
+       - :class:`~.MTFPlot`: sagittal and tangential MTF
+       - :class:`~.RelativeIlluminationPlot`: relative illumination and
+         transmission versus field
+       - :class:`~.ThroughFocusPlot`: spot size, wavefront error and
+         encircled energy versus focus
 
 .. Created on Tue Mar 17 16:21:27 2020
 
@@ -365,19 +370,29 @@ class Wavefront():
 class DiffractionPSF():
     """Point Spread Function (PSF) calculation and display.
 
+    The pupil amplitude is cached and reused when only the focus changes,
+    i.e. when update_data is called with build='update'.
+
     Attributes:
-        pupil_grid: a RayGrid instance
+        pupil_grid: a RayGrid instance, or a list of RayGrids for a
+                    polychromatic PSF, e.g. from :func:`~.psf_ray_grids`
         maxdim: the size of the sampling array
+        wvl_weights: spectral weights of a list of pupil_grids. If None, the
+                     weights are looked up in the optical spec.
+        workers: number of threads used by `scipy.fft`; None for the default
         title: title, if desired, of this plot panel
         yaxis_ticks_position: 'left' or 'right', default is 'left'
         cmap: color map for plot, defaults to 'RdBu_r'
         kwargs: passed to plot call
     """
 
-    def __init__(self, pupil_grid, maxdim,
+    def __init__(self, pupil_grid, maxdim, wvl_weights=None, workers=None,
                  yaxis_ticks_position='left', **kwargs):
         self.pupil_grid = pupil_grid
         self.maxdim = maxdim
+        self.wvl_weights = wvl_weights
+        self.workers = workers
+        self.pupil_amps = None
 
         if 'title' in kwargs:
             self.title = kwargs.pop('title', None)
@@ -395,8 +410,25 @@ class DiffractionPSF():
 
         self.update_data()
 
+    @property
+    def pupil_grids(self):
+        if isinstance(self.pupil_grid, (list, tuple)):
+            return self.pupil_grid
+        else:
+            return [self.pupil_grid]
+
+    @property
+    def ref_grid(self):
+        """the grid at the central wavelength, or the first grid """
+        grids = self.pupil_grids
+        wvls = grids[0].opt_model['optical_spec']['wvls']
+        for grid in grids:
+            if grid.wvl == wvls.central_wvl:
+                return grid
+        return grids[0]
+
     def init_axis(self, ax):
-        pupil_grid = self.pupil_grid
+        pupil_grid = self.ref_grid
         delta_x, delta_xp = pupil_grid.calc_psf_scaling(self.maxdim)
         image_scale = self.image_scale = delta_xp * self.maxdim
         ax.set_xlim(-image_scale, image_scale)
@@ -412,10 +444,33 @@ class DiffractionPSF():
         self.plot()
 
     def update_data(self, build='rebuild'):
-        self.pupil_grid.update_data(build=build)
-        ndim = self.pupil_grid.num_rays
+        grids = self.pupil_grids
         maxdim = self.maxdim
-        self.AP = analyses.calc_psf(self.pupil_grid.grid[2], ndim, maxdim)
+        for grid in grids:
+            grid.update_data(build=build)
+
+        # the pupil amplitude is unchanged by a refocus
+        if build == 'rebuild' or self.pupil_amps is None:
+            self.pupil_amps = [
+                analyses.calc_pupil_amplitude(grid.grid[2], grid.num_rays,
+                                              maxdim) for grid in grids]
+
+        if len(grids) == 1:
+            grid = grids[0]
+            self.AP = analyses.calc_psf(grid.grid[2], grid.num_rays, maxdim,
+                                        pupil_amp=self.pupil_amps[0],
+                                        workers=self.workers)
+        else:
+            weights = self.wvl_weights
+            if weights is None:
+                wvls = grids[0].opt_model['optical_spec']['wvls']
+                wts = dict(zip(wvls.wavelengths, wvls.spectral_wts))
+                weights = [wts.get(grid.wvl, 1.) for grid in grids]
+            self.AP = analyses.calc_polychromatic_psf(
+                [grid.grid[2] for grid in grids], 
+                [grid.num_rays for grid in grids],
+                maxdim, weights, pupil_amps=self.pupil_amps, 
+                workers=self.workers)
         return self
 
     def plot(self, ax):
@@ -431,3 +486,168 @@ class DiffractionPSF():
         ax.set_aspect('equal')
 
         return self
+
+
+class MTFPlot():
+    """Single axis line plot, supporting data display from multiple MTFs.
+
+    Attributes:
+        mtf_list: list of (mtf, data_type, kwargs)
+
+            - mtf: an :class:`~.analyses.MTF` instance
+            - data_type: 's' or 't' for the sagittal or tangential MTF
+            - kwargs: passed to axis.plot() call
+
+        max_freq: the upper limit of the frequency axis. If None, the
+                  largest frequency of the MTF data is used.
+        title: title, if desired, of this plot panel
+        yaxis_ticks_position: 'left' or 'right', default is 'left'
+    """
+
+    def __init__(self, mtf_list, max_freq=None,
+                 yaxis_ticks_position='left', **kwargs):
+        self.mtf_list = mtf_list
+        self.max_freq = max_freq
+        self.title = kwargs.pop('title', None)
+        self.yaxis_ticks_position = yaxis_ticks_position
+
+    def init_axis(self, ax):
+        ax.grid(True)
+        ax.set_xlabel('spatial frequency', fontsize='small')
+        ax.yaxis.set_ticks_position(self.yaxis_ticks_position)
+        if self.title is not None:
+            ax.set_title(self.title, fontsize='small')
+        return ax
+
+    def refresh(self, build='rebuild'):
+        self.update_data(build=build)
+        self.plot()
+
+    def update_data(self, build='rebuild'):
+        mtfs = []
+        for mtf, data_type, kws in self.mtf_list:
+            if not any(mtf is m for m in mtfs):
+                mtfs.append(mtf)
+        for mtf in mtfs:
+            mtf.update_data(build=build)
+        return self
+
+    def plot(self, ax):
+        max_freq = 0.
+        for mtf, data_type, kws in self.mtf_list:
+            mtf_data = mtf.mtf_s if data_type == 's' else mtf.mtf_t
+            ax.plot(mtf.freqs, mtf_data, **kws)
+            max_freq = max(max_freq, mtf.freqs[-1])
+
+        max_freq = max_freq if self.max_freq is None else self.max_freq
+        ax.set_xlim(0., max_freq)
+        ax.set_ylim(0., 1.)
+
+        return self
+
+
+class RelativeIlluminationPlot():
+    """Single axis line plot of relative illumination versus field.
+
+    Attributes:
+        ri_list: list of (ri, data_type, kwargs)
+
+            - ri: a :class:`~.analyses.RelativeIllumination` instance
+            - data_type: 'ri' for the relative illumination or 'transmission'
+              for the geometric transmission
+            - kwargs: passed to axis.plot() call
+
+        title: title, if desired, of this plot panel
+        yaxis_ticks_position: 'left' or 'right', default is 'left'
+    """
+
+    def __init__(self, ri_list, yaxis_ticks_position='left', **kwargs):
+        self.ri_list = ri_list
+        self.title = kwargs.pop('title', None)
+        self.yaxis_ticks_position = yaxis_ticks_position
+
+    def init_axis(self, ax):
+        ax.grid(True)
+        ax.set_xlabel('field', fontsize='small')
+        ax.yaxis.set_ticks_position(self.yaxis_ticks_position)
+        if self.title is not None:
+            ax.set_title(self.title, fontsize='small')
+        return ax
+
+    def refresh(self, build='rebuild'):
+        self.update_data(build=build)
+        self.plot()
+
+    def update_data(self, build='rebuild'):
+        ris = []
+        for ri, data_type, kws in self.ri_list:
+            if not any(ri is r for r in ris):
+                ris.append(ri)
+        for ri in ris:
+            ri.update_data(build=build)
+        return self
+
+    def plot(self, ax):
+        max_fld = 0.
+        for ri, data_type, kws in self.ri_list:
+            ri_data = ri.ri if data_type == 'ri' else ri.transmission
+            ax.plot(ri.field_values, ri_data, **kws)
+            max_fld = max(max_fld, ri.field_values[-1])
+
+        ax.set_xlim(0., max_fld)
+        ax.set_ylim(0., 1.05)
+
+        return self
+
+
+class ThroughFocusPlot():
+    """Single axis line plot of image quality metrics versus focus.
+
+    Attributes:
+        tf_list: list of (tf, metric, kwargs)
+
+            - tf: a :class:`~.analyses.ThroughFocus` instance
+            - metric: 'spot_rms', 'wfe_rms', 'wfe_pv' or 'ee_radius'
+            - kwargs: passed to axis.plot() call
+
+        title: title, if desired, of this plot panel
+        show_best_focus: if True, mark the best focus of each curve
+        yaxis_ticks_position: 'left' or 'right', default is 'left'
+    """
+
+    def __init__(self, tf_list, show_best_focus=False,
+                 yaxis_ticks_position='left', **kwargs):
+        self.tf_list = tf_list
+        self.title = kwargs.pop('title', None)
+        self.show_best_focus = show_best_focus
+        self.yaxis_ticks_position = yaxis_ticks_position
+
+    def init_axis(self, ax):
+        ax.grid(True)
+        ax.set_xlabel('focus', fontsize='small')
+        ax.yaxis.set_ticks_position(self.yaxis_ticks_position)
+        if self.title is not None:
+            ax.set_title(self.title, fontsize='small')
+        return ax
+
+    def refresh(self, build='rebuild'):
+        self.update_data(build=build)
+        self.plot()
+
+    def update_data(self, build='rebuild'):
+        tfs = []
+        for tf, metric, kws in self.tf_list:
+            if not any(tf is t for t in tfs):
+                tfs.append(tf)
+        for tf in tfs:
+            tf.update_data(build=build)
+        return self
+
+    def plot(self, ax):
+        for tf, metric, kws in self.tf_list:
+            lines = ax.plot(tf.foci, getattr(tf, metric), **kws)
+            if self.show_best_focus:
+                ax.axvline(tf.best_focus(metric), linestyle=':',
+                           color=lines[0].get_color())
+
+        return self
@@ -4,7 +4,11 @@
 """ Module for diffractive/holographic optical elements
 
     Classes that implement diffractive optics capabilities must implement
-    the function phase() for use by the ray trace engine.
+    the function phase() for use by the ray trace engine. The classes in
+    this module also implement phase_batch(), which evaluates arrays of
+    points, directions and normals for the batch ray tracer. The scalar and
+    batch versions share the same vector arithmetic, so they give the same
+    results for a ray.
 
     The :class:`~.DiffractiveElement` and :class:`~.HolographicElement`
     implementations are patterned after Wang, et al, `Ray tracing and wave
@@ -17,17 +21,47 @@
 """
 
 from typing import Optional
-from math import sqrt
 import numpy as np
 import importlib
 from rayoptics.coord_geometry_types import Vec3d, Dir3d
-import rayoptics.raytr.raytrace as rt
 from rayoptics.util.misc_math import normalize
 
 
+def _dot(a, b):
+    """ dot product over the last axis of single vectors or arrays of them """
+    return a[..., 0]*b[..., 0] + a[..., 1]*b[..., 1] + a[..., 2]*b[..., 2]
+
+
+def _normalize(v):
+    """ normalize a single vector or an [N, 3] array of vectors """
+    return v/np.sqrt(_dot(v, v))[..., np.newaxis]
+
+
+def _bend(d_in, normal, n_in, n_out):
+    """ refract d_in about normal, returns d_out and a TIR flag or mask """
+    normal_len = np.sqrt(_dot(normal, normal))
+    cosI = _dot(d_in, normal)/normal_len
+    sinI_sqr = 1.0 - cosI*cosI
+    radicand = n_out*n_out - n_in*n_in*sinI_sqr
+    tir = ~(radicand >= 0.)
+    n_cosIp = np.copysign(np.sqrt(np.where(tir, 0., radicand)), cosI)
+    alpha = n_cosIp - n_in*cosI
+    d_out = (n_in*d_in + alpha[..., np.newaxis]*normal)/n_out
+    return d_out, tir
+
+
+def _sqrt(a):
+    """ square root that returns nan for negative input without warning """
+    return np.sqrt(np.where(a >= 0., a, np.nan))
+
+
 def radial_phase_fct(pt, coefficients):
     """Evaluate the phase and slopes at **pt**
 
+    The even power polynomial in r is evaluated by Horner's scheme. **pt**
+    may also be an [N, 3] array of points, in which case arrays of results
+    are returned.
+
     Args:
         pt: 3d point of incidence in :class:`~.Interface` coordinates
         coefficients: list of even power radial phase coefficients,
@@ -40,20 +74,41 @@ def radial_phase_fct(pt, coefficients):
         - dWdX: slope in x direction
         - dWdY: slope in y direction
     """
-    x, y, z = pt
+    pt = np.asarray(pt)
+    x = pt[..., 0]
+    y = pt[..., 1]
     r_sqr = x*x + y*y
-    dW = 0
-    dWdX = 0
-    dWdY = 0
-    for i, c in enumerate(coefficients):
-        dW += c*r_sqr**(i+1)
-        r_exp = r_sqr**(i)
-        factor = 2*(i+1)
-        dWdX += factor*c*x*r_exp
-        dWdY += factor*c*y*r_exp
+    # dW = r_sqr*sum(c[i]*r_sqr**i), dWdr_sqr = sum((i+1)*c[i]*r_sqr**i)
+    dW = 0.
+    dWdr_sqr = 0.
+    for i in range(len(coefficients) - 1, -1, -1):
+        c = coefficients[i]
+        dW = dW*r_sqr + c
+        dWdr_sqr = dWdr_sqr*r_sqr + (i+1)*c
+    dW = dW*r_sqr
+    dWdX = 2*x*dWdr_sqr
+    dWdY = 2*y*dWdr_sqr
     return dW, dWdX, dWdY
 
 
+# phase functions that accept an [N, 3] array of points
+array_phase_fcts = (radial_phase_fct,)
+
+
+def _scalar_result(out_dir, dW, evanescent):
+    """ returns the phase() results for a single ray """
+    if evanescent:
+        raise ValueError("evanescent diffracted ray")
+    return out_dir, float(dW)
+
+
+def _batch_result(out_dirs, dW, evanescent):
+    """ returns the phase_batch() results, with nan for evanescent rays """
+    out_dirs[evanescent] = np.nan
+    dW = np.where(evanescent, np.nan, dW)
+    return out_dirs, dW, evanescent
+
+
 class DiffractionGrating:
     """ Linear (ruled) diffraction grating.
     
@@ -120,47 +175,62 @@ class DiffractionGrating:
               ifc_cntxt) -> tuple[Dir3d, float]:
         return self.phase_ludwig(pt, in_dir, srf_nrml, ifc_cntxt)
 
+    def phase_batch(self, pts, in_dirs, srf_nrmls, ifc_cntxt):
+        """Returns diffracted ray directions and phase increments for a batch.
+
+        See :meth:`~.Interface.phase_batch` for the arguments and results.
+        """
+        return _batch_result(*self._phase_ludwig(pts, in_dirs, srf_nrmls,
+                                                 ifc_cntxt))
+
     def phase_ludwig(self, pt: Vec3d, in_dir: Dir3d, srf_nrml: Dir3d, 
                      ifc_cntxt) -> tuple[Dir3d, float]:
+        return _scalar_result(*self._phase_ludwig(pt, in_dir, srf_nrml,
+                                                  ifc_cntxt))
+
+    def _phase_ludwig(self, pt, in_dir, srf_nrml, ifc_cntxt):
         z_dir, wvl, n_in, n_out, interact_mode = ifc_cntxt
         refl = -1 if interact_mode == 'reflect' else 1
-        normal = z_dir * normalize(srf_nrml)          # = R
+        normal = z_dir * _normalize(srf_nrml)          # = R
 
         # grating ruling vector, P = G x R
         P = np.cross(self.grating_normal, normal)
         # ruling separation vector, D = R x P
-        D = normalize(np.cross(normal, P))
+        D = _normalize(np.cross(normal, P))
 
         mu = n_in / n_out
         T = refl*(wvl * self.order)/(self._grating_spacing_nm * n_out)
 
-        in_cosI = np.dot(in_dir, normal)
+        in_cosI = _dot(in_dir, normal)
         V = mu * in_cosI
-        W = mu**2 - 1 + T**2 - 2*mu*T*(np.dot(D, in_dir))
+        W = mu**2 - 1 + T**2 - 2*mu*T*(_dot(D, in_dir))
         
-        result = np.sqrt(V**2 - W)
+        result = _sqrt(V*V - W)
+        evanescent = np.isnan(result)
         Q1 = result - V
         Q2 = -result - V
         if interact_mode == 'transmit':
-            Q = max(Q1, Q2)
+            Q = np.maximum(Q1, Q2)
         elif interact_mode == 'reflect':
-            Q = min(Q1, Q2)
+            Q = np.minimum(Q1, Q2)
 
-        out_dir = mu*in_dir - T*D + Q*normal
+        out_dir = mu*in_dir - T*D + Q[..., np.newaxis]*normal
         # `out_dir` is the unit vector in the diffracted ray direction.
         # The `l` and `m` components are correct in the unit circle.
         # The `n` component needs to be adjusted to fall on the unit hemisphere.
         # The sign of the original z-component is applied to the result.
-        out_dir[2] = np.copysign(sqrt(1 - out_dir[0]**2 - out_dir[1]**2),
-                                 out_dir[2])
+        out_dir[..., 2] = np.copysign(
+            _sqrt(1 - out_dir[..., 0]*out_dir[..., 0] -
+                  out_dir[..., 1]*out_dir[..., 1]),
+            out_dir[..., 2])
 
         # calculate path difference in wavelengths introduced by grating. 
-        in_sinI = sqrt(1 - in_cosI**2)
-        out_cosI = np.dot(out_dir, normal)
-        out_sinI = sqrt(1 - out_cosI**2)
+        in_sinI = np.sqrt(np.maximum(1 - in_cosI*in_cosI, 0.))
+        out_cosI = _dot(out_dir, normal)
+        out_sinI = np.sqrt(np.maximum(1 - out_cosI*out_cosI, 0.))
         dW = (self._grating_spacing_nm/wvl) * (n_in*in_sinI + refl*n_out*out_sinI)
 
-        if self.debug_output:
+        if self.debug_output and np.ndim(dW) == 0:
             from numpy.linalg import norm
             print(f"{interact_mode}: z_dir={z_dir}, {n_in:4.2f}, {n_out:4.2f}")
             print(f"in_dir: {in_dir}")
@@ -170,37 +240,42 @@ class DiffractionGrating:
             print(f"Q={Q:8.4f}, Q1={Q1:8.4f}, Q2={Q2:8.4f}")
             print(f"out_dir: {out_dir}, len={norm(out_dir):8.6f}")
 
-        return out_dir, dW
+        return out_dir, dW, evanescent
 
     def phase_welford(self, pt: Vec3d, in_dir: Dir3d, srf_nrml: Dir3d, 
                       ifc_cntxt) -> tuple[Dir3d, float]:
+        return _scalar_result(*self._phase_welford(pt, in_dir, srf_nrml,
+                                                   ifc_cntxt))
+
+    def _phase_welford(self, pt, in_dir, srf_nrml, ifc_cntxt):
         z_dir, wvl, n_in, n_out, interact_mode = ifc_cntxt
         refl = -1 if interact_mode == 'reflect' else 1
 
-        normal = z_dir * normalize(srf_nrml)          # = R
-        cosI = np.dot(in_dir, normal)
+        normal = z_dir * _normalize(srf_nrml)          # = R
+        cosI = _dot(in_dir, normal)
 
         T = refl*(wvl * self.order)/(self._grating_spacing_nm * n_out)
 
-        out_dir = in_dir.copy()
-        out_dir[0] = in_dir[0]
-        out_dir[1] = in_dir[1] - T
-        out_dir[2] = (in_dir[2] - cosI 
-                      + sqrt(cosI**2 + 2*in_dir[1]*T - T**2))
+        out_dir = np.array(in_dir, dtype=float)
+        out_dir[..., 1] = in_dir[..., 1] - T
+        radicand = cosI*cosI + 2*in_dir[..., 1]*T - T**2
+        evanescent = ~(radicand >= 0.)
+        out_dir[..., 2] = in_dir[..., 2] - cosI + _sqrt(radicand)
 
         # The `l` and `m` components are correct in the unit circle.
         # The `n` component needs to be adjusted to fall on the unit hemisphere.
         # The sign of the original z-component is applied to the result.
-        out_dir[2] = np.copysign(sqrt(1 - out_dir[0]**2 - out_dir[1]**2),
-                                 refl)
+        out_dir[..., 2] = np.copysign(
+            _sqrt(1 - out_dir[..., 0]*out_dir[..., 0] -
+                  out_dir[..., 1]*out_dir[..., 1]), refl)
 
         # calculate path difference in wavelengths introduced by grating. 
-        in_sinI = sqrt(1 - cosI**2)
-        out_cosI = np.dot(out_dir, normal)
-        out_sinI = sqrt(1 - out_cosI**2)
+        in_sinI = np.sqrt(np.maximum(1 - cosI*cosI, 0.))
+        out_cosI = _dot(out_dir, normal)
+        out_sinI = np.sqrt(np.maximum(1 - out_cosI*out_cosI, 0.))
         dW = (self._grating_spacing_nm/wvl) * (n_in*in_sinI + refl*n_out*out_sinI)
 
-        if self.debug_output:
+        if self.debug_output and np.ndim(dW) == 0:
             from numpy.linalg import norm
             print(f"{interact_mode}: z_dir={z_dir}, {n_in:4.2f}, {n_out:4.2f}")
             print(f"in_dir: {in_dir}")
@@ -208,7 +283,7 @@ class DiffractionGrating:
             print(f"T={T:8.4f}")
             print(f"out_dir: {out_dir}, len={norm(out_dir):8.6f}")
 
-        return out_dir, dW
+        return out_dir, dW, evanescent
 
 
 class DiffractiveElement:
@@ -290,24 +365,43 @@ class DiffractiveElement:
             - out_dir: direction cosine of the out going ray
             - dW: phase added by diffractive interaction
         """
+        return _scalar_result(*self._phase(pt, in_dir, srf_nrml, ifc_cntxt))
+
+    def phase_batch(self, pts, in_dirs, srf_nrmls, ifc_cntxt):
+        """Returns diffracted ray directions and phase increments for a batch.
+
+        If `phase_fct` isn't one of the :data:`array_phase_fcts`, it is
+        called for each point. See :meth:`~.Interface.phase_batch` for the
+        arguments and results.
+        """
+        return _batch_result(*self._phase(pts, in_dirs, srf_nrmls,
+                                          ifc_cntxt))
+
+    def _phase(self, pt, in_dir, srf_nrml, ifc_cntxt):
         z_dir, wvl, n_in, n_out, interact_mode = ifc_cntxt
         order = self.order
-        normal = normalize(srf_nrml)
+        normal = _normalize(srf_nrml)
         inc_dir = in_dir
+        evanescent = False
         if n_in != 1.0:
-            inc_dir = rt.bend(in_dir, srf_nrml, n_in, 1)
-        in_cosI = np.dot(inc_dir, normal)
+            inc_dir, evanescent = _bend(in_dir, srf_nrml, n_in, 1)
+        in_cosI = _dot(inc_dir, normal)
         mu = 1.0 if wvl is None else wvl/self.ref_wl
-        dW, dWdX, dWdY = self.phase_fct(pt, self.coefficients)
-        # print(wl, mu, dW, dWdX, dWdY)
-        b = in_cosI + order*mu*(normal[0]*dWdX + normal[1]*dWdY)
-        c = mu*(mu*(dWdX**2 + dWdY**2)/2 +
-                order*(inc_dir[0]*dWdX + inc_dir[1]*dWdY))
+        if np.ndim(pt) == 1 or self.phase_fct in array_phase_fcts:
+            dW, dWdX, dWdY = self.phase_fct(pt, self.coefficients)
+        else:
+            dW, dWdX, dWdY = np.array([self.phase_fct(p, self.coefficients)
+                                       for p in pt]).reshape(-1, 3).T
+        b = in_cosI + order*mu*(normal[..., 0]*dWdX + normal[..., 1]*dWdY)
+        c = mu*(mu*(dWdX*dWdX + dWdY*dWdY)/2 +
+                order*(inc_dir[..., 0]*dWdX + inc_dir[..., 1]*dWdY))
         # pick the root based on z_dir
-        Q = -b + z_dir*sqrt(b*b - 2*c)
-        if self.debug_output:
+        radicand = b*b - 2*c
+        evanescent = evanescent | ~(radicand >= 0.)
+        Q = -b + z_dir*_sqrt(radicand)
+        if self.debug_output and np.ndim(Q) == 0:
             print('inc_dir:', inc_dir)
-            scale_dir = in_dir
+            scale_dir = np.array(in_dir, dtype=float)
             scale_dir[2] = n_in
             scale_dir = normalize(scale_dir)
             print('scale_dir:', scale_dir)
@@ -315,12 +409,14 @@ class DiffractiveElement:
                   "            c           Q")
             print(f"{mu:6.3f} {dW:12.5g} {dWdX:12.5g} {dWdY:12.5g} {b:12.7g}"
                   f" {c:12.7g} {Q:12.7g}")
-        out_dir = inc_dir + order*mu*(np.array([dWdX, dWdY, 0])) + Q*normal
-        dW *= mu
+        grad = np.stack((dWdX, dWdY, np.zeros_like(dWdX)), axis=-1)
+        out_dir = inc_dir + order*mu*grad + Q[..., np.newaxis]*normal
+        dW = dW*mu
         if n_in != 1.0:
-            out_dir = rt.bend(out_dir, srf_nrml, 1, n_out)
+            out_dir, tir = _bend(out_dir, srf_nrml, 1, n_out)
+            evanescent = evanescent | tir
 
-        return out_dir, dW
+        return out_dir, dW, evanescent
 
 
 class HolographicElement:
@@ -371,25 +467,38 @@ class HolographicElement:
 
     def phase(self, pt: Vec3d, in_dir: Dir3d, srf_nrml: Dir3d, 
               ifc_cntxt) -> tuple[Dir3d, float]:
+        return _scalar_result(*self._phase(pt, in_dir, srf_nrml, ifc_cntxt))
+
+    def phase_batch(self, pts, in_dirs, srf_nrmls, ifc_cntxt):
+        """Returns diffracted ray directions and phase increments for a batch.
+
+        See :meth:`~.Interface.phase_batch` for the arguments and results.
+        """
+        return _batch_result(*self._phase(pts, in_dirs, srf_nrmls,
+                                          ifc_cntxt))
+
+    def _phase(self, pt, in_dir, srf_nrml, ifc_cntxt):
         z_dir, wvl, n_in, n_out, interact_mode = ifc_cntxt
-        normal = normalize(srf_nrml)
-        ref_dir = normalize(pt - self.ref_pt)
+        normal = _normalize(srf_nrml)
+        ref_dir = _normalize(pt - self.ref_pt)
         if self.ref_virtual:
             ref_dir = -ref_dir
-        ref_cosI = np.dot(ref_dir, normal)
-        obj_dir = normalize(pt - self.obj_pt)
+        ref_cosI = _dot(ref_dir, normal)
+        obj_dir = _normalize(pt - self.obj_pt)
         if self.obj_virtual:
             obj_dir = -obj_dir
-        obj_cosI = np.dot(obj_dir, normal)
-        in_cosI = np.dot(in_dir, normal)
+        obj_cosI = _dot(obj_dir, normal)
+        in_cosI = _dot(in_dir, normal)
         mu = 1.0 if wvl is None else wvl/self.ref_wl
         b = in_cosI + mu*(obj_cosI - ref_cosI)
-        refp_cosI = np.dot(ref_dir, in_dir)
-        objp_cosI = np.dot(obj_dir, in_dir)
-        ro_cosI = np.dot(ref_dir, obj_dir)
+        refp_cosI = _dot(ref_dir, in_dir)
+        objp_cosI = _dot(obj_dir, in_dir)
+        ro_cosI = _dot(ref_dir, obj_dir)
         c = mu*(mu*(1.0 - ro_cosI) + (objp_cosI - refp_cosI))
         # pick the root based on z_dir
-        Q = -b + z_dir*sqrt(b*b - 2*c)
-        out_dir = in_dir + mu*(obj_dir - ref_dir) + Q*normal
-        dW = 0.
-        return out_dir, dW
+        radicand = b*b - 2*c
+        evanescent = ~(radicand >= 0.)
+        Q = -b + z_dir*_sqrt(radicand)
+        out_dir = in_dir + mu*(obj_dir - ref_dir) + Q[..., np.newaxis]*normal
+        dW = np.zeros_like(Q)
+        return out_dir, dW, evanescent
@@ -8,7 +8,6 @@
 .. codeauthor: Michael J. Hayford
 """
 import os.path
-import json_tricks
 from collections.abc import Sequence
 from pathlib import Path
 
@@ -24,6 +23,7 @@ from rayoptics.elem.parttree import (PartTree, sequence_to_elements)
 from rayoptics.parax.paraxialdesign import ParaxialModel
 from rayoptics.seq.sequential import SequentialModel, overall_length
 from rayoptics.raytr.opticalspec import OpticalSpecs
+from rayoptics.raytr.trace import ChiefRayCache
 from rayoptics.parax.specsheet import create_specsheet_from_model
 
 
@@ -103,6 +103,9 @@ class OpticalModel:
     Attributes:
         ro_version: current version of rayoptics
         radius_mode: if True output radius, else output curvature
+        revision: counter incremented by each call of :meth:`update_model`
+        chief_ray_cache: :class:`~rayoptics.raytr.trace.ChiefRayCache` of
+                         chief rays and reference spheres for `revision`
         specsheet: :class:`~rayoptics.parax.specsheet.SpecSheet`
         system_spec: :class:`.SystemSpec`
         seq_model: :class:`~rayoptics.seq.sequential.SequentialModel`
@@ -114,6 +117,8 @@ class OpticalModel:
     def __init__(self, radius_mode=False, specsheet=None, **kwargs):
         self.ro_version = rayoptics.__version__
         self.radius_mode = radius_mode
+        self.revision = 0
+        self.chief_ray_cache = ChiefRayCache()
 
         self.map_submodels(specsheet=specsheet, **kwargs)
 
@@ -210,6 +215,8 @@ class OpticalModel:
         if hasattr(self, 'analysis_results'):
             del attrs['analysis_results']
         del attrs['_submodels']
+        attrs.pop('revision', None)
+        attrs.pop('chief_ray_cache', None)
         return attrs
 
     def listobj_str(self):
@@ -250,12 +257,26 @@ class OpticalModel:
         fs_dict = {}
         fs_dict['optical_model'] = self
 
+        import json_tricks
         with open(file_pth, 'w') as f:
             json_tricks.dump(fs_dict, f, indent=1,
                              separators=(',', ':'), allow_nan=True)
         delattr(self, 'profile_dict')
         delattr(self, 'parts_dict')
 
+    def save_snapshot(self, file_name, analysis=True, compress=True):
+        """Save the optical_model in a ray-optics binary snapshot file.
+
+        See :mod:`~rayoptics.gui.robfile` for the .rob file format.
+
+        Args:
+            file_name: str or Path
+            analysis: if True, include the computed analysis results
+            compress: if True, compress the snapshot
+        """
+        from rayoptics.gui.robfile import save_rob
+        return save_rob(self, file_name, analysis=analysis, compress=compress)
+
     def _build_profile_dict(self):
         """ build a profile dict for the union of the seq_model and part_tree. """
         profile_dict = {}
@@ -275,6 +296,8 @@ class OpticalModel:
     def sync_to_restore(self):
         if not hasattr(self, 'ro_version'):
             self.ro_version = rayoptics.__version__
+        self.revision = 0
+        self.chief_ray_cache = ChiefRayCache()
 
         self.profile_dict = (self.profile_dict if hasattr(self, 'profile_dict')
                              else {})
@@ -321,7 +344,10 @@ class OpticalModel:
     
                 - src_model: model that originated the modification
 
+        The model `revision` is incremented, invalidating the chief rays and
+        reference spheres in the `chief_ray_cache`.
         """
+        self.revision += 1
         self['seq_model'].update_model(**kwargs)
         self['optical_spec'].update_model(**kwargs)
         self.update_optical_properties(**kwargs)
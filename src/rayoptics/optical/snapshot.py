@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Binary snapshots of an OpticalModel
+
+    A snapshot stores the complete object graph of an
+    :class:`~.opticalmodel.OpticalModel`: the surfaces, gaps, profiles,
+    decenters, elements, part tree and specs and, optionally, the computed
+    paraxial and coordinate transform state. A model loaded from a snapshot
+    is ready for use without running
+    :meth:`~.opticalmodel.OpticalModel.update_model`, so snapshots are much
+    faster to load than the JSON based .roa files, and are suited for
+    caching models and shipping them to worker processes. The .rob file
+    format, see :mod:`~.gui.robfile`, is a snapshot written to a file.
+
+    A snapshot starts with a header::
+
+        magic           6 bytes, b'ROSNAP'
+        format version  uint16
+        flags           uint16, see SNAP_COMPRESSED and SNAP_ANALYSIS
+        ro_version      uint16 length + utf-8 version of the writer
+
+    followed by the model pickled with protocol 5, zlib compressed if the
+    SNAP_COMPRESSED flag is set. The `app_manager` and the contents of the
+    `chief_ray_cache` are not saved.
+
+    Snapshots use :mod:`pickle`; only load snapshots from trusted sources.
+    The .roa format remains the archival format: snapshots are tied to the
+    class layout of the rayoptics version that wrote them.
+"""
+
+import io
+import logging
+import pickle
+import struct
+import zlib
+
+import rayoptics
+from rayoptics.optical.opticalmodel import OpticalModel
+from rayoptics.raytr.trace import ChiefRayCache
+
+logger = logging.getLogger(__name__)
+
+SNAP_MAGIC = b'ROSNAP'
+SNAP_FORMAT_VERSION = 1
+
+# header flags
+SNAP_COMPRESSED = 0x1
+SNAP_ANALYSIS = 0x2
+
+_header = struct.Struct('<6sHHH')
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """ Pickler that leaves out the model's transient attributes. """
+
+    def __init__(self, file, opt_model, analysis):
+        super().__init__(file, protocol=5)
+        self.external = {id(opt_model.chief_ray_cache): 'chief_ray_cache'}
+        app_manager = getattr(opt_model, 'app_manager', None)
+        if app_manager is not None:
+            self.external[id(app_manager)] = 'app_manager'
+        if not analysis:
+            self.external[id(opt_model.analysis_results)] = 'analysis_results'
+
+    def persistent_id(self, obj):
+        return self.external.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """ Unpickler that supplies new instances of the transient attributes. """
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.restored = {}
+
+    def persistent_load(self, pid):
+        # return the same instance for each reference to an attribute
+        if pid not in self.restored:
+            if pid == 'chief_ray_cache':
+                self.restored[pid] = ChiefRayCache()
+            elif pid == 'analysis_results':
+                self.restored[pid] = {'parax_data': None}
+            elif pid == 'app_manager':
+                self.restored[pid] = None
+            else:
+                raise pickle.UnpicklingError(f"unknown persistent id: {pid}")
+        return self.restored[pid]
+
+
+def dumps_snapshot(opt_model: OpticalModel, analysis=True,
+                   compress=True) -> bytes:
+    """ Return a binary snapshot of `opt_model`.
+
+    Args:
+        opt_model: the model to save
+        analysis: if True, include the computed `analysis_results`,
+                  otherwise :meth:`update_model` is run when loading
+        compress: if True, zlib compress the pickled model
+
+    Returns:
+        the snapshot as bytes
+    """
+    buf = io.BytesIO()
+    _SnapshotPickler(buf, opt_model, analysis).dump(opt_model)
+    payload = buf.getvalue()
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= SNAP_COMPRESSED
+    if analysis:
+        flags |= SNAP_ANALYSIS
+    ro_version = rayoptics.__version__.encode('utf-8')
+    header = _header.pack(SNAP_MAGIC, SNAP_FORMAT_VERSION, flags,
+                          len(ro_version))
+    return header + ro_version + payload
+
+
+def loads_snapshot(data: bytes) -> OpticalModel:
+    """ Return the OpticalModel in the snapshot `data`.
+
+    Raises:
+        ValueError: if `data` isn't a snapshot of a supported format version
+    """
+    if len(data) < _header.size:
+        raise ValueError("not a rayoptics snapshot")
+    magic, fmt_version, flags, vlen = _header.unpack_from(data)
+    if magic != SNAP_MAGIC:
+        raise ValueError("not a rayoptics snapshot")
+    if fmt_version > SNAP_FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format version {fmt_version}")
+    start = _header.size + vlen
+    ro_version = data[_header.size:start].decode('utf-8')
+    payload = data[start:]
+    if flags & SNAP_COMPRESSED:
+        payload = zlib.decompress(payload)
+    opt_model = _SnapshotUnpickler(io.BytesIO(payload)).load()
+
+    if ro_version != rayoptics.__version__:
+        logger.info("snapshot written by rayoptics %s, recomputing model",
+                    ro_version)
+        opt_model.update_model()
+    elif not flags & SNAP_ANALYSIS:
+        opt_model.update_model()
+    return opt_model
@@ -0,0 +1,12 @@
+""" Package for optimization of optical models
+
+    The :mod:`~.optimize` subpackage provides damped least squares
+    optimization of the real ray performance of an optical model:
+
+        - Variables bound to interface, gap and profile attributes,
+          :mod:`~.variables`
+        - Merit function operands, e.g. spot size, OPD, focal length,
+          distortion and real ray targets, :mod:`~.operands`
+        - The damped least squares solver and the parallel evaluation of the
+          Jacobian, :mod:`~.dls`
+"""
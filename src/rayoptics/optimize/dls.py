@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Damped least squares optimization of an optical model
+
+    :class:`DampedLeastSquares` minimizes the sum of the squared residuals
+    of a list of :mod:`~.operands` by changing a list of :mod:`~.variables`,
+    using the Levenberg-Marquardt form of damped least squares. The
+    Jacobian is calculated by forward differences.
+
+    Each evaluation of the merit function sets the variables and updates
+    the model with :func:`update_for_evaluation`, which takes advantage of
+    the incremental update of the sequential model and leaves the element
+    model, part tree, paraxial model and clear apertures for the full
+    :meth:`~.OpticalModel.update_model` done at the end of the optimization.
+
+    The Jacobian columns are independent of each other. A
+    :class:`JacobianExecutor` evaluates them in parallel in a process pool,
+    each worker holding a copy of the model::
+
+        variables = [ProfileVariable(i, 'cv') for i in (1, 3, 9)]
+        operands = [SpotRMS(fi) for fi in range(3)] + [EFL(target=50.)]
+        with JacobianExecutor(opm, variables, operands) as executor:
+            dls = DampedLeastSquares(opm, variables, operands,
+                                     executor=executor).run()
+        print(dls.listobj_str())
+
+    The copies are taken when the executor is created; changes made to the
+    optical model afterwards, other than to the variables, aren't seen by
+    the workers.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rayoptics.optical.snapshot import dumps_snapshot, loads_snapshot
+from rayoptics.optimize import variables as var
+from rayoptics.optimize.operands import eval_residuals
+
+
+def update_for_evaluation(opt_model):
+    """ Update the parts of **opt_model** used by the merit function.
+
+    The sequential model is updated incrementally, followed by the first
+    order properties and the ray aiming of the fields. The model `revision`
+    is incremented, invalidating the cached chief rays.
+    """
+    opt_model.revision += 1
+    opt_model['seq_model'].update_model()
+    opt_model['optical_spec'].update_model()
+    opt_model['optical_spec'].update_optical_properties()
+
+
+def evaluate(opt_model, variables, operands, x):
+    """ Set the **variables** to **x** and return the operand residuals. """
+    var.set_values(opt_model, variables, x)
+    update_for_evaluation(opt_model)
+    return eval_residuals(opt_model, operands)
+
+
+# the optical model, variables and operands of each worker process
+_worker_pkg = None
+
+
+def _init_worker(snapshot, variables, operands):
+    global _worker_pkg
+    _worker_pkg = loads_snapshot(snapshot), variables, operands
+
+
+def _run_job(x):
+    """ evaluate the residuals at **x** on the worker's optical model """
+    opt_model, variables, operands = _worker_pkg
+    return evaluate(opt_model, variables, operands, x)
+
+
+class JacobianExecutor():
+    """ A process pool for evaluating the merit function on model copies.
+
+    Attributes:
+        opt_model: the :class:`~.OpticalModel` copied to the workers
+        max_workers: number of worker processes, defaults to the cpu count
+        mp_context: optional multiprocessing context for the process pool
+    """
+
+    def __init__(self, opt_model, variables, operands, max_workers=None,
+                 mp_context=None):
+        self.opt_model = opt_model
+        self.max_workers = max_workers
+        snapshot = dumps_snapshot(opt_model, compress=False)
+        self.pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=mp_context,
+                                        initializer=_init_worker,
+                                        initargs=(snapshot, variables,
+                                                  operands))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def submit(self, x):
+        """ Schedule an evaluation of the residuals at **x**. """
+        return self.pool.submit(_run_job, x)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+class DampedLeastSquares():
+    """ Damped least squares (Levenberg-Marquardt) optimizer.
+
+    Attributes:
+        opt_model: the :class:`~.OpticalModel` to optimize
+        variables: list of :class:`~.Variable`
+        operands: list of :class:`~.Operand`
+        damping: the current damping factor
+        fd_step: relative forward difference step, scaled by the larger of
+                 1 and the magnitude of the variable
+        max_iter: maximum number of iterations
+        ftol: convergence when the relative decrease of the merit function
+              is less than `ftol`
+        xtol: convergence when the relative step size is less than `xtol`
+        executor: a :class:`JacobianExecutor`, or None to evaluate the
+                  Jacobian serially
+        x: the current values of the variables
+        residuals: the operand residuals at `x`
+        merit: the merit function value, the sum of the squared residuals
+        history: list of the merit function values after each iteration
+        num_evals: number of merit function evaluations
+        eval_time: elapsed time of the merit function evaluations, s
+
+    Raises:
+        ValueError: if the residuals at the starting point aren't finite
+    """
+
+    def __init__(self, opt_model, variables, operands, damping=1e-3,
+                 fd_step=1e-6, max_iter=50, ftol=1e-6, xtol=1e-9,
+                 executor=None):
+        self.opt_model = opt_model
+        self.variables = variables
+        self.operands = operands
+        self.damping = damping
+        self.fd_step = fd_step
+        self.max_iter = max_iter
+        self.ftol = ftol
+        self.xtol = xtol
+        self.executor = executor
+        self.lower, self.upper = var.bounds(variables)
+        self.num_evals = 0
+        self.eval_time = 0.
+        self.x = var.get_values(opt_model, variables)
+        self.residuals = self.evaluate(self.x)
+        if not np.all(np.isfinite(self.residuals)):
+            cache = {}
+            bad = [op for op in operands
+                   if not np.all(np.isfinite(op.residual(opt_model, cache)))]
+            raise ValueError(f"operands with non-finite residuals: {bad}")
+        self.merit = np.dot(self.residuals, self.residuals)
+        self.history = [self.merit]
+
+    @property
+    def evals_per_sec(self):
+        """ merit function evaluations per second """
+        return self.num_evals/self.eval_time if self.eval_time > 0 else 0.
+
+    def evaluate(self, x):
+        """ Returns the residuals at **x**, evaluated on the model. """
+        start = time.perf_counter()
+        residuals = evaluate(self.opt_model, self.variables, self.operands,
+                             x)
+        self.eval_time += time.perf_counter() - start
+        self.num_evals += 1
+        return residuals
+
+    def jacobian(self, x, residuals):
+        """ Returns the forward difference Jacobian of the residuals at x. """
+        h = self.fd_step*np.maximum(np.abs(x), 1.)
+        h = np.where(x + h > self.upper, -h, h)
+        x_steps = x + np.diag(h)
+        start = time.perf_counter()
+        if self.executor is None:
+            columns = [evaluate(self.opt_model, self.variables,
+                                self.operands, xs) for xs in x_steps]
+        else:
+            futures = [self.executor.submit(xs) for xs in x_steps]
+            columns = [fut.result() for fut in futures]
+        self.eval_time += time.perf_counter() - start
+        self.num_evals += len(x)
+        J = (np.array(columns) - residuals).T/h
+        # a failed evaluation gives no information about that direction
+        return np.where(np.isfinite(J), J, 0.)
+
+    def step(self):
+        """ Take one damped least squares step.
+
+        Returns:
+            True if the optimization has converged
+        """
+        x, r, merit = self.x, self.residuals, self.merit
+        J = self.jacobian(x, r)
+        A = np.matmul(J.T, J)
+        g = np.matmul(J.T, r)
+        # Marquardt's scaling of the damping by the diagonal of A
+        D = np.diag(np.maximum(np.diag(A), 1e-12*np.max(np.diag(A))))
+        while self.damping < 1e10:
+            dx = np.linalg.lstsq(A + self.damping*D, -g, rcond=None)[0]
+            x_new = np.clip(x + dx, self.lower, self.upper)
+            r_new = self.evaluate(x_new)
+            merit_new = np.dot(r_new, r_new)
+            if np.isfinite(merit_new) and merit_new < merit:
+                self.x, self.residuals, self.merit = x_new, r_new, merit_new
+                self.damping = max(self.damping/10., 1e-12)
+                self.history.append(merit_new)
+                small_step = (np.linalg.norm(x_new - x) <=
+                              self.xtol*(np.linalg.norm(x) + self.xtol))
+                return merit - merit_new <= self.ftol*merit or small_step
+            self.damping *= 10.
+        # no decrease of the merit function could be found
+        return True
+
+    def run(self):
+        """ Iterate until converged or `max_iter` and update the model. """
+        for i in range(self.max_iter):
+            if self.merit == 0. or self.step():
+                break
+        var.set_values(self.opt_model, self.variables, self.x)
+        self.opt_model.update_model()
+        return self
+
+    def operand_values(self):
+        """ Returns a list of the operand values for the model's state. """
+        cache = {}
+        return [op.value(self.opt_model, cache) for op in self.operands]
+
+    def listobj_str(self):
+        o_str = (f"merit: {self.history[0]:12.6g} -> {self.merit:12.6g}"
+                 f"   iterations: {len(self.history) - 1}\n")
+        o_str += (f"evaluations: {self.num_evals}   "
+                  f"{self.evals_per_sec:.1f} evals/s\n")
+        for v, value in zip(self.variables, self.x):
+            o_str += f"{v.label:16s} {value:14.8g}\n"
+        for op, value in zip(self.operands, self.operand_values()):
+            o_str += (f"{type(op).__name__:10s} {op.label:16s} "
+                      f"{value:12.6g} {op.target:12.6g}\n")
+        return o_str
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Merit function operands
+
+    An operand evaluates one quantity of the optical model and returns the
+    weighted difference from its target, the residual. The merit function
+    is the sum of the squared residuals of a list of operands, see
+    :func:`eval_residuals`.
+
+    An operand may contribute an array of residuals, e.g. the ray errors of
+    a :class:`SpotRMS` operand. The operands of a merit function are
+    evaluated with a shared `cache` dict, so that, for example, a
+    :class:`SpotRMS` and an :class:`OPDRMS` operand at the same field and
+    wavelength trace the rays once.
+
+    Fields are given by their index in the field of view, and wavelengths by
+    their index in the spectral region, None selecting the central
+    wavelength.
+"""
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+import rayoptics.optical.model_constants as mc
+from rayoptics.raytr import analyses
+from rayoptics.raytr import sampler
+from rayoptics.raytr import trace
+from rayoptics.raytr import traceerror as terr
+from rayoptics.raytr import waveabr
+
+
+class Operand(ABC):
+    """ Base class of merit function operands.
+
+    Attributes:
+        target: the target value of the operand
+        weight: the residual is weight*(value - target)
+    """
+
+    def __init__(self, target=0., weight=1.):
+        self.target = target
+        self.weight = weight
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.label})"
+
+    @property
+    def label(self):
+        return ''
+
+    @abstractmethod
+    def value(self, opt_model, cache):
+        """ Returns the value of the operand for **opt_model**. """
+        raise NotImplementedError
+
+    def residual(self, opt_model, cache):
+        """ Returns the residual, or an array of residuals. """
+        return self.weight*(self.value(opt_model, cache) - self.target)
+
+
+class FirstOrder(Operand):
+    """ A :class:`~.FirstOrderData` attribute, e.g. 'efl', 'bfl' or 'm' """
+
+    def __init__(self, attr, target=0., weight=1.):
+        super().__init__(target=target, weight=weight)
+        self.attr = attr
+
+    @property
+    def label(self):
+        return self.attr
+
+    def value(self, opt_model, cache):
+        fod = opt_model['analysis_results']['parax_data'].fod
+        return getattr(fod, self.attr)
+
+
+class EFL(FirstOrder):
+    """ The effective focal length """
+
+    def __init__(self, target=0., weight=1.):
+        super().__init__('efl', target=target, weight=weight)
+
+
+class FieldOperand(Operand):
+    """ Base class of operands evaluated at a field and wavelength.
+
+    Attributes:
+        fi: index of the field
+        wl: index of the wavelength, or None for the central wavelength
+    """
+
+    def __init__(self, fi, wl=None, target=0., weight=1.):
+        super().__init__(target=target, weight=weight)
+        self.fi = fi
+        self.wl = wl
+
+    @property
+    def label(self):
+        wl = 'c' if self.wl is None else self.wl
+        return f"f{self.fi} w{wl}"
+
+
+@lru_cache(maxsize=16)
+def _pupil_samples(num_rays):
+    """ [rays, 2] array of samples of the unit circle, see :mod:`~.sampler` """
+    grid_def = [np.array([-1., -1.]), np.array([1., 1.]), num_rays]
+    return np.array(list(sampler.csd_grid_ray_generator(grid_def)))
+
+
+def _ray_errors(opt_model, cache, fi, wl, num_rays):
+    """ Returns the spot and OPD errors of a ray bundle at fi, wl.
+
+    The rays are traced once per evaluation of the merit function. Rays
+    that fail have nan errors.
+
+    Returns:
+        tuple: **spot_err**, **opd_err**
+
+            - **spot_err**: [rays, 2] array of the image points relative to
+              the centroid, in system units
+            - **opd_err**: [rays] array of the OPD, less its mean, in waves
+    """
+    key = 'ray_errors', fi, wl, num_rays
+    errors = cache.get(key)
+    if errors is None:
+        fld, wvl, foc = opt_model['optical_spec'].lookup_fld_wvl_focus(fi,
+                                                                       wl)
+        fod = opt_model['analysis_results']['parax_data'].fod
+        ref_sphere, cr_pkg = trace.setup_pupil_coords(opt_model, fld, wvl,
+                                                      foc)
+        ray_bundle = analyses.trace_ray_bundle(
+            opt_model, _pupil_samples(num_rays), fld, wvl, foc,
+            append_if_none=True, apply_vignetting=True)
+        valid = ray_bundle.valid[:, np.newaxis]
+
+        p_img, d_img = ray_bundle.last_segment()
+        spot = p_img[:, :2] + (foc/d_img[:, 2])[:, np.newaxis]*d_img[:, :2]
+        spot = np.where(valid, spot, np.nan)
+        spot_err = spot - np.nanmean(spot, axis=0)
+
+        convert_to_opd = 1/opt_model.nm_to_sys_units(wvl)
+        opd = convert_to_opd*waveabr.wave_abr_full_calc_batch(
+            fod, ray_bundle, cr_pkg, ref_sphere)
+        opd = np.where(valid[:, 0], opd, np.nan)
+        opd_err = opd - np.nanmean(opd)
+
+        errors = cache[key] = spot_err, opd_err
+    return errors
+
+
+class RayErrorOperand(FieldOperand):
+    """ Base class of the rms operands of a bundle of rays.
+
+    When the target is zero, the residuals are the individual ray errors,
+    scaled so that their sum of squares is the square of the rms value. This
+    gives the least squares solver much better information than the rms
+    value alone. Otherwise the residual is the difference of the rms value
+    from the target.
+
+    Rays that fail to trace are given an error of `fail_penalty`, so that
+    the number of residuals doesn't change and failed rays increase the
+    merit function.
+
+    Attributes:
+        num_rays: the rays are a grid of num_rays across the pupil diameter
+        fail_penalty: the error of a failed ray. If None, twice the largest
+                      error of the traced rays is used, or 1e3 if no ray
+                      traced.
+    """
+
+    def __init__(self, fi, wl=None, num_rays=21, fail_penalty=None,
+                 target=0., weight=1.):
+        super().__init__(fi, wl=wl, target=target, weight=weight)
+        self.num_rays = num_rays
+        self.fail_penalty = fail_penalty
+
+    @abstractmethod
+    def ray_errors(self, opt_model, cache):
+        """ Returns the [rays] or [rays, n] array of ray errors.
+
+        Rays that failed to trace have nan errors.
+        """
+        raise NotImplementedError
+
+    def penalized_errors(self, opt_model, cache):
+        """ Returns the [rays, n] ray errors with failed rays penalized. """
+        err = self.ray_errors(opt_model, cache)
+        err = np.reshape(err, (len(err), -1))
+        failed = ~np.all(np.isfinite(err), axis=1)
+        if np.any(failed):
+            penalty = self.fail_penalty
+            if penalty is None:
+                ray_err = np.sqrt(np.sum(err[~failed]**2, axis=1))
+                penalty = 2*np.max(ray_err) if len(ray_err) > 0 else 1e3
+            err = np.where(failed[:, np.newaxis],
+                           penalty/np.sqrt(err.shape[1]), err)
+        return err
+
+    def value(self, opt_model, cache):
+        err = self.penalized_errors(opt_model, cache)
+        return np.sqrt(np.mean(np.sum(err**2, axis=1)))
+
+    def residual(self, opt_model, cache):
+        if self.target != 0.:
+            return super().residual(opt_model, cache)
+        err = self.penalized_errors(opt_model, cache)
+        return self.weight*np.ravel(err)/np.sqrt(len(err))
+
+
+class SpotRMS(RayErrorOperand):
+    """ The rms spot radius about the centroid, in system units """
+
+    def ray_errors(self, opt_model, cache):
+        return _ray_errors(opt_model, cache, self.fi, self.wl,
+                           self.num_rays)[0]
+
+
+class OPDRMS(RayErrorOperand):
+    """ The rms wavefront error, in waves """
+
+    def ray_errors(self, opt_model, cache):
+        return _ray_errors(opt_model, cache, self.fi, self.wl,
+                           self.num_rays)[1]
+
+
+class Distortion(FieldOperand):
+    """ The distortion of the real chief ray, in percent
+
+    The real image point is compared with the paraxial chief ray scaled to
+    the field.
+    """
+
+    def value(self, opt_model, cache):
+        osp = opt_model['optical_spec']
+        fld, wvl, foc = osp.lookup_fld_wvl_focus(self.fi, self.wl)
+        ax_ray, pr_ray, fod = opt_model['analysis_results']['parax_data']
+        obj_pt, obj_dir = osp.obj_coords(fld)
+        if osp.conjugate_type('object') == 'infinite':
+            scale = (obj_dir[:2]/obj_dir[2])/pr_ray[0][mc.slp]
+        else:
+            scale = obj_pt[:2]/pr_ray[0][mc.ht]
+        parax_pt = pr_ray[-1][mc.ht]*scale
+        parax_sqr = np.dot(parax_pt, parax_pt)
+        if parax_sqr == 0.:
+            return 0.
+        chief_ray, cr_exp_seg = trace.get_chief_ray_pkg(opt_model, fld, wvl,
+                                                        foc)
+        real_pt = chief_ray[0][-1][mc.p][:2]
+        return 100.*(np.dot(real_pt, parax_pt)/parax_sqr - 1.)
+
+
+class RealRay(FieldOperand):
+    """ A coordinate of a real ray at an interface.
+
+    Attributes:
+        pupil: relative pupil coordinates of the ray
+        ifc: index of the interface
+        coord: 'x', 'y' or 'z' of the point of incidence or 'l', 'm' or 'n'
+               of the direction cosines following the interface
+
+    If the ray fails, the value is nan.
+    """
+    coords = {'x': (mc.p, 0), 'y': (mc.p, 1), 'z': (mc.p, 2),
+              'l': (mc.d, 0), 'm': (mc.d, 1), 'n': (mc.d, 2)}
+
+    def __init__(self, fi, pupil=(0., 1.), ifc=-1, coord='y', wl=None,
+                 target=0., weight=1.):
+        super().__init__(fi, wl=wl, target=target, weight=weight)
+        self.pupil = pupil
+        self.ifc = ifc
+        self.coord = coord
+
+    @property
+    def label(self):
+        return (f"{super().label} {self.coord} ifc{self.ifc} "
+                f"pupil{tuple(self.pupil)}")
+
+    def value(self, opt_model, cache):
+        fld, wvl, foc = opt_model['optical_spec'].lookup_fld_wvl_focus(
+            self.fi, self.wl)
+        try:
+            pupil = np.array(self.pupil, dtype=float)
+            ray, op, wvl = trace.trace_base(opt_model, pupil, fld, wvl)
+        except terr.TraceError:
+            return np.nan
+        seg_item, i = self.coords[self.coord]
+        return ray[self.ifc][seg_item][i]
+
+
+def eval_residuals(opt_model, operands):
+    """ Returns an array of the residuals of the **operands**. """
+    cache = {}
+    return np.concatenate([np.ravel(op.residual(opt_model, cache))
+                           for op in operands]).astype(float)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the damped least squares optimizer"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.optimize.variables import (Variable, SurfaceVariable,
+                                          GapVariable, ProfileVariable,
+                                          get_values)
+from rayoptics.optimize.operands import (FieldOperand, RayErrorOperand,
+                                         SpotRMS, OPDRMS, EFL, Distortion,
+                                         RealRay, eval_residuals)
+from rayoptics.optimize.dls import DampedLeastSquares, JacobianExecutor
+
+
+class OptimizeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(warnings.catch_warnings())
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        self.efl = self.opm['analysis_results']['parax_data'].fod.efl
+
+    def test_variables(self):
+        sm = self.opm['seq_model']
+        variables = [SurfaceVariable(3, 'profile_cv'), GapVariable(5),
+                     ProfileVariable(9, 'cv')]
+        npt.assert_array_equal(get_values(self.opm, variables),
+                               [sm.ifcs[3].profile_cv, sm.gaps[5].thi,
+                                sm.ifcs[9].profile.cv])
+        variables[1].set_value(self.opm, 15.)
+        self.assertEqual(sm.gaps[5].thi, 15.)
+
+    def test_abstract_bases(self):
+        for cls, args in ((Variable, (1, 'cv')), (FieldOperand, (0,)),
+                          (RayErrorOperand, (0,))):
+            with self.assertRaises(TypeError):
+                cls(*args)
+
+    def test_operands(self):
+        cache = {}
+        spot = SpotRMS(2, num_rays=12)
+        opd = OPDRMS(2, num_rays=12)
+        # the ray error residuals sum to the square of the rms value
+        spot_res = spot.residual(self.opm, cache)
+        self.assertAlmostEqual(np.dot(spot_res, spot_res),
+                               spot.value(self.opm, cache)**2)
+        opd_res = opd.residual(self.opm, cache)
+        self.assertAlmostEqual(np.dot(opd_res, opd_res),
+                               opd.value(self.opm, cache)**2)
+        self.assertAlmostEqual(EFL(target=self.efl).residual(self.opm, cache),
+                               0.)
+        self.assertEqual(Distortion(0).value(self.opm, cache), 0.)
+        self.assertLess(abs(Distortion(2).value(self.opm, cache)), 5.)
+        self.assertTrue(np.isfinite(RealRay(2).value(self.opm, cache)))
+
+    def test_dbl_gauss(self):
+        opm = self.opm
+        sm = opm['seq_model']
+        operands = ([SpotRMS(fi, num_rays=12) for fi in range(3)] +
+                    [EFL(target=self.efl, weight=0.01)])
+        res = eval_residuals(opm, operands)
+        design_merit = np.dot(res, res)
+
+        # spoil the design, then recover it
+        sm.ifcs[3].profile.cv *= 1.03
+        sm.ifcs[9].profile.cv *= 0.97
+        opm.update_model()
+        variables = [ProfileVariable(3, 'cv'), ProfileVariable(9, 'cv'),
+                     GapVariable(11)]
+        dls = DampedLeastSquares(opm, variables, operands).run()
+        self.assertGreater(dls.history[0], 100*design_merit)
+        self.assertLess(dls.merit, design_merit)
+        self.assertLess(len(dls.history), 20)
+        self.assertGreater(dls.evals_per_sec, 0.)
+        fod = opm['analysis_results']['parax_data'].fod
+        self.assertAlmostEqual(fod.efl, self.efl, delta=0.01*self.efl)
+
+    def test_failed_rays(self):
+        opm = self.opm
+        opm['optical_spec']['fov'].fields[2].y = 36.
+        opm.update_model()
+        cache = {}
+        spot = SpotRMS(2)
+        spot_res = spot.residual(opm, cache)
+        self.assertEqual(len(spot_res), 2*len(spot.ray_errors(opm, cache)))
+        self.assertTrue(np.all(np.isfinite(spot_res)))
+        self.assertAlmostEqual(np.dot(spot_res, spot_res),
+                               spot.value(opm, cache)**2)
+
+        variables = [ProfileVariable(3, 'cv'), GapVariable(11)]
+        dls = DampedLeastSquares(opm, variables, [spot], max_iter=3).run()
+        self.assertLess(dls.merit, dls.history[0])
+        with self.assertRaises(ValueError):
+            DampedLeastSquares(opm, variables, [RealRay(2)])
+
+    def test_parallel_jacobian(self):
+        variables = [ProfileVariable(3, 'cv'), GapVariable(11)]
+        operands = [SpotRMS(1, num_rays=8), EFL(target=self.efl)]
+        dls = DampedLeastSquares(self.opm, variables, operands)
+        jac = dls.jacobian(dls.x, dls.residuals)
+        with JacobianExecutor(self.opm, variables, operands,
+                              max_workers=2) as executor:
+            dls.executor = executor
+            npt.assert_allclose(dls.jacobian(dls.x, dls.residuals), jac,
+                                rtol=1e-8, atol=1e-8)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
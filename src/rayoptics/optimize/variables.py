@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Optimization variables bound to attributes of the sequential model
+
+    A variable names a component of the :class:`~.SequentialModel` by its
+    index, rather than holding a reference to it, so the same variable can
+    be applied to copies of the optical model, e.g. in worker processes::
+
+        variables = [ProfileVariable(1, 'cv'),
+                     GapVariable(5),
+                     ProfileVariable(3, 'coefs', item=1)]
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class Variable(ABC):
+    """ An optimization variable bound to an attribute of a model component.
+
+    Attributes:
+        idx: index of the interface or gap in the sequential model
+        attr: name of the attribute of the component
+        item: index into the attribute value, for list or array attributes
+              like aspheric coefficients, or None
+        lower: lower bound of the variable
+        upper: upper bound of the variable
+    """
+    kind = ''
+
+    def __init__(self, idx, attr, item=None, lower=-np.inf, upper=np.inf):
+        self.idx = idx
+        self.attr = attr
+        self.item = item
+        self.lower = lower
+        self.upper = upper
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.label})"
+
+    @property
+    def label(self):
+        item = '' if self.item is None else f"[{self.item}]"
+        return f"{self.kind}{self.idx}.{self.attr}{item}"
+
+    @abstractmethod
+    def component(self, opt_model):
+        """ Returns the model component that the variable is bound to. """
+        raise NotImplementedError
+
+    def get_value(self, opt_model):
+        value = getattr(self.component(opt_model), self.attr)
+        return value if self.item is None else value[self.item]
+
+    def set_value(self, opt_model, value):
+        comp = self.component(opt_model)
+        if self.item is None:
+            setattr(comp, self.attr, value)
+        else:
+            getattr(comp, self.attr)[self.item] = value
+
+
+class SurfaceVariable(Variable):
+    """ Variable bound to an attribute of an interface, e.g. 'profile_cv' """
+    kind = 's'
+
+    def component(self, opt_model):
+        return opt_model['seq_model'].ifcs[self.idx]
+
+
+class GapVariable(Variable):
+    """ Variable bound to an attribute of a gap, the thickness by default """
+    kind = 'g'
+
+    def __init__(self, idx, attr='thi', **kwargs):
+        super().__init__(idx, attr, **kwargs)
+
+    def component(self, opt_model):
+        return opt_model['seq_model'].gaps[self.idx]
+
+
+class ProfileVariable(Variable):
+    """ Variable bound to an attribute of an interface's profile, e.g. 'cv' """
+    kind = 'p'
+
+    def component(self, opt_model):
+        return opt_model['seq_model'].ifcs[self.idx].profile
+
+
+def get_values(opt_model, variables):
+    """ Returns an array of the current values of **variables**. """
+    return np.array([var.get_value(opt_model) for var in variables],
+                    dtype=float)
+
+
+def set_values(opt_model, variables, x):
+    """ Set the **variables** to the values **x**.
+
+    The model isn't updated, see :func:`~.dls.update_for_evaluation`.
+    """
+    for var, value in zip(variables, x):
+        var.set_value(opt_model, float(value))
+
+
+def bounds(variables):
+    """ Returns arrays of the lower and upper bounds of **variables**. """
+    return (np.array([var.lower for var in variables], dtype=float),
+            np.array([var.upper for var in variables], dtype=float))
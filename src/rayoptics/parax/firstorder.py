@@ -3,6 +3,10 @@
 # Copyright © 2018 Michael J. Hayford
 """ Functions to support paraxial ray tracing a sequential optical model
 
+    The functions ending in `_batch` evaluate the paraxial rays and first
+    order properties of many variants of the model at once, using stacked
+    arrays of ABCD matrices.
+
 .. Created on Tue Feb 13 10:48:19 2018
 
 .. codeauthor: Michael J. Hayford
@@ -30,6 +34,14 @@ ParaxData.fod.__doc__ = "instance of :class:`~.FirstOrderData`"
         fod: instance of :class:`~.FirstOrderData`
 """
 
+ParaxSystem = namedtuple('ParaxSystem', ['pwr', 'cv', 'thi', 'n', 'active'])
+ParaxSystem.pwr.__doc__ = "[batch, ifcs] array of interface optical powers"
+ParaxSystem.cv.__doc__ = "[batch, ifcs] array of interface curvatures"
+ParaxSystem.thi.__doc__ = "[batch, gaps] array of gap thicknesses"
+ParaxSystem.n.__doc__ = "[batch, gaps] array of signed refractive indices"
+ParaxSystem.active.__doc__ = ("[ifcs] boolean array, False for dummy and "
+                              "phantom interfaces")
+
 
 class FirstOrderData:
     """ Container class for first order optical properties
@@ -613,6 +625,336 @@ def compute_principle_points_for_fragment(path: Path, oal: float):
                           pp1, ppk, pp_sep, ffl, bfl)
 
 
+def _apply_variation(base, variation):
+    """ Returns a [batch, n] array of *base* values modified by *variation*.
+
+    *variation* may be None, an array broadcastable to [batch, n], or a dict
+    of {index: values} that replaces the values of the indexed items.
+    """
+    if variation is None:
+        return base[np.newaxis, :]
+    if isinstance(variation, dict):
+        num = max(np.size(v) for v in variation.values())
+        values = np.tile(base, (num, 1))
+        for idx, v in variation.items():
+            values[:, idx] = v
+        return values
+    return np.atleast_2d(np.asarray(variation, dtype=float))
+
+
+def parax_system_from_seq(sm, wvl=None, thi=None, cv=None, pwr=None,
+                          rndx=None) -> ParaxSystem:
+    """ Returns a :class:`ParaxSystem` of arrays for a batch of variants of sm.
+
+    Each of the optional parameter variations replaces the model values,
+    and may be a [batch, n] array, an [n] array, or a dict of
+    {index: [batch] values} that varies only the indexed items. The
+    variations are broadcast to a common batch size.
+
+    When **cv** or **rndx** are varied and **pwr** isn't, the powers of
+    surfaces whose power is given by their curvature are recomputed from
+    the varied curvatures and indices.
+
+    Args:
+        sm: the :class:`~.SequentialModel`
+        wvl: wavelength in nm, defaults to central wavelength
+        thi: gap thickness variations
+        cv: interface curvature variations
+        pwr: interface optical power variations
+        rndx: gap refractive index variations (unsigned)
+
+    Returns:
+        :class:`ParaxSystem` of [batch, ...] arrays
+    """
+    path = list(sm.path(wl=wvl))
+    ifcs = [p[mc.Intfc] for p in path]
+    base_pwr = np.array([ifc.optical_power for ifc in ifcs])
+    base_cv = np.array([ifc.profile_cv for ifc in ifcs])
+    base_thi = np.array([p[mc.Gap].thi for p in path[:-1]])
+    base_rndx = np.array([p[mc.Indx] for p in path[:-1]])
+    z_dir = np.array([p[mc.Zdir] for p in path[:-1]])
+    active = np.array([ifc.interact_mode not in ('dummy', 'phantom')
+                       for ifc in ifcs])
+
+    params = [_apply_variation(base, var) for base, var in
+              ((base_pwr, pwr), (base_cv, cv), (base_thi, thi),
+               (base_rndx, rndx))]
+    num = max(a.shape[0] for a in params)
+    pwr_b, cv_b, thi_b, rndx_b = [np.broadcast_to(a, (num, a.shape[1]))
+                                  for a in params]
+    n = z_dir*rndx_b
+
+    if pwr is None and (cv is not None or rndx is not None):
+        delta_n = np.zeros_like(cv_b)
+        delta_n[:, 1:-1] = n[:, 1:] - n[:, :-1]
+        base_delta_n = np.array([getattr(ifc, 'delta_n', 0.)
+                                 for ifc in ifcs])
+        from_cv = active & (base_pwr == base_delta_n*base_cv)
+        pwr_b = np.where(from_cv, cv_b*delta_n, pwr_b)
+
+    return ParaxSystem(pwr_b, cv_b, thi_b, n, active)
+
+
+def _effective_rndx(psys: ParaxSystem):
+    """ [batch, gaps] signed indices, carried across dummy interfaces """
+    n_eff = np.array(psys.n)
+    for k in range(1, n_eff.shape[1]):
+        if not psys.active[k]:
+            n_eff[:, k] = n_eff[:, k-1]
+    return n_eff
+
+
+def parax_matrix_stack(psys: ParaxSystem):
+    """ Returns the stacked transfer matrices from the 1st to each interface.
+
+    The matrices operate on [y, n*u] ray vectors incident on the first
+    interface and return the ray vector following interface k. Entry 0 is
+    the matrix from the 1st interface back to the object surface. The
+    columns of the matrices are the p and q rays of
+    :func:`compute_principle_points`.
+
+    Args:
+        psys: :class:`ParaxSystem` of [batch, ...] arrays
+
+    Returns:
+        [batch, ifcs, 2, 2] array of ABCD matrices
+    """
+    # the work is done interface by interface on contiguous [batch] rows
+    pwr = np.where(psys.active, psys.pwr, 0.).T.copy()
+    tau = (psys.thi/_effective_rndx(psys)).T.copy()
+    num_ifcs, num = pwr.shape
+    M = np.empty((2, 2, num_ifcs, num))
+    A, B, C, D = M[0, 0], M[0, 1], M[1, 0], M[1, 1]
+    A[0], B[0], C[0], D[0] = 1., -tau[0], 0., 1.
+    A[1], B[1], C[1], D[1] = 1., 0., -pwr[1], 1.
+    for k in range(2, num_ifcs):
+        A[k] = A[k-1] + tau[k-1]*C[k-1]
+        B[k] = B[k-1] + tau[k-1]*D[k-1]
+        C[k] = C[k-1] - pwr[k]*A[k]
+        D[k] = D[k-1] - pwr[k]*B[k]
+    return M.transpose(3, 2, 0, 1)
+
+
+def paraxial_trace_batch(psys: ParaxSystem, M, start_yu, start_yu_bar):
+    """ Paraxial trace of 2 rays in each system of a batch.
+
+    The array version of :func:`paraxial_trace`, starting at the object
+    surface.
+
+    Args:
+        psys: :class:`ParaxSystem` of [batch, ...] arrays
+        M: the [batch, ifcs, 2, 2] matrices from :func:`parax_matrix_stack`
+        start_yu: [y, u] at the object surface, items may be [batch] arrays
+        start_yu_bar: [y, u] at the object surface for the 2nd ray
+
+    Returns:
+        (**p_ray, p_ray_bar**)
+
+        - p_ray: [batch, ifcs, 3] array of ht, slp, aoi
+        - p_ray_bar: [batch, ifcs, 3] array of ht, slp, aoi
+    """
+    n_eff = _effective_rndx(psys)
+    n_after = np.concatenate((n_eff, n_eff[:, -1:]), axis=1)
+    t0 = psys.thi[:, 0]
+    rays = []
+    for y0, u0 in (start_yu, start_yu_bar):
+        y0 = np.broadcast_to(y0, t0.shape)
+        u0 = np.broadcast_to(u0, t0.shape)
+        y1 = (y0 + t0*u0)[:, np.newaxis]
+        nu1 = (n_eff[:, 0]*u0)[:, np.newaxis]
+        ray = np.empty(M.shape[:2] + (3,))
+        ray[..., mc.ht] = M[..., 0, 0]*y1 + M[..., 0, 1]*nu1
+        ray[..., mc.slp] = (M[..., 1, 0]*y1 + M[..., 1, 1]*nu1)/n_after
+        ray[:, 0, mc.ht] = y0
+        ray[:, 0, mc.slp] = u0
+        ray[..., mc.aoi] = ray[..., mc.slp] + ray[..., mc.ht]*psys.cv
+        rays.append(ray)
+    return rays[0], rays[1]
+
+
+def compute_first_order_batch(opt_model, stop, wvl, **variations):
+    """ Returns paraxial rays and first order data for a batch of variants.
+
+    The array version of :func:`compute_first_order`. The system is
+    represented by stacked ABCD matrices, see :func:`parax_matrix_stack`,
+    and the first order properties of all of the variants are computed
+    together, e.g.::
+
+        thi = {5: np.linspace(15., 18., 1000)}
+        ax_ray, pr_ray, fod = compute_first_order_batch(opm, stop, wvl,
+                                                        thi=thi)
+        efl = fod['efl']
+
+    Args:
+        opt_model: the :class:`~.OpticalModel`
+        stop: the stop surface index, or None for a floating stop
+        wvl: wavelength in nm
+        variations: parameter variations passed to
+                    :func:`parax_system_from_seq`, i.e. thi, cv, pwr, rndx
+
+    Returns:
+        :class:`ParaxData` where ax_ray and pr_ray are [batch, ifcs, 3]
+        arrays and fod is a dict of [batch] arrays keyed by the
+        :class:`FirstOrderData` attribute names.
+    """
+    sm = opt_model['seq_model']
+    osp = opt_model['optical_spec']
+    psys = parax_system_from_seq(sm, wvl, **variations)
+    M = parax_matrix_stack(psys)
+    n_eff = _effective_rndx(psys)
+    n_0 = n_eff[:, 0]
+    n_k = n_eff[:, -1]
+    thi = psys.thi
+    oal = np.sum(thi[:, 1:-1], axis=1)
+    img = -2 if sm.get_num_surfaces() > 2 else -1
+    ak1, bk1, ck1, dk1 = [M[:, img, i, j] for i in (0, 1) for j in (0, 1)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if stop is None:
+            # use previously computed paraxial data to float the stop
+            parax_data = (opt_model['analysis_results']['parax_data']
+                          if opt_model['analysis_results'] is not None
+                          else None)
+            if parax_data is not None:
+                pr = parax_data.pr_ray
+                enp_dist = -pr[1][mc.ht]/(n_0*pr[0][mc.slp])
+            else:  # nothing pre-computed, assume 1st surface
+                enp_dist = 0.0
+                if misc_math.is_fuzzy_zero(sm.gaps[0].thi):
+                    for i, g in enumerate(sm.gaps):
+                        if not misc_math.is_fuzzy_zero(g.thi):
+                            stop = i+1
+                            enp_dist += g.thi
+                            break
+                else:
+                    stop = 1
+        if stop is not None:
+            # find entrance pupil location w.r.t. first surface
+            ybar1 = -M[:, stop, 0, 1]
+            ubar1 = M[:, stop, 0, 0]
+            enp_dist = -ybar1/(n_0*ubar1)
+        else:
+            ybar1 = -M[:, 1, 0, 1]
+            ubar1 = M[:, 1, 0, 0]
+
+        thi0 = thi[:, 0]
+
+        # calculate reduction ratio for given object distance
+        red = dk1 + thi0*ck1
+        obj2enp_dist = thi0 + enp_dist
+
+        pupil = osp['pupil']
+        pupil_oi_key, pupil_key, pupil_value = pupil.derive_parax_params()
+        if pupil_oi_key == 'object':
+            if pupil_key == 'height':
+                slp0 = pupil_value/obj2enp_dist
+            elif pupil_key == 'slope':
+                slp0 = pupil_value
+            elif pupil_key == 'epd':
+                slp0 = 0.5*pupil.value/obj2enp_dist
+            elif pupil_key == 'f/#':
+                slp0 = -1./(2.0*pupil.value)
+            elif pupil_key == 'NA':
+                slp0 = pupil.value/n_0
+        elif pupil_oi_key == 'image':
+            if pupil_key == 'height':
+                slpk = pupil_value/obj2enp_dist
+            elif pupil_key == 'slope':
+                slpk = pupil_value
+            elif pupil_key == 'f/#':
+                slpk = -1./(2.0*pupil.value)
+            elif pupil_key == 'NA':
+                slpk = pupil.value/n_k
+            slp0 = slpk/red
+        slp0 = np.broadcast_to(slp0, thi0.shape)
+
+        fov_oi_key, field_key, field_value = (
+            osp['fov'].derive_parax_params())
+        if fov_oi_key == 'object':
+            if field_key == 'slope':
+                slpbar0 = field_value
+                ybar0 = -slpbar0*obj2enp_dist
+            elif field_key == 'height':
+                ybar0 = field_value
+                slpbar0 = -ybar0/obj2enp_dist
+        elif fov_oi_key == 'image':
+            ai = M[:, -1, 0, 0]
+            ci = M[:, -1, 1, 0]
+            qk_ht = ak1*ybar1 + bk1*ubar1
+            qk_slp = ck1*ybar1 + dk1*ubar1
+            exp_dist = -qk_ht/(n_k*qk_slp)
+            img2exp_dist = exp_dist - thi[:, -1]
+
+            if field_key == 'height':
+                ht_i = field_value
+                slp_i = -ht_i/img2exp_dist
+                # transfer back to the 1st interface
+                slpbar0 = -ci*ht_i + ai*slp_i
+            if field_key == 'slope':
+                slp_k = field_value
+                ht_k = -slp_k*exp_dist
+                slpbar0 = -ck1*ht_k + ak1*slp_k
+            ybar0 = -slpbar0*obj2enp_dist
+        ybar0 = np.broadcast_to(ybar0, thi0.shape)
+        slpbar0 = np.broadcast_to(slpbar0, thi0.shape)
+
+        # We have the starting coordinates, now trace the rays
+        ax_ray, pr_ray = paraxial_trace_batch(psys, M, [0., slp0],
+                                              [ybar0, slpbar0])
+
+        # Calculate the optical invariant
+        opt_inv = n_0*(ax_ray[:, 1, mc.ht]*pr_ray[:, 0, mc.slp] -
+                       pr_ray[:, 1, mc.ht]*ax_ray[:, 0, mc.slp])
+
+        fod = {}
+        fod['opt_inv'] = opt_inv
+        fod['obj_dist'] = obj_dist = thi0
+        no_pwr = ck1 == 0.0
+        ax_slp_img = ax_ray[:, img, mc.slp]
+        img_dist = np.where(ax_slp_img != 0,
+                            -ax_ray[:, img, mc.ht]/ax_slp_img,
+                            np.copysign(1e10, thi[:, -1]))
+        fod['img_dist'] = img_dist = np.where(no_pwr, 1e10, img_dist)
+        fod['power'] = power = np.where(no_pwr, 0.0, -ck1)
+        fod['fl_obj'] = fl_obj = np.where(no_pwr, 0.0, n_0/power)
+        fod['fl_img'] = fl_img = np.where(no_pwr, 0.0, n_k/power)
+        fod['efl'] = fl_img
+        fod['pp1'] = pp1 = np.where(no_pwr, 0.0, (1.0 - dk1)*fl_obj)
+        fod['ppk'] = ppk = np.where(no_pwr, 0.0, (ak1 - 1.0)*fl_img)
+
+        fod['ffl'] = pp1 + (-fl_obj)
+        fod['bfl'] = ppk + fl_img
+        fod['pp_sep'] = oal - pp1 + ppk
+
+        ax_slp_k = n_k*ax_ray[:, -1, mc.slp]
+        fod['fno'] = np.where(ax_slp_img != 0, -1.0/(2.0*ax_slp_k), 1e10)
+        fod['img_ht'] = np.where(ax_slp_img != 0, -opt_inv/ax_slp_k, 1e10)
+
+        fod['m'] = ak1 + ck1*img_dist/n_k
+        fod['red'] = dk1 + ck1*obj_dist
+        fod['n_obj'] = n_0
+        fod['n_img'] = n_k
+        pr_slp0 = pr_ray[:, 0, mc.slp]
+        fod['obj_ang'] = np.degrees(np.arctan(pr_slp0))
+        nu_pr0 = n_0*pr_slp0
+        fod['enp_dist'] = np.where(pr_slp0 != 0,
+                                   -pr_ray[:, 1, mc.ht]/nu_pr0, -1e10)
+        fod['enp_radius'] = np.where(pr_slp0 != 0,
+                                     np.abs(opt_inv/nu_pr0), 1e10)
+
+        pr_slpk = pr_ray[:, -1, mc.slp]
+        fod['exp_dist'] = np.where(
+            pr_slpk != 0, -(pr_ray[:, -1, mc.ht]/pr_slpk - img_dist), -1e10)
+        fod['exp_radius'] = np.where(pr_slpk != 0,
+                                     np.abs(opt_inv/(n_k*pr_slpk)), 1e10)
+
+        # compute object and image space numerical apertures
+        fod['obj_na'] = np.abs(n_0)*sm.z_dir[0]*ax_ray[:, 0, mc.slp]
+        fod['img_na'] = n_k*sm.z_dir[-1]*ax_ray[:, -1, mc.slp]
+
+    return ParaxData(ax_ray, pr_ray, fod)
+
+
 def list_parax_trace_fotr(opt_model, reduced=False):
     """ list the paraxial axial and chief ray data 
     
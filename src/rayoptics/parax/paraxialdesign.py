@@ -20,6 +20,7 @@ import rayoptics.parax.firstorder as fo
 from rayoptics.parax.idealimager import ideal_imager_setup
 from rayoptics.parax.specsheet import SpecSheet
 from rayoptics.seq.gap import Gap
+from rayoptics.seq import medium
 from rayoptics.elem.surface import Surface
 from opticalglass import opticalmedium as om
 
@@ -604,7 +605,7 @@ class ParaxialModel():
         """Update the refractive index using the `gap` at *surf*."""
         gap = self.seq_model.gaps[surf]
         wvl = self.seq_model.central_wavelength()
-        self.sys[surf][mc.indx] = gap.medium.rindex(wvl)
+        self.sys[surf][mc.indx] = medium.rindex(gap.medium, wvl)
 
     def change_glass_const_power(self, idx: int, mat: om.OpticalMedium):
         """Change the gap at idx to mat holding first order props constant."""
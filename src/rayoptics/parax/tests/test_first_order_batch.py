@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the array based first order calculations"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.parax import firstorder
+
+
+class FirstOrderBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_first_order(self, fod, fod_batch, i):
+        for key, value in vars(fod).items():
+            npt.assert_allclose(fod_batch[key][i], value,
+                                rtol=1e-9, atol=1e-12, err_msg=key)
+
+    def test_model_values(self):
+        # object and image space pupil and field specifications
+        for filename in ['codev/tests/ag_dblgauss.seq',
+                         'codev/tests/landscape_lens.seq',
+                         'optical/tests/cell_phone_camera.roa']:
+            opm = open_model(self.root_pth/filename)
+            stop = opm['seq_model'].stop_surface
+            wvl = opm['osp']['wvls'].central_wvl
+            ax_ray, pr_ray, fod = firstorder.compute_first_order(opm, stop,
+                                                                 wvl)
+            batch = firstorder.compute_first_order_batch(opm, stop, wvl)
+            npt.assert_allclose(batch.ax_ray[0], ax_ray, rtol=1e-9, atol=1e-12)
+            npt.assert_allclose(batch.pr_ray[0], pr_ray, rtol=1e-9, atol=1e-12)
+            self.compare_first_order(fod, batch.fod, 0)
+
+    def test_variations(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm['seq_model']
+        stop = sm.stop_surface
+        wvl = opm['osp']['wvls'].central_wvl
+        thi = np.linspace(14., 18., 3)
+        cv = np.linspace(0.01, 0.03, 3)
+        batch = firstorder.compute_first_order_batch(
+            opm, stop, wvl, thi={5: thi}, cv={3: cv})
+        self.assertEqual(batch.ax_ray.shape, (3, len(sm.ifcs), 3))
+
+        for i in range(3):
+            sm.gaps[5].thi = thi[i]
+            sm.ifcs[3].profile_cv = cv[i]
+            opm.update_model()
+            fod = opm['analysis_results']['parax_data'].fod
+            self.compare_first_order(fod, batch.fod, i)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -3,7 +3,8 @@
     The :mod:`~.raytr` subpackage provides core classes and functions
     for optical ray tracing and analyses. These include:
 
-        - Base level ray tracing, :mod:`~.raytrace`
+        - Base level ray tracing, of single rays and of batches of rays,
+          :mod:`~.raytrace`
         - Calculation of wavefront aberration, :mod:`~.waveabr`
         - Specification of aperture, field, wavelength and defocus,
           :mod:`~.opticalspec`
@@ -13,6 +14,11 @@
           pupil exploration, :mod:`~.vigcalc`
         - Tracing of fans, lists and grids of rays, including refocusing of OPD
           values, :mod:`~.analyses`
+        - Array based storage of the results of many rays, :mod:`~.raybundle`
+        - Parallel evaluation of analyses over fields and wavelengths,
+          :mod:`~.parallel`
+        - Opt-in instrumentation of the ray trace hot path,
+          :mod:`~.instrument`
         - Exception classes for reporting ray trace errors, :mod:`~.traceerror`
         - Sample generation for ray grids, :mod:`~.sampler`
 
@@ -38,3 +44,23 @@ RaySeg.p.__doc__ = "the point of incidence"
 RaySeg.d.__doc__ = "ray direction cosine following the interface"
 RaySeg.dst.__doc__ = "geometric distance to next point of incidence"
 RaySeg.nrml.__doc__ = "surface normal vector at the point of incidence"
+
+RayBatch = namedtuple('RayBatch', ['p', 'd', 'dst', 'nrml', 'op', 'wvl',
+                                   'err_code', 'err_surf'])
+RayBatch.__doc__ = "Struct-of-arrays ray data for a batch of traced rays"
+RayBatch.p.__doc__ = "[rays, surfaces, 3] array of points of incidence"
+RayBatch.d.__doc__ = "[rays, surfaces, 3] array of directions following the interface"
+RayBatch.dst.__doc__ = "[rays, surfaces] array of distances to next point of incidence"
+RayBatch.nrml.__doc__ = "[rays, surfaces, 3] array of surface normals"
+RayBatch.op.__doc__ = "[rays] array of optical path lengths between pupils"
+RayBatch.wvl.__doc__ = "wavelength (in nm) that the rays were traced in"
+RayBatch.err_code.__doc__ = "[rays] array of traceerror codes, OK if success"
+RayBatch.err_surf.__doc__ = "[rays] array of failure surface indices, -1 if success"
+
+AimResult = namedtuple('AimResult', ['pupil', 'converged', 'iterations',
+                                     'residual'])
+AimResult.__doc__ = "Relative pupil coordinates of a batch of aimed rays"
+AimResult.pupil.__doc__ = "[rays, 2] array of relative pupil coordinates"
+AimResult.converged.__doc__ = "[rays] boolean array, True if the ray hit its target"
+AimResult.iterations.__doc__ = "[rays] array of Newton iteration counts"
+AimResult.residual.__doc__ = "[rays] array of distances from the targets"
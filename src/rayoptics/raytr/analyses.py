@@ -14,16 +14,24 @@
         - :class:`~.RayFan`: trace a fan of rays in either the x or y meridian
         - :class:`~.RayList`: trace a list of rays from an object point
         - :class:`~.RayGrid`: trace a rectilinear grid of rays
+        - :class:`~.MTF`: sagittal and tangential MTF, from a RayGrid or RayList
+        - :class:`~.RelativeIllumination`: relative illumination and 
+          geometric transmission versus field
+        - :class:`~.ThroughFocus`: spot size, wavefront error and encircled
+          energy versus focus
 
     All but the `Ray` class are supported by a group of functions to trace the
     rays, accumulate the data (trace_*), and refocus (focus_*) the data. A
     all-in-one function (eval_*) to trace and apply focus is supplied also.
     These are used in the update_data methods of the classes to generate the
-    ray data.
+    ray data. Unless an output or ray error filter is specified, the rays are
+    traced as a batch and returned in a :class:`~.RayBundle`. The keyword
+    argument `aim='real'` aims the rays at their real, rather than paraxial,
+    pupil positions, see :func:`~.aim_pupil_coords`.
 
     This module also has functions to calculate chief ray and reference sphere
-    information as well as functions for calculating the monochromatic PSF of
-    the model.
+    information as well as functions for calculating the PSF and MTF of the
+    model.
 
 .. Created on Sat Feb 22 22:01:56 2020
 
@@ -31,16 +39,19 @@
 """
 from typing import Optional
 import numpy as np
-from numpy.fft import fftshift, fft2
+import scipy.fft as sfft
 
 from scipy.interpolate import interp1d
 
 import rayoptics.optical.model_constants as mc
 
+from rayoptics.raytr import AimResult
 from rayoptics.raytr import sampler
 from rayoptics.raytr import trace
 from rayoptics.raytr import traceerror as terr
 from rayoptics.raytr import waveabr
+from rayoptics.raytr.opticalspec import Field
+from rayoptics.raytr.raybundle import RayBundle
 
 
 # --- Single ray
@@ -130,12 +141,14 @@ class RayFan():
         image_delta: image offset to apply to image_pt_2d
         num_rays: number of samples along the fan
         xyfan: 'x' or 'y', specifies the axis the fan is sampled on
+        executor: an :class:`~.AnalysisExecutor` to trace the fan in, or None
+                  to trace it in this process
     """
 
     def __init__(self, opt_model, f=0, wl=None, foc=None, image_pt_2d=None,
                  image_delta=None, num_rays=21, xyfan='y', output_filter=None,
                  rayerr_filter=None, color=None, clip_rays=False, 
-                 **kwargs):
+                 executor=None, **kwargs):
         self.opt_model = opt_model
         osp = opt_model.optical_spec
         self.fld = osp.field_of_view.fields[f] if isinstance(f, int) else f
@@ -155,6 +168,7 @@ class RayFan():
             self.xyfan = int(xyfan)
 
         self.color = color
+        self.executor = executor
 
         self.rt_kwargs = kwargs
         self.rt_kwargs['output_filter'] = output_filter
@@ -167,14 +181,17 @@ class RayFan():
         attrs = dict(vars(self))
         del attrs['opt_model']
         del attrs['fan_pkg']
+        attrs['executor'] = None
         return attrs
 
     def update_data(self, **kwargs):
         """Set the fan attribute to a list of (pupil coords), dx, dy, opd."""
+        from rayoptics.raytr.parallel import eval_fld_wvl
         build = kwargs.get('build', 'rebuild')
         if build == 'rebuild':
-            self.fan_pkg = trace_fan(
-                self.opt_model, self.fld, self.wvl, self.foc, self.xyfan,
+            self.fan_pkg = eval_fld_wvl(
+                self.opt_model, trace_fan, self.fld, self.wvl, self.foc, 
+                self.xyfan, executor=self.executor,
                 image_pt_2d=self.image_pt_2d, image_delta=self.image_delta, 
                 num_rays=self.num_rays,
                 **self.rt_kwargs)
@@ -216,6 +233,10 @@ def trace_ray_fan(opt_model, fan_rng, fld, wvl, foc,
     stop = fan_rng[1]
     num = fan_rng[2]
     step = (stop - start)/(num - 1)
+    if output_filter is None and rayerr_filter is None:
+        pupils = [start + r*step for r in range(num)]
+        return trace_ray_bundle(opt_model, pupils, fld, wvl, foc, **kwargs)
+
     fan = []
     for r in range(num):
         pupil = np.array(start)
@@ -361,13 +382,15 @@ class RayList():
         image_pt_2d: base image point. if None, the chief ray is used
         image_delta: image offset to apply to image_pt_2d
         apply_vignetting: whether to apply vignetting factors to pupil coords
+        executor: an :class:`~.AnalysisExecutor` to trace the rays in, or
+                  None to trace them in this process
     """
 
     def __init__(self, opt_model,
                  pupil_gen=None, pupil_coords=None, num_rays=21,
                  f=0, wl=None, foc=None, image_pt_2d=None, image_delta=None, 
                  output_filter=None, rayerr_filter=None, clip_rays=False, 
-                 apply_vignetting=True, **kwargs):
+                 apply_vignetting=True, executor=None, **kwargs):
         self.opt_model = opt_model
         osp = opt_model.optical_spec
         if pupil_coords is not None and pupil_gen is None:
@@ -391,6 +414,7 @@ class RayList():
         self.foc = osp.defocus.focus_shift if foc is None else foc
         self.image_pt_2d = image_pt_2d
         self.image_delta = image_delta
+        self.executor = executor
 
         self.rt_kwargs = kwargs
         self.rt_kwargs['apply_vignetting'] = apply_vignetting
@@ -406,18 +430,25 @@ class RayList():
         del attrs['pupil_gen']
         del attrs['pupil_coords']
         del attrs['ray_list']
+        attrs['executor'] = None
         return attrs
 
     def update_data(self, **kwargs):
+        from rayoptics.raytr.parallel import (eval_fld_wvl,
+                                              trace_pupil_coords_job)
         build = kwargs.get('build', 'rebuild')
         if build == 'rebuild':
             if self.pupil_gen:
                 fct, args, kwa = self.pupil_gen
                 self.pupil_coords = fct(*args, **kwa)
-
-            self.ray_list = trace_pupil_coords(
-                self.opt_model, self.pupil_coords,
-                self.fld, self.wvl, self.foc,
+            if self.executor is not None:
+                # generators can't be sent to the worker processes
+                self.pupil_coords = list(self.pupil_coords)
+
+            self.ray_list = eval_fld_wvl(
+                self.opt_model, trace_pupil_coords_job,
+                self.fld, self.wvl, self.foc, self.pupil_coords,
+                executor=self.executor,
                 image_pt_2d=self.image_pt_2d, 
                 image_delta=self.image_delta, 
                 **self.rt_kwargs)
@@ -438,11 +469,26 @@ def trace_ray_list(opt_model, pupil_coords, fld, wvl, foc,
                    append_if_none=False,
                    output_filter=None, rayerr_filter=None,
                    **kwargs):
-    """Trace a list of rays at fld and wvl and return ray_pkgs in a list."""
+    """Trace a list of rays at fld and wvl and return ray_pkgs in a list.
+
+    If the keyword argument `aim` is 'real', the rays are aimed at their
+    real pupil positions, see :func:`aim_pupil_coords`.
+    """
+    if output_filter is None and rayerr_filter is None:
+        return trace_ray_bundle(opt_model, pupil_coords, fld, wvl, foc,
+                                append_if_none=append_if_none, **kwargs)
+
+    pupil_coords = list(pupil_coords)
+    aim_coords = pupil_coords
+    if kwargs.pop('aim', 'paraxial') == 'real':
+        aim_coords = aim_pupil_coords(opt_model, pupil_coords, fld, wvl, 
+                                      kwargs.get('apply_vignetting', True)
+                                      ).pupil
+        kwargs['apply_vignetting'] = False
 
     ray_list = []
-    for pupil in pupil_coords:
-        ray_result = trace.trace_safe(opt_model, pupil, fld, wvl, 
+    for pupil, aim_pupil in zip(pupil_coords, aim_coords):
+        ray_result = trace.trace_safe(opt_model, aim_pupil, fld, wvl, 
                                       output_filter, rayerr_filter, 
                                       **kwargs)
         ray_pkg, ray_err = ray_result
@@ -455,6 +501,85 @@ def trace_ray_list(opt_model, pupil_coords, fld, wvl, foc,
     return ray_list
 
 
+def trace_ray_bundle(opt_model, pupil_coords, fld, wvl, foc,
+                     append_if_none=False, shape=None, **kwargs):
+    """Trace a batch of rays at fld and wvl and return a :class:`~.RayBundle`.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        pupil_coords: list or iterator of 2d pupil coordinates
+        fld: :class:`~.Field` point to trace
+        wvl: wavelength (nm) to trace the rays
+        foc: focus shift, not used
+        append_if_none: if False, failed rays are removed from the bundle
+        shape: the logical shape of the collection of rays, e.g. (n, n)
+        aim: 'paraxial' (default) to aim the rays at the paraxial entrance
+             pupil, or 'real' to aim them at their real pupil position on 
+             the stop surface, see :func:`aim_pupil_coords`
+        **kwargs: keyword args passed to the trace function
+    """
+    pupils = np.array([np.asarray(pc, dtype=float)[:2] 
+                       for pc in pupil_coords]).reshape(-1, 2)
+    kwargs.pop('use_named_tuples', None)
+    aim_converged = None
+    if kwargs.pop('aim', 'paraxial') == 'real':
+        aim_result = aim_pupil_coords(opt_model, pupils, fld, wvl, 
+                                      kwargs.get('apply_vignetting', True))
+        kwargs['apply_vignetting'] = False
+        aim_converged = aim_result.converged
+        ray_batch = trace.trace_base_batch(opt_model, aim_result.pupil, 
+                                           fld, wvl, **kwargs)
+    else:
+        ray_batch = trace.trace_base_batch(opt_model, pupils, fld, wvl, 
+                                           **kwargs)
+    ray_bundle = RayBundle(pupils, ray_batch, shape=shape, 
+                           aim_converged=aim_converged)
+    if not append_if_none:
+        ray_bundle = ray_bundle.select(ray_bundle.valid)
+    return ray_bundle
+
+
+def aim_pupil_coords(opt_model, pupil_coords, fld, wvl, 
+                     apply_vignetting=True, **kwargs) -> AimResult:
+    """Aim rays at their real pupil positions on the stop surface.
+
+    The relative pupil coordinates, vignetted if `apply_vignetting` is True,
+    are scaled by the paraxial marginal ray height at the stop to give the
+    target coordinates on the stop surface. The rays are aimed at the 
+    targets with :func:`~.trace.aim_rays_batch`, by default to a tolerance 
+    of 1e-5 of the stop radius. For a floating stop, the pupil coordinates 
+    are returned unchanged.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        pupil_coords: list or iterator of 2d relative pupil coordinates
+        fld: :class:`~.Field` point to trace
+        wvl: wavelength (nm) to trace the rays
+        apply_vignetting: if True, apply the `fld` vignetting factors
+        **kwargs: keyword args passed to :func:`~.trace.aim_rays_batch`
+
+    Returns:
+        an :class:`~.AimResult` with the unvignetted relative pupil 
+        coordinates of the aimed rays
+    """
+    pupils = np.array([np.asarray(pc, dtype=float)[:2] 
+                       for pc in pupil_coords]).reshape(-1, 2)
+    if apply_vignetting:
+        pupils = np.array([fld.apply_vignetting(pupil) 
+                           for pupil in pupils]).reshape(-1, 2)
+    stop = opt_model['seq_model'].stop_surface
+    if stop is None:
+        num_rays = len(pupils)
+        return AimResult(pupils, np.full(num_rays, True), 
+                         np.zeros(num_rays, dtype=int), np.zeros(num_rays))
+    ax_ray = opt_model['analysis_results']['parax_data'].ax_ray
+    stop_radius = ax_ray[stop][mc.ht]
+    targets = pupils*stop_radius
+    kwargs['tol'] = kwargs.get('tol', 1e-5*abs(stop_radius))
+    return trace.aim_rays_batch(opt_model, stop, targets, fld, wvl,
+                                start_coords=pupils, **kwargs)
+
+
 def trace_list_of_rays(opt_model, rays,
                        output_filter=None, rayerr_filter=None,
                        **kwargs):
@@ -592,12 +717,14 @@ class RayGrid():
         image_pt_2d: base image point. if None, the chief ray is used
         image_delta: image offset to apply to image_pt_2d
         num_rays: number of samples along the side of the grid
+        executor: an :class:`~.AnalysisExecutor` to trace the grid in, or
+                  None to trace it in this process
     """
 
     def __init__(self, opt_model, f=0, wl=None, foc=None, image_pt_2d=None,
                  image_delta=None, output_filter=None, rayerr_filter=None, 
                  num_rays=21, clip_rays=True, value_if_none=np.nan, 
-                 oversize=1., **kwargs):
+                 oversize=1., executor=None, **kwargs):
         self.opt_model = opt_model
         osp = opt_model.optical_spec
         self.fld = osp.field_of_view.fields[f] if isinstance(f, int) else f
@@ -609,6 +736,7 @@ class RayGrid():
 
         self.num_rays = num_rays
         self.value_if_none = value_if_none
+        self.executor = executor
 
         self.rt_kwargs = kwargs
         self.rt_kwargs['oversize'] = oversize
@@ -622,13 +750,16 @@ class RayGrid():
         attrs = dict(vars(self))
         del attrs['opt_model']
         del attrs['grid_pkg']
+        attrs['executor'] = None
         return attrs
 
     def update_data(self, **kwargs):
+        from rayoptics.raytr.parallel import eval_fld_wvl
         build = kwargs.get('build', 'rebuild')
         if build == 'rebuild':
-            self.grid_pkg = trace_wavefront(
-                self.opt_model, self.fld, self.wvl, self.foc,
+            self.grid_pkg = eval_fld_wvl(
+                self.opt_model, trace_wavefront, self.fld, self.wvl, self.foc,
+                executor=self.executor,
                 image_pt_2d=self.image_pt_2d, image_delta=self.image_delta, 
                 num_rays=self.num_rays,
                 **self.rt_kwargs)
@@ -665,19 +796,38 @@ class RayGrid():
 
 def trace_ray_grid(opt_model, grid_rng, fld, wvl, foc, append_if_none=True,
                    output_filter=None, rayerr_filter=None, **kwargs):
-    """Trace a grid of rays at fld and wvl and return ray_pkgs in 2d list."""
+    """Trace a grid of rays at fld and wvl and return ray_pkgs in 2d list.
+
+    If the keyword argument `aim` is 'real', the rays are aimed at their
+    real pupil positions, see :func:`aim_pupil_coords`.
+    """
     start = np.array(grid_rng[0])
     stop = grid_rng[1]
     num = grid_rng[2]
     step = np.array((stop - start)/(num - 1))
     grid = []
     kwargs['apply_vignetting'] = kwargs.get('apply_vignetting', False)
+    pupils = [[start[0] + i*step[0], start[1] + j*step[1]]
+              for i in range(num) for j in range(num)]
+    if (output_filter is None and rayerr_filter is None and 
+        append_if_none):
+        return trace_ray_bundle(opt_model, pupils, fld, wvl, foc,
+                                append_if_none=True, shape=(num, num),
+                                **kwargs)
+
+    aim_coords = None
+    if kwargs.pop('aim', 'paraxial') == 'real':
+        aim_coords = aim_pupil_coords(opt_model, pupils, fld, wvl, 
+                                      kwargs['apply_vignetting']).pupil
+        kwargs['apply_vignetting'] = False
+
     for i in range(num):
         grid_row = []
 
         for j in range(num):
             pupil = np.array(start)
-            ray_result = trace.trace_safe(opt_model, pupil, fld, wvl, 
+            aim_pupil = pupil if aim_coords is None else aim_coords[i*num + j]
+            ray_result = trace.trace_safe(opt_model, aim_pupil, fld, wvl, 
                                           output_filter, rayerr_filter, 
                                           **kwargs)
             ray_pkg, ray_err = ray_result
@@ -718,6 +868,11 @@ def eval_wavefront(opt_model, fld, wvl, foc, image_pt_2d=None,
 
     convert_to_opd = 1 / opt_model.nm_to_sys_units(wvl)
 
+    if isinstance(grid, RayBundle):
+        opd = convert_to_opd*waveabr.wave_abr_full_calc_batch(
+            fod, grid, cr_pkg, ref_sphere)
+        return _opd_grid_from_bundle(grid, opd, value_if_none)
+
     def rfc(gij):
         pupil_x, pupil_y, ray_pkg = gij
         if ray_pkg is not None:
@@ -752,6 +907,11 @@ def trace_wavefront(opt_model, fld, wvl, foc,
     grid = trace_ray_grid(opt_model, vig_grid_def, 
                           fld, wvl, foc, **kwargs)
 
+    if isinstance(grid, RayBundle):
+        upd_grid = waveabr.wave_abr_pre_calc_batch(fod, grid, cr_pkg, 
+                                                   ref_sphere)
+        return grid, upd_grid
+
     def wpc(gij):
         pupil_x, pupil_y, ray_pkg = gij
         if ray_pkg is not None:
@@ -776,6 +936,11 @@ def focus_wavefront(opt_model, grid_pkg, fld, wvl, foc, image_pt_2d=None,
                                                   image_delta=image_delta)
     convert_to_opd = 1 / opt_model.nm_to_sys_units(wvl)
 
+    if isinstance(grid, RayBundle):
+        opd = convert_to_opd*waveabr.wave_abr_calc_batch(
+            fod, cr_pkg, upd_grid, ref_sphere, grid.p[:, -1])
+        return _opd_grid_from_bundle(grid, opd, value_if_none)
+
     def rfc(gij, uij):
         pupil_x, pupil_y, ray_pkg = gij
         if ray_pkg is not None:
@@ -791,6 +956,12 @@ def focus_wavefront(opt_model, grid_pkg, fld, wvl, foc, image_pt_2d=None,
     return np.array(refocused_grid)
 
 
+def _opd_grid_from_bundle(grid, opd, value_if_none):
+    """Returns a [num, num, 3] array of pupil_x, pupil_y, opd for a grid. """
+    opd = np.where(grid.valid, opd, value_if_none)
+    return np.column_stack((grid.pupil, opd)).reshape(*grid.shape, 3)
+
+
 # --- PSF calculation
 def psf_sampling(n: Optional[int]=None, 
                  n_pupil: Optional[int]=None, 
@@ -845,8 +1016,20 @@ def calc_psf_scaling(opt_model: "OpticalModel", fld: "Field", wvl: float,
     return delta_x, delta_xp
 
 
-def calc_psf(wavefront, ndim, maxdim):
-    """Calculate the point spread function of wavefront W.
+def embed_wavefront(wavefront, ndim, maxdim, fill_value=0.):
+    """Center the ndim x ndim *wavefront* in a maxdim x maxdim array. """
+    W = np.full([maxdim, maxdim], fill_value, dtype=np.asarray(wavefront).dtype)
+    lo = maxdim//2 - (ndim - 1)//2
+    hi = lo + ndim
+    W[lo:hi, lo:hi] = wavefront
+    return W
+
+
+def calc_pupil_amplitude(wavefront, ndim, maxdim):
+    """Calculate the pupil amplitude, i.e. the aperture mask, of wavefront W.
+
+    The pupil amplitude only depends on which rays were traced successfully,
+    so it can be reused when only the focus of the wavefront changes.
 
     Args:
         wavefront: ndim x ndim Numpy array of wavefront errors. No data
@@ -854,30 +1037,689 @@ def calc_psf(wavefront, ndim, maxdim):
         ndim: The sampling across the wavefront
         maxdim: The total width of the sampling grid
 
-    Returns: AP, the PSF of the input wavefront
+    Returns: maxdim x maxdim array, 1 inside the aperture and 0 outside
     """
-    maxdim_by_2 = maxdim//2
-    W = np.zeros([maxdim, maxdim])
-    nd2 = ndim//2
-    W[maxdim_by_2-(nd2-1):maxdim_by_2+(nd2+1),
-      maxdim_by_2-(nd2-1):maxdim_by_2+(nd2+1)] = np.nan_to_num(wavefront)
+    mask = np.isfinite(wavefront).astype(float)
+    return embed_wavefront(mask, ndim, maxdim)
+
 
-    phase = np.exp(1j*2*np.pi*W)
+def _psf_intensity(pupil_amp, W, workers=None):
+    """Returns |FFT|**2 of the pupil function, with the origin centered. """
+    phase = pupil_amp*np.exp(1j*2*np.pi*W)
+    F = sfft.fft2(sfft.fftshift(phase), workers=workers)
+    AP = F.real**2 + F.imag**2
+    return sfft.fftshift(AP)
 
-    for i in range(len(phase)):
-        for j in range(len(phase)):
-            if phase[i][j] == 1:
-                phase[i][j] = 0
 
-    AP = abs(fftshift(fft2(fftshift(phase))))**2
+def calc_psf(wavefront, ndim, maxdim, pupil_amp=None, workers=None):
+    """Calculate the point spread function of wavefront W.
+
+    Args:
+        wavefront: ndim x ndim Numpy array of wavefront errors. No data
+                   condition is indicated by nan
+        ndim: The sampling across the wavefront
+        maxdim: The total width of the sampling grid
+        pupil_amp: optional pupil amplitude from :func:`calc_pupil_amplitude`.
+                   If None, it is calculated from the wavefront.
+        workers: number of threads used by `scipy.fft`; None for the default
+
+    Returns: AP, the PSF of the input wavefront
+    """
+    if pupil_amp is None:
+        pupil_amp = calc_pupil_amplitude(wavefront, ndim, maxdim)
+    W = embed_wavefront(np.nan_to_num(wavefront), ndim, maxdim)
+
+    AP = _psf_intensity(pupil_amp, W, workers=workers)
     AP_max = np.nanmax(AP)
     AP = AP/AP_max
     return AP
 
 
+def calc_polychromatic_psf(wavefronts, ndims, maxdim, weights, 
+                           pupil_amps=None, workers=None):
+    """Calculate the weighted sum of the PSFs of a list of wavefronts.
+
+    Each monochromatic PSF is normalized to unit energy before weighting. The
+    image plane spacing of the PSFs depends on wavelength; a common spacing
+    is obtained by scaling the wavefront sampling, ndim, inversely with the
+    wavelength, see :func:`psf_ray_grids`.
+
+    Args:
+        wavefronts: list of ndim x ndim Numpy arrays of wavefront errors
+        ndims: list of the sampling across each wavefront
+        maxdim: The total width of the sampling grid
+        weights: list of the spectral weights of the wavefronts
+        pupil_amps: optional list of pupil amplitudes
+        workers: number of threads used by `scipy.fft`; None for the default
+
+    Returns: AP, the polychromatic PSF, normalized to a peak of 1
+    """
+    if pupil_amps is None:
+        pupil_amps = [None]*len(wavefronts)
+    AP_sum = np.zeros([maxdim, maxdim])
+    for wavefront, ndim, wt, pupil_amp in zip(wavefronts, ndims, weights,
+                                              pupil_amps):
+        if pupil_amp is None:
+            pupil_amp = calc_pupil_amplitude(wavefront, ndim, maxdim)
+        W = embed_wavefront(np.nan_to_num(wavefront), ndim, maxdim)
+        AP = _psf_intensity(pupil_amp, W, workers=workers)
+        AP_sum += wt*AP/np.sum(AP)
+    return AP_sum/np.nanmax(AP_sum)
+
+
+def psf_ray_grids(opt_model, f=0, num_rays=32, foc=None, **kwargs):
+    """Create a RayGrid for each wavelength, for a polychromatic PSF.
+
+    The number of rays across the grid at each wavelength is scaled 
+    inversely with wavelength, relative to `num_rays` at the central 
+    wavelength, so that the PSFs share a common image plane sampling.
+
+    Returns:
+        (grids, weights) - a list of RayGrids and a list of spectral weights
+    """
+    wvls = opt_model['optical_spec']['wvls']
+    ref_wvl = wvls.central_wvl
+    grids = []
+    for wvl in wvls.wavelengths:
+        ndim = max(2, round(num_rays*ref_wvl/wvl))
+        grids.append(RayGrid(opt_model, f=f, wl=wvl, foc=foc, 
+                             num_rays=ndim, **kwargs))
+    return grids, list(wvls.spectral_wts)
+
+
 def update_psf_data(pupil_grid, build='rebuild'):
     pupil_grid.update_data(build=build)
     ndim = pupil_grid.num_rays
     maxdim = pupil_grid.maxdim
     AP = calc_psf(pupil_grid.grid[2], ndim, maxdim)
     return AP
+
+
+# --- MTF calculation
+class MTF():
+    """Sagittal and tangential MTF at a field point.
+
+    The diffraction MTF is calculated from the wavefront of a
+    :class:`~.RayGrid`, either as the FFT of the PSF (method='psf') or by
+    autocorrelation of the pupil function (method='autocorr'). The geometric
+    MTF (method='geometric') is the Fourier transform of the spot data of a
+    :class:`~.RayList`.
+
+    The rays are traced once per wavelength. Calling update_data() with
+    build='update' after changing `foc` only refocuses the traced rays, so
+    the MTF can be evaluated rapidly through focus.
+
+    The polychromatic MTF is the weighted sum of the monochromatic MTFs. Each
+    wavelength is referenced to its own chief ray, i.e. lateral color isn't
+    included.
+
+    Attributes:
+        opt_model: :class:`~.OpticalModel` instance
+        f: index into :class:`~.FieldSpec` or a :class:`~.Field` instance
+        wl: wavelength (nm), or None for the polychromatic MTF using the
+            spectral weights
+        foc: focus shift to apply to the results
+        num_rays: number of rays across the pupil at the central wavelength
+        maxdim: size of the PSF grid for method 'psf'. It should be at least
+                twice the pupil sampling to avoid aliasing the MTF.
+        method: 'psf', 'autocorr' or 'geometric'
+        freqs: spatial frequencies (cycles per system unit) to evaluate. If
+               None, the range from 0 to the diffraction cutoff is used.
+        workers: number of threads used by `scipy.fft`; None for the default
+        mtf_s: the sagittal MTF at freqs
+        mtf_t: the tangential MTF at freqs
+    """
+
+    def __init__(self, opt_model, f=0, wl=None, foc=None, num_rays=32,
+                 maxdim=None, method='psf', freqs=None, workers=None,
+                 **kwargs):
+        self.opt_model = opt_model
+        osp = opt_model.optical_spec
+        self.fld = osp.field_of_view.fields[f] if isinstance(f, int) else f
+        self.wvl = wl
+        self.foc = osp.defocus.focus_shift if foc is None else foc
+        self.num_rays = num_rays
+        self.maxdim = maxdim
+        self.method = method
+        self.user_freqs = freqs
+        self.workers = workers
+        self.rt_kwargs = kwargs
+
+        self.update_data()
+
+    def __json_encode__(self):
+        attrs = dict(vars(self))
+        del attrs['opt_model']
+        del attrs['data_objs']
+        del attrs['pupil_amps']
+        return attrs
+
+    def create_data_objs(self):
+        """Returns a ray data object and spectral weight for each wavelength."""
+        opt_model = self.opt_model
+        if self.wvl is None:
+            wvls = opt_model['optical_spec']['wvls']
+            wvl_list = wvls.wavelengths
+            weights = list(wvls.spectral_wts)
+        else:
+            wvl_list = [self.wvl]
+            weights = [1.]
+
+        if self.method == 'geometric':
+            data_objs = [RayList(opt_model, f=self.fld, wl=wvl, foc=self.foc,
+                                 num_rays=self.num_rays, **self.rt_kwargs)
+                         for wvl in wvl_list]
+        elif self.wvl is None:
+            data_objs, weights = psf_ray_grids(opt_model, f=self.fld,
+                                               num_rays=self.num_rays,
+                                               foc=self.foc, **self.rt_kwargs)
+        else:
+            data_objs = [RayGrid(opt_model, f=self.fld, wl=self.wvl,
+                                 foc=self.foc, num_rays=self.num_rays,
+                                 **self.rt_kwargs)]
+        return data_objs, weights
+
+    def update_data(self, **kwargs):
+        build = kwargs.get('build', 'rebuild')
+        if build == 'rebuild':
+            self.data_objs, self.weights = self.create_data_objs()
+            self.pupil_amps = None
+        else:
+            for data_obj in self.data_objs:
+                data_obj.foc = self.foc
+                data_obj.update_data(build=build)
+
+        if self.method == 'psf':
+            ndims = [grid.num_rays for grid in self.data_objs]
+            maxdim = (sfft.next_fast_len(2*max(ndims)) if self.maxdim is None
+                      else self.maxdim)
+            if self.pupil_amps is None:
+                self.pupil_amps = [calc_pupil_amplitude(grid.grid[2], ndim,
+                                                        maxdim)
+                                   for grid, ndim in zip(self.data_objs, ndims)]
+
+        # the diffraction cutoff changes with the reference sphere radius
+        cutoffs = [mtf_cutoff_freq(self.opt_model, data_obj.fld, data_obj.wvl,
+                                   self.foc) for data_obj in self.data_objs]
+        if build == 'rebuild':
+            # the frequencies are kept fixed when refocusing
+            if self.user_freqs is None:
+                self.freqs = np.linspace(0., max(cutoffs), self.num_rays+1)
+            else:
+                self.freqs = np.asarray(self.user_freqs, dtype=float)
+
+        self.mtf_s = np.zeros(len(self.freqs))
+        self.mtf_t = np.zeros(len(self.freqs))
+        for i, data_obj in enumerate(self.data_objs):
+            if self.method == 'geometric':
+                mtf_s, mtf_t = calc_geometric_mtf(data_obj.ray_abr,
+                                                  self.freqs)
+            else:
+                wavefront = data_obj.grid[2]
+                ndim = data_obj.num_rays
+                if self.method == 'psf':
+                    mtf_s, mtf_t = calc_mtf_from_psf(
+                        wavefront, ndim, maxdim,
+                        pupil_amp=self.pupil_amps[i], workers=self.workers)
+                else:
+                    mtf_s, mtf_t = calc_mtf_autocorr(wavefront,
+                                                     workers=self.workers)
+                # resample from the pupil shifts to the output frequencies;
+                # the pupil diameter spans ndim-1 samples, so a shift of
+                # ndim-1 samples is the cutoff
+                nu = cutoffs[i]*np.arange(len(mtf_s))/(ndim - 1)
+                mtf_s = np.interp(self.freqs, nu, mtf_s, right=0.)
+                mtf_t = np.interp(self.freqs, nu, mtf_t, right=0.)
+            self.mtf_s += self.weights[i]*mtf_s
+            self.mtf_t += self.weights[i]*mtf_t
+
+        wt_sum = sum(self.weights)
+        self.mtf_s /= wt_sum
+        self.mtf_t /= wt_sum
+
+        return self
+
+
+def mtf_cutoff_freq(opt_model, fld, wvl, foc):
+    """Returns the diffraction cutoff frequency (cycles per system unit).
+
+    The cutoff frequency corresponds to a shift of the full pupil in the
+    autocorrelation of the pupil function. The scaling is consistent with
+    :func:`calc_psf_scaling`.
+    """
+    fod = opt_model['analysis_results']['parax_data'].fod
+    ref_sphere, cr_pkg = trace.setup_pupil_coords(opt_model, fld, wvl, foc)
+    wl = opt_model.nm_to_sys_units(wvl)
+    return 2*fod.exp_radius/(wl*ref_sphere[2])
+
+
+def calc_mtf_from_psf(wavefront, ndim, maxdim, pupil_amp=None, workers=None):
+    """Calculate the sagittal and tangential MTF as the FFT of the PSF.
+
+    Args:
+        wavefront: ndim x ndim Numpy array of wavefront errors. No data
+                   condition is indicated by nan
+        ndim: The sampling across the wavefront
+        maxdim: The total width of the sampling grid, at least 2*ndim
+        pupil_amp: optional pupil amplitude from :func:`calc_pupil_amplitude`
+        workers: number of threads used by `scipy.fft`; None for the default
+
+    Returns:
+        (mtf_s, mtf_t) sampled at pupil shifts of 0 to ndim samples
+    """
+    AP = calc_psf(wavefront, ndim, maxdim, pupil_amp=pupil_amp,
+                  workers=workers)
+    otf = sfft.rfft2(sfft.ifftshift(AP), workers=workers)
+    mtf = np.abs(otf)/np.abs(otf[0, 0])
+    n = min(ndim, maxdim//2) + 1
+    # the first axis of the wavefront is x, the second is y
+    return mtf[:n, 0], mtf[0, :n]
+
+
+def calc_mtf_autocorr(wavefront, workers=None):
+    """Calculate the sagittal and tangential MTF by pupil autocorrelation.
+
+    The autocorrelation of the pupil function for shifts along each axis is
+    evaluated with zero padded 1d FFTs, avoiding the PSF calculation.
+
+    Args:
+        wavefront: ndim x ndim Numpy array of wavefront errors. No data
+                   condition is indicated by nan
+        workers: number of threads used by `scipy.fft`; None for the default
+
+    Returns:
+        (mtf_s, mtf_t) sampled at pupil shifts of 0 to ndim samples
+    """
+    ndim = len(wavefront)
+    amp = np.isfinite(wavefront)
+    P = np.where(amp, np.exp(1j*2*np.pi*np.nan_to_num(wavefront)), 0.)
+    area = np.count_nonzero(amp)
+
+    def shift_mtf(axis):
+        F = sfft.fft(P, n=2*ndim, axis=axis, workers=workers)
+        acf = sfft.ifft(F.real**2 + F.imag**2, axis=axis, workers=workers)
+        return np.abs(acf.sum(axis=1-axis)[:ndim+1])/area
+
+    return shift_mtf(0), shift_mtf(1)
+
+
+def calc_geometric_mtf(ray_abr, freqs, weights=None):
+    """Calculate the sagittal and tangential geometric MTF of spot data.
+
+    Args:
+        ray_abr: [2, rays] array of the x and y transverse aberrations
+        freqs: spatial frequencies (cycles per system unit) to evaluate
+        weights: optional weight for each ray
+
+    Returns:
+        (mtf_s, mtf_t) at freqs
+    """
+    x, y = np.asarray(ray_abr, dtype=float)
+    wts = np.ones(len(x)) if weights is None else np.asarray(weights)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y, wts = x[valid], y[valid], wts[valid]
+
+    def line_mtf(t):
+        phase = 2*np.pi*np.outer(freqs, t - np.average(t, weights=wts))
+        return np.hypot(np.cos(phase) @ wts, np.sin(phase) @ wts)/wts.sum()
+
+    return line_mtf(x), line_mtf(y)
+
+
+# --- Relative illumination
+class RelativeIllumination():
+    """Relative illumination and geometric transmission versus field.
+
+    Field samples are taken from on-axis to the maximum field of the
+    :class:`~.FieldSpec`. For each field sample, a grid of rays over the
+    oversized entrance pupil, centered on the real chief ray, is traced with
+    the real apertures applied.
+
+    The image irradiance from a Lambertian object is proportional to the 
+    projected solid angle of the image space ray cone, i.e. the area covered
+    by the transmitted rays in image space direction cosine (L, M) space. 
+    This is the sum, over the transmitted rays, of the Jacobian of (L, M) 
+    wrt the pupil coordinates. The relative illumination, `ri`, is the 
+    projected solid angle normalized to its on-axis value.
+
+    The geometric `transmission` is the entrance pupil area of the
+    transmitted rays, normalized to its on-axis value.
+
+    The chief rays of the field samples are aimed together and cached in
+    the model's :class:`~.trace.ChiefRayCache`, and the rays of several field
+    samples are traced in each batch, see 
+    :func:`calc_relative_illumination`.
+
+    Attributes:
+        opt_model: :class:`~.OpticalModel` instance
+        num_flds: number of field samples from on-axis to the max field
+        wl: wavelength (nm) to trace the rays, or central wavelength if None
+        num_rays: number of samples across the oversized pupil
+        oversize: radius of the pupil sample, relative to the paraxial pupil
+        max_rays: maximum number of rays traced in a batch
+        field_fractions: [num_flds] array of the fraction of the max field
+        field_values: [num_flds] array of the field values
+        proj_solid_angle: [num_flds] array of the image space projected 
+                          solid angle (sr)
+        ri: [num_flds] array of the relative illumination
+        transmission: [num_flds] array of the geometric transmission
+    """
+
+    def __init__(self, opt_model, num_flds=21, wl=None, num_rays=32,
+                 oversize=1.25, max_rays=20000, **kwargs):
+        self.opt_model = opt_model
+        osp = opt_model.optical_spec
+        self.wvl = osp.spectral_region.central_wvl if wl is None else wl
+        self.num_flds = num_flds
+        self.num_rays = num_rays
+        self.oversize = oversize
+        self.max_rays = max_rays
+        self.rt_kwargs = kwargs
+
+        self.update_data()
+
+    def __json_encode__(self):
+        attrs = dict(vars(self))
+        del attrs['opt_model']
+        del attrs['flds']
+        return attrs
+
+    def update_data(self, **kwargs):
+        fov = self.opt_model['optical_spec']['fov']
+        max_fld_value, max_fi = fov.max_field()
+        max_fld = fov.fields[max_fi]
+        self.field_fractions = np.linspace(0., 1., self.num_flds)
+        self.field_values = self.field_fractions*max_fld_value
+        self.flds = [Field(x=ff*max_fld.x, y=ff*max_fld.y, fov=fov)
+                     for ff in self.field_fractions]
+
+        self.proj_solid_angle, pupil_area = calc_relative_illumination(
+            self.opt_model, self.flds, self.wvl, num_rays=self.num_rays,
+            oversize=self.oversize, max_rays=self.max_rays, **self.rt_kwargs)
+
+        self.ri = self.proj_solid_angle/self.proj_solid_angle[0]
+        self.transmission = pupil_area/pupil_area[0]
+        return self
+
+
+def calc_relative_illumination(opt_model, flds, wvl, num_rays=32, 
+                               oversize=1.25, max_rays=20000, **kwargs):
+    """Calculate the projected solid angle and pupil area for a list of fields.
+
+    The rays for each field are a grid of `num_rays` across a circle of
+    radius `oversize` in relative pupil coordinates, centered on the chief
+    ray found by :func:`~.trace.aim_chief_rays_batch`. The rays of as many 
+    fields as fit in `max_rays` are traced together, with aperture checking.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        flds: list of :class:`~.Field` points
+        wvl: wavelength (nm) to trace the rays
+        num_rays: number of samples across the oversized pupil
+        oversize: radius of the pupil sample, relative to the paraxial pupil
+        max_rays: maximum number of rays traced in a batch
+        **kwargs: keyword args passed to :func:`~.trace.trace_base_batch`
+
+    Returns:
+        (**proj_solid_angle**, **pupil_area**)
+
+        - **proj_solid_angle** - [fields] array of the image space projected
+          solid angle (sr) of the transmitted rays
+        - **pupil_area** - [fields] array of the relative pupil area of the
+          transmitted rays
+    """
+    aim_pts = trace.aim_chief_rays_batch(opt_model, flds, wvl)
+
+    coords = np.linspace(-oversize, oversize, num_rays)
+    step = coords[1] - coords[0]
+    px, py = np.meshgrid(coords, coords, indexing='ij')
+    in_circle = px**2 + py**2 <= oversize**2*(1 + 1e-12)
+    grid_pts = np.stack((px[in_circle], py[in_circle]), axis=-1)
+    num_pts = len(grid_pts)
+
+    kwargs['apply_vignetting'] = False
+    kwargs['check_apertures'] = kwargs.get('check_apertures', True)
+    proj_solid_angle = np.zeros(len(flds))
+    pupil_area = np.zeros(len(flds))
+    flds_per_batch = max(1, max_rays//num_pts)
+    for start in range(0, len(flds), flds_per_batch):
+        batch_flds = flds[start:start+flds_per_batch]
+        nf = len(batch_flds)
+        pupils = grid_pts[np.newaxis] + aim_pts[start:start+nf, np.newaxis]
+        ray_flds = [fld for fld in batch_flds for i in range(num_pts)]
+        ray_batch = trace.trace_base_batch(opt_model, pupils.reshape(-1, 2), 
+                                           ray_flds, wvl, **kwargs)
+        valid = (ray_batch.err_code == terr.OK).reshape(nf, num_pts)
+        dir_cos = ray_batch.d[:, -1, :2].reshape(nf, num_pts, 2)
+
+        # image space direction cosines on the pupil grid, nan if blocked
+        L = np.full((nf, num_rays, num_rays), np.nan)
+        M = np.full((nf, num_rays, num_rays), np.nan)
+        L[:, in_circle] = np.where(valid, dir_cos[..., 0], np.nan)
+        M[:, in_circle] = np.where(valid, dir_cos[..., 1], np.nan)
+        jac = (_grid_diff(L, 1)*_grid_diff(M, 2) - 
+               _grid_diff(L, 2)*_grid_diff(M, 1))
+        proj_solid_angle[start:start+nf] = np.nansum(np.abs(jac), 
+                                                     axis=(1, 2))
+        pupil_area[start:start+nf] = valid.sum(axis=1)*step**2
+
+    return proj_solid_angle, pupil_area
+
+
+def _grid_diff(a, axis):
+    """Differences of `a` per grid step along `axis`, nan aware.
+
+    Central differences are used where both neighbors are defined, one sided
+    differences at the edges of the defined region, and nan for points 
+    without defined neighbors.
+    """
+    def along(s):
+        return tuple(s if k == axis else slice(None) for k in range(a.ndim))
+
+    d = np.diff(a, axis=axis)
+    fwd = np.full(a.shape, np.nan)
+    bwd = np.full(a.shape, np.nan)
+    fwd[along(slice(None, -1))] = d
+    bwd[along(slice(1, None))] = d
+    ctr = (fwd + bwd)/2
+    one_sided = np.where(np.isfinite(fwd), fwd, bwd)
+    return np.where(np.isfinite(ctr), ctr, one_sided)
+
+
+# --- Through focus analysis
+class ThroughFocus():
+    """Spot size, wavefront error and encircled energy through focus.
+
+    A set of rays at the field point is traced once. The final ray segments
+    and the focus independent part of the OPD calculation are kept, so each
+    focus position only needs the rays to be propagated to the defocused 
+    image plane and the reference sphere to be updated. All of the focus 
+    positions are evaluated together on the arrays of ray data.
+
+    The spot size and encircled energy are geometric and measured from the
+    centroid of the spot. The wavefront error is in waves, with the piston
+    removed.
+
+    Calling update_data() with build='update' after changing `foc`, 
+    `defocus_range` or `num_foc` reuses the traced rays.
+
+    Attributes:
+        opt_model: :class:`~.OpticalModel` instance
+        f: index into :class:`~.FieldSpec` or a :class:`~.Field` instance
+        wl: wavelength (nm) to trace the rays, or central wavelength if None
+        foc: focus shift at the center of the focus range
+        defocus_range: +/- half the focus range. If None, the defocus range 
+                       of the :class:`~.FocusRange`, or if that is zero, 
+                       +/- 2 waves of defocus
+        num_foc: number of focus positions across the focus range
+        num_rays: number of samples across the pupil
+        ee_fraction: fraction of the rays for the encircled energy radius
+        foci: [num_foc] array of focus positions
+        spot_rms: [num_foc] array of the rms spot radius
+        wfe_rms: [num_foc] array of the rms wavefront error
+        wfe_pv: [num_foc] array of the peak to valley wavefront error
+        ee_radius: [num_foc] array of the radius enclosing `ee_fraction` of 
+                   the rays
+    """
+
+    metrics = ('spot_rms', 'wfe_rms', 'wfe_pv', 'ee_radius')
+
+    def __init__(self, opt_model, f=0, wl=None, foc=None, defocus_range=None,
+                 num_foc=21, num_rays=21, ee_fraction=0.8, **kwargs):
+        self.opt_model = opt_model
+        osp = opt_model.optical_spec
+        self.fld = osp.field_of_view.fields[f] if isinstance(f, int) else f
+        self.wvl = osp.spectral_region.central_wvl if wl is None else wl
+        self.foc = osp.defocus.focus_shift if foc is None else foc
+        self.defocus_range = defocus_range
+        self.num_foc = num_foc
+        self.num_rays = num_rays
+        self.ee_fraction = ee_fraction
+        self.rt_kwargs = kwargs
+
+        self.update_data()
+
+    def __json_encode__(self):
+        attrs = dict(vars(self))
+        del attrs['opt_model']
+        del attrs['tf_pkg']
+        return attrs
+
+    def update_data(self, **kwargs):
+        build = kwargs.get('build', 'rebuild')
+        if build == 'rebuild':
+            self.tf_pkg = trace_through_focus(self.opt_model, self.fld, 
+                                              self.wvl, self.foc, 
+                                              num_rays=self.num_rays, 
+                                              **self.rt_kwargs)
+
+        defocus_range = self.defocus_range
+        if defocus_range is None:
+            defocus_range = self.opt_model['osp']['focus'].defocus_range
+            if defocus_range == 0.:
+                defocus_range = default_defocus_range(self.opt_model, 
+                                                      self.wvl)
+        self.foci = self.foc + np.linspace(-1., 1., self.num_foc)*defocus_range
+
+        results = self.eval_focus(self.foci)
+        for metric, values in zip(self.metrics, results):
+            setattr(self, metric, values)
+
+        return self
+
+    def eval_focus(self, foci):
+        """Returns the arrays of metrics for the focus positions `foci`. """
+        return focus_through_focus(self.opt_model, self.tf_pkg, self.fld, 
+                                   self.wvl, foci, 
+                                   ee_fraction=self.ee_fraction)
+
+    def best_focus(self, metric='wfe_rms'):
+        """Returns the focus position minimizing `metric`.
+
+        The minimum on the `foci` samples is refined with a bounded scalar
+        search between the neighboring samples. 
+
+        Args:
+            metric: 'spot_rms', 'wfe_rms', 'wfe_pv' or 'ee_radius'
+        """
+        from scipy.optimize import minimize_scalar
+
+        mi = self.metrics.index(metric)
+        i = int(np.nanargmin(getattr(self, metric)))
+        lower = self.foci[max(i - 1, 0)]
+        upper = self.foci[min(i + 1, len(self.foci) - 1)]
+        if lower == upper:
+            return self.foci[i]
+
+        def merit(foc):
+            return self.eval_focus([foc])[mi][0]
+
+        res = minimize_scalar(merit, bounds=(lower, upper), method='bounded',
+                              options={'xatol': 1e-6*(upper - lower)})
+        # the bounded search doesn't evaluate the ends of the interval
+        return res.x if res.fun < getattr(self, metric)[i] else self.foci[i]
+
+
+def default_defocus_range(opt_model, wvl, waves=2.):
+    """Returns the focus shift giving `waves` of defocus wavefront error. 
+    
+    The paraxial defocus coefficient is W020 = dz*NA**2/2, where NA is the 
+    image space numerical aperture.
+    """
+    fod = opt_model['analysis_results']['parax_data'].fod
+    wvl_sys = opt_model.nm_to_sys_units(wvl)
+    return 2.*waves*wvl_sys/fod.img_na**2
+
+
+def trace_through_focus(opt_model, fld, wvl, foc, num_rays=21, **kwargs):
+    """Trace rays at `fld` and pre-calculate the data used through focus.
+
+    The rays are a grid of `num_rays` across the unit circle in the pupil,
+    with vignetting applied. The OPD data independent of focus is 
+    calculated by :func:`~.waveabr.wave_abr_pre_calc_batch` for the 
+    reference sphere at `foc`.
+
+    Returns:
+        tuple: **ray_bundle**, **chief_ray_pkg**, **pre_opd_pkg**
+
+            - **ray_bundle**: the transmitted rays, a :class:`~.RayBundle`
+            - **chief_ray_pkg**: chief_ray, cr_exp_seg
+            - **pre_opd_pkg**: tuple of arrays of the focus independent 
+              OPD data of the rays
+    """
+    fod = opt_model['analysis_results']['parax_data'].fod
+    ref_sphere, cr_pkg = trace.setup_pupil_coords(opt_model, fld, wvl, foc)
+
+    grid_def = [np.array([-1., -1.]), np.array([1., 1.]), num_rays]
+    pupils = list(sampler.csd_grid_ray_generator(grid_def))
+    kwargs['apply_vignetting'] = kwargs.get('apply_vignetting', True)
+    ray_bundle = trace_ray_bundle(opt_model, pupils, fld, wvl, foc, 
+                                  **kwargs)
+
+    pre_opd_pkg = waveabr.wave_abr_pre_calc_batch(fod, ray_bundle, cr_pkg,
+                                                  ref_sphere)
+
+    return ray_bundle, cr_pkg, pre_opd_pkg
+
+
+def focus_through_focus(opt_model, tf_pkg, fld, wvl, foci, ee_fraction=0.8):
+    """Evaluate the spot size, wavefront error and encircled energy at `foci`.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        tf_pkg: the data returned by :func:`trace_through_focus`
+        fld: :class:`~.Field` point that was traced
+        wvl: wavelength (nm) that was traced
+        foci: list of focus positions
+        ee_fraction: fraction of the rays for the encircled energy radius
+
+    Returns:
+        tuple: **spot_rms**, **wfe_rms**, **wfe_pv**, **ee_radius**, arrays
+        of the metrics at `foci`
+    """
+    fod = opt_model['analysis_results']['parax_data'].fod
+    ray_bundle, cr_pkg, pre_opd_pkg = tf_pkg
+    foci = np.asarray(foci, dtype=float)
+    p_img, d_img = ray_bundle.last_segment()
+
+    # propagate the rays to all of the defocused image planes together
+    dist = foci[:, np.newaxis] / d_img[np.newaxis, :, 2]
+    pts = (p_img[np.newaxis, :, :2] + 
+           dist[..., np.newaxis]*d_img[np.newaxis, :, :2])
+    spot = pts - np.mean(pts, axis=1, keepdims=True)
+    r = np.hypot(spot[..., 0], spot[..., 1])
+    spot_rms = np.sqrt(np.mean(r**2, axis=1))
+    ee_radius = np.quantile(r, ee_fraction, axis=1)
+
+    convert_to_opd = 1 / opt_model.nm_to_sys_units(wvl)
+    opd = np.array([waveabr.wave_abr_calc_batch(
+                        fod, cr_pkg, pre_opd_pkg,
+                        waveabr.calculate_reference_sphere(
+                            opt_model, fld, wvl, foc, cr_pkg),
+                        p_img)
+                    for foc in foci])*convert_to_opd
+    opd -= np.mean(opd, axis=1, keepdims=True)
+    wfe_rms = np.sqrt(np.mean(opd**2, axis=1))
+    wfe_pv = np.ptp(opd, axis=1)
+
+    return spot_rms, wfe_rms, wfe_pv, ee_radius
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Opt-in instrumentation of the ray trace hot path
+
+    A :class:`TraceInstrument` accumulates statistics from
+    :func:`~.raytrace.trace_raw`, the batch ray trace,
+    :func:`~.raytrace.trace_batch_raw`, and the iterative profile
+    intersections, :meth:`~.profiles.SurfaceProfile.intersect_spencer` and
+    :meth:`~.profiles.SurfaceProfile.intersect_batch`:
+
+        - the number of intersections, Newton iterations, intersections that
+          didn't converge within the iteration limit, missed surfaces and
+          rays blocked by the aperture check
+        - the cumulative time spent in surface intersection, phase element
+          (DOE) evaluation and aperture checks
+
+    The statistics are kept per surface index and per profile type. An
+    instrument is activated for a whole analysis run with the
+    :func:`instrument_trace` context manager::
+
+        with instrument_trace() as instr:
+            ray_fan = analyses.RayFan(opm, f=fld, wl=wvl, num_rays=21)
+            ...
+        print(instr.table(by='profile'))
+
+    or for the traces of a single call by passing it to
+    :func:`~.raytrace.trace_raw` or :func:`~.raytrace.trace_batch_raw` with
+    the `instrument` keyword. The batch trace counts each ray of the batch
+    as an intersection; its Newton iterations are counted per ray.
+
+    Instrumentation is off by default; the only cost is a check for an
+    active instrument per ray (or batch) and per iterative profile
+    intersection.
+"""
+
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+from rayoptics.raytr.traceerror import TraceMissedSurfaceError
+
+# the instrument receiving the trace statistics, or None
+active = None
+
+
+class TraceStats():
+    """ Counters and cumulative times for a surface or profile type.
+
+    Attributes:
+        calls: number of surface intersections
+        iterations: total number of Newton iterations
+        max_iterations: the largest iteration count for a single intersection
+        not_converged: intersections that hit the iteration limit
+        misses: rays that missed the surface
+        blocked: rays blocked by the aperture check
+        intersect_time: cumulative time in surface intersection (s)
+        phase_time: cumulative time in phase element evaluation (s)
+        aperture_time: cumulative time in aperture checks (s)
+    """
+    fields = ('calls', 'iterations', 'max_iterations', 'not_converged',
+              'misses', 'blocked', 'intersect_time', 'phase_time',
+              'aperture_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.iterations = 0
+        self.max_iterations = 0
+        self.not_converged = 0
+        self.misses = 0
+        self.blocked = 0
+        self.intersect_time = 0.
+        self.phase_time = 0.
+        self.aperture_time = 0.
+
+    def __repr__(self):
+        return "{!s}({})".format(type(self).__name__, ", ".join(
+            f"{f}={getattr(self, f)}" for f in self.fields))
+
+    def as_dict(self):
+        return {f: getattr(self, f) for f in self.fields}
+
+
+class TraceInstrument():
+    """ Accumulates ray trace statistics per surface and per profile type.
+
+    Attributes:
+        by_surface: dict of surface index to :class:`TraceStats`
+        by_profile: dict of profile type name to :class:`TraceStats`
+        num_rays: number of rays traced by :func:`~.raytrace.trace_raw` and
+                  :func:`~.raytrace.trace_batch_raw`
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.by_surface = {}
+        self.by_profile = {}
+        self.num_rays = 0
+        self._targets = ()
+        self._in_intersect = False
+
+    def _stats(self, stats_dict, key):
+        stats = stats_dict.get(key)
+        if stats is None:
+            stats = stats_dict[key] = TraceStats()
+        return stats
+
+    def start_ray(self, num_rays=1):
+        self.num_rays += num_rays
+        self._targets = ()
+
+    def _set_targets(self, surf, ifc):
+        prf = getattr(ifc, 'profile', ifc)
+        self._targets = (self._stats(self.by_surface, surf),
+                         self._stats(self.by_profile, type(prf).__name__))
+
+    def intersect(self, surf, ifc, p0, d, eps, z_dir):
+        """ Timed intersection of the ray with `ifc`, at index `surf`. """
+        self._set_targets(surf, ifc)
+        missed = False
+        self._in_intersect = True
+        t0 = perf_counter()
+        try:
+            return ifc.intersect(p0, d, eps=eps, z_dir=z_dir)
+        except TraceMissedSurfaceError:
+            missed = True
+            raise
+        finally:
+            dt = perf_counter() - t0
+            self._in_intersect = False
+            for stats in self._targets:
+                stats.calls += 1
+                stats.intersect_time += dt
+                stats.misses += missed
+
+    def intersect_batch(self, surf, ifc, p0, d, eps, z_dir):
+        """ Timed intersection of a batch of rays with `ifc`. """
+        self._set_targets(surf, ifc)
+        self._in_intersect = True
+        t0 = perf_counter()
+        try:
+            result = ifc.intersect_batch(p0, d, eps=eps, z_dir=z_dir)
+        finally:
+            dt = perf_counter() - t0
+            self._in_intersect = False
+        num_missed = int(result[2].sum())
+        for stats in self._targets:
+            stats.calls += len(p0)
+            stats.intersect_time += dt
+            stats.misses += num_missed
+        return result
+
+    def record_iterations(self, profile, iterations, converged=True):
+        """ Record the Newton iteration count of a `profile` intersection. """
+        if self._in_intersect:
+            targets = self._targets
+        else:  # a direct call of the profile's intersect
+            targets = (self._stats(self.by_profile, type(profile).__name__),)
+        for stats in targets:
+            stats.iterations += iterations
+            if iterations > stats.max_iterations:
+                stats.max_iterations = iterations
+            if not converged:
+                stats.not_converged += 1
+
+    def record_batch_iterations(self, profile, iterations, max_iterations,
+                                not_converged):
+        """ Record the Newton iterations of a batch `profile` intersection.
+
+        Args:
+            iterations: the total number of iterations of all of the rays
+            max_iterations: the number of iterations of the slowest ray
+            not_converged: the number of rays that hit the iteration limit
+        """
+        if self._in_intersect:
+            targets = self._targets
+        else:  # a direct call of the profile's intersect_batch
+            targets = (self._stats(self.by_profile, type(profile).__name__),)
+        for stats in targets:
+            stats.iterations += iterations
+            if max_iterations > stats.max_iterations:
+                stats.max_iterations = max_iterations
+            stats.not_converged += not_converged
+
+    def point_inside(self, ifc, x, y, **kwargs):
+        """ Timed aperture check at the last intersected surface. """
+        t0 = perf_counter()
+        inside = ifc.point_inside(x, y, **kwargs)
+        dt = perf_counter() - t0
+        for stats in self._targets:
+            stats.aperture_time += dt
+            stats.blocked += not inside
+        return inside
+
+    def points_inside(self, ifc, x, y, **kwargs):
+        """ Timed aperture check of a batch of rays. """
+        t0 = perf_counter()
+        inside = ifc.points_inside(x, y, **kwargs)
+        dt = perf_counter() - t0
+        num_blocked = int(np.count_nonzero(~inside))
+        for stats in self._targets:
+            stats.aperture_time += dt
+            stats.blocked += num_blocked
+        return inside
+
+    def phase(self, phase_fct, *args):
+        """ Timed evaluation of `phase_fct` at the last intersected surface. """
+        t0 = perf_counter()
+        try:
+            return phase_fct(*args)
+        finally:
+            dt = perf_counter() - t0
+            for stats in self._targets:
+                stats.phase_time += dt
+
+    def rows(self, by='surface'):
+        """ Return a list of (key, stats dict) for `by` 'surface'|'profile'. """
+        stats = self.by_surface if by == 'surface' else self.by_profile
+        return [(k, s.as_dict()) for k, s in stats.items()]
+
+    def as_dataframe(self, by='surface'):
+        """ Return the statistics as a pandas DataFrame. """
+        import pandas as pd
+        rows = self.rows(by=by)
+        return pd.DataFrame([s for k, s in rows],
+                            index=pd.Index([k for k, s in rows], name=by),
+                            columns=TraceStats.fields)
+
+    def table(self, by='surface'):
+        """ Return a formatted table of the statistics, times in ms. """
+        rows = self.rows(by=by)
+        w = max([10] + [len(str(k)) for k, s in rows])
+        hdr = (f"{by:>{w}s} {'calls':>8s} {'iters':>9s} {'max':>5s} "
+               f"{'no conv':>7s} {'misses':>6s} {'blocked':>7s} "
+               f"{'intrsct ms':>10s} {'phase ms':>9s} {'aper ms':>8s}")
+        lines = [hdr]
+        for k, s in rows:
+            lines.append(
+                f"{str(k):>{w}s} {s['calls']:8d} {s['iterations']:9d} "
+                f"{s['max_iterations']:5d} {s['not_converged']:7d} "
+                f"{s['misses']:6d} {s['blocked']:7d} "
+                f"{1e3*s['intersect_time']:10.3f} "
+                f"{1e3*s['phase_time']:9.3f} {1e3*s['aperture_time']:8.3f}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def instrument_trace(instrument=None):
+    """ Collect ray trace statistics for the duration of the `with` block.
+
+    Args:
+        instrument: an existing :class:`TraceInstrument` to accumulate into,
+                    otherwise a new one is created
+
+    Yields:
+        the active :class:`TraceInstrument`
+    """
+    global active
+    instr = TraceInstrument() if instrument is None else instrument
+    previous = active
+    active = instr
+    try:
+        yield instr
+    finally:
+        active = previous
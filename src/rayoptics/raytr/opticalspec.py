@@ -285,10 +285,27 @@ class OpticalSpecs:
                 - 'aim pt': aim point on pupil plane
                 - 'aim dir': aim direction in object space
         """
+        pt0, dir0 = self.ray_starts_from_osp([pupil[:2]], fld, pupil_type)
+        return pt0[0], dir0[0]
+
+    def ray_starts_from_osp(self, pupils, fld, pupil_type:str):
+        """ turn an array of pupil coordinates at `fld` into ray starts. 
         
+        This is the vectorized counterpart to :meth:`ray_start_from_osp`, 
+        for a batch of rays from a single field point.
+
+        Args:
+            pupils: [N, 2] aperture coordinates of the rays
+            fld: instance of :class:`~.Field`
+            pupil_type: see :meth:`ray_start_from_osp`
+
+        Returns:
+            ([N, 3] starting points, [N, 3] starting directions)
+        """
+        pupils = np.asarray(pupils, dtype=float).reshape(-1, 2)
+        num_rays = len(pupils)
         pupil_oi_key, pupil_value_key = self['pupil'].key
         pupil_value = self['pupil'].value
-        fov_oi_key, fov_value_key = self['fov'].key
         n_obj, n_img = self.obj_img_rindex()
         p0, d0 = self.obj_coords(fld)
 
@@ -298,11 +315,8 @@ class OpticalSpecs:
         # object space parameter
         if pupil_oi_key == 'image':
             if abs(fod.m) < 1e-10:   # infinite object distance
-                if 'epd' == pupil_value_key:
-                    pupil_value = 2*fod.enp_radius
-                else:
-                    pupil_value_key = 'epd'
-                    pupil_value = 2*fod.enp_radius
+                pupil_value_key = 'epd'
+                pupil_value = 2*fod.enp_radius
             else:  # finite conjugate
                 if abs(fod.enp_dist) > 1e10:  # telecentric entrance pupil
                     pupil_value_key = 'NA'
@@ -316,20 +330,21 @@ class OpticalSpecs:
         if hasattr(fld, 'aim_info') and fld.aim_info is not None:
             aim_info = fld.aim_info
         z_enp = fod.enp_dist
-        # generate starting pt and dir depending on whether the pupil spec is 
-        # spatial or angular
+        # generate starting pts and dirs depending on whether the pupil spec 
+        # is spatial or angular
         if 'epd' == pupil_value_key:
             if pupil_type == 'aim pt':
                 pt0 = p0
-                pt1 = np.array([pupil[0], pupil[1],
-                                fod.obj_dist + z_enp])
+                pt1 = np.empty((num_rays, 3))
+                pt1[:, :2] = pupils
+                pt1[:, 2] = fod.obj_dist + z_enp
             else:             
                 eprad = pupil_value/2
                 if self['fov'].is_wide_angle:
-                    # transform pupil_pt, in direction coords into surf#1 coordinates 
-                    pupil_pt = eprad * np.array([pupil[0], pupil[1], 0.])
+                    # transform pupil_pts, in direction coords into surf#1 
+                    # coordinates 
                     rot_mat_d2s = rot_v1_into_v2(d0, np.array([0., 0., 1.]))
-                    pt1 = np.matmul(rot_mat_d2s, pupil_pt)
+                    pt1 = (eprad*pupils).dot(rot_mat_d2s[:, :2].T)
                     if aim_info is not None:
                         z_enp = aim_info
                     obj2enp_dist = -(fod.obj_dist + z_enp)
@@ -338,53 +353,54 @@ class OpticalSpecs:
                     enp_pt = np.array([0., 0., obj2enp_dist])
                     rot_mat_s2d = rot_v1_into_v2(np.array([0., 0., 1.]), d0)
                     pt0 = np.matmul(rot_mat_s2d, enp_pt) - enp_pt
-                    pt1[2] -= obj2enp_dist
+                    pt1[:, 2] -= obj2enp_dist
 
                 else:
                     aim_pt = [0., 0.] if aim_info is None else aim_info
                     obj2enp_dist = -(fod.obj_dist + z_enp)
-                    pt1 = np.array([eprad*pupil[0]+aim_pt[0], 
-                                    eprad*pupil[1]+aim_pt[1],
-                                    fod.obj_dist+z_enp])
-                    pt0 = obj2enp_dist*np.array([d0[0]/d0[2], d0[1]/d0[2], 0.])
-
-            dir0 = normalize(pt1 - pt0)
+                    pt1 = np.empty((num_rays, 3))
+                    pt1[:, :2] = eprad*pupils + aim_pt
+                    pt1[:, 2] = fod.obj_dist + z_enp
+                    pt0 = obj2enp_dist*np.array([d0[0]/d0[2], d0[1]/d0[2], 
+                                                 0.])
+
+            pt0 = np.tile(pt0, (num_rays, 1))
+            dir0 = pt1 - pt0
+            length = np.sqrt(np.einsum('ij,ij->i', dir0, dir0))
+            length[length == 0.0] = 1.0
+            dir0 /= length[:, np.newaxis]
 
         else:  # an angular based measure
             if pupil_type == 'aim dir':
-                dir_tot = pupil
-                pt0 = p0
+                dir_tot = pupils
             else:
                 if 'NA' in pupil_value_key:
                     n = n_obj if pupil_oi_key == 'object' else n_img
                     na = pupil_value
                     sin_ang = na / n
-                    pupil_dir = sin_ang * np.array([pupil[0], pupil[1]])
+                    pupil_dir = sin_ang * pupils
                 elif 'f/#' in pupil_value_key:
                     fno = pupil_value
                     slope = -1/(2*fno)
-                    hypt = np.sqrt(
-                        1 + (pupil[0]*slope)**2 + (pupil[1]*slope)**2
-                        )
-                    pupil_dir = np.array([slope*pupil[0]/hypt, 
-                                        slope*pupil[1]/hypt])
+                    hypt = np.sqrt(1 + (pupils[:, 0]*slope)**2 + 
+                                   (pupils[:, 1]*slope)**2)
+                    pupil_dir = slope*pupils/hypt[:, np.newaxis]
 
-                pt0 = p0
                 if d0 is not None:
                     cr_dir = d0[:2]
                 else:
                     aim_pt = aim_info
                     pt1 = np.array([aim_pt[0], aim_pt[1], 
                                     fod.obj_dist+fod.enp_dist])
-                    cr_dir = normalize(pt1 - pt0)[:2]
+                    cr_dir = normalize(pt1 - p0)[:2]
                 dir_tot = pupil_dir + cr_dir
 
-            dir0 = np.array([dir_tot[0], dir_tot[1], 
-                             np.sqrt(1 - np.dot(dir_tot, dir_tot))])
+            pt0 = np.tile(p0, (num_rays, 1))
+            dir0 = np.column_stack((dir_tot, 
+                                    np.sqrt(1 - np.sum(dir_tot**2, axis=1))))
         
         return pt0, dir0
 
-        
     def lookup_fld_wvl_focus(self, fi, wl=None, fr=0.0):
         """ returns field, wavelength and defocus data
 
@@ -1275,6 +1291,14 @@ class Field:
                 vig_pupil[1] *= (1.0 - self.vuy)
         return vig_pupil
 
+    def apply_vignetting_batch(self, pupils):
+        """ Returns a vignetted copy of the [N, 2] array `pupils`. """
+        pupils = np.array(pupils, dtype=float).reshape(-1, 2)
+        vig_x = np.where(pupils[:, 0] < 0., self.vlx, self.vux)
+        vig_y = np.where(pupils[:, 1] < 0., self.vly, self.vuy)
+        vig = np.column_stack((vig_x, vig_y))
+        return pupils*(1.0 - vig)
+
 
 class FocusRange:
     """ Focus range specification
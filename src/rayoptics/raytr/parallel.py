@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Evaluate analyses over fields and wavelengths using a process pool
+
+    Each (field, wavelength) combination of an analysis is independent of the
+    others. The :class:`~.AnalysisExecutor` distributes these jobs to a
+    :class:`concurrent.futures.ProcessPoolExecutor`. The optical model is
+    sent to each worker once, as a binary snapshot (see
+    :func:`~.snapshot.dumps_snapshot`), when the worker starts; the individual
+    jobs only ship the analysis function, the field index, wavelength and
+    focus.
+
+    The analysis functions must be importable, module level functions with
+    the signature::
+
+        fct(opt_model, fld, wvl, foc, *args, **kwargs)
+
+    :func:`~.analyses.eval_fan`, :func:`~.analyses.eval_wavefront`,
+    :func:`~.analyses.trace_wavefront` and :func:`~.trace.trace_field` are
+    examples. :func:`trace_ray_grid_job`, :func:`trace_pupil_coords_job` and
+    :func:`trace_grid_job` adapt other trace functions to this signature.
+
+    The :class:`~.RayFan`, :class:`~.RayList` and :class:`~.RayGrid`
+    analyses and :meth:`~.SequentialModel.trace_grid` take an `executor`
+    keyword argument, which moves their ray tracing to the process pool.
+
+    Typical use::
+
+        with AnalysisExecutor(opt_model, max_workers=8) as executor:
+            opd = eval_fields_wvls(opt_model, analyses.eval_wavefront,
+                                   executor=executor, num_rays=64)
+
+    The snapshot is taken when the executor is created; changes made to the
+    optical model afterwards aren't seen by the workers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rayoptics.optical.snapshot import dumps_snapshot, loads_snapshot
+from rayoptics.raytr import analyses
+from rayoptics.raytr import trace
+
+
+# the optical model restored in each worker process
+_worker_model = None
+
+
+def _init_worker(snapshot):
+    global _worker_model
+    _worker_model = loads_snapshot(snapshot)
+
+
+def _run_job(fct, fi, wvl, foc, args, kwargs):
+    """ evaluate `fct` on the worker's optical model for field index fi. """
+    opt_model = _worker_model
+    fld = opt_model['optical_spec']['fov'].fields[fi]
+    return fct(opt_model, fld, wvl, foc, *args, **kwargs)
+
+
+def trace_ray_grid_job(opt_model, fld, wvl, foc, grid_rng, **kwargs):
+    """ :func:`~.analyses.trace_ray_grid` with the job argument order. """
+    return analyses.trace_ray_grid(opt_model, grid_rng, fld, wvl, foc,
+                                   **kwargs)
+
+
+def trace_pupil_coords_job(opt_model, fld, wvl, foc, pupil_coords, **kwargs):
+    """ :func:`~.analyses.trace_pupil_coords` with the job argument order. """
+    return analyses.trace_pupil_coords(opt_model, pupil_coords, fld, wvl, foc,
+                                       **kwargs)
+
+
+def trace_grid_job(opt_model, fld, wvl, foc, grid_rng, **kwargs):
+    """ Trace the rays of :func:`~.trace.trace_grid` without an image filter.
+
+    Returns:
+        a list of (pupil, ray_pkg) for each ray, in the order traced. The
+        ray_pkg is None if the ray failed. Use :func:`filter_grid` to apply
+        an image filter to the list.
+    """
+    rays = []
+
+    def keep_ray(pupil, ray_pkg):
+        rays.append((pupil, ray_pkg))
+
+    trace.trace_grid(opt_model, grid_rng, fld, wvl, foc, img_filter=keep_ray,
+                     form='list', append_if_none=False, **kwargs)
+    return rays
+
+
+def filter_grid(rays, num, img_filter, form='grid', append_if_none=True):
+    """ Apply `img_filter` to the results of :func:`trace_grid_job`.
+
+    The filtered results are collected as :func:`~.trace.trace_grid` does,
+    into rows of `num` results if `form` is 'grid', or a single list if
+    `form` is 'list'.
+    """
+    grid = []
+    for i in range(num):
+        working_grid = grid if form == 'list' else []
+        for pupil, ray_pkg in rays[i*num:(i + 1)*num]:
+            result = img_filter(pupil, ray_pkg)
+            if ray_pkg is not None or result is not None or append_if_none:
+                working_grid.append(result)
+        if form == 'grid':
+            grid.append(working_grid)
+    return np.array(grid)
+
+
+class AnalysisExecutor():
+    """ A process pool for evaluating (field, wavelength) analysis jobs.
+
+    Attributes:
+        opt_model: the :class:`~.OpticalModel` sent to the workers
+        max_workers: number of worker processes, defaults to the cpu count
+        mp_context: optional multiprocessing context for the process pool
+    """
+
+    def __init__(self, opt_model, max_workers=None, mp_context=None):
+        self.opt_model = opt_model
+        self.max_workers = max_workers
+        snapshot = dumps_snapshot(opt_model, compress=False)
+        self.pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=mp_context,
+                                        initializer=_init_worker,
+                                        initargs=(snapshot,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def submit(self, fct, fi, wvl, foc, *args, **kwargs):
+        """ Schedule `fct` for field index `fi`, returning a Future. """
+        return self.pool.submit(_run_job, fct, fi, wvl, foc, args, kwargs)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+def eval_fields_wvls(opt_model, fct, *args, executor=None,
+                     fields=None, wvls=None, foc=None, **kwargs):
+    """ Evaluate `fct` for each combination of field and wavelength.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        fct: module level function with the signature
+             fct(opt_model, fld, wvl, foc, \\*args, \\*\\*kwargs)
+        executor: an :class:`~.AnalysisExecutor`. If None, the jobs are
+                  evaluated serially in this process.
+        fields: list of field indices, defaults to all of the fields
+        wvls: list of wavelengths (nm), defaults to all of the wavelengths
+        foc: focus shift, defaults to the optical_spec focus shift
+        *args: additional positional arguments for `fct`
+        **kwargs: keyword arguments for `fct`
+
+    Returns:
+        a list, by field, of lists, by wavelength, of the results of `fct`
+    """
+    osp = opt_model['optical_spec']
+    fov = osp['fov']
+    fields = range(len(fov.fields)) if fields is None else fields
+    wvls = osp['wvls'].wavelengths if wvls is None else wvls
+    foc = osp['focus'].focus_shift if foc is None else foc
+
+    if executor is None:
+        return [[fct(opt_model, fov.fields[fi], wvl, foc, *args, **kwargs)
+                 for wvl in wvls] for fi in fields]
+
+    futures = [[executor.submit(fct, fi, wvl, foc, *args, **kwargs)
+                for wvl in wvls] for fi in fields]
+    return [[fut.result() for fut in fld_futs] for fld_futs in futures]
+
+
+def eval_fld_wvl(opt_model, fct, fld, wvl, foc, *args, executor=None,
+                 **kwargs):
+    """ Evaluate `fct` for a single field and wavelength.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        fct: see :func:`eval_fields_wvls`
+        fld: a :class:`~.Field`. If an executor is used, it must be one of
+             the fields of the optical spec.
+        wvl: wavelength (nm)
+        foc: focus shift
+        executor: an :class:`~.AnalysisExecutor`. If None, `fct` is
+                  evaluated in this process.
+
+    Returns:
+        the result of `fct`
+    """
+    if executor is None:
+        return fct(opt_model, fld, wvl, foc, *args, **kwargs)
+
+    fields = opt_model['optical_spec']['fov'].fields
+    fi = next((i for i, f in enumerate(fields) if f is fld), None)
+    if fi is None:
+        raise ValueError("only the fields of the optical spec can be "
+                         "evaluated by an executor")
+    return eval_fields_wvls(opt_model, fct, *args, executor=executor,
+                            fields=[fi], wvls=[wvl], foc=foc, **kwargs)[0][0]
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Array based container for the ray trace results of many rays
+
+    A :class:`~.RayBundle` holds the surface by surface ray data for a
+    collection of rays in contiguous arrays, rather than as a list of
+    :class:`~.RayPkg` s. It is produced by the batch ray tracer and used by
+    the :class:`~.RayFan`, :class:`~.RayList` and :class:`~.RayGrid`
+    analyses.
+
+    For compatibility with code written for the list based results,
+    iterating over a :class:`~.RayBundle` returns [pupil_x, pupil_y, ray_pkg]
+    items, where ray_pkg is a :class:`~.RayPkg` view of the ray data, or
+    None if the ray failed. A bundle with a 2d shape, i.e. a grid of rays,
+    iterates over rows of items, like the nested lists it replaces.
+"""
+
+import operator
+
+import numpy as np
+
+from . import RayPkg, RaySeg, RayBatch
+from . import traceerror as terr
+
+
+class RayBundle():
+    """Array based ray trace results for a collection of rays.
+
+    Attributes:
+        pupil: [rays, 2] array of the pupil coordinates of the rays
+        p: [rays, surfaces, 3] array of points of incidence
+        d: [rays, surfaces, 3] array of directions following the interface
+        dst: [rays, surfaces] array of distances to next point of incidence
+        nrml: [rays, surfaces, 3] array of surface normals
+        op: [rays] array of optical path lengths between pupils
+        wvl: wavelength (in nm) that the rays were traced in
+        err_code: [rays] array of :mod:`~.traceerror` codes, OK if success
+        err_surf: [rays] array of failure surface indices, -1 if success
+        shape: the logical shape of the collection of rays, e.g. (n, n) for
+               a grid of rays
+        aim_converged: [rays] boolean array, True if the ray was aimed at its
+                       real pupil position, or None if the rays were aimed
+                       paraxially
+    """
+
+    def __init__(self, pupil, ray_batch: RayBatch, shape=None,
+                 aim_converged=None):
+        self.pupil = np.asarray(pupil, dtype=float).reshape(-1, 2)
+        (self.p, self.d, self.dst, self.nrml, self.op, self.wvl,
+         self.err_code, self.err_surf) = ray_batch
+        self.shape = (len(self.pupil),) if shape is None else tuple(shape)
+        self.aim_converged = aim_converged
+
+    def __json_encode__(self):
+        return dict(vars(self))
+
+    def __json_decode__(self, **attrs):
+        self.__dict__.update(attrs)
+        if not hasattr(self, 'aim_converged'):
+            self.aim_converged = None
+
+    @classmethod
+    def from_ray_pkgs(cls, pupil, ray_pkgs, wvl, shape=None):
+        """Build a RayBundle from a list of :class:`~.RayPkg` s.
+
+        Args:
+            pupil: [rays, 2] pupil coordinates
+            ray_pkgs: list of ray_pkgs, or None for failed rays
+            wvl: wavelength (in nm) that the rays were traced in
+            shape: the logical shape of the collection of rays
+        """
+        num_rays = len(ray_pkgs)
+        num_srfs = max((len(rp[0]) for rp in ray_pkgs if rp is not None),
+                       default=0)
+        p = np.full((num_rays, num_srfs, 3), np.nan)
+        d = np.full((num_rays, num_srfs, 3), np.nan)
+        dst = np.full((num_rays, num_srfs), np.nan)
+        nrml = np.full((num_rays, num_srfs, 3), np.nan)
+        op = np.full(num_rays, np.nan)
+        err_code = np.full(num_rays, terr.OK)
+        err_surf = np.full(num_rays, -1)
+        for i, ray_pkg in enumerate(ray_pkgs):
+            if ray_pkg is None:
+                err_code[i] = terr.MISSED_SURFACE
+                continue
+            ray, op[i], _ = ray_pkg
+            k = len(ray)
+            p[i, :k] = [seg[0] for seg in ray]
+            d[i, :k] = [seg[1] for seg in ray]
+            dst[i, :k] = [seg[2] for seg in ray]
+            nrml[i, :k] = [seg[3] for seg in ray]
+        ray_batch = RayBatch(p, d, dst, nrml, op, wvl, err_code, err_surf)
+        return cls(pupil, ray_batch, shape=shape)
+
+    @property
+    def valid(self):
+        """boolean mask of the rays that traced successfully """
+        return self.err_code == terr.OK
+
+    @property
+    def blocked(self):
+        """boolean mask of the rays clipped by an aperture """
+        return self.err_code == terr.BLOCKED
+
+    @property
+    def blocked_at(self):
+        """[rays] array of the interface index that clipped each ray, -1 if
+        the ray wasn't clipped """
+        return np.where(self.blocked, self.err_surf, -1)
+
+    def transmission(self):
+        """fraction of the rays that weren't clipped or failed """
+        return np.count_nonzero(self.valid)/len(self.err_code)
+
+    @property
+    def num_srfs(self):
+        return self.p.shape[1]
+
+    @property
+    def nbytes(self):
+        """the memory used by the ray data arrays """
+        return sum(a.nbytes for a in (self.pupil, self.p, self.d, self.dst,
+                                      self.nrml, self.op, self.err_code,
+                                      self.err_surf))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def ray_pkg(self, i):
+        """Returns a :class:`~.RayPkg` view of ray *i*, or None if it failed."""
+        if self.err_code[i] != terr.OK:
+            return None
+        ray = [RaySeg(*seg) for seg in zip(self.p[i], self.d[i],
+                                           self.dst[i], self.nrml[i])]
+        return RayPkg(ray, self.op[i], self.wvl)
+
+    def item(self, i):
+        """Returns the [pupil_x, pupil_y, ray_pkg] item for ray *i*. """
+        return [self.pupil[i][0], self.pupil[i][1], self.ray_pkg(i)]
+
+    def __getitem__(self, key):
+        """Returns the item, or row of items for a grid, at index *key*.
+
+        Negative indices count from the end and a slice returns a list, as
+        for the nested lists the bundle replaces.
+        """
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        try:
+            i = operator.index(key)
+        except TypeError:
+            raise TypeError("RayBundle indices must be integers or slices, "
+                            f"not {type(key).__name__}") from None
+        if not -len(self) <= i < len(self):
+            raise IndexError("RayBundle index out of range")
+        i %= len(self)
+        if len(self.shape) == 2:
+            num_cols = self.shape[1]
+            return [self.item(i*num_cols + j) for j in range(num_cols)]
+        else:
+            return self.item(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, mask):
+        """Returns a 1d RayBundle of the rays selected by *mask*. """
+        ray_batch = RayBatch(self.p[mask], self.d[mask], self.dst[mask],
+                             self.nrml[mask], self.op[mask], self.wvl,
+                             self.err_code[mask], self.err_surf[mask])
+        aim_converged = (None if self.aim_converged is None
+                         else self.aim_converged[mask])
+        return RayBundle(self.pupil[mask], ray_batch,
+                         aim_converged=aim_converged)
+
+    def last_segment(self):
+        """Returns the point, direction arrays at the last interface. """
+        return self.p[:, -1], self.d[:, -1]
@@ -13,6 +13,9 @@ from numpy.linalg import norm
 from math import sqrt, copysign
 
 import rayoptics.optical.model_constants as mc
+from . import RayBatch
+from . import traceerror as terr
+from . import instrument as rt_instr
 from .traceerror import (TraceMissedSurfaceError, TraceTIRError,
                          TraceRayBlockedError, TraceEvanescentRayError)
 
@@ -97,6 +100,9 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
                        trace input ray coords directly.
         pt_inside_fuzz: accuracy tolerance for aperture clipping check
         filter_out_phantoms: if True, no ray data is saved for phantom interfaces
+        instrument: a :class:`~.instrument.TraceInstrument` to collect trace
+                    statistics in. Defaults to the instrument activated by
+                    :func:`~.instrument.instrument_trace`, if any.
 
     Returns:
         (**ray**, **op_delta**, **wvl**)
@@ -113,6 +119,17 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
           optical axis
         - **wvl** - wavelength (in nm) that the ray was traced in
     """
+    instr = kwargs.pop('instrument', None)
+    if instr is not None and instr is not rt_instr.active:
+        with rt_instr.instrument_trace(instr):
+            return trace_raw(path, pt0, dir0, wvl, eps=eps,
+                             check_apertures=check_apertures,
+                             intersect_obj=intersect_obj,
+                             filter_out_phantoms=filter_out_phantoms, **kwargs)
+    instr = rt_instr.active
+    if instr is not None:
+        instr.start_ray()
+
     ray = []
 
     first_surf = kwargs.get('first_surf', 0)
@@ -178,8 +195,14 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
             z_dir_after = after[mc.Zdir]
 
             # intersect ray with profile
-            pp_dst_intrsct, inc_pt = ifc.intersect(pp_pt_before, b4_dir,
-                                                    eps=eps, z_dir=z_dir_before)
+            if instr is None:
+                pp_dst_intrsct, inc_pt = ifc.intersect(pp_pt_before, b4_dir,
+                                                       eps=eps,
+                                                       z_dir=z_dir_before)
+            else:
+                pp_dst_intrsct, inc_pt = instr.intersect(surf, ifc,
+                                                         pp_pt_before, b4_dir,
+                                                         eps, z_dir_before)
             dst_b4 = pp_dst + pp_dst_intrsct
             
             if b4_interact_mode == 'phantom' and filter_out_phantoms:
@@ -198,7 +221,12 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
             if (check_apertures and 
                 in_surface_range(surf) and 
                 not interact_mode == 'phantom'):
-                if not ifc.point_inside(inc_pt[0], inc_pt[1], **fuzz):
+                if instr is None:
+                    inside = ifc.point_inside(inc_pt[0], inc_pt[1], **fuzz)
+                else:
+                    inside = instr.point_inside(ifc, inc_pt[0], inc_pt[1],
+                                                **fuzz)
+                if not inside:
                     raise TraceRayBlockedError(ifc, inc_pt)
 
             # if present, use the phase element to calculate after_dir
@@ -206,7 +234,12 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
                 ifc_cntxt = (z_dir_before, wvl, 
                              before[mc.Indx], after[mc.Indx],
                              interact_mode)
-                after_dir, phs = phase(ifc, inc_pt, b4_dir, normal, ifc_cntxt)
+                if instr is None:
+                    after_dir, phs = phase(ifc, inc_pt, b4_dir, normal,
+                                           ifc_cntxt)
+                else:
+                    after_dir, phs = instr.phase(phase, ifc, inc_pt, b4_dir,
+                                                 normal, ifc_cntxt)
                 op_delta += phs
             else:  # refract or reflect ray at interface
                 if interact_mode == 'reflect':
@@ -264,6 +297,299 @@ def trace_raw(path, pt0, dir0, wvl, eps=1.0e-12, check_apertures=False,
     return ray, op_delta, wvl
 
 
+def bend_batch(d_in, normal, n_in, n_out):
+    """ refract incoming directions, d_in, about normals
+
+    Returns:
+        tuple: [N, 3] outgoing directions and an [N] boolean mask of the 
+        rays that were TIR'd
+    """
+    normal_len = np.linalg.norm(normal, axis=-1)
+    cosI = np.einsum('ij,ij->i', d_in, normal)/normal_len
+    sinI_sqr = 1.0 - cosI*cosI
+    radicand = n_out*n_out - n_in*n_in*sinI_sqr
+    tir = ~(radicand >= 0.)
+    n_cosIp = np.copysign(np.sqrt(np.where(tir, 0., radicand)), cosI)
+    alpha = n_cosIp - n_in*cosI
+    d_out = (n_in*d_in + alpha[:, np.newaxis]*normal)/n_out
+    return d_out, tir
+
+
+def reflect_batch(d_in, normal):
+    """ reflect incoming directions, d_in, about normals """
+    normal_len = np.linalg.norm(normal, axis=-1)
+    cosI = np.einsum('ij,ij->i', d_in, normal)/normal_len
+    d_out = d_in - 2.0*cosI[:, np.newaxis]*normal
+    return d_out
+
+
+def trace_batch(seq_model, pts0, dirs0, wvl, **kwargs) -> RayBatch:
+    """ trace a batch of rays through the sequential model
+
+    This is the batch counterpart to :func:`trace`. All of the rays are
+    propagated together, surface by surface, as [N, 3] arrays.
+
+    Args:
+        seq_model: the sequential model to be traced
+        pts0: [N, 3] starting points in coords of first interface
+        dirs0: [N, 3] starting direction cosines in coords of first interface
+        wvl: wavelength in nm
+
+    Returns:
+        a :class:`~.RayBatch`, see :func:`trace_batch_raw`
+    """
+    path = seq_model.path(wvl)
+    kwargs['first_surf'] = kwargs.get('first_surf', 1)
+    kwargs['last_surf'] = kwargs.get('last_surf',
+                                     seq_model.get_num_surfaces()-2)
+    return trace_batch_raw(path, pts0, dirs0, wvl, **kwargs)
+
+
+def trace_batch_raw(path, pts0, dirs0, wvl, eps=1.0e-12, 
+                    check_apertures=False, intersect_obj=True, 
+                    filter_out_phantoms=False, **kwargs) -> RayBatch:
+    """ fundamental raytrace function for a batch of rays
+
+    The rays are carried as [N, 3] arrays from interface to interface. Ray 
+    failures don't raise exceptions; instead, the failure type and surface 
+    index are recorded for each ray and the failed rays are dropped from 
+    further processing. The ray data up to the failure matches what 
+    :func:`trace_raw` records in the ray package of the trace exception; the 
+    remaining ray data are set to nan.
+
+    Args:
+        path: an iterator containing interfaces and gaps to be traced.
+              for each iteration, the sequence or generator should return a
+              list containing: **Intfc, Gap, Trfm, Index, Z_Dir**
+        pts0: [N, 3] starting points in coords of object interface
+        dirs0: [N, 3] starting direction cosines in coords of object interface
+        wvl: wavelength in nm
+        eps: accuracy tolerance for surface intersection calculation
+        check_apertures: if True, do a points_inside() test on the inc_pts
+                         of the rays at each interface. Blocked rays are
+                         recorded as BLOCKED at that interface; the rays 
+                         that pass continue in the batch.
+        intersect_obj: if True, intersect the ray with the object, otherwise 
+                       trace input ray coords directly.
+        pt_inside_fuzz: accuracy tolerance for aperture clipping check
+        filter_out_phantoms: if True, no ray data is saved for phantom interfaces
+        instrument: a :class:`~.instrument.TraceInstrument` to collect trace
+                    statistics in. Defaults to the instrument activated by
+                    :func:`~.instrument.instrument_trace`, if any.
+
+    Returns:
+        a :class:`~.RayBatch` with these elements:
+
+        - **p**, **d**, **dst**, **nrml** - [rays, surfaces] arrays of the 
+          ray segment data for each interface in **path**
+        - **op** - [rays] optical path wrt equally inclined chords to the
+          optical axis
+        - **wvl** - wavelength (in nm) that the rays were traced in
+        - **err_code** - [rays] :mod:`~.traceerror` failure code, OK if success
+        - **err_surf** - [rays] failure surface index, -1 if success
+    """
+    instr = kwargs.pop('instrument', None)
+    if instr is not None and instr is not rt_instr.active:
+        with rt_instr.instrument_trace(instr):
+            return trace_batch_raw(path, pts0, dirs0, wvl, eps=eps,
+                                   check_apertures=check_apertures,
+                                   intersect_obj=intersect_obj,
+                                   filter_out_phantoms=filter_out_phantoms,
+                                   **kwargs)
+    instr = rt_instr.active
+
+    path = list(path)
+    pts0 = np.asarray(pts0, dtype=float).reshape(-1, 3)
+    dirs0 = np.asarray(dirs0, dtype=float).reshape(-1, 3)
+    num_rays = len(pts0)
+    num_srfs = len(path)
+    if instr is not None:
+        instr.start_ray(num_rays)
+
+    p = np.full((num_rays, num_srfs, 3), np.nan)
+    d = np.full((num_rays, num_srfs, 3), np.nan)
+    dst = np.full((num_rays, num_srfs), np.nan)
+    nrml = np.full((num_rays, num_srfs, 3), np.nan)
+    opl = np.zeros(num_rays)
+    op_delta = np.zeros(num_rays)
+    err_code = np.full(num_rays, terr.OK)
+    err_surf = np.full(num_rays, -1)
+
+    first_surf = kwargs.get('first_surf', 0)
+    last_surf = kwargs.get('last_surf', None)
+    pt_inside_fuzz = kwargs.get('pt_inside_fuzz', None)
+    fuzz = {} if pt_inside_fuzz is None else {'fuzz': pt_inside_fuzz}
+
+    def in_gap_range(gap_indx):
+        if first_surf == last_surf:
+            return False
+        if gap_indx < first_surf:
+            return False
+        if last_surf is None:
+            return True
+        else:
+            return gap_indx < last_surf
+
+    def in_surface_range(s):
+        if s < first_surf:
+            return False
+        if last_surf is None:
+            return True
+        else:
+            return s <= last_surf
+
+    def fail(rays, code, surf):
+        err_code[rays] = code
+        err_surf[rays] = surf
+
+    # trace object surface
+    obj = path[0]
+    live = np.arange(num_rays)
+    if intersect_obj:
+        srf_obj = obj[mc.Intfc]
+        _, before_pt, missed = srf_obj.intersect_batch(pts0, dirs0, 
+                                                       z_dir=obj[mc.Zdir])
+        if missed.any():
+            fail(live[missed], terr.MISSED_SURFACE, 0)
+            live = live[~missed]
+            before_pt = before_pt[~missed]
+        before_normal = srf_obj.normal_batch(before_pt)
+    else:
+        before_pt = pts0
+        before_normal = np.tile(np.array([0., 0., 1.]), (num_rays, 1))
+    before_dir = dirs0[live]
+
+    # loop of remaining surfaces in path
+    for surf in range(1, num_srfs):
+        if len(live) == 0:
+            break
+        before = path[surf-1]
+        after = path[surf]
+        z_dir_before = before[mc.Zdir]
+
+        # transform ray data from previous ifc coords to current one
+        rt, t = before[mc.Tfrm]
+        b4_pt = (before_pt - t).dot(rt.T)
+        b4_dir = before_dir.dot(rt.T)
+
+        pp_dst = -np.einsum('ij,ij->i', b4_pt, b4_dir)
+        pp_pt_before = b4_pt + pp_dst[:, np.newaxis]*b4_dir
+
+        ifc = after[mc.Intfc]
+        interact_mode = ifc.interact_mode
+
+        # intersect rays with profile
+        if instr is None:
+            pp_dst_intrsct, inc_pt, missed = ifc.intersect_batch(
+                pp_pt_before, b4_dir, eps=eps, z_dir=z_dir_before)
+        else:
+            pp_dst_intrsct, inc_pt, missed = instr.intersect_batch(
+                surf, ifc, pp_pt_before, b4_dir, eps, z_dir_before)
+        dst_b4 = pp_dst + pp_dst_intrsct
+
+        # add *previous* intersection point, direction, etc., to rays
+        p[live, surf-1] = before_pt
+        d[live, surf-1] = before_dir
+        dst[live, surf-1] = np.where(missed, pp_dst, dst_b4)
+        nrml[live, surf-1] = before_normal
+
+        if missed.any():
+            fail(live[missed], terr.MISSED_SURFACE, surf)
+            ok = ~missed
+            live, b4_dir, dst_b4 = live[ok], b4_dir[ok], dst_b4[ok]
+            inc_pt, before_dir = inc_pt[ok], before_dir[ok]
+
+        if in_gap_range(surf-1):
+            opl[live] += before[mc.Indx] * dst_b4
+
+        normal = ifc.normal_batch(inc_pt)
+
+        failed = np.zeros(len(live), dtype=bool)
+        if (check_apertures and 
+            in_surface_range(surf) and 
+            not interact_mode == 'phantom'):
+            if instr is None:
+                inside = ifc.points_inside(inc_pt[:, 0], inc_pt[:, 1],
+                                           **fuzz)
+            else:
+                inside = instr.points_inside(ifc, inc_pt[:, 0],
+                                             inc_pt[:, 1], **fuzz)
+            blocked = ~inside
+            if blocked.any():
+                fail(live[blocked], terr.BLOCKED, surf)
+                failed |= blocked
+
+        # if present, use the phase element to calculate after_dir
+        if hasattr(ifc, 'phase_element'):
+            ifc_cntxt = (z_dir_before, wvl, 
+                         before[mc.Indx], after[mc.Indx],
+                         interact_mode)
+            if instr is None:
+                after_dir, phs, evanescent = ifc.phase_batch(
+                    inc_pt, b4_dir, normal, ifc_cntxt)
+            else:
+                after_dir, phs, evanescent = instr.phase(
+                    ifc.phase_batch, inc_pt, b4_dir, normal, ifc_cntxt)
+            evanescent &= ~failed
+            if evanescent.any():
+                fail(live[evanescent], terr.EVANESCENT, surf)
+                failed |= evanescent
+            op_delta[live[~failed]] += phs[~failed]
+        else:  # refract or reflect ray at interface
+            if interact_mode == 'reflect':
+                after_dir = reflect_batch(b4_dir, normal)
+            elif interact_mode == 'transmit':
+                after_dir, tir = bend_batch(b4_dir, normal, 
+                                            before[mc.Indx], after[mc.Indx])
+                tir &= ~failed
+                if tir.any():
+                    fail(live[tir], terr.TIR, surf)
+                    failed |= tir
+            else:  # no action, input becomes output
+                after_dir = b4_dir
+
+        if failed.any():
+            fl = live[failed]
+            p[fl, surf] = inc_pt[failed]
+            d[fl, surf] = before_dir[failed]
+            dst[fl, surf] = 0.0
+            nrml[fl, surf] = normal[failed]
+            ok = ~failed
+            live = live[ok]
+            inc_pt, normal, after_dir = inc_pt[ok], normal[ok], after_dir[ok]
+
+        before_pt = inc_pt
+        before_normal = normal
+        before_dir = after_dir
+
+    else:
+        # add the final interface data to the surviving rays
+        p[live, -1] = before_pt
+        d[live, -1] = before_dir
+        dst[live, -1] = 0.0
+        nrml[live, -1] = before_normal
+
+    op = opl.copy()
+    ok = err_code == terr.OK
+    op[ok] += op_delta[ok]
+
+    if filter_out_phantoms:
+        b4_imode = obj[mc.Intfc].interact_mode if intersect_obj else 'dummy'
+        imodes = [b4_imode] + [sg[mc.Intfc].interact_mode 
+                               for sg in path[1:-1]]
+        keep = []
+        for k, imode in enumerate(imodes):
+            if imode == 'phantom' and len(keep) > 0:
+                # fold the phantom gap length into the previous segment
+                dst[:, keep[-1]] += np.nan_to_num(dst[:, k])
+            else:
+                keep.append(k)
+        keep.append(num_srfs-1)
+        p, d, dst, nrml = p[:, keep], d[:, keep], dst[:, keep], nrml[:, keep]
+
+    return RayBatch(p, d, dst, nrml, op, wvl, err_code, err_surf)
+
+
 def calc_optical_path(ray, path):
     """ computes equally inclined chords and path info for ray
 
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the batch ray tracer against the single ray tracer"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+import rayoptics.optical.model_constants as mc
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import traceerror as terr
+from rayoptics.raytr.raytrace import trace, trace_batch
+from rayoptics.raytr.analyses import RayGrid, RayList, trace_ray_grid
+from rayoptics.raytr.raybundle import RayBundle
+from rayoptics.oprops import doe
+
+
+def trace_rays_one_by_one(sm, pts0, dirs0, wvl, **kwargs):
+    """ trace rays with :func:`trace`, returning the ray pkg and error code """
+    results = []
+    for pt0, dir0 in zip(pts0, dirs0):
+        try:
+            ray_pkg = trace(sm, pt0, dir0, wvl, **kwargs)
+            code, surf = terr.OK, -1
+        except terr.TraceError as ray_error:
+            ray_pkg = ray_error.ray_pkg
+            code = terr.error_code[type(ray_error)]
+            surf = ray_error.surf
+        results.append((ray_pkg, code, surf))
+    return results
+
+
+class BatchTraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_traces(self, filename, pupil_max=1.0, rtol=1e-12, **kwargs):
+        opm = open_model(self.root_pth/filename)
+        sm = opm['seq_model']
+        osp = opm['optical_spec']
+        wvl = osp['wvls'].central_wvl
+        fld = osp['fov'].fields[-1]
+
+        pupils = [(px, py)
+                  for py in np.linspace(-pupil_max, pupil_max, 9)
+                  for px in np.linspace(-pupil_max, pupil_max, 9)]
+        starts = [osp.ray_start_from_osp(pupil, fld, 'rel pupil')
+                  for pupil in pupils]
+        pts0 = np.array([s[0] for s in starts])
+        dirs0 = np.array([s[1] for s in starts])
+
+        def assert_close(actual, desired):
+            # the tolerance is relative to the magnitude of the coordinates
+            scale = max(1., np.max(np.abs(desired)))
+            npt.assert_allclose(actual, desired, rtol=0, atol=rtol*scale)
+
+        # The points on the object surface agree to roundoff.
+        batch = trace_batch(sm, pts0, dirs0, wvl, **kwargs)
+        truth = trace_rays_one_by_one(sm, pts0, dirs0, wvl, **kwargs)
+        for i, ((ray, op, wl), code, surf) in enumerate(truth):
+            assert_close(batch.p[i, 0], ray[0][0])
+
+        # The object surface point is ill-conditioned as a start for the
+        #  remainder of the trace: the test lenses have an object ~1e10
+        #  from the lens, and the transfer to the first interface cancels
+        #  digits at that scale, differently in the batch and single ray
+        #  tracers. Start the rays instead at the point on each ray closest
+        #  to the first interface, without intersecting the object surface.
+        rt, t = next(sm.path(wvl))[mc.Tfrm]
+        pp_dst = -np.einsum('ij,ij->i', pts0 - t, dirs0)
+        pts0 = pts0 + pp_dst[:, np.newaxis]*dirs0
+        kwargs['intersect_obj'] = False
+        batch = trace_batch(sm, pts0, dirs0, wvl, **kwargs)
+        truth = trace_rays_one_by_one(sm, pts0, dirs0, wvl, **kwargs)
+
+        for i, ((ray, op, wl), code, surf) in enumerate(truth):
+            self.assertEqual(batch.err_code[i], code)
+            self.assertEqual(batch.err_surf[i], surf)
+            assert_close(batch.op[i], op)
+            for k, seg in enumerate(ray):
+                assert_close(batch.p[i, k], seg[0])
+                assert_close(batch.d[i, k], seg[1])
+                assert_close(batch.dst[i, k], seg[2])
+                assert_close(batch.nrml[i, k], seg[3])
+            # the remainder of a failed ray is filled with nan
+            self.assertTrue(np.isnan(batch.dst[i, len(ray):]).all())
+        return batch
+
+    def test_dbgauss(self):
+        batch = self.compare_traces('codev/tests/ag_dblgauss.seq')
+        self.assertTrue((batch.err_code == terr.OK).all())
+
+    def test_dbgauss_clipped(self):
+        batch = self.compare_traces('codev/tests/ag_dblgauss.seq',
+                                    pupil_max=1.5, check_apertures=True)
+        self.assertTrue((batch.err_code == terr.BLOCKED).any())
+
+        ray_bundle = RayBundle(np.zeros((len(batch.op), 2)), batch)
+        blocked_at = ray_bundle.blocked_at
+        npt.assert_array_equal(blocked_at >= 0, ray_bundle.blocked)
+        npt.assert_array_equal(blocked_at[ray_bundle.blocked],
+                               batch.err_surf[ray_bundle.blocked])
+        # the rays that pass all of the apertures reach the image
+        self.assertTrue(np.isfinite(batch.p[ray_bundle.valid, -1]).all())
+        self.assertAlmostEqual(ray_bundle.transmission(),
+                               np.count_nonzero(ray_bundle.valid)/81)
+
+    def test_cell_phone_asphere(self):
+        self.compare_traces('optical/tests/cell_phone_camera.roa')
+
+    def test_mangin_reflect(self):
+        self.compare_traces('codev/tests/mangin.seq')
+
+    def test_tilt_decenter(self):
+        self.compare_traces('codev/tests/dec_rev_tilt_test.seq')
+
+    def test_doe(self):
+        self.compare_traces('codev/tests/CODV_65988.seq')
+
+    def test_doe_phase_batch(self):
+        rng = np.random.default_rng(1)
+        pts = np.column_stack((rng.uniform(-5., 5., (50, 2)), np.zeros(50)))
+        dirs = np.column_stack((rng.uniform(-.3, .3, (50, 2)), np.ones(50)))
+        dirs /= np.linalg.norm(dirs, axis=1)[:, np.newaxis]
+        nrmls = np.tile([0., 0., -1.], (50, 1))
+        elements = [
+            doe.DiffractionGrating(grating_lpmm=300.,
+                                   grating_normal=np.array([0., 1., 0.])),
+            doe.DiffractiveElement(coefficients=[-1e-3, 2e-6, -1e-8],
+                                   phase_fct=doe.radial_phase_fct),
+            doe.HolographicElement(ref_pt=np.array([0., 0., -100.]),
+                                   obj_pt=np.array([1., 0., 50.]),
+                                   obj_virtual=True),
+            ]
+        for element in elements:
+            for ifc_cntxt in [(1, 486.1, 1.5, 1.0, 'transmit'),
+                              (-1, 656.3, 1.0, 1.0, 'reflect')]:
+                out_dirs, dW, evanescent = element.phase_batch(
+                    pts, dirs, nrmls, ifc_cntxt)
+                self.assertFalse(evanescent.any())
+                # the scalar and batch versions give identical results
+                for i in range(len(pts)):
+                    out_dir, dWi = element.phase(pts[i], dirs[i], nrmls[i],
+                                                 ifc_cntxt)
+                    npt.assert_array_equal(out_dir, out_dirs[i])
+                    self.assertEqual(dWi, dW[i])
+
+    def test_ray_grid_bundle(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        ray_grid = RayGrid(opm, f=1, num_rays=9)
+        grid = ray_grid.grid_pkg[0]
+        self.assertIsInstance(grid, RayBundle)
+        self.assertEqual(grid.shape, (9, 9))
+
+        # the list based trace is used if an output_filter is specified
+        list_grid = RayGrid(opm, f=1, num_rays=9, 
+                            output_filter=lambda ray_pkg: ray_pkg)
+        for row, list_row in zip(grid, list_grid.grid_pkg[0]):
+            for (x, y, ray_pkg), (lx, ly, list_pkg) in zip(row, list_row):
+                self.assertAlmostEqual(x, lx, places=14)
+                self.assertAlmostEqual(y, ly, places=14)
+                self.assertEqual(ray_pkg is None, list_pkg is None)
+                if ray_pkg is not None:
+                    npt.assert_allclose(ray_pkg.ray[-1].p, list_pkg[0][-1][0],
+                                        rtol=0, atol=1e-6)
+        npt.assert_allclose(ray_grid.grid, list_grid.grid, rtol=0, atol=1e-4)
+
+    def test_ray_bundle_indexing(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        grid = RayGrid(opm, f=1, num_rays=5).grid_pkg[0]
+        rows = list(grid)
+
+        def pupils(row):
+            return [(x, y) for x, y, ray_pkg in row]
+
+        self.assertEqual(pupils(grid[-1]), pupils(rows[4]))
+        self.assertEqual(pupils(grid[-5]), pupils(rows[0]))
+        self.assertEqual([pupils(r) for r in grid[1:4]],
+                         [pupils(r) for r in rows[1:4]])
+        self.assertEqual([pupils(r) for r in grid[::-2]],
+                         [pupils(r) for r in rows[::-2]])
+        self.assertEqual(grid[5:], [])
+        with self.assertRaises(IndexError):
+            grid[5]
+        with self.assertRaises(IndexError):
+            grid[-6]
+        with self.assertRaises(TypeError):
+            grid[1, 2]
+        with self.assertRaises(TypeError):
+            grid[1.]
+
+        ray_list = grid.select(grid.valid)
+        x, y, ray_pkg = ray_list[-1]
+        npt.assert_array_equal((x, y), ray_list.pupil[-1])
+        npt.assert_array_equal(ray_pkg.ray[-1].p, ray_list.p[-1, -1])
+
+    def test_real_aim(self):
+        opm = open_model(self.root_pth/'optical/tests/cell_phone_camera.roa')
+        osp = opm['optical_spec']
+        fld = osp['fov'].fields[-1]
+        wvl = osp['wvls'].central_wvl
+        stop = opm['seq_model'].stop_surface
+        stop_radius = opm['ar']['parax_data'].ax_ray[stop][mc.ht]
+
+        grid_def = [np.array([-1., -1.]), np.array([1., 1.]), 9]
+        grid = trace_ray_grid(opm, grid_def, fld, wvl, 0., aim='real')
+        self.assertEqual(len(grid.aim_converged), 81)
+        self.assertTrue(grid.aim_converged.all())
+        # the rays hit the stop surface at the scaled pupil coordinates
+        npt.assert_allclose(grid.p[:, stop, :2], grid.pupil*stop_radius,
+                            rtol=0, atol=1e-5*abs(stop_radius))
+
+        # the list based trace gives the same result
+        ray_list = RayList(opm, f=fld, num_rays=5, aim='real')
+        list_list = RayList(opm, f=fld, num_rays=5, aim='real',
+                            output_filter=lambda ray_pkg: ray_pkg)
+        npt.assert_allclose(ray_list.ray_abr, list_list.ray_abr,
+                            rtol=0, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the chief ray and reference sphere cache"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import trace
+from rayoptics.raytr.waveabr import calculate_reference_sphere
+
+
+class ChiefRayCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_cache(self):
+        opm = self.opm
+        osp = opm['optical_spec']
+        fld = osp['fov'].fields[-1]
+        wvls = osp['wvls'].wavelengths
+
+        rs0, cr0 = trace.setup_pupil_coords(opm, fld, wvls[0], 0.)
+        rs1, cr1 = trace.setup_pupil_coords(opm, fld, wvls[0], 0.)
+        self.assertIs(cr0, cr1)
+        self.assertIs(rs0, rs1)
+        # the chief ray is reused for a different focus
+        rs2, cr2 = trace.setup_pupil_coords(opm, fld, wvls[0], 0.1)
+        self.assertIs(cr0, cr2)
+        self.assertIsNot(rs0, rs2)
+        truth = calculate_reference_sphere(opm, fld, wvls[0], 0.1, cr0)
+        npt.assert_allclose(rs2[0], truth[0], rtol=0, atol=1e-12)
+        self.assertAlmostEqual(rs2[2], truth[2], places=12)
+
+        for wvl in wvls:
+            rs, cr = trace.setup_pupil_coords(opm, fld, wvl, 0.)
+            self.assertEqual(cr[0].wvl, wvl)
+        cache = opm.chief_ray_cache
+        fld_key = cache.field_key(opm, fld)
+        for wvl in wvls:
+            self.assertIn((fld_key, wvl), cache.chief_rays)
+
+        # update_model invalidates the cache and aims each field once
+        aim_chief_ray = trace.aim_chief_ray
+        num_aims = [0]
+
+        def counting_aim_chief_ray(*args, **kwargs):
+            num_aims[0] += 1
+            return aim_chief_ray(*args, **kwargs)
+
+        trace.aim_chief_ray = counting_aim_chief_ray
+        try:
+            revision = opm.revision
+            opm.update_model()
+            self.assertEqual(opm.revision, revision + 1)
+            for fld in osp['fov'].fields:
+                fld.aim_info = None
+                for wvl in wvls:
+                    rs, cr = trace.setup_pupil_coords(opm, fld, wvl, 0.)
+        finally:
+            trace.aim_chief_ray = aim_chief_ray
+        self.assertIsNot(cr, cr0)
+        self.assertEqual(num_aims[0], len(osp['fov'].fields))
+        self.assertEqual(len(cache.chief_rays),
+                         len(wvls)*len(osp['fov'].fields))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the ray trace instrumentation"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.elem import profiles
+from rayoptics.raytr import analyses
+from rayoptics.raytr import trace
+from rayoptics.raytr import instrument as rt_instr
+from rayoptics.raytr.instrument import TraceInstrument, instrument_trace
+
+
+class InstrumentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'optical/tests/cell_phone_camera.roa')
+
+    def test_instrument_trace(self):
+        opm = self.opm
+        osp = opm['optical_spec']
+        fld = osp['fov'].fields[-1]
+        wvl = osp['wvls'].central_wvl
+        ray, op, wl = trace.trace_base(opm, [0., 1.], fld, wvl)
+
+        with instrument_trace() as instr:
+            for i in range(3):
+                ray_i, op_i, wl = trace.trace_base(opm, [0., 1.], fld, wvl,
+                                                   check_apertures=True)
+        self.assertIsNone(rt_instr.active)
+        self.assertEqual(instr.num_rays, 3)
+        npt.assert_allclose(ray_i[-1][0], ray[-1][0], rtol=0, atol=1e-12)
+
+        num_ifcs = len(opm['seq_model'].ifcs) - 1
+        self.assertEqual(len(instr.by_surface), num_ifcs)
+        for stats in instr.by_surface.values():
+            self.assertEqual(stats.calls, 3)
+            self.assertEqual(stats.not_converged, 0)
+        asphere = instr.by_profile['RadialPolynomial']
+        self.assertGreater(asphere.iterations, 0)
+        self.assertEqual(instr.by_profile['Spherical'].iterations, 0)
+        df = instr.as_dataframe(by='profile')
+        self.assertEqual(df.loc['RadialPolynomial', 'calls'], asphere.calls)
+
+        # an instrument for a single call
+        instr1 = TraceInstrument()
+        trace.trace_base(opm, [0., 1.], fld, wvl, instrument=instr1)
+        self.assertEqual(instr1.num_rays, 1)
+        self.assertEqual(instr.num_rays, 3)
+
+    def test_batch_trace(self):
+        opm = self.opm
+        osp = opm['optical_spec']
+        fld = osp['fov'].fields[-1]
+        wvl = osp['wvls'].central_wvl
+        with instrument_trace() as instr:
+            analyses.RayFan(opm, f=fld, wl=wvl, num_rays=21)
+        self.assertGreaterEqual(instr.num_rays, 21)
+        asphere = instr.by_profile['RadialPolynomial']
+        self.assertGreaterEqual(asphere.calls, 21)
+        self.assertGreater(asphere.iterations, 0)
+
+        with instrument_trace() as instr:
+            analyses.RayGrid(opm, f=fld, wl=wvl, num_rays=21)
+        self.assertGreaterEqual(instr.num_rays, 21*21)
+        # the corners of the grid are outside the pupil
+        blocked = sum(s.blocked for s in instr.by_surface.values())
+        self.assertGreater(blocked, 0)
+        stats = instr.by_surface[2]
+        self.assertEqual(stats.calls + blocked, 21*21)
+        self.assertGreater(len(instr.table().splitlines()), 2)
+
+    def test_not_converged(self):
+        prf = profiles.EvenPolynomial(c=0.02, coefs=[0., 1e-5])
+        p0 = np.array([0., 1., -1.])
+        d0 = np.array([0., 0., 1.])
+        with instrument_trace() as instr:
+            prf.intersect(p0, d0, 1e-12, 1.)
+            prf.intersect(p0, d0, -1., 1.)
+        stats = instr.by_profile['EvenPolynomial']
+        self.assertEqual(stats.not_converged, 1)
+        self.assertEqual(stats.max_iterations, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the diffraction and geometric MTF calculations"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+
+
+def circular_pupil(ndim):
+    x = np.linspace(-1., 1., ndim)
+    r2 = x[:, np.newaxis]**2 + x**2
+    return np.where(r2 <= 1., 0., np.nan)
+
+
+class MTFTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.enterContext(warnings.catch_warnings())
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_diffraction_limited(self):
+        ndim = 64
+        flat = circular_pupil(ndim)
+        mtf_s, mtf_t = analyses.calc_mtf_autocorr(flat)
+        v = np.minimum(np.arange(ndim+1)/(ndim-1), 1.)
+        truth = 2/np.pi*(np.arccos(v) - v*np.sqrt(1 - v**2))
+        npt.assert_allclose(mtf_s, truth, rtol=0, atol=5e-3)
+        npt.assert_allclose(mtf_t, mtf_s, rtol=0, atol=1e-12)
+
+    def test_psf_vs_autocorr(self):
+        ray_grid = analyses.RayGrid(self.opm, f=2, num_rays=16)
+        wavefront = ray_grid.grid[2]
+        psf_mtf = analyses.calc_mtf_from_psf(wavefront, 16, 32)
+        ac_mtf = analyses.calc_mtf_autocorr(wavefront)
+        npt.assert_allclose(psf_mtf, ac_mtf, rtol=0, atol=1e-10)
+
+    def test_geometric_mtf(self):
+        rng = np.random.default_rng(1)
+        sigma = 0.01
+        spots = rng.normal(scale=sigma, size=(2, 100000))
+        freqs = np.linspace(0., 50., 11)
+        mtf_s, mtf_t = analyses.calc_geometric_mtf(spots, freqs)
+        truth = np.exp(-2*(np.pi*sigma*freqs)**2)
+        npt.assert_allclose(mtf_s, truth, rtol=0, atol=0.01)
+        npt.assert_allclose(mtf_t, truth, rtol=0, atol=0.01)
+
+    def test_through_focus(self):
+        freqs = np.linspace(0., 400., 9)
+        for method in ('psf', 'autocorr', 'geometric'):
+            mtf = analyses.MTF(self.opm, f=1, num_rays=16, method=method,
+                               freqs=freqs)
+            self.assertAlmostEqual(mtf.mtf_s[0], 1.0)
+            mtf.foc = 0.05
+            mtf.update_data(build='update')
+            refocused = analyses.MTF(self.opm, f=1, num_rays=16, foc=0.05,
+                                     method=method, freqs=freqs)
+            npt.assert_allclose(mtf.mtf_s, refocused.mtf_s, rtol=0, atol=1e-4)
+            npt.assert_allclose(mtf.mtf_t, refocused.mtf_t, rtol=0, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test evaluation of field/wavelength jobs in a process pool"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+import rayoptics.optical.model_constants as mc
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr.parallel import (AnalysisExecutor, eval_fields_wvls,
+                                      trace_ray_grid_job)
+
+
+class ParallelAnalysisTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_eval_fields_wvls(self):
+        opm = self.opm
+        serial = eval_fields_wvls(opm, analyses.eval_wavefront, num_rays=9)
+        grid_def = [np.array([-1., -1.]), np.array([1., 1.]), 5]
+        with AnalysisExecutor(opm, max_workers=2) as executor:
+            parallel = eval_fields_wvls(opm, analyses.eval_wavefront,
+                                        executor=executor, num_rays=9)
+            grids = eval_fields_wvls(opm, trace_ray_grid_job, grid_def,
+                                     executor=executor, wvls=[587.6])
+
+        num_flds = len(opm['osp']['fov'].fields)
+        num_wvls = len(opm['osp']['wvls'].wavelengths)
+        self.assertEqual(len(parallel), num_flds)
+        self.assertEqual(len(parallel[0]), num_wvls)
+        for s_fld, p_fld in zip(serial, parallel):
+            for s_opd, p_opd in zip(s_fld, p_fld):
+                npt.assert_allclose(p_opd, s_opd, rtol=0, atol=1e-10)
+        self.assertEqual(grids[0][0].shape, (5, 5))
+
+    def test_analysis_executor(self):
+        opm = self.opm
+        sm = opm['seq_model']
+        fld = opm['osp']['fov'].fields[1]
+
+        def spot(p, wi, ray_pkg, fld, wvl, foc):
+            if ray_pkg is not None:
+                return ray_pkg[mc.ray][-1][mc.p][:2] - fld.ref_sphere[0][:2]
+
+        serial = [analyses.RayGrid(opm, f=1, num_rays=9).grid,
+                  analyses.RayFan(opm, f=1, num_rays=9).fan,
+                  analyses.RayList(opm, f=1, num_rays=9).ray_abr]
+        serial_spots, rc = sm.trace_grid(spot, 1, num_rays=5, form='list',
+                                         append_if_none=False)
+        with AnalysisExecutor(opm, max_workers=2) as executor:
+            parallel = [
+                analyses.RayGrid(opm, f=1, num_rays=9,
+                                 executor=executor).grid,
+                analyses.RayFan(opm, f=fld, num_rays=9,
+                                executor=executor).fan,
+                analyses.RayList(opm, f=1, num_rays=9,
+                                 executor=executor).ray_abr]
+            spots, rc = sm.trace_grid(spot, 1, num_rays=5, form='list',
+                                      append_if_none=False, executor=executor)
+
+            # a field that isn't in the optical spec can't be sent
+            other_fld = analyses.Field(y=1.)
+            with self.assertRaises(ValueError):
+                analyses.RayGrid(opm, f=other_fld, num_rays=9,
+                                 executor=executor)
+
+        npt.assert_allclose(parallel[0], serial[0], rtol=0, atol=1e-10)
+        for data_type in range(3):
+            npt.assert_allclose(
+                analyses.select_plot_data(parallel[1], 1, data_type),
+                analyses.select_plot_data(serial[1], 1, data_type),
+                rtol=0, atol=1e-10)
+        npt.assert_allclose(parallel[2], serial[2], rtol=0, atol=1e-10)
+        self.assertEqual(len(spots), len(serial_spots))
+        for s_spot, p_spot in zip(serial_spots, spots):
+            npt.assert_allclose(p_spot, s_spot, rtol=0, atol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
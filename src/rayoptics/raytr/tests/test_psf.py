@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the FFT based PSF calculation"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+
+
+def direct_psf(wavefront, maxdim):
+    """ PSF by direct evaluation of the Fourier sum, for small grids. """
+    W = analyses.embed_wavefront(wavefront, len(wavefront), maxdim,
+                                 fill_value=np.nan)
+    pupil = np.where(np.isnan(W), 0., np.exp(1j*2*np.pi*np.nan_to_num(W)))
+    k = np.arange(maxdim) - maxdim//2
+    kernel = np.exp(-2j*np.pi*np.outer(k, k)/maxdim)
+    AP = np.abs(kernel @ pupil @ kernel.T)**2
+    return AP/AP.max()
+
+
+class PSFTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        root_pth = Path(ro.__file__).resolve().parent
+        self.opm = open_model(root_pth/'codev/tests/ag_dblgauss.seq')
+
+    def test_calc_psf(self):
+        ray_grid = analyses.RayGrid(self.opm, f=1, num_rays=16)
+        wavefront = ray_grid.grid[2]
+        AP = analyses.calc_psf(wavefront, 16, 32)
+        npt.assert_allclose(AP, direct_psf(wavefront, 32), rtol=0, atol=1e-12)
+
+        # a diffraction limited wavefront, with threaded FFTs
+        flat = np.where(np.isnan(wavefront), np.nan, 0.)
+        AP = analyses.calc_psf(flat, 16, 32, workers=2)
+        npt.assert_allclose(AP, direct_psf(flat, 32), rtol=0, atol=1e-12)
+
+    def test_polychromatic_psf(self):
+        grids, wts = analyses.psf_ray_grids(self.opm, f=0, num_rays=16)
+        wavefronts = [g.grid[2] for g in grids]
+        ndims = [g.num_rays for g in grids]
+        AP = analyses.calc_polychromatic_psf(wavefronts, ndims, 64, wts)
+        self.assertEqual(AP.shape, (64, 64))
+        self.assertAlmostEqual(AP.max(), 1.0)
+        # a single wavelength reproduces the monochromatic PSF
+        AP1 = analyses.calc_polychromatic_psf(wavefronts[:1], ndims[:1],
+                                              64, [1.])
+        npt.assert_allclose(AP1, analyses.calc_psf(wavefronts[0], ndims[0], 64),
+                            rtol=0, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the relative illumination analysis"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr import trace
+
+
+class RelativeIlluminationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def test_dbl_gauss(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        ri = analyses.RelativeIllumination(opm, num_flds=11)
+        self.assertAlmostEqual(ri.ri[0], 1.0)
+        self.assertTrue(np.all(np.diff(ri.ri) < 0.))
+        self.assertTrue(np.all((ri.transmission > 0.) &
+                               (ri.transmission <= 1.)))
+        # the chief ray aim points are cached for reuse
+        self.assertGreaterEqual(len(opm.chief_ray_cache.aim_pts), 11)
+
+        # splitting the fields into several traces gives the same results
+        osp = opm['osp']
+        psa, area = analyses.calc_relative_illumination(
+            opm, ri.flds, osp['wvls'].central_wvl, max_rays=3000)
+        npt.assert_allclose(psa, ri.proj_solid_angle, rtol=1e-12)
+
+    def test_on_axis_solid_angle(self):
+        opm = open_model(self.root_pth/'codev/tests/landscape_lens.seq')
+        ri = analyses.RelativeIllumination(opm, num_flds=3, num_rays=64)
+
+        # compare with the solid angle of the real marginal ray cone
+        osp = opm['osp']
+        fld, wvl, foc = osp.lookup_fld_wvl_focus(0)
+        ray_pkg = trace.trace_base(opm, [0., 1.], fld, wvl)
+        sin_u = np.hypot(*ray_pkg[0][-1][1][:2])
+        npt.assert_allclose(ri.proj_solid_angle[0], np.pi*sin_u**2,
+                            rtol=1e-2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the through focus analysis against retracing at each focus"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr import trace
+from rayoptics.raytr import waveabr
+
+
+class ThroughFocusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def check_through_focus(self, opm, f):
+        tf = analyses.ThroughFocus(opm, f=f, num_foc=5, num_rays=15)
+        fld, wvl = tf.fld, tf.wvl
+        fod = opm['analysis_results']['parax_data'].fod
+        ray_bundle = tf.tf_pkg[0]
+        for i, foc in enumerate(tf.foci):
+            ref_sphere, cr_pkg = trace.setup_pupil_coords(opm, fld, wvl, foc)
+            opd = np.array([waveabr.wave_abr_full_calc(
+                                fod, fld, wvl, foc, ray_bundle.ray_pkg(j),
+                                cr_pkg, ref_sphere)
+                            for j in range(len(ray_bundle))])
+            opd /= opm.nm_to_sys_units(wvl)
+            npt.assert_allclose(tf.wfe_rms[i], np.std(opd), rtol=1e-8)
+
+            ray_list = analyses.RayList(opm, f=f, foc=foc, num_rays=15)
+            t_abr = ray_list.ray_abr.T
+            t_abr = t_abr[np.all(np.isfinite(t_abr), axis=1)]
+            spot_rms = np.sqrt(np.mean(np.sum(
+                (t_abr - t_abr.mean(axis=0))**2, axis=1)))
+            npt.assert_allclose(tf.spot_rms[i], spot_rms, rtol=1e-8)
+
+        # the best focus is between the focus samples and is a minimum
+        best_foc = tf.best_focus('wfe_rms')
+        self.assertTrue(tf.foci[0] <= best_foc <= tf.foci[-1])
+        wfe_best = tf.eval_focus([best_foc])[1][0]
+        self.assertLessEqual(wfe_best, np.min(tf.wfe_rms) + 1e-12)
+        return tf
+
+    def test_dbl_gauss(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        self.check_through_focus(opm, 0)
+        tf = self.check_through_focus(opm, 2)
+
+        # refocusing reuses the traced rays
+        ray_bundle = tf.tf_pkg[0]
+        tf.num_foc = 11
+        tf.update_data(build='update')
+        self.assertIs(tf.tf_pkg[0], ray_bundle)
+        self.assertEqual(len(tf.ee_radius), 11)
+
+    def test_landscape_lens(self):
+        opm = open_model(self.root_pth/'codev/tests/landscape_lens.seq')
+        self.check_through_focus(opm, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
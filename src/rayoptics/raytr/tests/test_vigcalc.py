@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the batch vignetting calculation against the per field version"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import vigcalc
+
+
+def vig_factors(opm):
+    return [[fld.vux, fld.vlx, fld.vuy, fld.vly]
+            for fld in opm['osp']['fov'].fields]
+
+
+class VignettingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def check_set_vig(self, opm, use_bisection):
+        osp = opm['osp']
+        for fi in range(len(osp['fov'].fields)):
+            fld, wvl, foc = osp.lookup_fld_wvl_focus(fi)
+            vigcalc.calc_vignetting_for_field(opm, fld, wvl,
+                                              use_bisection=use_bisection)
+        vig_serial = vig_factors(opm)
+
+        vigcalc.set_vig(opm, use_bisection=use_bisection)
+        npt.assert_allclose(vig_factors(opm), vig_serial, atol=1e-5)
+
+    def test_cell_phone(self):
+        opm = open_model(self.root_pth/'optical/tests/cell_phone_camera.roa')
+        self.check_set_vig(opm, use_bisection=False)
+        self.check_set_vig(opm, use_bisection=True)
+
+    def test_dbl_gauss(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        self.check_set_vig(opm, use_bisection=False)
+        self.check_set_vig(opm, use_bisection=True)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the batch wavefront aberration calculation against the per ray one"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr import trace
+from rayoptics.raytr import waveabr
+
+
+class WaveAbrBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_opd(self, filename):
+        opm = open_model(self.root_pth/filename)
+        osp = opm['optical_spec']
+        fod = opm['analysis_results']['parax_data'].fod
+        pupils = [(px, py) for px in np.linspace(-1., 1., 9)
+                  for py in np.linspace(-1., 1., 9)]
+        for fi in range(len(osp['fov'].fields)):
+            fld, wvl, foc = osp.lookup_fld_wvl_focus(fi)
+            ref_sphere, cr_pkg = trace.setup_pupil_coords(opm, fld, wvl, foc)
+            rays = analyses.trace_ray_bundle(opm, pupils, fld, wvl, foc)
+            ray_pkgs = [rays.ray_pkg(i) for i in range(len(rays))]
+
+            opd = waveabr.wave_abr_full_calc_batch(fod, rays, cr_pkg,
+                                                   ref_sphere)
+            truth = [waveabr.wave_abr_full_calc(fod, fld, wvl, foc, ray_pkg,
+                                                cr_pkg, ref_sphere)
+                     for ray_pkg in ray_pkgs]
+            npt.assert_allclose(opd, truth, rtol=0, atol=1e-12)
+
+            # refocus using the focus independent data
+            pre_opd_pkg = waveabr.wave_abr_pre_calc_batch(fod, rays, cr_pkg,
+                                                          ref_sphere)
+            foc += 0.05
+            ref_sphere, cr_pkg = trace.setup_pupil_coords(opm, fld, wvl, foc)
+            opd = waveabr.wave_abr_calc_batch(fod, cr_pkg, pre_opd_pkg,
+                                              ref_sphere, rays.p[:, -1])
+            truth = [waveabr.wave_abr_full_calc(fod, fld, wvl, foc, ray_pkg,
+                                                cr_pkg, ref_sphere)
+                     for ray_pkg in ray_pkgs]
+            npt.assert_allclose(opd, truth, rtol=0, atol=1e-12)
+
+    def test_dbl_gauss(self):
+        self.compare_opd('codev/tests/ag_dblgauss.seq')
+
+    def test_decenter(self):
+        # the axial field has an infinite reference sphere
+        self.compare_opd('codev/tests/dec_test.seq')
+
+    def test_mirrors(self):
+        self.compare_opd('codev/tests/threemir.seq')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the Zernike polynomial fitting"""
+
+
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from rayoptics.raytr import analyses
+from rayoptics.raytr import zernike
+
+
+class ZernikeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+        coords = np.linspace(-1., 1., 65)
+        self.x, self.y = np.meshgrid(coords, coords, indexing='ij')
+
+    def test_indices(self):
+        self.assertEqual(zernike.zernike_indices(9, 'fringe'),
+                         [(0, 0), (1, 1), (1, -1), (2, 0), (2, 2), (2, -2),
+                          (3, 1), (3, -1), (4, 0)])
+        self.assertEqual(zernike.fringe_to_nm(16), (6, 0))
+        # the spherical terms of the Fringe set: Z4, Z9, Z16, ... Z37
+        fringe = zernike.zernike_indices(37, 'fringe')
+        self.assertEqual([fringe[j-1] for j in (4, 9, 16, 25, 36, 37)],
+                         [(2, 0), (4, 0), (6, 0), (8, 0), (10, 0), (12, 0)])
+        self.assertEqual(fringe[25:35], [(5, 5), (5, -5), (6, 4), (6, -4),
+                                         (7, 3), (7, -3), (8, 2), (8, -2),
+                                         (9, 1), (9, -1)])
+        with self.assertRaises(ValueError):
+            zernike.fringe_to_nm(38)
+        self.assertEqual(zernike.zernike_indices(11, 'noll'),
+                         [(0, 0), (1, 1), (1, -1), (2, 0), (2, -2), (2, 2),
+                          (3, -1), (3, 1), (3, -3), (3, 3), (4, 0)])
+        with self.assertRaises(ValueError):
+            zernike.zernike_indices(4, 'unknown')
+
+    def test_fit(self):
+        rng = np.random.default_rng(3)
+        for ordering in ('fringe', 'noll'):
+            coefs = rng.normal(size=25)
+            opd = zernike.eval_zernikes(coefs, self.x, self.y, ordering)
+            # rays that didn't trace
+            opd[rng.random(opd.shape) < 0.05] = np.nan
+            opd_grid = np.stack((self.x, self.y, opd), axis=-1)
+
+            zernike.basis_cache.clear()
+            zfit = zernike.ZernikeFit(opd_grid, num_terms=25,
+                                      ordering=ordering)
+            npt.assert_allclose(zfit.coefs, coefs, atol=1e-10)
+            self.assertLess(zfit.fit_rms, 1e-10)
+            recon = zfit.reconstruct()
+            npt.assert_allclose(recon[zfit.mask], opd[zfit.mask], atol=1e-10)
+
+            # refitting the same samples reuses the basis
+            zernike.ZernikeFit(opd_grid, num_terms=25, ordering=ordering)
+            self.assertEqual(zernike.basis_cache.misses, 1)
+            self.assertEqual(zernike.basis_cache.hits, 1)
+
+    def test_term_rms_pv(self):
+        inside = self.x**2 + self.y**2 <= 1.
+        for ordering in ('fringe', 'noll'):
+            for j in (4, 5, 9):
+                coefs = np.zeros(j)
+                coefs[-1] = 0.5
+                opd = zernike.eval_zernikes(coefs, self.x[inside],
+                                            self.y[inside], ordering)
+                npt.assert_allclose(zernike.term_rms(coefs, ordering)[-1],
+                                    np.std(opd), rtol=2e-2)
+                npt.assert_allclose(zernike.term_pv(coefs, ordering)[-1],
+                                    np.ptp(opd), rtol=2e-2)
+
+    def test_wavefront(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        osp = opm['optical_spec']
+        fld, wvl, foc = osp.lookup_fld_wvl_focus(0)
+        opd_grid = analyses.eval_wavefront(opm, fld, wvl, foc, num_rays=32)
+        zfit = zernike.ZernikeFit(opd_grid, num_terms=37)
+        self.assertLess(zfit.fit_rms, 1e-2*zfit.wfe_rms)
+        # the axial field is rotationally symmetric
+        rot_sym = [m == 0 for n, m in zfit.indices]
+        npt.assert_allclose(zfit.coefs[np.logical_not(rot_sym)], 0.,
+                            atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -15,10 +15,9 @@ import math
 import numpy as np
 from numpy.linalg import norm
 from scipy.optimize import newton, fsolve
-import pandas as pd
 
 from . import raytrace as rt
-from . import RayPkg, RaySeg, RayResult
+from . import RayPkg, RaySeg, RayResult, RayBatch, AimResult
 from .waveabr import (wave_abr_full_calc, calculate_reference_sphere, 
                       transfer_to_exit_pupil)
 from .wideangle import find_real_enp, enp_z_coordinate
@@ -30,11 +29,13 @@ logger = logging.getLogger(__name__)
 
 def ray_pkg(ray_pkg):
     """ return a |Series| containing a ray package (RayPkg) """
+    import pandas as pd
     return pd.Series(ray_pkg, index=['ray', 'op', 'wvl'])
 
 
 def ray_df(ray):
     """ return a |DataFrame| containing ray data """
+    import pandas as pd
     r = pd.DataFrame(ray, columns=['inc_pt', 'after_dir',
                                    'after_dst', 'normal'])
     r.index.names = ['intrfc']
@@ -310,6 +311,58 @@ def trace_base(opt_model, pupil, fld, wvl,
     return rt.trace(opt_model['seq_model'], pt0, dir0, wvl, **kwargs)
 
 
+def trace_base_batch(opt_model, pupils, fld, wvl, 
+                     apply_vignetting=True, pupil_type='rel pupil', 
+                     **kwargs) -> RayBatch:
+    """Trace a batch of rays specified by relative aperture and field point.
+
+    This is the batch counterpart to :func:`trace_base`; the rays are traced
+    together using :func:`~.raytrace.trace_batch`.
+
+    Args:
+        opt_model: instance of :class:`~.OpticalModel` to trace
+        pupils: [N, 2] aperture coordinates of the rays
+        fld: instance of :class:`~.Field`, or a list of N fields, one per ray
+        wvl: ray trace wavelength in nm
+        apply_vignetting: if True, apply the `fld` vignetting factors to **pupils**
+        pupil_type: see :func:`trace_base`
+        **kwargs: keyword arguments
+
+    Returns:
+        a :class:`~.RayBatch` with the ray data and failure codes of the rays
+    """
+    osp = opt_model['optical_spec']
+    sm = opt_model['seq_model']
+    pupils = np.asarray(pupils, dtype=float).reshape(-1, 2)
+    num_rays = len(pupils)
+    if isinstance(fld, (list, tuple)):
+        # group the rays by field point
+        fld_rays = {}
+        for i, f in enumerate(fld):
+            fld_rays.setdefault(id(f), (f, []))[1].append(i)
+        fld_rays = list(fld_rays.values())
+    else:
+        fld_rays = [(fld, slice(None))]
+
+    pts0 = np.empty((num_rays, 3))
+    dirs0 = np.empty((num_rays, 3))
+    for f, rays in fld_rays:
+        pupil_coords = pupils[rays]
+        if pupil_type == 'rel pupil' and apply_vignetting:
+            pupil_coords = f.apply_vignetting_batch(pupil_coords)
+        pts0[rays], dirs0[rays] = osp.ray_starts_from_osp(pupil_coords, f, 
+                                                          pupil_type)
+
+    # see trace_base for the handling of wide angle and virtual objects
+    if osp['fov'].is_wide_angle:
+        kwargs['intersect_obj'] = False
+    else:
+        flip = dirs0[:, 2] * sm.z_dir[0] < 0
+        dirs0[flip] = -dirs0[flip]
+
+    return rt.trace_batch(sm, pts0, dirs0, wvl, **kwargs)
+
+
 def iterate_ray(opt_model, ifcx, xy_target, fld, wvl, **kwargs):
     """ iterates a ray to xy_target on interface ifcx, returns aim points on
     the paraxial entrance pupil plane
@@ -415,16 +468,110 @@ def iterate_ray(opt_model, ifcx, xy_target, fld, wvl, **kwargs):
     return start_coords, rr
 
 
+def aim_rays_batch(opt_model, ifcx, xy_targets, fld, wvl, 
+                   start_coords=None, tol=1e-6, max_iter=20, 
+                   **kwargs) -> AimResult:
+    """ aim a batch of rays at the xy_targets on interface ifcx
+
+    This is a vectorized counterpart to :func:`iterate_ray`. A damped Newton
+    iteration is run on all of the rays at once. The Jacobian of the ray 
+    coordinates on ifcx wrt the relative pupil coordinates is estimated by
+    forward differences, with the perturbed rays traced in a single batch. 
+    If a Newton step doesn't reduce a ray's miss distance, the step is
+    halved, up to 8 times.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        ifcx: index of the interface the targets are on
+        xy_targets: [N, 2] target coordinates on interface ifcx
+        fld: :class:`~.Field` point to trace, or a list of N fields, one 
+             per ray
+        wvl: wavelength of the rays (nm)
+        start_coords: [N, 2] initial relative pupil coordinates, default 0
+        tol: convergence tolerance for the distance from the target. Rays
+             from an infinite object start far away, which limits the
+             attainable accuracy to about 1e-6 to 1e-5 of the pupil radius.
+        max_iter: maximum number of Newton iterations
+        **kwargs: keyword arguments passed to :func:`trace_base_batch`
+
+    Returns:
+        an :class:`~.AimResult` with the (unvignetted) relative pupil 
+        coordinates of the rays and their convergence status
+    """
+    targets = np.asarray(xy_targets, dtype=float).reshape(-1, 2)
+    num_rays = len(targets)
+    kwargs['apply_vignetting'] = False
+    kwargs['check_apertures'] = False
+
+    flds = fld if isinstance(fld, (list, tuple)) else None
+
+    def trace_xy(pupils, rays):
+        ray_flds = fld if flds is None else [flds[i] for i in rays]
+        ray_batch = trace_base_batch(opt_model, pupils, ray_flds, wvl, 
+                                     **kwargs)
+        return ray_batch.p[:, ifcx, :2]
+
+    # the step is large enough to be resolved for rays starting far away,
+    #  i.e. infinite object distances
+    h = 1e-4
+    u = (np.zeros((num_rays, 2)) if start_coords is None
+         else np.array(start_coords, dtype=float).reshape(-1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        res = trace_xy(u, range(num_rays)) - targets
+        err = np.hypot(res[:, 0], res[:, 1])
+        active = err > tol
+        iterations = np.zeros(num_rays, dtype=int)
+        for i in range(max_iter):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+            iterations[idx] += 1
+            ua = u[idx]
+            na = len(idx)
+            xyp = trace_xy(np.concatenate((ua + [h, 0.], ua + [0., h])),
+                           np.concatenate((idx, idx)))
+            jx = (xyp[:na] - targets[idx] - res[idx])/h
+            jy = (xyp[na:] - targets[idx] - res[idx])/h
+            # solve the 2x2 linear systems J step = -res
+            det = jx[:, 0]*jy[:, 1] - jy[:, 0]*jx[:, 1]
+            rx, ry = -res[idx, 0], -res[idx, 1]
+            step = np.stack(((jy[:, 1]*rx - jy[:, 0]*ry)/det,
+                             (jx[:, 0]*ry - jx[:, 1]*rx)/det), axis=-1)
+
+            # backtrack until the miss distance is reduced
+            pending = np.arange(na)
+            lam = 1.
+            for k in range(9):
+                ut = ua[pending] + lam*step[pending]
+                rt_res = trace_xy(ut, idx[pending]) - targets[idx[pending]]
+                errt = np.hypot(rt_res[:, 0], rt_res[:, 1])
+                better = errt < err[idx[pending]]
+                accepted = idx[pending[better]]
+                u[accepted] = ut[better]
+                res[accepted] = rt_res[better]
+                err[accepted] = errt[better]
+                pending = pending[~better]
+                if len(pending) == 0:
+                    break
+                lam *= 0.5
+            # rays that can't be improved are dropped
+            active[idx[pending]] = False
+            active &= err > tol
+
+    converged = err <= tol
+    return AimResult(u, converged, iterations, err)
+
+
 def trace_with_opd(opt_model, pupil, fld, wvl, foc, **kwargs):
     """ returns (ray, ray_opl, wvl, opd) """
 
     chief_ray_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     image_pt_2d = kwargs.get('image_pt', None)
     image_delta = kwargs.get('image_delta', None)
-    ref_sphere = calculate_reference_sphere(opt_model, fld, wvl, foc,
-                                            chief_ray_pkg,
-                                            image_pt_2d=image_pt_2d,
-                                            image_delta=image_delta)
+    ref_sphere = get_reference_sphere(opt_model, fld, wvl, foc,
+                                      chief_ray_pkg,
+                                      image_pt_2d=image_pt_2d,
+                                      image_delta=image_delta)
 
     ray_pkg, ray_err = trace_ray(opt_model, pupil, fld, wvl, **kwargs)
 
@@ -491,20 +638,31 @@ def trace_field(opt_model, fld, wvl, foc):
     osp = opt_model.optical_spec
     pupil_rays = osp.pupil.pupil_rays
     rdf_list = trace_ray_list_at_field(opt_model, pupil_rays, fld, wvl, foc)
+    import pandas as pd
     rset = pd.concat(rdf_list, keys=osp.pupil.ray_labels,
                      names=['pupil'])
     return rset
 
 
-def trace_all_fields(opt_model):
-    """ returns a |DataFrame| with the boundary rays for all fields """
+def trace_all_fields(opt_model, executor=None):
+    """ returns a |DataFrame| with the boundary rays for all fields 
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        executor: optional :class:`~.parallel.AnalysisExecutor`, used to
+                  trace the fields in parallel
+    """
     osp = opt_model.optical_spec
     fld, wvl, foc = osp.lookup_fld_wvl_focus(0)
-    fset = []
-    for f in osp.field_of_view.fields:
-        rset = trace_field(opt_model, f, wvl, foc)
-        fset.append(rset)
+    if executor is None:
+        fset = [trace_field(opt_model, f, wvl, foc)
+                for f in osp.field_of_view.fields]
+    else:
+        futures = [executor.submit(trace_field, fi, wvl, foc)
+                   for fi in range(len(osp.field_of_view.fields))]
+        fset = [future.result() for future in futures]
 
+    import pandas as pd
     fdf = pd.concat(fset, keys=osp.field_of_view.index_labels,
                     names=['field'])
     return fdf
@@ -609,6 +767,9 @@ def setup_pupil_coords(opt_model, fld, wvl, foc,
                        image_pt=None, image_delta=None):
     """Trace chief ray and setup reference sphere for `fld`.
 
+    The chief ray and reference sphere are kept in the
+    :class:`ChiefRayCache` of `opt_model` for the current model revision.
+
     Returns:
         tuple: **ref_sphere**, **chief_ray_pkg**
 
@@ -617,10 +778,10 @@ def setup_pupil_coords(opt_model, fld, wvl, foc,
     """
     chief_ray_pkg = get_chief_ray_pkg(opt_model, fld, wvl, foc)
     image_pt_2d = None if image_pt is None else image_pt[:2]
-    ref_sphere = calculate_reference_sphere(opt_model, fld, wvl, foc,
-                                            chief_ray_pkg,
-                                            image_pt_2d=image_pt_2d,
-                                            image_delta=image_delta)
+    ref_sphere = get_reference_sphere(opt_model, fld, wvl, foc,
+                                      chief_ray_pkg,
+                                      image_pt_2d=image_pt_2d,
+                                      image_delta=image_delta)
     return ref_sphere, chief_ray_pkg
 
 
@@ -640,6 +801,51 @@ def aim_chief_ray(opt_model, fld, wvl=None):
     return aim_info
 
 
+def aim_chief_rays_batch(opt_model, flds, wvl=None):
+    """ aim the chief rays of a list of fields at the center of the stop
+
+    The chief rays that aren't in the model's :class:`ChiefRayCache` are 
+    aimed together using :func:`aim_rays_batch`, without changing the 
+    fields' `aim_info`. For wide angle fovs, each field is aimed by 
+    :func:`aim_chief_ray` and its `aim_info` is set.
+
+    Args:
+        opt_model: :class:`~.OpticalModel` instance
+        flds: list of :class:`~.Field` points
+        wvl: wavelength (nm), the central wavelength if None
+
+    Returns:
+        [N, 2] array of the relative pupil coordinates of the chief rays
+    """
+    seq_model = opt_model['seq_model']
+    osp = opt_model['optical_spec']
+    if wvl is None:
+        wvl = seq_model.central_wavelength()
+    stop = seq_model.stop_surface
+    aim_pts = np.zeros((len(flds), 2))
+    if osp['fov'].is_wide_angle:
+        for fld in flds:
+            if fld.aim_info is None:
+                fld.aim_info = aim_chief_ray(opt_model, fld, wvl)
+        return aim_pts
+    if stop is None:
+        return aim_pts
+
+    cache = chief_ray_cache(opt_model)
+    keys = [(cache.field_key(opt_model, fld), wvl, 
+             None if fld.aim_info is None else tuple(fld.aim_info)) 
+            for fld in flds]
+    todo = [i for i, key in enumerate(keys) if key not in cache.aim_pts]
+    if len(todo) > 0:
+        aim_result = aim_rays_batch(opt_model, stop, np.zeros((len(todo), 2)),
+                                    [flds[i] for i in todo], wvl)
+        for i, aim_pt in zip(todo, aim_result.pupil):
+            cache.aim_pts[keys[i]] = aim_pt
+    for i, key in enumerate(keys):
+        aim_pts[i] = cache.aim_pts[key]
+    return aim_pts
+
+
 def apply_paraxial_vignetting(opt_model):
     fov = opt_model.optical_spec.field_of_view
     pm = opt_model.parax_model
@@ -657,9 +863,72 @@ def apply_paraxial_vignetting(opt_model):
         #     j, rel_fov, fld.vly, fld.vuy))
         
 
+class ChiefRayCache():
+    """ Chief rays and reference spheres for the current model revision.
+
+    An :class:`~.OpticalModel` keeps a ChiefRayCache in its
+    `chief_ray_cache` attribute. Chief ray packages are keyed by field and
+    wavelength, reference spheres additionally by focus, image point and
+    image offset. A field is identified by its index in the
+    :class:`~.FieldSpec`, or None, and its x and y values.
+
+    The entries are valid for one value of the optical model's `revision`
+    counter, incremented by :meth:`~.OpticalModel.update_model`. The cache
+    is cleared when a lookup finds the revision has changed.
+
+    Attributes:
+        revision: the model revision of the cached entries
+        chief_rays: dict of (field key, wvl) to chief ray package
+        ref_spheres: dict of (field key, wvl, foc, image_pt_2d, image_delta)
+                     to reference sphere
+        aim_pts: dict of (field key, wvl, aim_info) to the relative pupil
+                 coordinates of the chief ray, see 
+                 :func:`aim_chief_rays_batch`
+    """
+
+    def __init__(self):
+        self.revision = None
+        self.chief_rays = {}
+        self.ref_spheres = {}
+        self.aim_pts = {}
+
+    def __len__(self):
+        return len(self.chief_rays) + len(self.ref_spheres) + len(self.aim_pts)
+
+    def clear(self):
+        self.chief_rays = {}
+        self.ref_spheres = {}
+        self.aim_pts = {}
+
+    def check_revision(self, opt_model):
+        """ Clear the cache if `opt_model` has been updated. """
+        revision = getattr(opt_model, 'revision', None)
+        if revision != self.revision:
+            self.clear()
+            self.revision = revision
+        return self
+
+    @staticmethod
+    def field_key(opt_model, fld):
+        fields = opt_model['optical_spec']['fov'].fields
+        fi = next((i for i, f in enumerate(fields) if f is fld), None)
+        return fi, fld.x, fld.y
+
+
+def chief_ray_cache(opt_model) -> ChiefRayCache:
+    """ Return the :class:`ChiefRayCache` of `opt_model`, current revision. """
+    cache = getattr(opt_model, 'chief_ray_cache', None)
+    if cache is None:
+        cache = opt_model.chief_ray_cache = ChiefRayCache()
+    return cache.check_revision(opt_model)
+
+
 def get_chief_ray_pkg(opt_model, fld, wvl, foc):
     """Get the chief ray package at **fld**, computing it if necessary.
 
+    If **fld** hasn't been aimed, it is aimed in the central wavelength. The
+    chief ray is traced once per wavelength and model revision.
+
     Args:
         opt_model: :class:`~.OpticalModel` instance
         fld: :class:`~.Field` point for wave aberration calculation
@@ -677,16 +946,39 @@ def get_chief_ray_pkg(opt_model, fld, wvl, foc):
                 - dist: distance from interface to the exit pupil point
 
     """
-    if fld.chief_ray is None:
-        fld.aim_info = aim_chief_ray(opt_model, fld, wvl=wvl)
+    cache = chief_ray_cache(opt_model)
+    key = cache.field_key(opt_model, fld), wvl
+    chief_ray_pkg = cache.chief_rays.get(key)
+    if chief_ray_pkg is None:
+        if fld.aim_info is None:
+            fld.aim_info = aim_chief_ray(opt_model, fld)
         chief_ray_pkg = trace_chief_ray(opt_model, fld, wvl, foc)
-    elif fld.chief_ray[0][2] != wvl:
-        chief_ray_pkg = trace_chief_ray(opt_model, fld, wvl, foc)
-    else:
-        chief_ray_pkg = fld.chief_ray
+        cache.chief_rays[key] = chief_ray_pkg
     return chief_ray_pkg
 
 
+def get_reference_sphere(opt_model, fld, wvl, foc, chief_ray_pkg,
+                         image_pt_2d=None, image_delta=None):
+    """Get the reference sphere at **fld**, computing it if necessary.
+
+    See :func:`~.waveabr.calculate_reference_sphere` for the arguments.
+    `chief_ray_pkg` should be the package returned by
+    :func:`get_chief_ray_pkg` for **fld** and **wvl**.
+    """
+    cache = chief_ray_cache(opt_model)
+    key = (cache.field_key(opt_model, fld), wvl, foc,
+           None if image_pt_2d is None else tuple(image_pt_2d),
+           None if image_delta is None else tuple(image_delta))
+    ref_sphere = cache.ref_spheres.get(key)
+    if ref_sphere is None:
+        ref_sphere = calculate_reference_sphere(opt_model, fld, wvl, foc,
+                                                chief_ray_pkg,
+                                                image_pt_2d=image_pt_2d,
+                                                image_delta=image_delta)
+        cache.ref_spheres[key] = ref_sphere
+    return ref_sphere
+
+
 def refocus(opt_model):
     """ Compute a focus shift bringing the axial marginal ray to zero. """
     osp = opt_model['optical_spec']
@@ -47,3 +47,14 @@ class TraceRayBlockedError(TraceError):
     def __init__(self, ifc, int_pt):
         self.ifc = ifc
         self.int_pt = int_pt
+
+
+# codes recording ray failures in batched ray traces
+OK, MISSED_SURFACE, TIR, BLOCKED, EVANESCENT = range(5)
+
+error_code = {
+    TraceMissedSurfaceError: MISSED_SURFACE,
+    TraceTIRError: TIR,
+    TraceRayBlockedError: BLOCKED,
+    TraceEvanescentRayError: EVANESCENT,
+    }
@@ -100,12 +100,17 @@ def set_ape(opt_model, avoid_list=None, include_list=None):
 
 
 def set_vig(opm, **kwargs):
-    """ From existing fields and clear apertures, calculate vignetting. """
+    """ From existing fields and clear apertures, calculate vignetting. 
+    
+    The vignetting factors of all of the fields are calculated together, 
+    see :func:`calc_vignetting_for_fields`.
+    """
     osp = opm['osp']
+    flds = []
     for fi in range(len(osp['fov'].fields)):
         fld, wvl, foc = osp.lookup_fld_wvl_focus(fi)
-        logger.debug(f"set vig field {fi}:")
-        calc_vignetting_for_field(opm, fld, wvl, **kwargs)
+        flds.append(fld)
+    calc_vignetting_for_fields(opm, flds, wvl, **kwargs)
 
 
 def set_pupil(opm, use_parax=False):
@@ -230,6 +235,35 @@ def calc_vignetting_for_field(opm, fld, wvl, **kwargs):
     fld.vly = vig_factors[3]
 
 
+def calc_vignetting_for_fields(opm, flds, wvl, **kwargs):
+    """Calculate and set the vignetting parameters for a list of fields. 
+    
+    This is the batch counterpart to :func:`calc_vignetting_for_field`. The
+    marginal rays in the 4 pupil directions of all of the fields are 
+    iterated together, using :func:`calc_vignetted_rays` or
+    :func:`calc_vignetted_rays_by_bisection`.
+    """
+    use_bisection = kwargs.get('use_bisection', 
+                               opm['osp']['fov'].is_wide_angle)
+    pupil_starts = np.array(opm['osp']['pupil'].pupil_rays[1:5], dtype=float)
+    num_flds = len(flds)
+    start_dirs = np.tile(pupil_starts, (num_flds, 1))
+    xys = np.tile(np.arange(4)//2, num_flds)
+    ray_flds = [fld for fld in flds for i in range(4)]
+    if use_bisection:
+        vig, last_indx, ray_batch = calc_vignetted_rays_by_bisection(
+            opm, xys, start_dirs, ray_flds, wvl)
+    else:
+        vig, last_indx, ray_batch = calc_vignetted_rays(
+            opm, xys, start_dirs, ray_flds, wvl)
+
+    # update the fields' vignetting factors
+    for fi, fld in enumerate(flds):
+        fld.vux, fld.vlx, fld.vuy, fld.vly = vig[4*fi:4*fi+4].tolist()
+        logger.debug(f"field {fi}: vig={vig[4*fi:4*fi+4]}, "
+                     f"limited at ifcs{last_indx[4*fi:4*fi+4]}")
+
+
 def calc_vignetted_ray(opm, xy, start_dir, fld, wvl, max_iter_count=10):
     """ Find the limiting aperture and return the vignetting factor. 
 
@@ -411,3 +445,223 @@ def iterate_pupil_ray(opt_model, indx, xy, start_r0, r_target, fld, wvl, **kwarg
         start_coords[xy] = r_target
 
     return start_coords
+
+
+def calc_vignetted_rays(opm, xys, start_dirs, flds, wvl, max_iter_count=10):
+    """ Find the limiting apertures and return the vignetting factors. 
+
+    This is the batch counterpart to :func:`calc_vignetted_ray`. Each 
+    iteration traces all of the unfinished rays together, with aperture 
+    checking, and the rays that are blocked by a new aperture are solved 
+    together by :func:`iterate_pupil_rays`.
+
+    Args:
+        opm: :class:`~.OpticalModel` instance
+        xys: [N] array of 0 or 1 depending on x or y axis as the pupil 
+             direction
+        start_dirs: [N, 2] unit length starting pupil coordinates, e.g 
+                    [1., 0.]. These establish the radial direction of the 
+                    ray iterations.
+        flds: list of N :class:`~.Field` points, one per ray
+        wvl: wavelength of rays (nm)
+        max_iter_count: fail-safe limit on aperture search
+
+    Returns:
+        (**vig**, **last_indx**, **ray_batch**)
+
+        - **vig** - [N] array of vignetting factors
+        - **last_indx** - [N] array of the limiting interface indices, -1 
+          if none
+        - **ray_batch** - a :class:`~.RayBatch` of the vignetting-limited 
+          rays
+    """
+    sm = opm['sm']
+    stop_indx = sm.stop_surface
+    flds = list(flds)
+    xys = np.asarray(xys)
+    start_dirs = np.array(start_dirs, dtype=float)
+    num_rays = len(start_dirs)
+    rays = np.arange(num_rays)
+    rel_p1 = start_dirs.copy()
+    last_indx = np.full(num_rays, -1)
+    iterating = np.ones(num_rays, dtype=bool)
+    for iter_count in range(max_iter_count):
+        idx = np.flatnonzero(iterating)
+        if len(idx) == 0:
+            break
+        ray_batch = trace.trace_base_batch(opm, rel_p1[idx], 
+                                           [flds[i] for i in idx], wvl, 
+                                           apply_vignetting=False, 
+                                           check_apertures=True,
+                                           pt_inside_fuzz=1e-4)
+        blocked = ray_batch.err_code != terr.OK
+        # a ray blocked again by the limiting aperture is done, as is a
+        #  ray that passes after it's been iterated
+        done = ((blocked & (ray_batch.err_surf == last_indx[idx])) | 
+                (~blocked & (last_indx[idx] != -1)))
+        targets = np.where(blocked, ray_batch.err_surf, -1)
+        # the first time through, iterate the passed rays to the edge of
+        #  the stop surface; with a floating stop, they're done
+        first = ~blocked & (last_indx[idx] == -1)
+        if stop_indx is None:
+            done |= first
+        else:
+            targets[first] = stop_indx
+        targets[done] = -1
+        iterating[idx[done]] = False
+
+        tgt = np.flatnonzero(targets != -1)
+        if len(tgt) > 0:
+            ri = idx[tgt]
+            indxs = targets[tgt]
+            r_targets = [sm.ifcs[k].edge_pt_target(start_dirs[i])[xys[i]]
+                         for i, k in zip(ri, indxs)]
+            rel_p1[ri] = iterate_pupil_rays(opm, indxs, xys[ri], 
+                                            rel_p1[ri, xys[ri]], r_targets,
+                                            [flds[i] for i in ri], wvl)
+            last_indx[ri] = indxs
+
+    ray_batch = trace.trace_base_batch(opm, rel_p1, flds, wvl, 
+                                       apply_vignetting=False, 
+                                       check_apertures=True,
+                                       pt_inside_fuzz=1e-4)
+    vig = 1.0 - (rel_p1[rays, xys]/start_dirs[rays, xys])
+    return vig, last_indx, ray_batch
+
+
+def calc_vignetted_rays_by_bisection(opm, xys, start_dirs, flds, wvl, 
+                                     max_iter_count=10):
+    """ Find the limiting apertures and return the vignetting factors. 
+
+    This is the batch counterpart to :func:`calc_vignetted_ray_by_bisection`;
+    each bisection step traces all of the rays together. 
+
+    Args:
+        opm: :class:`~.OpticalModel` instance
+        xys: [N] array of 0 or 1 depending on x or y axis as the pupil 
+             direction
+        start_dirs: [N, 2] unit length starting pupil coordinates, e.g 
+                    [1., 0.]. These establish the radial direction of the 
+                    ray iterations.
+        flds: list of N :class:`~.Field` points, one per ray
+        wvl: wavelength of rays (nm)
+        max_iter_count: number of bisection steps
+
+    Returns:
+        (**vig**, **last_indx**, **ray_batch**)
+
+        - **vig** - [N] array of vignetting factors
+        - **last_indx** - [N] array of the limiting interface indices, -1 
+          if none
+        - **ray_batch** - a :class:`~.RayBatch` of the last traced rays
+    """
+    flds = list(flds)
+    xys = np.asarray(xys)
+    start_dirs = np.array(start_dirs, dtype=float)
+    num_rays = len(start_dirs)
+    rays = np.arange(num_rays)
+    rel_p1 = start_dirs.copy()
+    last_indx = np.full(num_rays, -1)
+    step_size = 1.0
+    for iter_count in range(max_iter_count):
+        step_size /= 2
+        ray_batch = trace.trace_base_batch(opm, rel_p1, flds, wvl, 
+                                           apply_vignetting=False, 
+                                           check_apertures=True,
+                                           pt_inside_fuzz=1e-4)
+        blocked = ray_batch.err_code != terr.OK
+        last_indx[blocked] = ray_batch.err_surf[blocked]
+        steps = np.where(blocked, -step_size, step_size)
+        rel_p1 += steps[:, np.newaxis]*start_dirs
+
+    vig = 1.0 - (rel_p1[rays, xys]/start_dirs[rays, xys])
+    return vig, last_indx, ray_batch
+
+
+def iterate_pupil_rays(opt_model, indxs, xys, start_r0, r_targets, flds, 
+                       wvl, tol=1e-6, maxiter=50):
+    """ iterates rays to r_targets on interfaces indxs, returns aim points 
+    on the paraxial entrance pupil plane
+
+    This is the batch counterpart to :func:`iterate_pupil_ray`. The secant
+    iteration used by :func:`scipy.optimize.newton` is run on all of the rays
+    at once. A ray that fails to reach its interface gets aim point 0.
+
+    Args:
+        opm: :class:`~.OpticalModel` instance
+        indxs: [N] array of the indices of the interfaces whose edges are 
+               the iteration targets
+        xys: [N] array of 0 or 1 depending on x or y axis as the pupil 
+             direction
+        start_r0: [N] array of iteration starting points
+        r_targets: [N] clear aperture radii that are the iteration targets.
+        flds: list of N :class:`~.Field` points, one per ray
+        wvl: wavelength of rays (nm)
+        tol: convergence tolerance on the pupil coordinate
+        maxiter: maximum number of secant iterations
+
+    Returns:
+        start_coords: [N, 2] pupil coordinates for the rays thru r_targets 
+        on interfaces indxs.
+    """
+    flds = list(flds)
+    indxs = np.asarray(indxs)
+    xys = np.asarray(xys)
+    r_targets = np.asarray(r_targets, dtype=float)
+    num_rays = len(indxs)
+
+    def r_pupil_coordinate(sel, xy_coord):
+        rays = np.arange(len(sel))
+        rel_p1 = np.zeros((len(sel), 2))
+        rel_p1[rays, xys[sel]] = xy_coord
+        ray_batch = trace.trace_base_batch(opt_model, rel_p1, 
+                                           [flds[i] for i in sel], wvl, 
+                                           apply_vignetting=False, 
+                                           check_apertures=False)
+        # rays that fail before reaching indx have no (nan) data at indx
+        r_ray = ray_batch.p[rays, indxs[sel], xys[sel]]
+        return r_ray - r_targets[sel]
+
+    # follow the secant method of scipy.optimize.newton
+    eps = 1e-4
+    all_rays = np.arange(num_rays)
+    p0 = np.array(start_r0, dtype=float)
+    p1 = p0*(1 + eps)
+    p1 += np.where(p1 >= 0, eps, -eps)
+    q0 = r_pupil_coordinate(all_rays, p0)
+    q1 = r_pupil_coordinate(all_rays, p1)
+    swap = np.abs(q1) < np.abs(q0)
+    p0, p1 = np.where(swap, p1, p0), np.where(swap, p0, p1)
+    q0, q1 = np.where(swap, q1, q0), np.where(swap, q0, q1)
+    failed = np.isnan(q0) | np.isnan(q1)
+    root = p1.copy()
+    active = ~failed
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for itr in range(maxiter):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+            a0, a1, b0, b1 = p0[idx], p1[idx], q0[idx], q1[idx]
+            p = np.where(np.abs(b1) > np.abs(b0),
+                         (-b0/b1*a1 + a0)/(1 - b0/b1),
+                         (-b1/b0*a0 + a1)/(1 - b1/b0))
+            # a flat secant stops the iteration at the midpoint
+            flat = b1 == b0
+            p[flat] = (a1[flat] + a0[flat])/2
+            root[idx] = p
+            converged = flat | (np.abs(p - a1) <= tol)
+            active[idx[converged]] = False
+
+            nxt = idx[~converged]
+            p0[nxt], q0[nxt] = p1[nxt], q1[nxt]
+            p1[nxt] = p[~converged]
+            if len(nxt) > 0:
+                q1[nxt] = r_pupil_coordinate(nxt, p1[nxt])
+                lost = np.isnan(q1[nxt])
+                failed[nxt[lost]] = True
+                active[nxt[lost]] = False
+
+    root[failed] = 0.0
+    start_coords = np.zeros((num_rays, 2))
+    start_coords[all_rays, xys] = root
+    return start_coords
@@ -16,7 +16,8 @@ import numpy as np
 from rayoptics.coord_geometry_types import Vec3d, Dir3d, Ray3d
 
 from rayoptics.optical import model_constants as mc
-from rayoptics.elem.transform import transform_after_surface
+from rayoptics.elem.transform import (transform_after_surface,
+                                     transform_after_surface_batch)
 
 from rayoptics.util.misc_math import normalize, is_kinda_big
 
@@ -486,3 +487,186 @@ def wave_abr_calc_inf_ref(fod, fld, wvl, foc, ray_pkg, chief_ray_pkg,
 
     opd = pre_opd - W_inf
     return opd
+
+
+# --- Wavefront aberration of a batch of rays
+#  The batch functions take the ray data of a :class:`~.RayBundle` (or a
+#  :class:`~.RayBatch`), i.e. [rays, surfaces, 3] arrays of points and
+#  directions, and evaluate all of the rays in one pass. Rays that failed
+#  to trace give nan results.
+def eic_distance_batch(p, d, p0, d0):
+    """ array version of :func:`eic_distance`
+
+    Args:
+        p, d: [rays, 3] arrays of points on and direction cosines of the rays
+        p0, d0: point on and direction cosine of the reference ray
+
+    Returns:
+        [rays] array of the distances along the rays from the equally 
+        inclined chord points to p
+    """
+    # eq 3.9
+    return (np.sum((d + d0)*(p - p0), axis=-1) /
+            (1. + np.sum(d*d0, axis=-1)))
+
+
+def dist_to_shortest_join_batch(p1, d1, p2, d2):
+    """ array version of :func:`dist_to_shortest_join`
+
+    Args:
+        p1, d1: ray 1, defined by point p1 and unit direction d1
+        p2, d2: [rays, 3] arrays of the points and directions of rays 2
+
+    Returns: p1_min, p2_min
+        p1_min: [rays, 3] points on ray 1 at the closest join
+        p2_min: [rays, 3] points on rays 2 at the closest join
+    """
+    del_p = p2 - p1
+    n = np.cross(d1, d2)
+    nn = np.sum(n*n, axis=-1)
+    parallel = nn == 0
+    nn = np.where(parallel, 1., nn)
+    t1 = np.where(parallel, 0.,
+                  np.sum(np.cross(d2, n)*del_p, axis=-1) / nn)
+    t2 = np.where(parallel,
+                  np.sum(-del_p*d1, axis=-1)*np.sum(d1*d2, axis=-1),
+                  np.sum(np.cross(d1, n)*del_p, axis=-1) / nn)
+    p1_min = p1 + t1[:, np.newaxis]*d1
+    p2_min = p2 + t2[:, np.newaxis]*d2
+    return p1_min, p2_min
+
+
+def wave_abr_full_calc_batch(fod, ray_bundle, chief_ray_pkg, ref_sphere):
+    """Given a bundle of rays, a chief ray and an image pt, evaluate the OPD.
+
+    This is the array version of :func:`wave_abr_full_calc`.
+
+    Args:
+        fod: :class:`~.FirstOrderData` for object and image space refractive
+             indices
+        ray_bundle: a :class:`~.RayBundle` or :class:`~.RayBatch`
+        chief_ray_pkg: input tuple of chief_ray, cr_exp_seg
+        ref_sphere: input tuple of image_pt, ref_dir, ref_sphere_radius, 
+                    lcl_tfrm_last
+
+    Returns:
+        opd: [rays] array of the OPD of the rays wrt the chief ray
+    """
+    pre_opd_pkg = wave_abr_pre_calc_batch(fod, ray_bundle, chief_ray_pkg,
+                                          ref_sphere)
+    return wave_abr_calc_batch(fod, chief_ray_pkg, pre_opd_pkg, ref_sphere,
+                               ray_bundle.p[:, -1])
+
+
+def wave_abr_pre_calc_batch(fod, ray_bundle, chief_ray_pkg, ref_sphere):
+    """Pre-calculate the part of the OPD calc independent of focus.
+
+    This is the array version of :func:`wave_abr_pre_calc`. The arrays 
+    returned are the stacked results of :func:`wave_abr_pre_calc` for the
+    rays.
+    """
+    image_pt, ref_dir, ref_sphere_radius, lcl_tfrm_last = ref_sphere
+    cr, cr_exp_seg = chief_ray_pkg
+    cr_ray, cr_op, wvl = cr
+    p, d = ray_bundle.p, ray_bundle.d
+
+    k = -2  # last interface in sequence
+    n_obj = abs(fod.n_obj)
+    n_img = abs(fod.n_img)
+
+    # eq 3.12
+    e1 = eic_distance_batch(p[:, 1], d[:, 0],
+                            cr_ray[1][mc.p], cr_ray[0][mc.d])
+
+    if is_kinda_big(ref_sphere_radius):
+        if lcl_tfrm_last is not None:
+            rt, t = lcl_tfrm_last   # sm.lcl_tfrms[k]
+            # row vector form of rt.dot(v)
+            p_b4, d_b4 = (p[:, k] - t).dot(rt.T), d[:, k].dot(rt.T)
+            p_cr_b4, d_cr_b4 = (rt.dot(cr_ray[k][mc.p] - t), 
+                                rt.dot(cr_ray[k][mc.d]))
+        else:
+            p_b4, d_b4 = p[:, k], d[:, k]
+            p_cr_b4, d_cr_b4 = cr_ray[k][mc.p], cr_ray[k][mc.d]
+
+        op_b4 = -np.sum(d_b4*p_b4, axis=-1)
+        op_cr_b4 = ray_dist_to_perp_from_origin((p_cr_b4, d_cr_b4))
+
+        P1, P2 = dist_to_shortest_join_batch(cr_ray[-1][mc.p], 
+                                             cr_ray[-1][mc.d],
+                                             p[:, -1], d[:, -1])
+        rF0 = (P1 + P2)/2
+
+        V_B = ray_bundle.op + op_b4
+        V_BE = cr_op + op_cr_b4
+
+        W0 = V_B - V_BE + n_img * np.sum((d_b4 - d_cr_b4)*rF0, axis=-1)
+
+        pre_opd = -n_obj*e1 - W0
+
+        p_cr_b4 = np.broadcast_to(p_cr_b4, p_b4.shape)
+        d_cr_b4 = np.broadcast_to(d_cr_b4, d_b4.shape)
+        return pre_opd, W0, p_b4, d_b4, p_cr_b4, d_cr_b4
+
+    else:
+        cr_exp_pt, cr_exp_dir, cr_exp_dist, ifc, cr_b4_pt, cr_b4_dir = \
+            cr_exp_seg
+
+        # eq 3.13
+        ekp = eic_distance_batch(p[:, k], d[:, k],
+                                 cr_ray[k][mc.p], cr_ray[k][mc.d])
+
+        pre_opd = -n_obj*e1 - ray_bundle.op + n_img*ekp + cr_op
+
+        b4_pt, b4_dir = transform_after_surface_batch(ifc, p[:, k], d[:, k])
+        dst = ekp - cr_exp_dist
+        eic_exp_pt = b4_pt - dst[:, np.newaxis]*b4_dir
+        p_coord = eic_exp_pt - cr_exp_pt
+
+        return pre_opd, p_coord, b4_pt, b4_dir
+
+
+def wave_abr_calc_batch(fod, chief_ray_pkg, pre_opd_pkg, ref_sphere,
+                        img_pts):
+    """Given pre-calculated info for many rays, return the OPD of each ray.
+
+    This is the array version of :func:`wave_abr_calc`, used to refocus a
+    traced set of rays rapidly.
+
+    Args:
+        fod: :class:`~.FirstOrderData` for object and image space refractive
+             indices
+        chief_ray_pkg: input tuple of chief_ray, cr_exp_seg
+        pre_opd_pkg: tuple of arrays, the stacked results of 
+                     :func:`wave_abr_pre_calc` for the rays
+        ref_sphere: input tuple of image_pt, ref_dir, ref_sphere_radius, 
+                    lcl_tfrm_last
+        img_pts: [rays, 3] array of the ray intersections with the image 
+                 interface
+
+    Returns:
+        opd: [rays] array of the OPD of the rays wrt the chief ray
+    """
+    image_pt, ref_dir, ref_sphere_radius, lcl_tfrm_last = ref_sphere
+    n_img = abs(fod.n_img)
+
+    if is_kinda_big(ref_sphere_radius):
+        pre_opd, W0, p_b4, d_b4, p_cr_b4, d_cr_b4 = pre_opd_pkg
+        ta = img_pts - image_pt
+        d_dot = np.sum(d_b4*d_cr_b4, axis=-1)
+        numer = np.sum((d_cr_b4 - d_b4*d_dot[:, np.newaxis])*ta, axis=-1)
+        W_inf = n_img * numer / (1 + d_dot)
+        opd = pre_opd - W_inf
+    else:
+        cr, cr_exp_seg = chief_ray_pkg
+        pre_opd, p_coord, b4_pt, b4_dir = pre_opd_pkg
+        R = ref_sphere_radius
+        F = b4_dir.dot(ref_dir) - np.sum(b4_dir*p_coord, axis=-1)/R
+        J = np.sum(p_coord*p_coord, axis=-1)/R - 2.0*p_coord.dot(ref_dir)
+
+        sign_soln = -1 if ref_dir[2]*cr.ray[-1][mc.d][2] < 0 else 1
+        denom = F + sign_soln*np.sqrt(F**2 + J/R)
+        ep = np.divide(J, denom, out=np.zeros_like(J), where=denom != 0)
+        opd = pre_opd - n_img*ep
+
+    return opd
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Zernike polynomial decomposition of wavefront maps
+
+    Wavefront maps, e.g. from :func:`~.analyses.eval_wavefront` or a
+    :class:`~.analyses.RayGrid`, are fit to Zernike polynomials over the unit
+    circle in relative pupil coordinates by least squares. Two orderings are
+    supported:
+
+        - 'fringe': the 37 term Fringe (University of Arizona) set, with
+          polynomials that have a value of 1 at the edge of the pupil
+        - 'noll': the Standard (Noll) ordering, with polynomials normalized
+          to unit rms over the pupil. 'standard' is accepted as an alias.
+
+    The basis matrix and its pseudo-inverse depend only on the pupil sample
+    points, the vignetting mask, the ordering and the number of terms. They
+    are kept in a :class:`ZernikeBasisCache`, so repeated fits across fields
+    and focus positions cost a matrix-vector product.
+"""
+
+import hashlib
+from collections import OrderedDict
+from math import factorial, sqrt
+
+import numpy as np
+
+
+orderings = ('fringe', 'noll', 'standard')
+
+
+def noll_to_nm(j):
+    """ Returns the radial and azimuthal orders (n, m) of Noll index `j`.
+
+    Negative m are the sin(\\|m\\|θ) terms, positive m the cos(mθ) terms.
+    """
+    if j < 1:
+        raise ValueError(f"Noll index must be >= 1, not {j}")
+    n = 0
+    j1 = j - 1
+    while j1 > n:
+        n += 1
+        j1 -= n
+    m = (-1)**j * ((n % 2) + 2*((j1 + (n + 1) % 2)//2))
+    return n, m
+
+
+def fringe_to_nm(j):
+    """ Returns the radial and azimuthal orders (n, m) of Fringe index `j`.
+
+    Negative m are the sin(\\|m\\|θ) terms, positive m the cos(mθ) terms.
+    The Fringe set has 37 terms; the last one is the 12th order spherical
+    term, (12, 0), rather than the next term of group 6.
+    """
+    if j < 1 or j > 37:
+        raise ValueError(f"Fringe index must be in 1 ... 37, not {j}")
+    if j == 37:
+        return 12, 0
+    # the terms are grouped by (n + |m|)/2
+    grp = int(sqrt(j - 1))
+    k = j - grp**2 - 1  # position in group, 0 ... 2*grp
+    abs_m = grp - k//2
+    n = 2*grp - abs_m
+    m = -abs_m if k % 2 == 1 else abs_m
+    return n, m
+
+
+def zernike_indices(num_terms, ordering='fringe'):
+    """ Returns a list of the (n, m) of the first `num_terms` polynomials. """
+    to_nm = _index_fct(ordering)
+    return [to_nm(j) for j in range(1, num_terms + 1)]
+
+
+def _index_fct(ordering):
+    if ordering == 'fringe':
+        return fringe_to_nm
+    elif ordering in ('noll', 'standard'):
+        return noll_to_nm
+    else:
+        raise ValueError(f"Unknown Zernike ordering: {ordering}")
+
+
+def zernike_radial(n, m, rho):
+    """ Returns the radial polynomial R_n^m evaluated at `rho`. """
+    abs_m = abs(m)
+    rho = np.asarray(rho, dtype=float)
+    r = np.zeros_like(rho)
+    for k in range((n - abs_m)//2 + 1):
+        c = ((-1)**k * factorial(n - k) /
+             (factorial(k) * factorial((n + abs_m)//2 - k) *
+              factorial((n - abs_m)//2 - k)))
+        r += c*rho**(n - 2*k)
+    return r
+
+
+def zernike_polynomial(n, m, rho, theta, normalized=False):
+    """ Returns the Zernike polynomial Z_n^m evaluated at (rho, theta).
+
+    Args:
+        n: radial order
+        m: azimuthal order, negative for the sin terms
+        rho: normalized radial pupil coordinate
+        theta: pupil angle (radians), measured from the x axis
+        normalized: if True, the polynomial has unit rms over the unit
+                    circle, otherwise its value at the edge is 1
+    """
+    z = zernike_radial(n, m, rho)
+    if m > 0:
+        z = z*np.cos(m*theta)
+    elif m < 0:
+        z = z*np.sin(-m*theta)
+    if normalized:
+        z = z*(sqrt(n + 1) if m == 0 else sqrt(2*(n + 1)))
+    return z
+
+
+def zernike_basis(x, y, num_terms, ordering='fringe'):
+    """ Returns the [points, num_terms] matrix of polynomials at (x, y).
+
+    Args:
+        x, y: arrays of pupil coordinates, normalized to the unit circle
+        num_terms: number of polynomials
+        ordering: 'fringe', or 'noll' or 'standard'
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    rho = np.hypot(x, y)
+    theta = np.arctan2(y, x)
+    normalized = ordering != 'fringe'
+    return np.column_stack([zernike_polynomial(n, m, rho, theta,
+                                               normalized=normalized)
+                            for n, m in zernike_indices(num_terms,
+                                                        ordering)])
+
+
+class ZernikeBasis():
+    """ Basis matrix and pseudo-inverse for a set of pupil sample points.
+
+    Attributes:
+        ordering: 'fringe', or 'noll' or 'standard'
+        indices: list of the (n, m) of the polynomials
+        matrix: [points, terms] array of the polynomials at the points
+        pinv: [terms, points] pseudo-inverse of `matrix`
+    """
+
+    def __init__(self, x, y, num_terms, ordering='fringe'):
+        self.ordering = ordering
+        self.indices = zernike_indices(num_terms, ordering)
+        self.matrix = zernike_basis(x, y, num_terms, ordering)
+        self.pinv = np.linalg.pinv(self.matrix)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def fit(self, opd):
+        """ Returns the least squares coefficients for the sample `opd`. """
+        return self.pinv.dot(opd)
+
+    def evaluate(self, coefs):
+        """ Returns the wavefront at the sample points for `coefs`. """
+        return self.matrix.dot(coefs)
+
+
+class ZernikeBasisCache():
+    """ Cache of :class:`ZernikeBasis` keyed on the sample points and terms.
+
+    The key is a digest of the pupil coordinates of the valid wavefront
+    samples, i.e. the grid and the vignetting mask, along with the ordering
+    and number of terms. The least recently used entries are dropped when
+    there are more than `max_size` of them.
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.bases = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.bases)
+
+    def clear(self):
+        self.bases.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, x, y, num_terms, ordering='fringe'):
+        """ Returns the :class:`ZernikeBasis` for the valid points (x, y). """
+        x = np.ascontiguousarray(x, dtype=float)
+        y = np.ascontiguousarray(y, dtype=float)
+        digest = hashlib.sha1(x.tobytes() + y.tobytes()).digest()
+        key = digest, num_terms, ordering
+        basis = self.bases.get(key)
+        if basis is None:
+            self.misses += 1
+            basis = ZernikeBasis(x, y, num_terms, ordering)
+            self.bases[key] = basis
+            if len(self.bases) > self.max_size:
+                self.bases.popitem(last=False)
+        else:
+            self.hits += 1
+            self.bases.move_to_end(key)
+        return basis
+
+
+basis_cache = ZernikeBasisCache()
+
+
+def fit_zernikes(x, y, opd, num_terms=37, ordering='fringe'):
+    """ Least squares fit of wavefront samples to Zernike polynomials.
+
+    Samples that are nan, i.e. rays that didn't trace, or that are outside
+    the unit circle are excluded from the fit.
+
+    Args:
+        x, y: arrays of relative pupil coordinates
+        opd: array of wavefront samples at (x, y)
+        num_terms: number of polynomials to fit
+        ordering: 'fringe', or 'noll' or 'standard'
+
+    Returns:
+        (**coefs**, **mask**)
+
+        - **coefs** - [num_terms] array of polynomial coefficients
+        - **mask** - boolean array of the samples used in the fit
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    opd = np.asarray(opd, dtype=float)
+    mask = np.isfinite(opd) & (x**2 + y**2 <= 1. + 1e-12)
+    basis = basis_cache.get(x[mask], y[mask], num_terms, ordering)
+    return basis.fit(opd[mask]), mask
+
+
+def eval_zernikes(coefs, x, y, ordering='fringe'):
+    """ Returns the wavefront of the polynomial `coefs` at (x, y). """
+    x = np.asarray(x, dtype=float)
+    z = zernike_basis(x, y, len(coefs), ordering).dot(coefs)
+    return z.reshape(x.shape)
+
+
+def term_rms(coefs, ordering='fringe'):
+    """ Returns the rms over the pupil of each term of `coefs`.
+
+    The piston term has zero rms.
+    """
+    coefs = np.asarray(coefs, dtype=float)
+    rms = np.abs(coefs)
+    if ordering == 'fringe':
+        norms = np.array([sqrt(n + 1) if m == 0 else sqrt(2*(n + 1))
+                          for n, m in zernike_indices(len(coefs), ordering)])
+        rms = rms/norms
+    rms[0] = 0.
+    return rms
+
+
+def term_pv(coefs, ordering='fringe'):
+    """ Returns the peak to valley over the pupil of each term of `coefs`. """
+    coefs = np.asarray(coefs, dtype=float)
+    rho = np.linspace(0., 1., 1001)
+    normalized = ordering != 'fringe'
+    pv = np.zeros(len(coefs))
+    for i, (n, m) in enumerate(zernike_indices(len(coefs), ordering)):
+        if m == 0:
+            r = zernike_polynomial(n, m, rho, 0., normalized=normalized)
+            pv[i] = np.ptp(r) if n > 0 else 0.
+        else:
+            # the azimuthal factor spans -1 to 1, largest at the edge
+            r = zernike_polynomial(n, abs(m), 1., 0., normalized=normalized)
+            pv[i] = 2*abs(r)
+    return np.abs(coefs)*pv
+
+
+class ZernikeFit():
+    """Zernike polynomial fit of a wavefront map.
+
+    Attributes:
+        opd_grid: [num, num, 3] array of pupil_x, pupil_y, opd, as returned
+                  by :func:`~.analyses.eval_wavefront`
+        num_terms: number of polynomials to fit
+        ordering: 'fringe', or 'noll' or 'standard'
+        indices: list of the (n, m) of the polynomials
+        coefs: [num_terms] array of the polynomial coefficients
+        rms: [num_terms] array of the rms of each term
+        pv: [num_terms] array of the peak to valley of each term
+        wfe_rms: rms of the wavefront samples, piston removed
+        fit_rms: rms of the fit residual
+    """
+
+    def __init__(self, opd_grid, num_terms=37, ordering='fringe'):
+        self.opd_grid = opd_grid
+        self.num_terms = num_terms
+        self.ordering = ordering
+        _index_fct(ordering)
+
+        self.update_data()
+
+    @classmethod
+    def from_ray_grid(cls, ray_grid, **kwargs):
+        """Fit the wavefront of a :class:`~.analyses.RayGrid`. """
+        return cls(np.moveaxis(ray_grid.grid, 0, -1), **kwargs)
+
+    def update_data(self, **kwargs):
+        x, y, opd = np.moveaxis(np.asarray(self.opd_grid, dtype=float), -1, 0)
+        self.indices = zernike_indices(self.num_terms, self.ordering)
+        self.coefs, self.mask = fit_zernikes(x, y, opd, self.num_terms,
+                                             self.ordering)
+        self.rms = term_rms(self.coefs, self.ordering)
+        self.pv = term_pv(self.coefs, self.ordering)
+
+        opd_valid = opd[self.mask]
+        self.wfe_rms = np.std(opd_valid)
+        residual = opd_valid - eval_zernikes(self.coefs, x[self.mask],
+                                             y[self.mask], self.ordering)
+        self.fit_rms = np.std(residual)
+        return self
+
+    def reconstruct(self, x=None, y=None):
+        """ Returns the fitted wavefront, on the fit grid by default.
+
+        Points of the fit grid that weren't used in the fit are nan.
+        """
+        if x is None:
+            x, y = self.opd_grid[..., 0], self.opd_grid[..., 1]
+            return np.where(self.mask,
+                            eval_zernikes(self.coefs, x, y, self.ordering),
+                            np.nan)
+        return eval_zernikes(self.coefs, x, y, self.ordering)
+
+    def listobj_str(self):
+        o_str = (f"{self.ordering} Zernike fit: wfe rms={self.wfe_rms:.6g}"
+                 f", fit rms={self.fit_rms:.6g}\n")
+        o_str += "   j   n   m          coef           rms            pv\n"
+        for j, ((n, m), c, rms, pv) in enumerate(zip(self.indices, self.coefs,
+                                                     self.rms, self.pv),
+                                                 start=1):
+            o_str += f"{j:4d}{n:4d}{m:4d}{c:14.6g}{rms:14.6g}{pv:14.6g}\n"
+        return o_str
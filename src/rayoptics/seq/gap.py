@@ -11,6 +11,8 @@
 
 from opticalglass import opticalmedium as om
 
+from rayoptics.seq.medium import medium_key
+
 
 def gap_medium(g) -> str:
     """ return a formatted string of the gap's medium. """
@@ -61,6 +63,17 @@ class Gap:
 
         return o_str
 
+    def medium_key(self) -> tuple:
+        """ Returns a key that changes when the medium is replaced or changed.
+
+        The refractive indices of the gap are recomputed by
+        :meth:`~.SequentialModel.update_model` when the key changes. The key
+        includes the dispersion data of the medium (see
+        :func:`~.medium.medium_key`), so changes made to a medium in place
+        are detected as well.
+        """
+        return id(self.medium), medium_key(self.medium)
+
     def sync_to_restore(self, seq_model):
         if hasattr(self.medium, 'sync_to_restore'):
             self.medium.sync_to_restore()
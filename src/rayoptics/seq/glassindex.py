@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" An index of the glasses in the installed :mod:`opticalglass` catalogs
+
+    The :class:`GlassIndex` records the name, catalog, nd and vd of every
+    glass in the manufacturer catalogs and the legacy Robb1983 catalog. It
+    supports:
+
+        - exact lookup of a glass name, using the same decoded glass name
+          key as the catalogs' `glass_lookup`
+        - lookup of the glasses in the same family (group and number) as a
+          name, for substitutions
+        - a KD-tree search for the glasses nearest a (nd, vd) point
+
+    Building the index requires loading every catalog. :func:`glass_index`
+    builds it once per session, when a glass isn't found and a substitute
+    is needed; exact name lookups only use an index that is already
+    available. The index is saved and reused by later
+    sessions only if the RAYOPTICS_CACHE_DIR environment variable names a
+    cache directory; it is rebuilt when the opticalglass version changes.
+
+    The index only finds glasses; a catalog is still loaded by
+    :func:`opticalglass.glassfactory.create_glass` to create the glass found.
+"""
+
+import logging
+import os
+import pickle
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import opticalglass as og
+from opticalglass import glass as cat_glass
+from opticalglass import glassfactory as gfact
+from opticalglass import glasserror
+
+logger = logging.getLogger(__name__)
+
+GlassEntry = namedtuple('GlassEntry', ['name', 'catalog', 'nd', 'vd'])
+GlassEntry.name.__doc__ = "glass name, as used by the catalog"
+GlassEntry.catalog.__doc__ = "catalog name, as used by create_glass()"
+GlassEntry.nd.__doc__ = "refractive index at the d line"
+GlassEntry.vd.__doc__ = "Abbe number at the d line"
+
+# weights of nd and vd in the (nd, vd) distance, equal per glass code digit
+nd_scale = 1000.
+vd_scale = 10.
+
+
+# the opticalglass manufacturer catalogs, used if the package doesn't
+#  provide its list
+_default_catalog_names = ["CDGM", "Hikari", "Hoya", "Ohara", "Schott",
+                          "Sumita"]
+
+
+def glass_catalog_names() -> list[str]:
+    """ Return the names of the opticalglass catalogs, in search order.
+
+    The list includes catalogs of glasses registered with
+    :func:`opticalglass.glassfactory.register_glass`. opticalglass doesn't
+    provide a public accessor, so its internal list is read here, falling
+    back to the manufacturer catalogs if it isn't present.
+    """
+    return list(getattr(gfact, '_cat_names', _default_catalog_names))
+
+
+def custom_glass_registry() -> dict:
+    """ Return the registered custom glasses, keyed by (name, catalog).
+
+    Reads the internal opticalglass registry, see
+    :func:`glass_catalog_names`.
+    """
+    return dict(getattr(gfact, '_custom_glass_registry', {}))
+
+
+def family_key(gn_decode) -> str:
+    """ Return the group+num string of a decoded glass name. """
+    return gn_decode[0][0].upper() + gn_decode[0][1]
+
+
+class GlassIndex():
+    """ Index of glass names, catalogs and (nd, vd) values.
+
+    Attributes:
+        names: list of glass names
+        catalogs: list of the catalog name of each glass
+        gn_decodes: list of the decoded glass name of each glass
+        nd: array of nd values
+        vd: array of vd values
+        catalog_names: list of the indexed catalogs, in search order
+        og_version: version of opticalglass the index was built from
+    """
+    format_version = 1
+
+    def __init__(self, names, catalogs, gn_decodes, nd, vd,
+                 catalog_names, og_version=og.__version__):
+        self.names = names
+        self.catalogs = catalogs
+        self.gn_decodes = gn_decodes
+        self.nd = np.asarray(nd, dtype=float)
+        self.vd = np.asarray(vd, dtype=float)
+        self.catalog_names = catalog_names
+        self.og_version = og_version
+        self._build_lookups()
+
+    def _build_lookups(self):
+        self._catalogs_uc = {c.upper() for c in self.catalog_names}
+        self._name_lookup = {}
+        self._family_lookup = {}
+        for i, (gn_decode, nd, vd) in enumerate(zip(self.gn_decodes,
+                                                     self.nd, self.vd)):
+            self._name_lookup.setdefault(gn_decode, []).append(i)
+            self._family_lookup.setdefault(family_key(gn_decode),
+                                           []).append(i)
+        self._valid = np.nonzero(np.isfinite(self.nd) &
+                                 np.isfinite(self.vd))[0]
+        self._kdtree = cKDTree(np.column_stack(
+            (nd_scale*self.nd[self._valid], vd_scale*self.vd[self._valid])))
+
+    @classmethod
+    def build(cls, catalog_names=None):
+        """ Build the index from the installed catalogs.
+
+        Args:
+            catalog_names: the catalogs to index. If None, the default
+                           opticalglass catalogs are used. The Robb1983
+                           legacy catalogs are always included.
+        """
+        if catalog_names is None:
+            custom_cats = {gc for gn, gc in custom_glass_registry()}
+            catalog_names = [c for c in glass_catalog_names()
+                             if c not in custom_cats]
+        names, catalogs, gn_decodes, nds, vds = [], [], [], [], []
+
+        def add_glasses(glass_list, nd, vd, gnames):
+            nd_vd = {gn: (n, v) for gn, n, v in zip(gnames, nd, vd)}
+            for gn_decode, gn, gc in glass_list:
+                n, v = nd_vd.get(gn, (np.nan, np.nan))
+                names.append(gn)
+                catalogs.append(gc)
+                gn_decodes.append(gn_decode)
+                nds.append(n)
+                vds.append(v)
+
+        indexed = []
+        for cat_name in catalog_names:
+            try:
+                cat = gfact.get_glass_catalog(cat_name)
+            except glasserror.GlassCatalogNotFoundError:
+                continue
+            nd, vd, *_, gnames = cat.glass_map_data('d')
+            add_glasses(cat.glass_list, nd, vd, list(gnames))
+            indexed.append(cat_name)
+
+        robb = cat_glass.Robb1983Catalog()
+        for cat_name in robb.glass_data:
+            nd, vd, *_, gnames = robb.glass_map_data('d', cat_name=cat_name)
+            add_glasses([g for g in robb.glass_list if g[2] == cat_name],
+                        nd, vd, list(gnames))
+            indexed.append(cat_name)
+
+        return cls(names, catalogs, gn_decodes, nds, vds, indexed)
+
+    def __getstate__(self):
+        return {'format_version': self.format_version,
+                'names': self.names, 'catalogs': self.catalogs,
+                'gn_decodes': self.gn_decodes, 'nd': self.nd, 'vd': self.vd,
+                'catalog_names': self.catalog_names,
+                'og_version': self.og_version}
+
+    def __setstate__(self, state):
+        del state['format_version']
+        self.__init__(**state)
+
+    def save(self, file_path):
+        """ Save the index to `file_path`. """
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}")
+        with tmp_path.open('wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """ Load an index saved by :meth:`save`. """
+        with Path(file_path).open('rb') as f:
+            return pickle.load(f)
+
+    def is_current(self, catalog_names=None) -> bool:
+        """ True if the index matches the installed catalogs. """
+        if self.og_version != og.__version__:
+            return False
+        if catalog_names is not None:
+            return all(c.upper() in self._catalogs_uc for c in catalog_names)
+        return True
+
+    def is_indexed(self, catalog) -> bool:
+        """ True if `catalog` is one of the indexed catalogs. """
+        return catalog.upper() in self._catalogs_uc
+
+    def entry(self, i) -> GlassEntry:
+        return GlassEntry(self.names[i], self.catalogs[i],
+                          self.nd[i], self.vd[i])
+
+    def _ordered(self, indices, catalogs):
+        """ Return entries for `indices` in `catalogs` order, if given. """
+        if catalogs is None:
+            return [self.entry(i) for i in indices]
+        entries = []
+        for cat in catalogs:
+            cat_uc = cat.upper()
+            entries += [self.entry(i) for i in indices
+                        if self.catalogs[i].upper() == cat_uc]
+        return entries
+
+    def lookup(self, name, catalogs=None) -> list[GlassEntry]:
+        """ Return the glasses matching `name`, in `catalogs` order.
+
+        The glass name is matched using its decoded form, as done by the
+        catalogs' glass lookup.
+        """
+        gn_decode = cat_glass.decode_glass_name(name.strip())
+        return self._ordered(self._name_lookup.get(gn_decode, []), catalogs)
+
+    def family(self, name, catalogs=None) -> list[GlassEntry]:
+        """ Return the glasses with the same group and number as `name`. """
+        gn_decode = cat_glass.decode_glass_name(name.strip())
+        return self._ordered(self._family_lookup.get(family_key(gn_decode),
+                                                     []), catalogs)
+
+    def nearest(self, nd, vd, k=1, catalogs=None) -> list[GlassEntry]:
+        """ Return the `k` glasses nearest (nd, vd), closest first.
+
+        The distance weights a change of 0.001 in nd the same as a change of
+        0.1 in vd, i.e. equally per digit of the 6 digit glass code.
+
+        Args:
+            nd: refractive index at the d line
+            vd: Abbe number at the d line
+            k: the number of glasses to return
+            catalogs: if given, only glasses in these catalogs are returned
+        """
+        pt = (nd_scale*nd, vd_scale*vd)
+        num_pts = len(self._valid)
+        if catalogs is not None:
+            cats_uc = {c.upper() for c in catalogs}
+        kk = k
+        while True:
+            kk = min(kk, num_pts)
+            dist, idx = self._kdtree.query(pt, k=kk)
+            idx = np.atleast_1d(idx)
+            entries = [self.entry(self._valid[i]) for i in idx
+                       if i < num_pts]
+            if catalogs is not None:
+                entries = [e for e in entries
+                           if e.catalog.upper() in cats_uc]
+            if len(entries) >= k or kk == num_pts:
+                return entries[:k]
+            kk *= 4
+
+
+def cache_dir() -> Path|None:
+    """ Return the rayoptics cache directory, or None if there isn't one.
+
+    The cache directory is given by the RAYOPTICS_CACHE_DIR environment
+    variable; nothing is written to disk if it isn't set.
+    """
+    cache_pth = os.environ.get('RAYOPTICS_CACHE_DIR')
+    return None if not cache_pth else Path(cache_pth)
+
+
+_glass_index = None
+_glass_index_lock = threading.Lock()
+
+
+def glass_index(build=True) -> GlassIndex|None:
+    """ Return the shared :class:`GlassIndex`, loading or building it.
+
+    Args:
+        build: if False, the index is only returned if it was already built
+               in this session or can be loaded from the cache directory,
+               otherwise None is returned. Building the index loads every
+               catalog.
+    """
+    global _glass_index
+    with _glass_index_lock:
+        if _glass_index is None:
+            cache_pth = cache_dir()
+            index_pth = (None if cache_pth is None
+                         else cache_pth/'glass_index.pkl')
+            gindex = None
+            if index_pth is not None and index_pth.exists():
+                try:
+                    gindex = GlassIndex.load(index_pth)
+                except Exception as exc:
+                    logger.info("can't load glass index %s: %r",
+                                index_pth, exc)
+                else:
+                    if not gindex.is_current():
+                        gindex = None
+            if gindex is None:
+                if not build:
+                    return None
+                gindex = GlassIndex.build()
+                if index_pth is not None:
+                    try:
+                        gindex.save(index_pth)
+                    except OSError as exc:
+                        logger.info("can't save glass index %s: %r",
+                                    index_pth, exc)
+            _glass_index = gindex
+        return _glass_index
@@ -13,6 +13,7 @@ from numpy import sqrt
 from typing import Optional
 from rayoptics.typing import Z_DIR
 from rayoptics.coord_geometry_types import V2d, Vec2d, Vec3d, Dir3d
+from rayoptics.raytr.traceerror import TraceMissedSurfaceError
 
 
 class Interface:
@@ -61,6 +62,14 @@ class Interface:
         if self.decenter is not None:
             self.decenter.update()
 
+    def geometry_key(self) -> tuple:
+        """ Returns a key that changes when the coordinate transforms or
+        the z direction following the interface could change.
+        """
+        dec_key = (self.decenter.geometry_key() 
+                   if self.decenter is not None else None)
+        return self.interact_mode, dec_key
+
     def interface_type(self) -> str:
         return type(self).__name__
 
@@ -120,6 +129,21 @@ class Interface:
         """
         return sqrt(x*x + y*y) <= self.max_aperture + fuzz
 
+    def points_inside(self, x, y, fuzz: float = 1e-5) -> np.ndarray:
+        """ Returns a boolean array, True for points inside the clear aperture.
+
+        This is the vectorized counterpart to :meth:`point_inside`.
+
+        Args:
+            x: array of x coordinates of the test points
+            y: array of y coordinates of the test points
+            fuzz: tolerance on test pt/aperture comparison, 
+                  i.e. pt fuzzy <= surface_od
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        return sqrt(x*x + y*y) <= self.max_aperture + fuzz
+
     def set_max_aperture(self, max_ap: float):
         """ max_ap is the max aperture radius """
         self.max_aperture = max_ap
@@ -151,6 +175,37 @@ class Interface:
         """Returns the unit normal of the interface at point *p*. """
         pass
 
+    def intersect_batch(self, p0, d, z_dir: Z_DIR=1, eps: float=1.0e-12):
+        ''' Intersect a batch of rays with the :class:`~.Interface`.
+
+        The default implementation calls :meth:`intersect` for each ray;
+        subclasses may override it with a vectorized version.
+
+        Args:
+            p0:  [N, 3] array of start points in the interface's coordinates
+            d:  [N, 3] array of direction cosines in the interface's coordinates
+            z_dir: +1 if propagation positive direction, -1 if otherwise
+            eps: numeric tolerance for convergence of any iterative procedure
+
+        Returns:
+            tuple: distances *s1* [N], intersection points *p* [N, 3] and a 
+            boolean mask [N] of the rays that missed the interface
+        '''
+        num_rays = len(p0)
+        s1 = np.full(num_rays, np.nan)
+        p = np.full((num_rays, 3), np.nan)
+        missed = np.zeros(num_rays, dtype=bool)
+        for i in range(num_rays):
+            try:
+                s1[i], p[i] = self.intersect(p0[i], d[i], z_dir=z_dir, eps=eps)
+            except TraceMissedSurfaceError:
+                missed[i] = True
+        return s1, p, missed
+
+    def normal_batch(self, p):
+        """Returns an [N, 3] array of unit normals at the [N, 3] points *p*. """
+        return np.array([self.normal(pi) for pi in p]).reshape(-1, 3)
+
     def phase(self, pt: Vec3d, in_dir: Dir3d, srf_nrml: Dir3d, 
               ifc_cntxt: tuple) -> Optional[tuple[Dir3d, float]]:
         """Returns a diffracted ray direction and phase increment.
@@ -177,6 +232,43 @@ class Interface:
         if hasattr(self, 'phase_element'):
             return self.phase_element.phase(pt, in_dir, srf_nrml, ifc_cntxt)
 
+    def phase_batch(self, pts, in_dirs, srf_nrmls, ifc_cntxt):
+        """Returns diffracted ray directions and phase increments for a batch.
+
+        If the phase_element implements phase_batch(), it is used to
+        evaluate all of the rays together. Otherwise :meth:`phase` is called
+        for each ray.
+
+        Args:
+            pts: [N, 3] points of incidence in :class:`~.Interface` coordinates
+            in_dirs: [N, 3] direction cosines of the incident rays
+            srf_nrmls: [N, 3] :class:`~.Interface` surface normals at pts
+            ifc_cntxt: see :meth:`phase`
+
+        Returns:
+            (**out_dirs, dW, evanescent**)
+
+            - out_dirs: [N, 3] direction cosines of the out going rays
+            - dW: [N] phase added by diffractive interaction
+            - evanescent: [N] boolean mask of rays diffracted evanescently
+        """
+        phase_element = getattr(self, 'phase_element', None)
+        if hasattr(phase_element, 'phase_batch'):
+            return phase_element.phase_batch(pts, in_dirs, srf_nrmls, 
+                                             ifc_cntxt)
+
+        num_rays = len(pts)
+        out_dirs = np.full((num_rays, 3), np.nan)
+        dW = np.full(num_rays, np.nan)
+        evanescent = np.zeros(num_rays, dtype=bool)
+        for i in range(num_rays):
+            try:
+                out_dirs[i], dW[i] = self.phase(pts[i], in_dirs[i], 
+                                                srf_nrmls[i], ifc_cntxt)
+            except ValueError:
+                evanescent[i] = True
+        return out_dirs, dW, evanescent
+
     def apply_scale_factor(self, scale_factor: float):
         self.max_aperture *= abs(scale_factor)
         if self.decenter:
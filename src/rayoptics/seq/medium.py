@@ -10,16 +10,22 @@
 import json
 import difflib
 import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 
 from rayoptics.util.misc_math import isanumber
+from rayoptics.seq.glassindex import (glass_index, glass_catalog_names,
+                                      custom_glass_registry)
 
 import opticalglass as og
-from opticalglass import glass as cat_glass
 from opticalglass import glassfactory as gfact
 from opticalglass import opticalmedium as om
 from opticalglass import modelglass as mg
 from opticalglass import rindexinfo as rii
 from opticalglass import glasserror
+from opticalglass.spectral_lines import get_wavelength
 
 logger = logging.getLogger(__name__)
 
@@ -85,7 +91,7 @@ def decode_medium(*inputs, print_errors=True, **kwargs) -> om.OpticalMedium:
                 name, cat = name.strip(), cat.strip()
             else:  # no catalog name, go with the default catalogs
                 name = inputs[0].strip()
-                cat = gfact._cat_names
+                cat = glass_catalog_names()
         elif num_str_args == 0:
             mat = om.Air()
 
@@ -110,6 +116,126 @@ def decode_medium(*inputs, print_errors=True, **kwargs) -> om.OpticalMedium:
     return mat
 
 
+# --- refractive index cache
+RIndexCacheInfo = namedtuple('RIndexCacheInfo',
+                             ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+# attributes of the opticalglass media holding their dispersion data
+_dispersion_attrs = ('n', 'v', 'coefs', 'wvls', 'rndx', 'rind0', 'wv0')
+
+
+def _data_key(value):
+    """ Returns a hashable form of an index data value. """
+    if value is None:
+        return None
+    try:
+        return np.ascontiguousarray(value, dtype=float).tobytes()
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def medium_key(medium) -> tuple:
+    """ Returns a hashable key identifying the dispersion of `medium`.
+
+    The key is built from the medium's type, name and catalog, plus its
+    dispersion data, e.g. the coefficients of catalog glasses or the
+    wavelength and index data of interpolated media. Media with the same
+    name but different data get different keys, while copies of a medium,
+    e.g. in copies of a model, share cache entries.
+    """
+    data = tuple(_data_key(getattr(medium, attr, None))
+                 for attr in _dispersion_attrs)
+    return (type(medium), medium.name(), medium.catalog_name()) + data
+
+
+class RIndexCache():
+    """ Bounded LRU cache of refractive indices keyed by (medium, wavelength).
+
+    The cache is shared by all of the models in the process; the module level
+    instance, :data:`rindex_cache`, is used by :func:`rindex`. Entries are
+    keyed by :func:`medium_key`, so a medium whose dispersion data is
+    changed in place doesn't return stale entries; these can be removed by
+    calling :meth:`invalidate`.
+
+    Attributes:
+        maxsize: the maximum number of cached index values
+        hits: number of lookups satisfied by the cache
+        misses: number of lookups requiring an index calculation
+    """
+
+    def __init__(self, maxsize=8192):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rindex(self, medium, wvl) -> float:
+        """ Returns the refractive index of `medium` at `wvl`.
+
+        Args:
+            medium: an :class:`~opticalglass.opticalmedium.OpticalMedium`
+            wvl: the wavelength in nm or a spectral line identifier string
+        """
+        key = medium_key(medium), wvl
+        with self._lock:
+            n = self._cache.get(key)
+            if n is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return n
+        n = medium.rindex(wvl)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = n
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return n
+
+    def rindex_array(self, medium, wvls) -> np.ndarray:
+        """ Returns an array of the refractive indices of `medium` at `wvls`.
+
+        The dispersion formula is evaluated once for the whole array of
+        wavelengths; the results aren't cached.
+        """
+        wv_nm = np.array([get_wavelength(w) for w in wvls], dtype=float)
+        n = medium.calc_rindex(wv_nm)
+        if np.ndim(n) == 0:
+            return np.full(wv_nm.shape, n, dtype=float)
+        elif np.shape(n) != wv_nm.shape:
+            # the medium doesn't support array arguments
+            return np.array([medium.calc_rindex(w) for w in wv_nm])
+        return np.asarray(n, dtype=float)
+
+    def invalidate(self, medium=None):
+        """ Remove the entries for `medium`, or all entries if None. """
+        with self._lock:
+            if medium is None:
+                self._cache.clear()
+            else:
+                mkey = medium_key(medium)
+                for key in [k for k in self._cache if k[0] == mkey]:
+                    del self._cache[key]
+
+    def cache_info(self) -> RIndexCacheInfo:
+        return RIndexCacheInfo(self.hits, self.misses, self.maxsize,
+                               len(self._cache))
+
+
+rindex_cache = RIndexCache()
+
+
+def rindex(medium, wvl) -> float:
+    """ Returns the refractive index of `medium` at `wvl`, using the cache. """
+    return rindex_cache.rindex(medium, wvl)
+
+
+def rindex_array(medium, wvls) -> np.ndarray:
+    """ Returns the refractive indices of `medium` at an array of `wvls`. """
+    return rindex_cache.rindex_array(medium, wvls)
+
+
 # --- glass finder base class
 class GlassHandlerBase():
     """Base class for glass matching capability.
@@ -141,8 +267,9 @@ class GlassHandlerBase():
             self.filename = filename.with_suffix('.smx')
             self.glasses_not_found = self.load_replacements(self.filename)
         self.no_replacements = not self.glasses_not_found
-        self.custom_glass_registry = {key[0]: (key[1], value) 
-                                      for key, value in gfact._custom_glass_registry.items()}
+        self.custom_glass_registry = {
+            key[0]: (key[1], value)
+            for key, value in custom_glass_registry().items()}
 
     def load_replacements(self, filename):
         glasses_not_found = og.util.Counter()
@@ -156,6 +283,7 @@ class GlassHandlerBase():
                 else:  # eval code to create a new glass instance
                     mat = eval(val)
                 gfact.register_glass(mat)
+                rindex_cache.invalidate(mat)
         return glasses_not_found
 
     def save_replacements(self):
@@ -168,11 +296,14 @@ class GlassHandlerBase():
                 with self.filename.open('w') as file:
                     json.dump(self.glasses_not_found, file)
 
-    def find_glass(self, name, catalog, always=True) -> om.OpticalMedium|None:
+    def find_glass(self, name, catalog, always=True,
+                   nd_vd=None) -> om.OpticalMedium|None:
         """ find `name` glass or a substitute or, if always is True, n=1.5 
         
         Include searching the custom_glass_registry from the 
-        opticalglass package.
+        opticalglass package. If the file provides the glass's (nd, vd)
+        values, `nd_vd`, they're used to find a substitute when no glass of
+        the same family is found.
         """
 
         try:
@@ -180,8 +311,8 @@ class GlassHandlerBase():
                 if name in self.custom_glass_registry:
                     catalog = self.custom_glass_registry[name][0]
                 else:
-                    catalog = gfact._cat_names
-            medium = gfact.create_glass(name, catalog)
+                    catalog = glass_catalog_names()
+            medium = self.create_catalog_glass(name, catalog)
         except glasserror.GlassNotFoundError:
             pass
         else:
@@ -189,7 +320,7 @@ class GlassHandlerBase():
             return medium
 
         if self.no_replacements:
-            medium = self.find_substitute_glass(name)
+            medium = self.find_substitute_glass(name, nd_vd=nd_vd)
             if medium is not None:
                 self.track_contents['glass substituted'] += 1
                 return medium
@@ -201,6 +332,37 @@ class GlassHandlerBase():
 
         return medium
 
+    def create_catalog_glass(self, name, catalog) -> om.OpticalMedium:
+        """ create `name` glass from the first `catalog` that has it
+
+        If the :func:`~.glass_index` is already available, it is used to
+        find the catalog with the glass, so that only that catalog is loaded.
+        Otherwise the catalogs are searched in order, loading them as needed.
+
+        Raises:
+            GlassNotFoundError: if name isn't in the specified catalogs
+        """
+        if isinstance(catalog, str):
+            return gfact.create_glass(name, catalog)
+
+        gindex = glass_index(build=False)
+        if gindex is None:
+            return gfact.create_glass(name, catalog)
+        custom_keys = custom_glass_registry()
+        for cat in catalog:
+            if (gindex.is_indexed(cat) and
+                    (name.strip(), cat) not in custom_keys):
+                entries = gindex.lookup(name, [cat])
+                if len(entries) > 0:
+                    return gfact.create_glass(entries[0].name,
+                                              entries[0].catalog)
+            else:
+                try:
+                    return gfact.create_glass(name, cat)
+                except glasserror.GlassError:
+                    continue
+        raise glasserror.GlassNotFoundError(catalog, name)
+
     def find_6_digit_code(self, name) -> om.OpticalMedium|None:
         """ process `name` as a 6 digit glass code"""
         if isanumber(name):
@@ -214,55 +376,50 @@ class GlassHandlerBase():
         else:
             return None
 
-    def find_substitute_glass(self, name) -> om.OpticalMedium|None:
-        """Try to find a similar glass to ``name``."""
+    def find_substitute_glass(self, name,
+                              nd_vd=None) -> om.OpticalMedium|None:
+        """Try to find a similar glass to ``name``.
+
+        Glasses of the same family (group and number) as ``name`` are
+        searched first, including the legacy Robb1983 catalog. If there
+        aren't any and the (nd, vd) values of the glass are given by
+        ``nd_vd``, the nearest catalog glass in (nd, vd) is used.
+        """
 
         # create a list of catalogs
         # the original lookup didn't find anything so
         # look in all of our catalogs
         cat_names = [gc.upper() for gc in self.glass_catalogs]
-        for gc in gfact._cat_names_uc:
+        for gc in [c.upper() for c in glass_catalog_names()]:
             if gc not in cat_names:
                 cat_names.append(gc)
 
-        # create a glass list for the given catalogs
-        glist = []
-        for glass_cat in cat_names:
-            try:
-                glass_cat = gfact.get_glass_catalog(glass_cat)
-            except glasserror.GlassCatalogNotFoundError:
-                pass
-            else:
-                glist += glass_cat.glass_list
-
+        gindex = glass_index()
         # Add legacy glasses
-        glist += cat_glass.Robb1983Catalog().glass_list
-
-        # decode the input name
-        gn_decode = cat_glass.decode_glass_name(name)
-        # build an uppercase version for comparisons
-        gn_decode_uc = gn_decode[0][0].upper() + gn_decode[0][1]
-
-        subs_glasses = []
-        for g in glist:
-            gn_decode, gn, gc = g
-            if gn_decode_uc == gn_decode[0][0].upper() + gn_decode[0][1]:
-                subs_glasses.append(g)
+        legacy_cats = [gc for gc in gindex.catalog_names if 'Robb1983' in gc]
+        subs_glasses = gindex.family(name, cat_names + legacy_cats)
 
         if len(subs_glasses):
-            possibilities = [gn for gn_decode, gn, gc in subs_glasses]
+            possibilities = [g.name for g in subs_glasses]
             matches = difflib.get_close_matches(name, possibilities)
             if len(matches) > 0:
                 gn = matches[0]
-                gc = next((g[2] for g in subs_glasses if g[1] == gn), None)
+                gc = next((g.catalog for g in subs_glasses if g.name == gn),
+                          None)
             else:
-                gn_decode, gn, gc = subs_glasses[0]
-            medium = gfact.create_glass(gn, gc)
-            self.glasses_not_found[name] = gn, gc
-            return medium
+                gn, gc = subs_glasses[0].name, subs_glasses[0].catalog
+        elif nd_vd is not None:
+            nearest = gindex.nearest(*nd_vd, catalogs=cat_names)
+            if len(nearest) == 0:
+                return None
+            gn, gc = nearest[0].name, nearest[0].catalog
         else:
             return None
 
+        medium = gfact.create_glass(gn, gc)
+        self.glasses_not_found[name] = gn, gc
+        return medium
+
     def handle_glass_not_found(self, name) -> om.OpticalMedium|None:
         """Record missing glasses or create new replacement glass instances."""
 
@@ -279,6 +436,7 @@ class GlassHandlerBase():
                 else:  # eval code to create a new glass instance
                     mat = eval(self.glasses_not_found[name])
                 gfact.register_glass(mat)
+                rindex_cache.invalidate(mat)
                 return mat
             else:
                 return None
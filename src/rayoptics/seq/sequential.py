@@ -23,6 +23,7 @@ from rayoptics.seq.interface import Interface
 from . import medium
 from rayoptics.raytr import raytrace as rt
 from rayoptics.raytr import trace as trace
+from rayoptics.raytr import traceerror as terr
 from rayoptics.raytr import vigcalc
 from rayoptics.raytr import waveabr
 from rayoptics.elem import transform as trns
@@ -114,6 +115,7 @@ class SequentialModel:
         del attrs['wvlns']
         del attrs['rndx']
         del attrs['seq_def']
+        attrs.pop('_update_keys', None)
         return attrs
 
     def _initialize_arrays(self):
@@ -259,6 +261,8 @@ class SequentialModel:
     def calc_ref_indices_for_spectrum(self, wvls):
         """ returns a list with refractive indices for all **wvls**
 
+        The indices are looked up in the shared :data:`~.medium.rindex_cache`.
+
         Args:
             wvls: list of wavelengths in nm
         """
@@ -267,7 +271,7 @@ class SequentialModel:
             ri = []
             mat = g.medium
             for w in wvls:
-                rndx = mat.rindex(w)
+                rndx = medium.rindex(mat, w)
                 ri.append(rndx)
             indices.append(ri)
 
@@ -344,7 +348,7 @@ class SequentialModel:
         self.lcl_tfrms.insert(idx, tfrm)
 
         wvls = self.opt_model.optical_spec.spectral_region.wavelengths
-        rindex = [gap.medium.rindex(w) for w in wvls]
+        rindex = [medium.rindex(gap.medium, w) for w in wvls]
         self.rndx.insert(idx, rindex)
 
         if ifc.interact_mode == 'reflect':
@@ -610,13 +614,40 @@ class SequentialModel:
             self._use_cache = True
 
     def update_model(self, **kwargs):
+        """ Update the refractive indices, z_dir and transforms of the model.
+
+        The media, interfaces and gaps are compared with their state at the
+        previous update (see :meth:`~.Gap.medium_key` and
+        :meth:`~.Interface.geometry_key`). Refractive indices are only
+        recomputed for gaps whose medium changed, and transforms only for the
+        interfaces affected by a change. Everything is recomputed if
+        build='rebuild' is specified, or if the wavelengths or the number of
+        interfaces changed.
+        """
         # delta n across each surface interface must be set to some
         #  reasonable default value. use the index at the central wavelength
         spectral_region = self.opt_model['optical_spec'].spectral_region
         ref_wl = spectral_region.reference_wvl
 
+        prev_keys = getattr(self, '_update_keys', None)
+        wvlns = list(spectral_region.wavelengths)
+        media_keys = [g.medium_key() for g in self.gaps]
+        full_update = (kwargs.get('build', None) == 'rebuild' or 
+                       prev_keys is None or
+                       prev_keys[0] != wvlns or
+                       len(prev_keys[1]) != len(media_keys) or
+                       len(self.rndx) != len(self.gaps))
+
         self.wvlns = spectral_region.wavelengths
-        self.rndx = self.calc_ref_indices_for_spectrum(self.wvlns)
+        if full_update:
+            self.rndx = self.calc_ref_indices_for_spectrum(self.wvlns)
+        else:
+            rndx = list(self.rndx)
+            for i, g in enumerate(self.gaps):
+                if media_keys[i] != prev_keys[1][i]:
+                    rndx[i] = [medium.rindex(g.medium, w)
+                               for w in self.wvlns]
+            self.rndx = rndx
 
         num_ifcs = len(self.ifcs)
         if self.cur_surface is not None:
@@ -660,9 +691,25 @@ class SequentialModel:
             # call update() on the surface interface
             ifc.update()
 
-        self.gbl_tfrms = self.compute_global_coords()
-        self.lcl_tfrms = self.compute_local_transforms()
-
+        geom_keys = [(ifc.geometry_key(), g.thi if g is not None else None)
+                     for ifc, g in itertools.zip_longest(self.ifcs, 
+                                                         self.gaps)]
+        if (full_update or len(prev_keys[2]) != len(geom_keys) or
+                len(self.lcl_tfrms) != num_ifcs):
+            self.gbl_tfrms = self.compute_global_coords()
+            self.lcl_tfrms = self.compute_local_transforms()
+        else:
+            changed = [key != prev_key 
+                       for key, prev_key in zip(geom_keys, prev_keys[2])]
+            if any(changed):
+                self.gbl_tfrms = trns.update_global_coords(
+                    self, self.gbl_tfrms, changed)
+                self.lcl_tfrms = trns.update_local_transforms(
+                    self, self.lcl_tfrms, changed)
+        self._update_keys = wvlns, media_keys, geom_keys
+
+        # interfaces and gaps may have been replaced by equivalent objects,
+        #  so the cached paths are always discarded
         if self._use_cache:
             self.path_sequence.cache_clear()
             self.reverse_path_sequence.cache_clear()
@@ -1056,8 +1103,13 @@ class SequentialModel:
         return fans_x, fans_y, (max_rho_val, max_y_val), rc
 
     def trace_grid(self, fct, fi, wl=None, num_rays=21, form='grid',
-                   append_if_none=True, **kwargs):
-        """ fct is applied to the raw grid and returned as a grid  """
+                   append_if_none=True, executor=None, **kwargs):
+        """ fct is applied to the raw grid and returned as a grid
+
+        If an :class:`~.AnalysisExecutor` is given as `executor`, the rays
+        for each wavelength are traced in the worker processes and `fct` is
+        applied to the results in this process.
+        """
         osp = self.opt_model.optical_spec
         wvls = osp.spectral_region
         wvl = self.central_wavelength()
@@ -1074,44 +1126,55 @@ class SequentialModel:
         grid_start = np.array([-1., -1.])
         grid_stop = np.array([1., 1.])
         grid_def = [grid_start, grid_stop, num_rays]
+        if executor is not None:
+            from rayoptics.raytr import parallel
+            ray_grids = parallel.eval_fields_wvls(
+                self.opt_model, parallel.trace_grid_job, grid_def,
+                executor=executor, fields=[fi], wvls=wv_list, foc=foc,
+                **kwargs)[0]
         for wi, wvl in enumerate(wv_list):
-            grid = trace.trace_grid(self.opt_model, grid_def, fld, wvl, foc,
-                                    form=form, append_if_none=append_if_none,
-                                    img_filter=lambda p, ray_pkg:
-                                    fct(p, wi, ray_pkg, fld, wvl, foc),
-                                    **kwargs)
+            if executor is None:
+                grid = trace.trace_grid(self.opt_model, grid_def, fld, wvl,
+                                        foc, form=form,
+                                        append_if_none=append_if_none,
+                                        img_filter=lambda p, ray_pkg:
+                                        fct(p, wi, ray_pkg, fld, wvl, foc),
+                                        **kwargs)
+            else:
+                grid = parallel.filter_grid(ray_grids[wi], num_rays,
+                                            lambda p, ray_pkg:
+                                            fct(p, wi, ray_pkg, fld, wvl, foc),
+                                            form=form,
+                                            append_if_none=append_if_none)
             grids.append(grid)
         rc = wvls.render_colors
         return grids, rc
 
     def trace_wavefront(self, fld, wvl, foc, num_rays=32):
+        """Returns a [num_rays, num_rays, 3] grid of pupil_x, pupil_y, opd.
 
-        def wave(p, ray_pkg, fld, wvl, foc):
-            x = p[0]
-            y = p[1]
-            if ray_pkg is not None:
-                fod = self.opt_model['analysis_results']['parax_data'].fod
-                opd = waveabr.wave_abr_full_calc(fod, fld, wvl, foc, ray_pkg,
-                                                 fld.chief_ray,
-                                                 fld.ref_sphere)
-                opd = opd/self.opt_model.nm_to_sys_units(wvl)
-            else:
-                opd = 0.0
-            return np.array([x, y, opd])
-
+        The rays are traced as a batch and the OPD is evaluated for all of
+        the rays together. Rays that fail to trace have an OPD of 0.
+        """
         rs_pkg, cr_pkg = trace.setup_pupil_coords(self.opt_model,
                                                   fld, wvl, foc)
         fld.chief_ray = cr_pkg
         fld.ref_sphere = rs_pkg
 
-        grid_start = np.array([-1., -1.])
-        grid_stop = np.array([1., 1.])
-        grid_def = (grid_start, grid_stop, num_rays)
-
-        grid = trace.trace_grid(self.opt_model, grid_def, fld, wvl, foc,
-                                img_filter=lambda p, ray_pkg:
-                                wave(p, ray_pkg, fld, wvl, foc), form='grid')
-        return grid
+        coords = np.linspace(-1., 1., num_rays)
+        px, py = np.meshgrid(coords, coords, indexing='ij')
+        pupils = np.column_stack((px.ravel(), py.ravel()))
+        ray_batch = trace.trace_base_batch(self.opt_model, pupils, fld, wvl,
+                                           check_apertures=True)
+
+        fod = self.opt_model['analysis_results']['parax_data'].fod
+        opd = waveabr.wave_abr_full_calc_batch(fod, ray_batch, cr_pkg,
+                                               rs_pkg)
+        opd = opd/self.opt_model.nm_to_sys_units(wvl)
+        opd = np.where(ray_batch.err_code == terr.OK, opd, 0.0)
+        # the grid has the vignetted pupil coordinates
+        pupils = fld.apply_vignetting_batch(pupils)
+        return np.column_stack((pupils, opd)).reshape(num_rays, num_rays, 3)
 
     def set_clear_apertures_paraxial(self):
         ax_ray, pr_ray, _ = self.opt_model['analysis_results']['parax_data']
@@ -1297,7 +1360,7 @@ def create_surface_and_gap(surf_data, radius_mode=False, prev_medium=None,
         s.set_max_aperture(kwargs.get('sd'))
     thi = surf_data[1]
     g = gap.Gap(thi, mat)
-    rndx = mat.rindex(wvl)
+    rndx = medium.rindex(mat, wvl)
     tfrm = np.identity(3), np.array([0., 0., thi])
 
     return s, g, z_dir, rndx, tfrm
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the glass catalog index"""
+
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from opticalglass import glasserror
+
+from rayoptics.seq import glassindex
+from rayoptics.seq.medium import GlassHandlerBase
+
+
+class GlassIndexTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # build the index in a temporary cache directory
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        with mock.patch.dict(os.environ,
+                             {'RAYOPTICS_CACHE_DIR': cls.tmp_dir.name}):
+            saved_index, glassindex._glass_index = glassindex._glass_index, None
+            try:
+                cls.gindex = glassindex.glass_index()
+            finally:
+                glassindex._glass_index = saved_index
+        cls.index_pth = Path(cls.tmp_dir.name)/'glass_index.pkl'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_cache_dir(self):
+        self.assertTrue(self.index_pth.exists())
+        with mock.patch.dict(os.environ, {'RAYOPTICS_CACHE_DIR': ''}):
+            self.assertIsNone(glassindex.cache_dir())
+
+    def test_lookup(self):
+        entries = self.gindex.lookup('n-bk7', ['Hoya', 'Schott'])
+        self.assertEqual(entries[0][:2], ('N-BK7', 'Schott'))
+        self.assertAlmostEqual(entries[0].nd, 1.5168, places=4)
+        self.assertEqual(self.gindex.lookup('NOT-A-GLASS'), [])
+
+        nearest = self.gindex.nearest(1.5168, 64.17, k=3,
+                                      catalogs=['Schott'])
+        self.assertEqual(len(nearest), 3)
+        self.assertEqual(nearest[0].name, 'N-BK7')
+        self.assertTrue(all(e.catalog == 'Schott' for e in nearest))
+
+    def test_save_load(self):
+        gindex = glassindex.GlassIndex.load(self.index_pth)
+        self.assertTrue(gindex.is_current())
+        self.assertEqual(gindex.names, self.gindex.names)
+        self.assertEqual(gindex.lookup('F2'), self.gindex.lookup('F2'))
+
+    def test_glass_handler(self):
+        handler = GlassHandlerBase(None)
+        # without an available index, the catalogs are searched in order
+        with mock.patch.dict(os.environ, {'RAYOPTICS_CACHE_DIR': ''}), \
+                mock.patch.object(glassindex, '_glass_index', None):
+            medium = handler.create_catalog_glass('S-BSL7',
+                                                  ['Schott', 'Ohara'])
+            self.assertIsNone(glassindex._glass_index)
+        self.assertEqual(medium.catalog_name(), 'Ohara')
+
+        with mock.patch.object(glassindex, '_glass_index', self.gindex):
+            medium = handler.create_catalog_glass('S-BSL7',
+                                                  ['Schott', 'Ohara'])
+        self.assertEqual(medium.catalog_name(), 'Ohara')
+        with self.assertRaises(glasserror.GlassNotFoundError):
+            handler.create_catalog_glass('NOT-A-GLASS', ['Schott'])
+
+        # a same family substitute
+        medium = handler.find_substitute_glass('Q-BAF4')
+        self.assertIn('Q-BAF4', handler.glasses_not_found)
+        self.assertIn('BAF', medium.name().upper())
+        # a substitute from nd, vd
+        medium = handler.find_substitute_glass('XYZ1', nd_vd=(1.5168, 64.17))
+        self.assertAlmostEqual(medium.rindex('d'), 1.5168, places=4)
+        self.assertIn('XYZ1', handler.glasses_not_found)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the refractive index cache"""
+
+
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from opticalglass import glassfactory as gfact
+from opticalglass import modelglass as mg
+from opticalglass import opticalmedium as om
+
+from rayoptics.seq.medium import RIndexCache
+
+
+class RIndexCacheTestCase(unittest.TestCase):
+
+    def test_hits_and_invalidate(self):
+        cache = RIndexCache(maxsize=4)
+        bk7 = gfact.create_glass('N-BK7', 'Schott')
+        bk7_copy = gfact.create_glass('N-BK7', 'Schott')
+        n = cache.rindex(bk7, 587.6)
+        self.assertEqual(n, bk7.rindex(587.6))
+        # a copy of the medium shares the cache entry
+        self.assertEqual(cache.rindex(bk7_copy, 587.6), n)
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+        # a model glass with a changed index doesn't hit the stale entry
+        glass = mg.ModelGlass(1.5, 60., 'model')
+        n0 = cache.rindex(glass, 'd')
+        glass.update(1.6, 40.)
+        self.assertNotEqual(cache.rindex(glass, 'd'), n0)
+
+        cache.invalidate(bk7)
+        self.assertEqual(cache.cache_info().currsize, 2)
+        for w in (450., 500., 550., 600.):
+            cache.rindex(glass, w)
+        self.assertEqual(cache.cache_info().currsize, 4)
+        cache.invalidate()
+        self.assertEqual(cache.cache_info().currsize, 0)
+
+    def test_same_name_different_data(self):
+        cache = RIndexCache()
+        wvls = [400., 500., 587.6, 700., 800.]
+        rndx = [1.50, 1.49, 1.485, 1.48, 1.475]
+        g1 = om.InterpolatedMedium('G1', wvls=wvls, rndx=rndx, cat='')
+        g2 = om.InterpolatedMedium('G1', wvls=wvls,
+                                   rndx=[n + 0.2 for n in rndx], cat='')
+        self.assertAlmostEqual(cache.rindex(g1, 587.6), 1.485)
+        self.assertAlmostEqual(cache.rindex(g2, 587.6), 1.685)
+
+    def test_rindex_array(self):
+        cache = RIndexCache()
+        wvls = np.linspace(400., 800., 201)
+        for mat in (gfact.create_glass('N-SF6', 'Schott'),
+                    mg.ModelGlass(1.517, 64.2, '517642'), om.Air()):
+            n = cache.rindex_array(mat, wvls)
+            self.assertEqual(n.shape, wvls.shape)
+            npt.assert_allclose(n, [mat.rindex(w) for w in wvls],
+                                rtol=0, atol=1e-14)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the incremental update of the sequential model"""
+
+
+import copy
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy.testing as npt
+
+import rayoptics as ro
+from rayoptics.gui.appcmds import open_model
+from opticalglass import modelglass as mg
+
+
+class IncrementalUpdateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings("ignore", category=RuntimeWarning)
+        self.root_pth = Path(ro.__file__).resolve().parent
+
+    def compare_to_rebuild(self, sm):
+        """ an incremental update must match a full update """
+        sm.update_model()
+        lcl_tfrms, gbl_tfrms = sm.lcl_tfrms, sm.gbl_tfrms
+        rndx = sm.rndx
+        delta_n = [ifc.delta_n for ifc in sm.ifcs]
+
+        sm.update_model(build='rebuild')
+        for (r, t), (r_full, t_full) in zip(lcl_tfrms, sm.lcl_tfrms):
+            npt.assert_allclose(r, r_full, rtol=0, atol=1e-14)
+            npt.assert_allclose(t, t_full, rtol=0, atol=1e-12)
+        for (r, t), (r_full, t_full) in zip(gbl_tfrms, sm.gbl_tfrms):
+            npt.assert_allclose(r, r_full, rtol=0, atol=1e-14)
+            npt.assert_allclose(t, t_full, rtol=0, atol=1e-12)
+        self.assertEqual(rndx, sm.rndx)
+        self.assertEqual(delta_n, [ifc.delta_n for ifc in sm.ifcs])
+
+    def test_thickness_and_medium(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm['seq_model']
+        sm.gaps[3].thi += 0.5
+        self.compare_to_rebuild(sm)
+
+        sm.gaps[0].thi = 1.0e5
+        self.compare_to_rebuild(sm)
+
+        sm.gaps[4].medium = mg.ModelGlass(1.6, 40., '')
+        self.compare_to_rebuild(sm)
+
+    def test_medium_changed_in_place(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm['seq_model']
+        glass = sm.gaps[4].medium = mg.ModelGlass(1.6, 40., 'G1')
+        sm.update_model()
+        glass.update(1.65, 35.)
+        self.compare_to_rebuild(sm)
+
+    def test_replaced_interface(self):
+        opm = open_model(self.root_pth/'codev/tests/ag_dblgauss.seq')
+        sm = opm['seq_model']
+        list(sm.path())
+        ifc = copy.deepcopy(sm.ifcs[3])
+        ifc.profile.cv *= 1.1
+        sm.ifcs[3] = ifc
+        opm.update_model()
+        self.assertIs(list(sm.path())[3][0], sm.ifcs[3])
+        self.assertIs(list(sm.reverse_path(4))[1][0], sm.ifcs[3])
+
+    def test_decenter(self):
+        opm = open_model(self.root_pth/'codev/tests/dec_rev_tilt_test.seq')
+        sm = opm['seq_model']
+        # decenters are often edited in place
+        sm.ifcs[3].decenter.euler[0] += 2.
+        self.compare_to_rebuild(sm)
+
+        sm.ifcs[4].decenter.dec[1] -= 0.1
+        sm.gaps[2].thi += 1.
+        self.compare_to_rebuild(sm)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
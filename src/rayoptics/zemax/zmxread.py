@@ -15,6 +15,7 @@ from rayoptics.elem.surface import (DecenterData, Circular, Rectangular,
                                     Elliptical)
 from rayoptics.elem import profiles
 from rayoptics.seq.medium import GlassHandlerBase
+from rayoptics.seq.glassindex import glass_catalog_names
 from rayoptics.raytr.opticalspec import Field
 from rayoptics.util.misc_math import isanumber
 import rayoptics.zemax.zmx2ro as zmx2ro
@@ -33,9 +34,28 @@ _fh = logging.FileHandler('zmx_read_lens.log', mode='w', delay=True)
 _fh.setLevel(logging.INFO)
 logger.addHandler(_fh)
 
-_glass_handler = None
-_cmd_not_handled = None
-_track_contents = None
+
+class ZmxImportContext():
+    """ The parse state of a single .zmx file import.
+
+    :func:`read_lens` creates a new context for each file and passes it to
+    the line processing functions, so that files can be imported
+    concurrently from multiple threads.
+
+    Attributes:
+        glass_handler: the :class:`ZmxGlassHandler` for the file
+        cmd_not_handled: Counter of the unrecognized commands
+        track_contents: Counter of the import statistics
+    """
+
+    def __init__(self, filename):
+        self.glass_handler = ZmxGlassHandler(filename)
+        self.cmd_not_handled = og.util.Counter()
+        self.track_contents = og.util.Counter()
+
+    def info(self) -> tuple[dict, dict]:
+        """ Return the import info tuple. """
+        return self.track_contents, self.glass_handler.glasses_not_found
 
 
 def read_lens_file(filename, **kwargs):
@@ -52,7 +72,6 @@ def read_lens_file(filename, **kwargs):
     Returns:
         an OpticalModel instance and a info tuple
     """
-    global _track_contents
     if 'encoding' in kwargs:
         encodings = kwargs['encoding']
         if isinstance(encodings, str):
@@ -70,14 +89,13 @@ def read_lens_file(filename, **kwargs):
             break
 
     opt_model, info = read_lens(filename, inpt, **kwargs)
-    _track_contents['encoding'] = decode
+    info[0]['encoding'] = decode
 
     return opt_model, info
 
 
 def read_lens_url(url, **kwargs) -> tuple["OpticalModel", tuple[dict, dict]]:
     ''' given a url to a Zemax file, return an OpticalModel  '''
-    global _track_contents
     r = requests.get(url, allow_redirects=True)
 
     apparent_encoding = r.apparent_encoding
@@ -85,7 +103,7 @@ def read_lens_url(url, **kwargs) -> tuple["OpticalModel", tuple[dict, dict]]:
     inpt = r.text
 
     opt_model, info = read_lens(None, inpt, **kwargs)
-    _track_contents['encoding'] = apparent_encoding
+    info[0]['encoding'] = apparent_encoding
 
     return opt_model, info
 
@@ -94,32 +112,26 @@ def read_lens(filename, inpt, **kwargs) -> tuple["OpticalModel",
                                                  tuple[dict, dict]]:
     ''' given inpt str of a Zemax .zmx file, return an OpticalModel  '''
     from rayoptics.optical.opticalmodel import OpticalModel
-    global _glass_handler, _cmd_not_handled, _track_contents
-    _cmd_not_handled = og.util.Counter()
-    _track_contents = og.util.Counter()
+    ctx = ZmxImportContext(filename)
 
     # create an empty optical model; all surfaces will come from .zmx file
     opt_model = OpticalModel(do_init=False)
 
     input_lines = inpt.splitlines()
 
-    _glass_handler = ZmxGlassHandler(filename)
-
     for i, line in enumerate(input_lines):
-        process_line(opt_model, line, i+1)
+        process_line(opt_model, line, i+1, ctx)
 
-    post_process_input(opt_model, filename, **kwargs)
-    _glass_handler.save_replacements()
-    _track_contents.update(_glass_handler.track_contents)
+    post_process_input(opt_model, filename, ctx, **kwargs)
+    ctx.glass_handler.save_replacements()
+    ctx.track_contents.update(ctx.glass_handler.track_contents)
 
     opt_model.update_model()
 
-    info = _track_contents, _glass_handler.glasses_not_found
-    return opt_model, info
+    return opt_model, ctx.info()
 
 
-def process_line(opt_model, line, line_no):
-    global _glass_handler, _cmd_not_handled, _track_contents
+def process_line(opt_model, line, line_no, ctx):
     sm = opt_model['seq_model']
     osp = opt_model['optical_spec']
     cur = sm.cur_surface
@@ -140,7 +152,7 @@ def process_line(opt_model, line, line_no):
     elif cmd == "NOTE":
         opt_model.note = inputs.strip("\"")
     elif cmd == "VERS":
-        _track_contents["VERS"] = inputs.strip("\"")
+        ctx.track_contents["VERS"] = inputs.strip("\"")
     elif cmd == "SURF":
         s, g = sm.insert_surface_and_gap()
         # set type to Standard, some files don't have a Type command
@@ -153,7 +165,7 @@ def process_line(opt_model, line, line_no):
         g = sm.gaps[cur]
         g.thi = float(inputs)
 
-    elif _glass_handler(sm, cur, cmd, inputs):
+    elif ctx.glass_handler(sm, cur, cmd, inputs):
         pass
 
     elif cmd == "STOP":
@@ -175,16 +187,16 @@ def process_line(opt_model, line, line_no):
         sr = osp.spectral_region
         sr.spectral_wts = [float(i)*1e+3 for i in inputs.split() if i]
 
-    elif pupil_data(opt_model, cmd, inputs):
+    elif pupil_data(opt_model, cmd, inputs, ctx):
         pass
 
-    elif field_spec_data(opt_model, cmd, inputs):
+    elif field_spec_data(opt_model, cmd, inputs, ctx):
         pass
 
-    elif handle_types_and_params(opt_model, cur, cmd, inputs):
+    elif handle_types_and_params(opt_model, cur, cmd, inputs, ctx):
         pass
 
-    elif handle_aperture_data(opt_model, cur, cmd, inputs):
+    elif handle_aperture_data(opt_model, cur, cmd, inputs, ctx):
         pass
 
     elif cmd in ("OPDX",  # opd
@@ -215,11 +227,10 @@ def process_line(opt_model, line, line_no):
         logger.info('Line %d: Command %s not supported', line_no, cmd)
     else:
         # don't recognize this cmd, record # of times encountered
-        _cmd_not_handled[cmd] += 1
+        ctx.cmd_not_handled[cmd] += 1
 
 
-def post_process_input(opt_model, filename, **kwargs):
-    global _track_contents
+def post_process_input(opt_model, filename, ctx, **kwargs):
     sm = opt_model['seq_model']
     sm.gaps.pop()
     sm.z_dir.pop()
@@ -235,16 +246,16 @@ def post_process_input(opt_model, filename, **kwargs):
     if math.isinf(sm.gaps[0].thi):
         sm.gaps[0].thi = 1e10
         conj_type = 'infinite'
-    _track_contents['conj type'] = conj_type
+    ctx.track_contents['conj type'] = conj_type
 
     sm.ifcs[0].label = 'Obj'
     sm.ifcs[0].interact_mode = 'dummy'
     sm.ifcs[-1].label = 'Img'
     sm.ifcs[-1].interact_mode = 'dummy'
-    _track_contents['# surfs'] = len(sm.ifcs)
+    ctx.track_contents['# surfs'] = len(sm.ifcs)
 
     # if DIAM records, turn off sm aperture setting
-    if _track_contents.get('# clear ap', 0) > 0:
+    if ctx.track_contents.get('# clear ap', 0) > 0:
         sm.do_apertures = False
 
     do_post_processing = kwargs.get('do_postprocess', False)
@@ -265,15 +276,15 @@ def post_process_input(opt_model, filename, **kwargs):
             sr.wavelengths.pop()
             sr.spectral_wts.pop()
     sr.reference_wvl = len(sr.wavelengths)//2
-    _track_contents['# wvls'] = len(sr.wavelengths)
+    ctx.track_contents['# wvls'] = len(sr.wavelengths)
 
     fov = osp['fov']
-    _track_contents['fov'] = fov.key
+    ctx.track_contents['fov'] = fov.key
 
     max_fld, max_fld_idx = fov.max_field()
     fov.value = max_fld
     fov.fields = [f for f in fov.fields[:max_fld_idx+1]]
-    _track_contents['# fields'] = len(fov.fields)
+    ctx.track_contents['# fields'] = len(fov.fields)
     # switch vignetting definition to asymmetric vly, vuy style
     # need to verify this is how this works
     for f in fov.fields:
@@ -291,14 +302,13 @@ def log_cmd(label, cmd, inputs):
     logger.debug("%s: %s %s", label, cmd, str(inputs))
 
 
-def handle_types_and_params(optm, cur, cmd, inputs):
-    global _track_contents
+def handle_types_and_params(optm, cur, cmd, inputs, ctx):
     if cmd == "TYPE":
         ifc = optm.seq_model.ifcs[cur]
         typ = inputs.split()[0]
         # useful to remember the Type of Zemax surface
         ifc.z_type = typ
-        _track_contents[typ] += 1
+        ctx.track_contents[typ] += 1
         if typ == 'EVENASPH':
             cur_profile = ifc.profile
             new_profile = profiles.mutate_profile(cur_profile,
@@ -326,7 +336,7 @@ def handle_types_and_params(optm, cur, cmd, inputs):
             ifc.z_type = typ
             optm.seq_model.ifcs[cur] = ifc
     elif cmd == "CONI":
-        _track_contents["CONI"] += 1
+        ctx.track_contents["CONI"] += 1
         ifc = optm.seq_model.ifcs[cur]
         cur_profile = ifc.profile
         if not hasattr(cur_profile, 'cc'):
@@ -387,12 +397,11 @@ def handle_types_and_params(optm, cur, cmd, inputs):
     return True
 
 
-def handle_aperture_data(optm, cur, cmd, inputs):
+def handle_aperture_data(optm, cur, cmd, inputs, ctx):
     # DIAM 7.5 1 0 0 1 ""
     # FLAP 0 7.5 0
     # CLAP 0 25.399999999999999 0
     # OBDC 0.000000000000E+00 1.906000000000E+02
-    global _track_contents
     sm = optm.seq_model
     items = inputs.split()
     if cmd == "DIAM":
@@ -422,16 +431,16 @@ def handle_aperture_data(optm, cur, cmd, inputs):
                     case 7:
                         ca = Elliptical(is_obscuration=True)
                     case _:
-                        _track_contents['ca_type_not_recognized'] += 1
+                        ctx.track_contents['ca_type_not_recognized'] += 1
                         # print('ca_type', cur, ca_type, items[1])
                         return True
 
                 if ca_type in [1, 4, 6]:
-                    _track_contents['# clear ap'] += 1
+                    ctx.track_contents['# clear ap'] += 1
                 if ca_type in [2, 5, 7]:
-                    _track_contents['# obscurations'] += 1
+                    ctx.track_contents['# obscurations'] += 1
                 if ca_type in [5, 7]:
-                    _track_contents['non_circular_ca_type'] += 1
+                    ctx.track_contents['non_circular_ca_type'] += 1
     
                 if ca:
                     ca_list.append(ca)
@@ -455,11 +464,10 @@ def handle_aperture_data(optm, cur, cmd, inputs):
     return True
 
 
-def pupil_data(optm, cmd, inputs):
+def pupil_data(optm, cmd, inputs, ctx):
     # FNUM 2.1 0
     # OBNA 1.5E-1 0
     # ENPD 20
-    global _track_contents
     pupil = optm.optical_spec.pupil
     if cmd == 'FNUM':
         pupil.key = 'image', 'f/#'
@@ -470,7 +478,7 @@ def pupil_data(optm, cmd, inputs):
     else:
         return False
 
-    _track_contents['pupil'] = pupil.key
+    ctx.track_contents['pupil'] = pupil.key
 
     pupil.value = float(inputs.split()[0])
 
@@ -479,7 +487,7 @@ def pupil_data(optm, cmd, inputs):
     return True
 
 
-def field_spec_data(optm, cmd, inputs):
+def field_spec_data(optm, cmd, inputs, ctx):
     # XFLN 0 0 0 0 0 0 0 0 0 0 0 0
     # YFLN 0 8.0 1.36E+1 0 0 0 0 0 0 0 0 0
     # FWGN 1 1 1 1 1 1 1 1 1 1 1 1
@@ -493,14 +501,12 @@ def field_spec_data(optm, cmd, inputs):
     # XFLD 0 0 0
     # YFLD 0 35 50
     # FWGT 1 1 1
-    global _track_contents
-
     fov = optm.optical_spec.field_of_view
     if cmd == 'XFLN' or cmd == 'YFLN' or cmd == 'XFLD' or cmd == 'YFLD':
         attr = cmd[0].lower()
     elif cmd == 'FTYP':
         ftyp = int(inputs.split()[0])
-        _track_contents["FTYP"] = inputs
+        ctx.track_contents["FTYP"] = inputs
         if ftyp == 0:
             fov.key = 'object', 'angle'
         elif ftyp == 1:
@@ -557,7 +563,7 @@ class ZmxGlassHandler(GlassHandlerBase):
                     self.glass_catalogs.append(gc)
             # If no catalogs were recognized, use the default set
             if len(self.glass_catalogs) == 0:
-                self.glass_catalogs = gfact._cat_names
+                self.glass_catalogs = glass_catalog_names()
             self.track_contents["GCAT"] = inputs
             return True
         elif cmd == "GLAS":
@@ -588,7 +594,15 @@ class ZmxGlassHandler(GlassHandlerBase):
                     self.track_contents['6 digit code'] += 1
                     return True
             else:  # must be a glass type
-                medium = self.find_glass(name, self.glass_catalogs)
+                # the nd and vd values are used to find a substitute glass
+                nd_vd = None
+                if (len(inputs) > 4 and isanumber(inputs[3]) and
+                        isanumber(inputs[4])):
+                    nd, vd = float(inputs[3]), float(inputs[4])
+                    if nd > 1.0 and vd > 0.0:
+                        nd_vd = nd, vd
+                medium = self.find_glass(name, self.glass_catalogs,
+                                         nd_vd=nd_vd)
                 g.medium = medium
                 return True
 